@@ -1,15 +1,18 @@
 import numpy as np
 import pandas as pd
 
-import os, queue, sys
+import os, sys
 from message.Message import MessageType
 
-from util.util import log_print
+from util.EventQueue import EVENT_QUEUES
+from util.LogFormat import LOG_FORMATS, checkLogFormat
+from util.util import log_print, log_enabled
 
 
 class Kernel:
 
-  def __init__(self, kernel_name, random_state = None):
+  def __init__(self, kernel_name, random_state = None, event_queue = 'priority', log_spill_rows = None,
+               log_format = 'bz2'):
     # kernel_name is for human readers only.
     self.name = kernel_name
     self.random_state = random_state
@@ -20,12 +23,23 @@ class Kernel:
       sys.exit()
 
     # A single message queue to keep everything organized by increasing
-    # delivery timestamp.
-    self.messages = queue.PriorityQueue()
+    # delivery timestamp.  Delivery times in the queue are integer nanoseconds.
+    # The default 'priority' queue is the thread-safe queue.PriorityQueue; the
+    # 'heap' queue is a plain heapq with integer-only tiebreaks, which is much
+    # faster.  Both deliver events in exactly the same order.
+    if event_queue not in EVENT_QUEUES:
+      raise ValueError("Unknown event queue requested for the Kernel",
+                       "event_queue:", event_queue, "options:", list(EVENT_QUEUES))
+
+    self.event_queue = event_queue
+    self.messages = EVENT_QUEUES[event_queue]()
 
     # currentTime is None until after kernelStarting() event completes
     # for all agents.  This is a pd.Timestamp that includes the date.
+    # The Kernel itself keeps time as integer nanoseconds since the epoch
+    # (currentTimeNs), converting to pd.Timestamp only when agents need it.
     self.currentTime = None
+    self.currentTimeNs = None
 
     # Timestamp at which the Kernel was created.  Primarily used to
     # create a unique log directory for this run.  Also used to
@@ -43,6 +57,21 @@ class Kernel:
     # is for things like "final position value" and such.
     self.summaryLog = []
 
+    # File format for the agent logs and the summary log (see util.LogFormat).
+    # The default 'bz2' is a bz2-compressed pickle of each log DataFrame.
+    checkLogFormat(log_format)
+    self.log_format = log_format
+
+    # If set, agents write their event logs to their log files in chunks of
+    # log_spill_rows events as the simulation runs (see openLogWriter), rather
+    # than holding them in memory for the whole simulation.  Only the formats
+    # which can be written in chunks (not the bz2 pickle) allow this.
+    if log_spill_rows and not LOG_FORMATS[log_format].streaming:
+      raise ValueError("log_spill_rows needs a log format that can be written in chunks",
+                       "log_format:", log_format,
+                       "options:", [f for f in LOG_FORMATS if LOG_FORMATS[f].streaming])
+    self.log_spill_rows = log_spill_rows
+
     log_print ("Kernel initialized: {}", self.name)
 
 
@@ -69,6 +98,7 @@ class Kernel:
     # the simulation, separate from anything like exchange open/close).
     self.startTime = startTime
     self.stopTime = stopTime
+    stopTimeNs = self.toNs(stopTime)
 
     # The global seed, NOT used for anything agent-related.
     self.seed = seed
@@ -93,15 +123,14 @@ class Kernel:
     # it is still "in the future")
 
     # This also nicely enforces agents being unable to act before
-    # the simulation startTime.
-    self.agentCurrentTimes = [self.startTime] * len(agents)
+    # the simulation startTime.  Agent times are integer nanoseconds.
+    self.agentCurrentTimes = [self.toNs(self.startTime)] * len(agents)
 
     # agentComputationDelays is in nanoseconds, starts with a default
     # value from config, and can be changed by any agent at any time
     # (for itself only).  It represents the time penalty applied to
     # an agent each time it is awakened  (wakeup or recvMsg).  The
     # penalty applies _after_ the agent acts, before it may act again.
-    # TODO: this might someday change to pd.Timedelta objects.
     self.agentComputationDelays = [defaultComputationDelay] * len(agents)
 
     # If an agentLatencyModel is defined, it will be used instead of
@@ -146,6 +175,7 @@ class Kernel:
 
     # Set the kernel to its startTime.
     self.currentTime = self.startTime
+    self.currentTimeNs = self.toNs(self.startTime)
     log_print ("\n--- Kernel Clock started ---")
     log_print ("Kernel.currentTime is now {}", self.currentTime)
 
@@ -180,7 +210,7 @@ class Kernel:
 
     # Start processing the Event Queue.
     log_print ("\n--- Kernel Event Queue begins ---")
-    log_print ("Kernel will start processing messages.  Queue length: {}", len(self.messages.queue))
+    log_print ("Kernel will start processing messages.  Queue length: {}", self.messages.qsize())
 
     # Track starting wall clock time and total message count for stats at the end.
     eventQueueWallClockStart = pd.Timestamp('now')
@@ -189,19 +219,22 @@ class Kernel:
     # Process messages until there aren't any (at which point there never can
     # be again, because agents only "wake" in response to messages), or until
     # the kernel stop time is reached.
-    while not self.messages.empty() and self.currentTime and (self.currentTime <= self.stopTime):
+    while not self.messages.empty() and self.currentTimeNs is not None and (self.currentTimeNs <= stopTimeNs):
       # Get the next message in timestamp order (delivery time) and extract it.
-      self.currentTime, event = self.messages.get()
+      currentTimeNs, event = self.messages.get()
       msg_recipient, msg_type, msg = event
+      self.currentTimeNs = currentTimeNs
+      self.currentTime = pd.Timestamp(currentTimeNs)
 
       # Periodically print the simulation time and total messages, even if muted.
       if ttl_messages % 100000 == 0:
         print ("\n--- Simulation time: {}, messages processed: {}, wallclock elapsed: {} ---\n".format(
                         self.fmtTime(self.currentTime), ttl_messages, pd.Timestamp('now') - eventQueueWallClockStart))
 
-      log_print ("\n--- Kernel Event Queue pop ---")
-      log_print ("Kernel handling {} message for agent {} at time {}", 
-                  msg_type, msg_recipient, self.fmtTime(self.currentTime))
+      if log_enabled():
+        log_print ("\n--- Kernel Event Queue pop ---")
+        log_print ("Kernel handling {} message for agent {} at time {}", 
+                    msg_type, msg_recipient, self.fmtTime(self.currentTime))
 
       ttl_messages += 1
 
@@ -216,27 +249,29 @@ class Kernel:
 
         # Test to see if the agent is already in the future.  If so,
         # delay the wakeup until the agent can act again.
-        if self.agentCurrentTimes[agent] > self.currentTime:
+        if self.agentCurrentTimes[agent] > currentTimeNs:
           # Push the wakeup call back into the PQ with a new time.
           self.messages.put((self.agentCurrentTimes[agent],
                             (msg_recipient, msg_type, msg)))
-          log_print ("Agent in future: wakeup requeued for {}",
-                      self.fmtTime(self.agentCurrentTimes[agent]))
+          if log_enabled():
+            log_print ("Agent in future: wakeup requeued for {}",
+                        self.fmtTime(self.agentCurrentTimes[agent]))
           continue
           
         # Set agent's current time to global current time for start
         # of processing.
-        self.agentCurrentTimes[agent] = self.currentTime
+        self.agentCurrentTimes[agent] = currentTimeNs
 
         # Wake the agent.
         agents[agent].wakeup(self.currentTime)
 
         # Delay the agent by its computation delay plus any transient additional delay requested.
-        self.agentCurrentTimes[agent] += pd.Timedelta(self.agentComputationDelays[agent] +
-                                                      self.currentAgentAdditionalDelay)
+        self.agentCurrentTimes[agent] += int(self.agentComputationDelays[agent] +
+                                             self.currentAgentAdditionalDelay)
 
-        log_print ("After wakeup return, agent {} delayed from {} to {}",
-                    agent, self.fmtTime(self.currentTime), self.fmtTime(self.agentCurrentTimes[agent]))
+        if log_enabled():
+          log_print ("After wakeup return, agent {} delayed from {} to {}",
+                      agent, self.fmtTime(self.currentTime), self.fmtTime(self.agentCurrentTimes[agent]))
 
       elif msg_type == MessageType.MESSAGE:
 
@@ -245,27 +280,29 @@ class Kernel:
 
         # Test to see if the agent is already in the future.  If so,
         # delay the message until the agent can act again.
-        if self.agentCurrentTimes[agent] > self.currentTime:
+        if self.agentCurrentTimes[agent] > currentTimeNs:
           # Push the message back into the PQ with a new time.
           self.messages.put((self.agentCurrentTimes[agent],
                             (msg_recipient, msg_type, msg)))
-          log_print ("Agent in future: message requeued for {}",
-                      self.fmtTime(self.agentCurrentTimes[agent]))
+          if log_enabled():
+            log_print ("Agent in future: message requeued for {}",
+                        self.fmtTime(self.agentCurrentTimes[agent]))
           continue
 
         # Set agent's current time to global current time for start
         # of processing.
-        self.agentCurrentTimes[agent] = self.currentTime
+        self.agentCurrentTimes[agent] = currentTimeNs
 
         # Deliver the message.
         agents[agent].receiveMessage(self.currentTime, msg)
 
         # Delay the agent by its computation delay plus any transient additional delay requested.
-        self.agentCurrentTimes[agent] += pd.Timedelta(self.agentComputationDelays[agent] +
-                                                      self.currentAgentAdditionalDelay)
+        self.agentCurrentTimes[agent] += int(self.agentComputationDelays[agent] +
+                                             self.currentAgentAdditionalDelay)
 
-        log_print ("After receiveMessage return, agent {} delayed from {} to {}",
-                    agent, self.fmtTime(self.currentTime), self.fmtTime(self.agentCurrentTimes[agent]))
+        if log_enabled():
+          log_print ("After receiveMessage return, agent {} delayed from {} to {}",
+                      agent, self.fmtTime(self.currentTime), self.fmtTime(self.agentCurrentTimes[agent]))
 
       else:
         raise ValueError("Unknown message type found in queue",
@@ -276,7 +313,7 @@ class Kernel:
       log_print ("\n--- Kernel Event Queue empty ---")
 
 
-    if self.currentTime and (self.currentTime > self.stopTime):
+    if self.currentTimeNs is not None and (self.currentTimeNs > stopTimeNs):
       log_print ("\n--- Kernel Stop Time surpassed ---")
 
     # Record wall clock stop time and elapsed time for stats at the end.
@@ -300,6 +337,11 @@ class Kernel:
     for agent in agents:
       agent.kernelTerminating()
 
+    # All agent logs have now been written, so any spilled book snapshots have been read back.
+    spill_path = os.path.join(".", "log", self.log_dir, "spill")
+    if os.path.isdir(spill_path) and not os.listdir(spill_path):
+      os.rmdir(spill_path)
+
     print ("Event Queue elapsed: {}, messages: {}, messages per second: {:0.1f}".format(
             eventQueueWallClockElapsed, ttl_messages, 
             ttl_messages / (eventQueueWallClockElapsed / (np.timedelta64(1, 's')))))
@@ -308,7 +350,7 @@ class Kernel:
     # The Kernel adds a handful of custom state results for all simulations,
     # which configurations may use, print, log, or discard.
     self.custom_state['kernel_event_queue_elapsed_wallclock'] = eventQueueWallClockElapsed
-    self.custom_state['kernel_slowest_agent_finish_time'] = max(self.agentCurrentTimes)
+    self.custom_state['kernel_slowest_agent_finish_time'] = pd.Timestamp(max(self.agentCurrentTimes))
 
     # Agents will request the Kernel to serialize their agent logs, usually
     # during kernelTerminating, but the Kernel must write out the summary
@@ -365,30 +407,33 @@ class Kernel:
     # This means message delay (before latency) is the agent's standard computation delay
     # PLUS any accumulated delay for this wake cycle PLUS any one-time requested delay
     # for this specific message only.
-    sentTime = self.currentTime + pd.Timedelta(self.agentComputationDelays[sender] + 
-                                               self.currentAgentAdditionalDelay + delay)
+    sentTime = self.currentTimeNs + int(self.agentComputationDelays[sender] +
+                                        self.currentAgentAdditionalDelay + delay)
 
     # Apply communication delay per the agentLatencyModel, if defined, or the
     # agentLatency matrix [sender][recipient] otherwise.
     if self.agentLatencyModel is not None:
       latency = self.agentLatencyModel.get_latency(sender_id = sender, recipient_id = recipient)
-      deliverAt = sentTime + pd.Timedelta(latency)
-      log_print ("Kernel applied latency {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
-                 latency, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
-                 self.fmtTime(deliverAt))
+      deliverAt = sentTime + int(latency)
+      if log_enabled():
+        log_print ("Kernel applied latency {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
+                   latency, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
+                   self.fmtTime(deliverAt))
     else:
       latency = self.agentLatency[sender][recipient]
       noise = self.random_state.choice(len(self.latencyNoise), 1, self.latencyNoise)[0]
-      deliverAt = sentTime + pd.Timedelta(latency + noise)
-      log_print ("Kernel applied latency {}, noise {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
-                 latency, noise, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
-                 self.fmtTime(deliverAt))
+      deliverAt = sentTime + int(latency + noise)
+      if log_enabled():
+        log_print ("Kernel applied latency {}, noise {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
+                   latency, noise, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
+                   self.fmtTime(deliverAt))
 
     # Finally drop the message in the queue with priority == delivery time.
     self.messages.put((deliverAt, (recipient, MessageType.MESSAGE, msg)))
 
-    log_print ("Sent time: {}, current time {}, computation delay {}", sentTime, self.currentTime, self.agentComputationDelays[sender])
-    log_print ("Message queued: {}", msg)
+    if log_enabled():
+      log_print ("Sent time: {}, current time {}, computation delay {}", self.fmtTime(sentTime), self.currentTime, self.agentComputationDelays[sender])
+      log_print ("Message queued: {}", msg)
 
 
 
@@ -401,24 +446,35 @@ class Kernel:
     # kernel will not supply any parameters to the wakeup() call.
 
     if requestedTime is None:
-        requestedTime = self.currentTime + pd.to_timedelta(1, 'ns')
+      requestedTimeNs = self.currentTimeNs + 1
+    else:
+      requestedTimeNs = self.toNs(requestedTime)
 
     if sender is None:
       raise ValueError("setWakeup() called without valid sender ID",
                        "sender:", sender, "requestedTime:", requestedTime)
 
-    if self.currentTime and (requestedTime < self.currentTime):
+    if self.currentTimeNs is not None and (requestedTimeNs < self.currentTimeNs):
       raise ValueError("setWakeup() called with requested time not in future",
                        "currentTime:", self.currentTime,
                        "requestedTime:", requestedTime)
 
-    log_print ("Kernel adding wakeup for agent {} at time {}",
-               sender, self.fmtTime(requestedTime))
+    if log_enabled():
+      log_print ("Kernel adding wakeup for agent {} at time {}",
+                 sender, self.fmtTime(requestedTimeNs))
 
-    self.messages.put((requestedTime,
+    self.messages.put((requestedTimeNs,
                       (sender, MessageType.WAKEUP, None)))
 
 
+  def nextEventTime(self):
+    # Delivery time (integer nanoseconds) of the next event in the queue, or
+    # None if the queue is empty.  An agent may use this to tell that nothing
+    # else can happen in the simulation before some future time, and so act
+    # for that time now (delaying its messages to match) instead of waking.
+    return self.messages.peekTime()
+
+
   def getAgentComputeDelay(self, sender = None):
     # Allows an agent to query its current computation delay.
     return self.agentComputationDelays[sender]
@@ -500,17 +556,46 @@ class Kernel:
 
     if self.skip_log: return
 
+    LOG_FORMATS[self.log_format].write(dfLog, self.logPath(sender, filename))
+
+
+  def openLogWriter (self, sender, filename=None, pickled=()):
+    # Called by agents which are writing their event logs as the simulation
+    # runs (see log_spill_rows).  Returns a util.LogFormat.LogWriter for the
+    # file writeLog would write, to which the agent writes its log in chunks
+    # and which it closes at termination.  Object columns which may hold
+    # anything but strings must be listed in pickled.
+    return LOG_FORMATS[self.log_format].openWriter(self.logPath(sender, filename), pickled)
+
+
+  def logPath (self, sender, filename=None):
+    # The file to which the log of sender (or the named log) is written.
     path = os.path.join(".", "log", self.log_dir)
 
+    log_format = LOG_FORMATS[self.log_format]
+
     if filename:
-      file = "{}.bz2".format(filename)
+      file = "{}{}".format(filename, log_format.extension)
     else:
-      file = "{}.bz2".format(self.agents[sender].name.replace(" ",""))
+      file = "{}{}".format(self.agents[sender].name.replace(" ",""), log_format.extension)
 
     if not os.path.exists(path):
       os.makedirs(path)
 
-    dfLog.to_pickle(os.path.join(path, file), compression='bz2')
+    return os.path.join(path, file)
+
+
+  def logSpillPath (self, sender, part):
+    # Called by order books which are spilling their snapshot logs to disk
+    # during the simulation (see log_spill_rows and util.OrderBookLog).  Returns
+    # the file name to use for the given part of the sender's log.  Spilled
+    # parts are temporary, and are removed once the full log has been written.
+    path = os.path.join(".", "log", self.log_dir, "spill")
+
+    if not os.path.exists(path):
+      os.makedirs(path)
+
+    return os.path.join(path, "{}.{}.pkl".format(self.agents[sender].name.replace(" ",""), part))
 
 
   def appendSummaryLog (self, sender, eventType, event):
@@ -523,14 +608,15 @@ class Kernel:
 
   def writeSummaryLog (self):
     path = os.path.join(".", "log", self.log_dir)
-    file = "summary_log.bz2"
+    log_format = LOG_FORMATS[self.log_format]
+    file = "summary_log{}".format(log_format.extension)
 
     if not os.path.exists(path):
       os.makedirs(path)
 
     dfLog = pd.DataFrame(self.summaryLog)
 
-    dfLog.to_pickle(os.path.join(path, file), compression='bz2')
+    log_format.write(dfLog, os.path.join(path, file))
 
 
   def updateAgentState (self, agent_id, state):
@@ -546,12 +632,23 @@ class Kernel:
     self.custom_state['agent_state'][agent_id] = state
 
  
+  @staticmethod
+  def toNs(simulationTime):
+    # Converts a pd.Timestamp (or anything pd.Timestamp accepts) to the integer
+    # nanoseconds since the epoch used internally by the Kernel event queue.
+    if type(simulationTime) is pd.Timestamp: return simulationTime.value
+    return pd.Timestamp(simulationTime).value
+
+
   @staticmethod
   def fmtTime(simulationTime):
     # The Kernel class knows how to pretty-print time.  It is assumed simulationTime
     # is in nanoseconds since midnight.  Note this is a static method which can be
     # called either on the class or an instance.
 
+    # Internal Kernel times are integer nanoseconds since the epoch.
+    if isinstance(simulationTime, (int, np.integer)): return pd.Timestamp(simulationTime)
+
     # Try just returning the pd.Timestamp now.
     return (simulationTime)
 
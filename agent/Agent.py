@@ -1,10 +1,25 @@
-import pandas as pd
-
-from copy import deepcopy
-from util.util import log_print
+from message.Message import BodyFields
+from util.EventLog import EventLog, copyEvent
+from util.util import log_print, log_enabled
 
 class Agent:
 
+  # The message handlers of this agent class: message kind -> name of the method to which
+  # dispatch() passes messages of that kind.  A subclass lists only the handlers it adds or
+  # replaces; the table in effect merges those of all its parent classes (see __init_subclass__).
+  handlers = {}
+  _handlers = {}
+
+  def __init_subclass__ (cls, **kwargs):
+    # Resolves the merged handler table of a new agent class to functions once, when the class
+    # is defined, so that methods overridden by the class are the ones called.
+    super().__init_subclass__(**kwargs)
+
+    names = {}
+    for klass in reversed(cls.__mro__):
+      names.update(vars(klass).get('handlers', {}))
+    cls._handlers = {kind: getattr(cls, name) for kind, name in names.items()}
+
   def __init__ (self, id, name, type, random_state, log_to_file=True):
 
     # ID must be a unique number (usually autoincremented).
@@ -34,16 +49,16 @@ class Agent:
     self.currentTime = None
 
     # Agents may choose to maintain a log.  During simulation,
-    # it should be stored as a list of dictionaries.  The expected
-    # keys by default are: EventTime, EventType, Event.  Other
-    # Columns may be added, but will then require specializing
-    # parsing and will increase output dataframe size.  If there
-    # is a non-empty log, it will be written to disk as a Dataframe
-    # at kernel termination.
-
-    # It might, or might not, make sense to formalize these log Events
-    # as a class, with enumerated EventTypes and so forth.
-    self.log = []
+    # it is stored as a columnar util.EventLog of EventTime, EventType
+    # and Event.  If there is a non-empty log, it will be written to
+    # disk as a Dataframe at kernel termination.
+
+    # If the Kernel requests it (see kernelInitializing), the log is
+    # instead written to its file every log_spill_rows events during
+    # simulation, through log_writer.
+    self.log = EventLog()
+    self.log_spill_rows = None
+    self.log_writer = None
     self.logEvent("AGENT_TYPE", type)
 
 
@@ -59,6 +74,10 @@ class Agent:
 
     self.kernel = kernel
 
+    # Spilling the log to disk only makes sense if it will be written out.
+    if self.log_to_file and not kernel.skip_log:
+      self.log_spill_rows = kernel.log_spill_rows
+
     log_print ("{} exists!", self.name)
 
 
@@ -71,8 +90,9 @@ class Agent:
     # Base Agent schedules a wakeup call for the first available timestamp.
     # Subclass agents may override this behavior as needed.
 
-    log_print ("Agent {} ({}) requesting kernel wakeup at time {}",
-           self.id, self.name, self.kernel.fmtTime(startTime))
+    if log_enabled():
+      log_print ("Agent {} ({}) requesting kernel wakeup at time {}",
+             self.id, self.name, self.kernel.fmtTime(startTime))
 
     self.setWakeup(startTime)
 
@@ -90,25 +110,32 @@ class Agent:
 
     # If this agent has been maintaining a log, convert it to a Dataframe
     # and request that the Kernel write it to disk before terminating.
-    if self.log and self.log_to_file:
-      dfLog = pd.DataFrame(self.log)
-      dfLog.set_index('EventTime', inplace=True)
+    if self.log_writer:
+      # The rest of the log follows the rows already written to its file.
+      self.log.spill(self.log_writer)
+      self.log_writer.close()
+    elif self.log and self.log_to_file:
+      dfLog = self.log.toDataFrame()
       self.writeLog(dfLog)
 
 
   ### Methods for internal use by agents (e.g. bookkeeping).
 
   def logEvent (self, eventType, event = '', appendSummaryLog = False):
-    # Adds an event to this agent's log.  The deepcopy of the Event field,
+    # Adds an event to this agent's log.  The copy of the Event field,
     # often an object, ensures later state changes to the object will not
-    # retroactively update the logged event.
+    # retroactively update the logged event.  (Immutable values are not
+    # copied, and simple dicts and lists only shallow copied.)
 
     # We can make a single copy of the object (in case it is an arbitrary
     # class instance) for both potential log targets, because we don't
     # alter logs once recorded.
-    e = deepcopy(event)
-    self.log.append({ 'EventTime' : self.currentTime, 'EventType' : eventType,
-                      'Event' : e })
+    e = copyEvent(event)
+    self.log.append(self.currentTime, eventType, e)
+
+    if self.log_spill_rows and self.log.buffered() >= self.log_spill_rows:
+      if self.log_writer is None: self.log_writer = self.kernel.openLogWriter(self.id, pickled=['Event'])
+      self.log.spill(self.log_writer)
 
     if appendSummaryLog: self.kernel.appendSummaryLog(self.id, eventType, e)
 
@@ -126,8 +153,26 @@ class Agent:
 
     self.currentTime = currentTime
 
-    log_print ("At {}, agent {} ({}) received: {}",
-                  self.kernel.fmtTime(currentTime), self.id, self.name, msg)
+    if log_enabled():
+      log_print ("At {}, agent {} ({}) received: {}",
+                    self.kernel.fmtTime(currentTime), self.id, self.name, msg)
+
+
+  def dispatch (self, msg):
+    # Passes msg to the handler of its kind in this agent's handler table, if there is one, and
+    # returns whether there was.  Subclasses call this from receiveMessage, once they have done
+    # whatever they do for every message.  A message with a body dict goes to the handler of its
+    # body['msg'], as a BodyFields view so that the handler can read its fields as attributes.
+    kind = msg.kind
+    if kind is None:
+      if not isinstance(msg.body, dict): return False
+      kind = msg.body.get('msg')
+
+    handler = self._handlers.get(kind)
+    if handler is None: return False
+
+    handler(self, msg if msg.kind is not None else BodyFields(msg))
+    return True
 
 
   def wakeup (self, currentTime):
@@ -137,8 +182,9 @@ class Agent:
 
     self.currentTime = currentTime
 
-    log_print ("At {}, agent {} ({}) received wakeup.",
-                  self.kernel.fmtTime(currentTime), self.id, self.name)
+    if log_enabled():
+      log_print ("At {}, agent {} ({}) received wakeup.",
+                    self.kernel.fmtTime(currentTime), self.id, self.name)
 
 
   ### Methods used to request services from the Kernel.  These should be used
@@ -3,10 +3,17 @@
 # of its order books, a pipeline delay (in ns) for order activity, the exchange computation delay (in ns),
 # the levels of order stream history to maintain per symbol (maintains all orders that led to the last N trades),
 # whether to log all order activity to the agent log, and a random state object (already seeded) to use
-# for stochasticity.
+# for stochasticity.  The order book implementation may be selected with book_type (see ORDER_BOOK_TYPES).
+# Archived order book snapshots may be limited to the top book_log_depth levels on each side.  Transacted volume
+# queries may be limited to a lookback of at most volume_lookback, so the executions kept to answer them stay bounded.
 from agent.FinancialAgent import FinancialAgent
-from message.Message import Message
+from message.Message import BodyFields, MessageKind
+from message.ExchangeMessages import (WhenMktOpenReplyMsg, WhenMktCloseReplyMsg, QueryLastTradeReplyMsg,
+                                      QuerySpreadReplyMsg, QueryOrderStreamReplyMsg, QueryTransactedVolumeReplyMsg,
+                                      MktClosedMsg, FinalCloseMsg)
 from util.OrderBook import OrderBook
+from util.IndexedOrderBook import IndexedOrderBook
+from util.MarketDataFeed import MarketDataFeed
 from util.util import log_print
 
 import datetime as dt
@@ -18,13 +25,47 @@ warnings.simplefilter(action='ignore', category=UserWarning)
 import pandas as pd
 pd.set_option('display.max_rows', 500)
 
-from copy import deepcopy
+# Order book implementations available to the exchange.  'list' is the original list-of-lists book;
+# 'indexed' keeps a sorted price index with O(1) cancellation and produces identical fills.
+ORDER_BOOK_TYPES = {
+  'list': OrderBook,
+  'indexed': IndexedOrderBook,
+}
+
+# The kinds of message that carry an order for the exchange to act on, and of the notifications of order
+# activity to which the exchange applies its pipeline delay.
+ORDER_KINDS = frozenset([MessageKind.LIMIT_ORDER, MessageKind.MARKET_ORDER, MessageKind.CANCEL_ORDER,
+                         MessageKind.MODIFY_ORDER])
+PIPELINE_KINDS = frozenset([MessageKind.ORDER_ACCEPTED, MessageKind.ORDER_CANCELLED, MessageKind.ORDER_EXECUTED])
 
 
 class ExchangeAgent(FinancialAgent):
 
+  # The requests this exchange handles (see Agent.dispatch).
+  handlers = {
+    MessageKind.MARKET_DATA_SUBSCRIPTION_REQUEST: 'handleSubscription',
+    MessageKind.MARKET_DATA_SUBSCRIPTION_CANCELLATION: 'handleSubscription',
+    MessageKind.WHEN_MKT_OPEN: 'handleWhenMktOpen',
+    MessageKind.WHEN_MKT_CLOSE: 'handleWhenMktClose',
+    MessageKind.QUERY_LAST_TRADE: 'handleQueryLastTrade',
+    MessageKind.QUERY_SPREAD: 'handleQuerySpread',
+    MessageKind.QUERY_ORDER_STREAM: 'handleQueryOrderStream',
+    MessageKind.QUERY_TRANSACTED_VOLUME: 'handleQueryTransactedVolume',
+    MessageKind.LIMIT_ORDER: 'handleLimitOrder',
+    MessageKind.MARKET_ORDER: 'handleMarketOrder',
+    MessageKind.CANCEL_ORDER: 'handleCancelOrder',
+    MessageKind.MODIFY_ORDER: 'handleModifyOrder',
+  }
+
+  # The requests still answered after the market has closed (any other is answered with MKT_CLOSED):
+  # the queries, so agents can get the final trade of the day, and the market hours, for interday sims.
+  after_close = frozenset([MessageKind.QUERY_LAST_TRADE, MessageKind.QUERY_SPREAD, MessageKind.QUERY_ORDER_STREAM,
+                           MessageKind.QUERY_TRANSACTED_VOLUME, MessageKind.WHEN_MKT_OPEN,
+                           MessageKind.WHEN_MKT_CLOSE])
+
   def __init__(self, id, name, type, mkt_open, mkt_close, symbols, book_freq='S', wide_book=False, pipeline_delay = 40000,
-               computation_delay = 1, stream_history = 0, days = 1, log_orders = False, random_state = None):
+               computation_delay = 1, stream_history = 0, days = 1, log_orders = False, book_type = 'list',
+               book_log_depth = None, volume_lookback = None, random_state = None):
 
     super().__init__(id, name, type, random_state)
 
@@ -53,23 +94,32 @@ class ExchangeAgent(FinancialAgent):
     # Log all order activity?
     self.log_orders = log_orders
 
-    # Create an order book for each symbol.
-    self.order_books = {}
-
-    for symbol in symbols:
-      self.order_books[symbol] = OrderBook(self, symbol)
-
-    # At what frequency will we archive the order books for visualization and analysis?
+    # At what frequency will we archive the order books for visualization and analysis?  Each order book
+    # records its snapshots as the simulation runs (see util.OrderBookLog), keeping at most book_log_depth
+    # price levels per side (all of them if None).
     self.book_freq = book_freq
+    self.book_log_depth = book_log_depth
+
+    # The longest lookback period of the transacted volume queries the order books must answer (see
+    # util.TransactedVolume), or None for any period within the day.
+    self.volume_lookback = volume_lookback
 
     # Store orderbook in wide format? ONLY WORKS with book_freq == 0
     self.wide_book = wide_book
 
-    # The subscription dict is a dictionary with the key = agent ID,
-    # value = dict (key = symbol, value = list [levels (no of levels to recieve updates for),
-    # frequency (min number of ns between messages), last agent update timestamp]
-    # e.g. {101 : {'AAPL' : [1, 10, pd.Timestamp(10:00:00)}}
-    self.subscription_dict = {}
+    # Create an order book for each symbol.
+    if book_type not in ORDER_BOOK_TYPES:
+      raise ValueError("Unknown order book type requested for the ExchangeAgent",
+                       "book_type:", book_type, "options:", list(ORDER_BOOK_TYPES))
+
+    self.order_books = {}
+
+    for symbol in symbols:
+      self.order_books[symbol] = ORDER_BOOK_TYPES[book_type](self, symbol)
+
+    # Market data subscriptions, and the MARKET_DATA updates sent to subscribers after every order event
+    # (see util.MarketDataFeed).
+    self.market_data = MarketDataFeed(self)
 
   # The exchange agent overrides this to obtain a reference to an oracle.
   # This is needed to establish a "last trade price" at open (i.e. an opening
@@ -113,6 +163,14 @@ class ExchangeAgent(FinancialAgent):
         print("Time taken to log the order book: {}".format(end_time - start_time))
         print("Order book archival complete.")
 
+  # Besides the next market open of multi-day simulations, the exchange wakes itself up to send the market data
+  # updates held back for conflated subscriptions.
+  def wakeup(self, currentTime):
+    super().wakeup(currentTime)
+
+    self.setComputationDelay(self.computation_delay)
+    self.market_data.flush()
+
   def receiveMessage(self, currentTime, msg):
     super().receiveMessage(currentTime, msg)
 
@@ -125,215 +183,215 @@ class ExchangeAgent(FinancialAgent):
     # Note that computation delay MUST be updated before any calls to sendMessage.
     self.setComputationDelay(self.computation_delay)
 
+    # Requests may be typed messages or (from agents not using them) messages with a body dict,
+    # which are read through the same attributes.
+    if msg.kind is None: msg = BodyFields(msg)
+    kind = msg.kind
+
     # Is the exchange closed?  (This block only affects post-close, not pre-open.)
     if self.checkMarketClosed():
       # Most messages after close will receive a 'MKT_CLOSED' message in response.  A few things
       # might still be processed, like requests for final trade prices or such.
-      if msg.body['msg'] in ['LIMIT_ORDER', 'MARKET_ORDER', 'CANCEL_ORDER', 'MODIFY_ORDER']:
-        log_print("{} received {}: {}", self.name, msg.body['msg'], msg.body['order'])
-        self.sendMessage(msg.body['sender'], Message({"msg": "MKT_CLOSED"}))
+      if kind in ORDER_KINDS:
+        log_print("{} received {}: {}", self.name, kind, msg.order)
+        self.sendMessage(msg.sender, MktClosedMsg())
 
         # Don't do any further processing on these messages!
         return
-      elif 'QUERY' in msg.body['msg'] or 'WHEN_MKT_OPEN' in msg.body['msg'] or 'WHEN_MKT_CLOSE' in msg.body['msg']: 
+      elif kind in self.after_close:
         # Specifically do allow querying after market close, so agents can get the
         # final trade of the day as their "daily close" price for a symbol.
         # Also allow when_mkt_open for interday sims
         pass
       else:
-        log_print("{} received {}, discarded: market is closed.", self.name, msg.body['msg'])
-        self.sendMessage(msg.body['sender'], Message({"msg": "MKT_CLOSED"}))
+        log_print("{} received {}, discarded: market is closed.", self.name, kind)
+        self.sendMessage(msg.sender, MktClosedMsg())
 
         # Don't do any further processing on these messages!
         return
 
     # Log order messages only if that option is configured.  Log all other messages.
-    if msg.body['msg'] in ['LIMIT_ORDER', 'MARKET_ORDER', 'CANCEL_ORDER', 'MODIFY_ORDER']:
-      if self.log_orders: self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
+    if kind in ORDER_KINDS:
+      if self.log_orders: self.logEvent(str(kind), msg.order.to_dict())
     else:
-      self.logEvent(msg.body['msg'], msg.body['sender'])
+      self.logEvent(str(kind), msg.sender)
 
-    # Handle the DATA SUBSCRIPTION request and cancellation messages from the agents.
-    if msg.body['msg'] in ["MARKET_DATA_SUBSCRIPTION_REQUEST", "MARKET_DATA_SUBSCRIPTION_CANCELLATION"]:
-      log_print("{} received {} request from agent {}", self.name, msg.body['msg'], msg.body['sender'])
-      self.updateSubscriptionDict(msg, currentTime)
-
-    # Handle all message types understood by this exchange.
-    if msg.body['msg'] == "WHEN_MKT_OPEN":
-      log_print("{} received WHEN_MKT_OPEN request from agent {}", self.name, msg.body['sender'])
-
-      # The exchange is permitted to respond to requests for simple immutable data (like "what are your
-      # hours?") instantly.  This does NOT include anything that queries mutable data, like equity
-      # quotes or trades.
-      self.setComputationDelay(0)
-
-      # check if market has shut for last time
-      # TODO: improve this so it works with getMarketClosed function 
-      if self.currentTime > self.mkt_close and self.currentTime > self.mkt_open and (self.sim_days == self.current_day):
-        # TODO: never enters this block?
-        self.sendMessage(msg.body['sender'], Message({"msg": "FINAL_CLOSE"}))
-        return
+    # Handle all message types understood by this exchange (see handlers).
+    self.dispatch(msg)
 
-      self.sendMessage(msg.body['sender'], Message({"msg": "WHEN_MKT_OPEN", "data": self.mkt_open}))
-   
-    elif msg.body['msg'] == "WHEN_MKT_CLOSE":
-      log_print("{} received WHEN_MKT_CLOSE request from agent {}", self.name, msg.body['sender'])
-
-      # The exchange is permitted to respond to requests for simple immutable data (like "what are your
-      # hours?") instantly.  This does NOT include anything that queries mutable data, like equity
-      # quotes or trades.
-      self.setComputationDelay(0)
-      # check if market has shut for last time
-      if self.currentTime > self.mkt_close and self.currentTime > self.mkt_open and (self.sim_days == self.current_day):
-        self.sendMessage(msg.body['sender'], Message({"msg": "FINAL_CLOSE"}))
-        return
+  # Handlers of the requests to this exchange, each passed the request (see handlers).
 
-      self.sendMessage(msg.body['sender'], Message({"msg": "WHEN_MKT_CLOSE", "data": self.mkt_close}))
-    
-    elif msg.body['msg'] == "QUERY_LAST_TRADE":
-      symbol = msg.body['symbol']
-      if symbol not in self.order_books:
-        log_print("Last trade request discarded.  Unknown symbol: {}", symbol)
-      else:
-        log_print("{} received QUERY_LAST_TRADE ({}) request from agent {}", self.name, symbol, msg.body['sender'])
-
-        # Return the single last executed trade price (currently not volume) for the requested symbol.
-        # This will return the average share price if multiple executions resulted from a single order.
-        self.sendMessage(msg.body['sender'], Message({"msg": "QUERY_LAST_TRADE", "symbol": symbol,
-                                                      "data": self.order_books[symbol].last_trade,
-                                                      "mkt_closed": self.checkMarketClosed()}))
-    elif msg.body['msg'] == "QUERY_SPREAD":
-      symbol = msg.body['symbol']
-      depth = msg.body['depth']
-      if symbol not in self.order_books:
-        log_print("Bid-ask spread request discarded.  Unknown symbol: {}", symbol)
-      else:
-        log_print("{} received QUERY_SPREAD ({}:{}) request from agent {}", self.name, symbol, depth,
-                  msg.body['sender'])
-
-        # Return the requested depth on both sides of the order book for the requested symbol.
-        # Returns price levels and aggregated volume at each level (not individual orders).
-        self.sendMessage(msg.body['sender'], Message({"msg": "QUERY_SPREAD", "symbol": symbol, "depth": depth,
-                                                      "bids": self.order_books[symbol].getInsideBids(depth),
-                                                      "asks": self.order_books[symbol].getInsideAsks(depth),
-                                                      "data": self.order_books[symbol].last_trade,
-                                                      "mkt_closed": self.checkMarketClosed(),
-                                                      "book": ''}))
-
-        # It is possible to also send the pretty-printed order book to the agent for logging, but forcing pretty-printing
-        # of a large order book is very slow, so we should only do it with good reason.  We don't currently
-        # have a configurable option for it.
-        # "book": self.order_books[symbol].prettyPrint(silent=True) }))
-    elif msg.body['msg'] == "QUERY_ORDER_STREAM":
-      symbol = msg.body['symbol']
-      length = msg.body['length']
-
-      if symbol not in self.order_books:
-        log_print("Order stream request discarded.  Unknown symbol: {}", symbol)
-      else:
-        log_print("{} received QUERY_ORDER_STREAM ({}:{}) request from agent {}", self.name, symbol, length,
-                  msg.body['sender'])
-
-      # We return indices [1:length] inclusive because the agent will want "orders leading up to the last
-      # L trades", and the items under index 0 are more recent than the last trade.
-      self.sendMessage(msg.body['sender'], Message({"msg": "QUERY_ORDER_STREAM", "symbol": symbol, "length": length,
-                                                    "mkt_closed": self.checkMarketClosed(),
-                                                    "orders": self.order_books[symbol].history[1:length + 1]
-                                                    }))
-    elif msg.body['msg'] == 'QUERY_TRANSACTED_VOLUME':
-      symbol = msg.body['symbol']
-      lookback_period = msg.body['lookback_period']
-      if symbol not in self.order_books:
-        log_print("Order stream request discarded.  Unknown symbol: {}", symbol)
-      else:
-        log_print("{} received QUERY_TRANSACTED_VOLUME ({}:{}) request from agent {}", self.name, symbol, lookback_period,
-                  msg.body['sender'])
-      self.sendMessage(msg.body['sender'], Message({"msg": "QUERY_TRANSACTED_VOLUME", "symbol": symbol,
-                                                    "transacted_volume": self.order_books[symbol].get_transacted_volume(lookback_period),
-                                                    "mkt_closed": self.checkMarketClosed()
-                                                    }))
-    elif msg.body['msg'] == "LIMIT_ORDER":
-      order = msg.body['order']
-      log_print("{} received LIMIT_ORDER: {}", self.name, order)
-      if order.symbol not in self.order_books:
-        log_print("Limit Order discarded.  Unknown symbol: {}", order.symbol)
-      else:
-        # Hand the order to the order book for processing.
-        self.order_books[order.symbol].handleLimitOrder(deepcopy(order))
-        self.publishOrderBookData()
-    elif msg.body['msg'] == "MARKET_ORDER":
-      order = msg.body['order']
-      log_print("{} received MARKET_ORDER: {}", self.name, order)
-      if order.symbol not in self.order_books:
-        log_print("Market Order discarded.  Unknown symbol: {}", order.symbol)
-      else:
-        # Hand the market order to the order book for processing.
-        # TODO: arbitary delay conditional on sender type msg.body['sender'] == "Retail":
-        
-        self.order_books[order.symbol].handleMarketOrder(deepcopy(order))
-        self.publishOrderBookData()
-    elif msg.body['msg'] == "CANCEL_ORDER":
-      # Note: this is somewhat open to abuse, as in theory agents could cancel other agents' orders.
-      # An agent could also become confused if they receive a (partial) execution on an order they
-      # then successfully cancel, but receive the cancel confirmation first.  Things to think about
-      # for later...
-      order = msg.body['order']
-      log_print("{} received CANCEL_ORDER: {}", self.name, order)
-      if order.symbol not in self.order_books:
-        log_print("Cancellation request discarded.  Unknown symbol: {}", order.symbol)
-      else:
-        # Hand the order to the order book for processing.
-        self.order_books[order.symbol].cancelOrder(deepcopy(order))
-        self.publishOrderBookData()
-    elif msg.body['msg'] == 'MODIFY_ORDER':
-      # Replace an existing order with a modified order.  There could be some timing issues
-      # here.  What if an order is partially executed, but the submitting agent has not
-      # yet received the norification, and submits a modification to the quantity of the
-      # (already partially executed) order?  I guess it is okay if we just think of this
-      # as "delete and then add new" and make it the agent's problem if anything weird
-      # happens.
-      order = msg.body['order']
-      new_order = msg.body['new_order']
-      log_print("{} received MODIFY_ORDER: {}, new order: {}".format(self.name, order, new_order))
-      if order.symbol not in self.order_books:
-        log_print("Modification request discarded.  Unknown symbol: {}".format(order.symbol))
-      else:
-        self.order_books[order.symbol].modifyOrder(deepcopy(order), deepcopy(new_order))
-        self.publishOrderBookData()
+  def handleSubscription(self, msg):
+    # Handle the DATA SUBSCRIPTION request and cancellation messages from the agents.
+    log_print("{} received {} request from agent {}", self.name, msg.kind, msg.sender)
+    self.updateSubscriptionDict(msg, self.currentTime)
+
+  def handleWhenMktOpen(self, msg):
+    log_print("{} received WHEN_MKT_OPEN request from agent {}", self.name, msg.sender)
+
+    # The exchange is permitted to respond to requests for simple immutable data (like "what are your
+    # hours?") instantly.  This does NOT include anything that queries mutable data, like equity
+    # quotes or trades.
+    self.setComputationDelay(0)
+
+    # check if market has shut for last time
+    # TODO: improve this so it works with getMarketClosed function 
+    if self.currentTime > self.mkt_close and self.currentTime > self.mkt_open and (self.sim_days == self.current_day):
+      # TODO: never enters this block?
+      self.sendMessage(msg.sender, FinalCloseMsg())
+      return
+
+    self.sendMessage(msg.sender, WhenMktOpenReplyMsg(self.mkt_open))
+
+  def handleWhenMktClose(self, msg):
+    log_print("{} received WHEN_MKT_CLOSE request from agent {}", self.name, msg.sender)
+
+    # The exchange is permitted to respond to requests for simple immutable data (like "what are your
+    # hours?") instantly.  This does NOT include anything that queries mutable data, like equity
+    # quotes or trades.
+    self.setComputationDelay(0)
+    # check if market has shut for last time
+    if self.currentTime > self.mkt_close and self.currentTime > self.mkt_open and (self.sim_days == self.current_day):
+      self.sendMessage(msg.sender, FinalCloseMsg())
+      return
+
+    self.sendMessage(msg.sender, WhenMktCloseReplyMsg(self.mkt_close))
+
+  def handleQueryLastTrade(self, msg):
+    symbol = msg.symbol
+    if symbol not in self.order_books:
+      log_print("Last trade request discarded.  Unknown symbol: {}", symbol)
+    else:
+      log_print("{} received QUERY_LAST_TRADE ({}) request from agent {}", self.name, symbol, msg.sender)
+
+      # Return the single last executed trade price (currently not volume) for the requested symbol.
+      # This will return the average share price if multiple executions resulted from a single order.
+      self.sendMessage(msg.sender, QueryLastTradeReplyMsg(symbol, self.order_books[symbol].last_trade,
+                                                          self.checkMarketClosed()))
+
+  def handleQuerySpread(self, msg):
+    symbol = msg.symbol
+    depth = msg.depth
+    if symbol not in self.order_books:
+      log_print("Bid-ask spread request discarded.  Unknown symbol: {}", symbol)
+    else:
+      log_print("{} received QUERY_SPREAD ({}:{}) request from agent {}", self.name, symbol, depth, msg.sender)
+
+      # Return the requested depth on both sides of the order book for the requested symbol.
+      # Returns price levels and aggregated volume at each level (not individual orders).
+      book = self.order_books[symbol]
+      self.sendMessage(msg.sender, QuerySpreadReplyMsg(symbol, depth, book.getInsideBids(depth),
+                                                       book.getInsideAsks(depth), book.last_trade,
+                                                       self.checkMarketClosed(), ''))
+
+      # It is possible to also send the pretty-printed order book to the agent for logging, but forcing pretty-printing
+      # of a large order book is very slow, so we should only do it with good reason.  We don't currently
+      # have a configurable option for it.
+      # "book": self.order_books[symbol].prettyPrint(silent=True) }))
+
+  def handleQueryOrderStream(self, msg):
+    symbol = msg.symbol
+    length = msg.length
+
+    if symbol not in self.order_books:
+      log_print("Order stream request discarded.  Unknown symbol: {}", symbol)
+    else:
+      log_print("{} received QUERY_ORDER_STREAM ({}:{}) request from agent {}", self.name, symbol, length, msg.sender)
+
+    # We return indices [1:length] inclusive because the agent will want "orders leading up to the last
+    # L trades", and the items under index 0 are more recent than the last trade.
+    self.sendMessage(msg.sender, QueryOrderStreamReplyMsg(symbol, length, self.checkMarketClosed(),
+                                                          self.order_books[symbol].history[1:length + 1]))
+
+  def handleQueryTransactedVolume(self, msg):
+    symbol = msg.symbol
+    lookback_period = msg.lookback_period
+    if symbol not in self.order_books:
+      log_print("Order stream request discarded.  Unknown symbol: {}", symbol)
+    else:
+      log_print("{} received QUERY_TRANSACTED_VOLUME ({}:{}) request from agent {}", self.name, symbol, lookback_period,
+                msg.sender)
+    self.sendMessage(msg.sender, QueryTransactedVolumeReplyMsg(
+                                   symbol, self.order_books[symbol].get_transacted_volume(lookback_period),
+                                   self.checkMarketClosed()))
+
+  def handleLimitOrder(self, msg):
+    order = msg.order
+    log_print("{} received LIMIT_ORDER: {}", self.name, order)
+    if order.symbol not in self.order_books:
+      log_print("Limit Order discarded.  Unknown symbol: {}", order.symbol)
+    else:
+      # Hand the order to the order book for processing.  The order is not copied: once an
+      # agent sends an order to the exchange, the exchange owns that object and may keep it
+      # in the book and modify it.  Agents must keep their own copy (as TradingAgent does).
+      self.order_books[order.symbol].handleLimitOrder(order)
+      self.publishOrderBookData(order.symbol)
+
+  def handleMarketOrder(self, msg):
+    order = msg.order
+    log_print("{} received MARKET_ORDER: {}", self.name, order)
+    if order.symbol not in self.order_books:
+      log_print("Market Order discarded.  Unknown symbol: {}", order.symbol)
+    else:
+      # Hand the market order to the order book for processing.
+      # TODO: arbitary delay conditional on sender type msg.body['sender'] == "Retail":
+      
+      self.order_books[order.symbol].handleMarketOrder(order)
+      self.publishOrderBookData(order.symbol)
+
+  def handleCancelOrder(self, msg):
+    # Note: this is somewhat open to abuse, as in theory agents could cancel other agents' orders.
+    # An agent could also become confused if they receive a (partial) execution on an order they
+    # then successfully cancel, but receive the cancel confirmation first.  Things to think about
+    # for later...
+    order = msg.order
+    log_print("{} received CANCEL_ORDER: {}", self.name, order)
+    if order.symbol not in self.order_books:
+      log_print("Cancellation request discarded.  Unknown symbol: {}", order.symbol)
+    else:
+      # Hand the order to the order book for processing.
+      self.order_books[order.symbol].cancelOrder(order)
+      self.publishOrderBookData(order.symbol)
+
+  def handleModifyOrder(self, msg):
+    # Replace an existing order with a modified order.  There could be some timing issues
+    # here.  What if an order is partially executed, but the submitting agent has not
+    # yet received the norification, and submits a modification to the quantity of the
+    # (already partially executed) order?  I guess it is okay if we just think of this
+    # as "delete and then add new" and make it the agent's problem if anything weird
+    # happens.
+    order = msg.order
+    new_order = msg.new_order
+    log_print("{} received MODIFY_ORDER: {}, new order: {}", self.name, order, new_order)
+    if order.symbol not in self.order_books:
+      log_print("Modification request discarded.  Unknown symbol: {}", order.symbol)
+    else:
+      # As with new orders, new_order is not copied.  It takes the old order's place in the book.
+      self.order_books[order.symbol].modifyOrder(order, new_order)
+      self.publishOrderBookData(order.symbol)
 
   def updateSubscriptionDict(self, msg, currentTime):
-    # The subscription dict is a dictionary with the key = agent ID,
-    # value = dict (key = symbol, value = list [levels (no of levels to recieve updates for),
-    # frequency (min number of ns between messages), last agent update timestamp]
-    # e.g. {101 : {'AAPL' : [1, 10, pd.Timestamp(10:00:00)}}
+    # Each agent may subscribe to the top levels (no of levels to receive updates for) of one symbol, at a frequency
+    # (min number of ns between messages), as a full snapshot in every message or only as deltas from the last,
+    # or conflated (changes within the frequency are sent together at its end).
     if msg.body['msg'] == "MARKET_DATA_SUBSCRIPTION_REQUEST":
       agent_id, symbol, levels, freq = msg.body['sender'], msg.body['symbol'], msg.body['levels'], msg.body['freq']
-      self.subscription_dict[agent_id] = {symbol: [levels, freq, currentTime]}
+      self.market_data.subscribe(agent_id, symbol, levels, freq, currentTime, deltas=msg.body.get('deltas', False),
+                                 conflate=msg.body.get('conflate', False))
     elif msg.body['msg'] == "MARKET_DATA_SUBSCRIPTION_CANCELLATION":
       agent_id, symbol = msg.body['sender'], msg.body['symbol']
-      del self.subscription_dict[agent_id][symbol]
+      self.market_data.unsubscribe(agent_id, symbol)
 
-  def publishOrderBookData(self):
+  def publishOrderBookData(self, symbol = None):
     '''
     The exchange agents sends an order book update to the agents using the subscription API if one of the following
     conditions are met:
     1) agent requests ALL order book updates (freq == 0)
     2) order book update timestamp > last time agent was updated AND the orderbook update time stamp is greater than
     the last agent update time stamp by a period more than that specified in the freq parameter.
+    Called after every order event on the book of symbol (None if any book may have changed).
     '''
-    for agent_id, params in self.subscription_dict.items():
-      for symbol, values in params.items():
-        levels, freq, last_agent_update = values[0], values[1], values[2]
-        orderbook_last_update = self.order_books[symbol].last_update_ts
-        if (freq == 0) or \
-           ((orderbook_last_update > last_agent_update) and ((orderbook_last_update - last_agent_update).delta >= freq)):
-          self.sendMessage(agent_id, Message({"msg": "MARKET_DATA",
-                                              "symbol": symbol,
-                                              "bids": self.order_books[symbol].getInsideBids(levels),
-                                              "asks": self.order_books[symbol].getInsideAsks(levels),
-                                              "last_transaction": self.order_books[symbol].last_trade,
-                                              "exchange_ts": self.currentTime}))
-          self.subscription_dict[agent_id][symbol][2] = orderbook_last_update
+    self.market_data.publish(symbol)
 
   def logOrderBookSnapshots(self, symbol):
     """
@@ -354,13 +412,15 @@ class ExchangeAgent(FinancialAgent):
 
     book = self.order_books[symbol]
 
+    # The book log already holds one snapshot per sampling time (or per distinct time, with book_freq 0),
+    # in time order.  Record the final state of the book too.
+    book.book_log.finish(book)
+
     if book.book_log:
 
       print("Logging order book to file...")
-      dfLog = book.book_log_to_df()
-      dfLog.set_index('QuoteTime', inplace=True)
-      dfLog = dfLog[~dfLog.index.duplicated(keep='last')]
-      dfLog.sort_index(inplace=True)
+      # Any snapshots spilled during the simulation are read back: the archived log is built whole.
+      dfLog = book.book_log.toDataFrame()
 
       if str(self.book_freq).isdigit() and int(self.book_freq) == 0:  # Save all possible information
         # Get the full range of quotes at the finest possible resolution.
@@ -376,12 +436,9 @@ class ExchangeAgent(FinancialAgent):
         filename = f'ORDERBOOK_{symbol}_FULL'
 
       else:  # Sample at frequency self.book_freq
-        # With multiple quotes in a nanosecond, use the last one, then resample to the requested freq.
-        dfLog = dfLog.resample(self.book_freq).ffill()
-        dfLog.sort_index(inplace=True)
-
         # Create a fully populated index at the desired frequency from market open to close.
-        # Then project the logged data into this complete index.
+        # Then project the logged data into this complete index: the book at each time is the last
+        # snapshot at or before it.
         time_idx = pd.date_range(self.mkt_open, self.mkt_close, freq=self.book_freq, closed='right')
         dfLog = dfLog.reindex(time_idx, method='ffill')
         dfLog.sort_index(inplace=True)
@@ -420,11 +477,12 @@ class ExchangeAgent(FinancialAgent):
     # TODO: probably organize the order types into categories once there are more, so we can
     # take action by category (e.g. ORDER-related messages) instead of enumerating all message
     # types to be affected.
-    if msg.body['msg'] in ['ORDER_ACCEPTED', 'ORDER_CANCELLED', 'ORDER_EXECUTED']:
+    kind = msg.body['msg'] if msg.kind is None else msg.kind
+    if kind in PIPELINE_KINDS:
       # Messages that require order book modification (not simple queries) incur the additional
       # parallel processing delay as configured.
       super().sendMessage(recipientID, msg, delay = self.pipeline_delay)
-      if self.log_orders: self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
+      if self.log_orders: self.logEvent(str(kind), msg.body['order'].to_dict())
     else:
       # Other message types incur only the currently-configured computation delay for this agent.
       super().sendMessage(recipientID, msg)
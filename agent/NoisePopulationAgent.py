@@ -0,0 +1,69 @@
+from agent.PopulationAgent import PopulationAgent, NEVER
+from util.util import log_print
+
+import numpy as np
+import pandas as pd
+
+
+class NoisePopulationAgent(PopulationAgent):
+
+    # A population of NoiseAgents (see agent.PopulationAgent).  Like a NoiseAgent, each member
+    # trades at market open and again at its own wakeup time, each time placing an order for its
+    # fixed size in a random direction at the inside quote on the opposite side.
+    #
+    # A NoiseAgent's two arrival chains (see ValuePopulationAgent) wake it at nearly the same times,
+    # both before the spread it asked for comes back, so it places one order for both.  Each member
+    # therefore runs a single chain.
+    #
+    # Most members trade at market open, while the book is filling, so the batch window is short:
+    # a member batched with others sees the book as of the first member's arrival.
+
+    def __init__(self, id, name, type, num_members, symbol='IBM', starting_cash=100000, wakeup_times=None,
+                 batch_window='10us', log_orders=False, log_to_file=True, random_state=None):
+
+        # Base class init.
+        super().__init__(id, name, type, num_members, symbol=symbol, starting_cash=starting_cash,
+                         batch_window=batch_window, log_orders=log_orders, log_to_file=log_to_file,
+                         random_state=random_state)
+
+        # Wakeup time of each member in ns (market open only, if none is given).
+        if wakeup_times is None:
+            self.wakeup_times = np.full(num_members, NEVER, dtype=np.int64)
+        else:
+            self.wakeup_times = pd.DatetimeIndex(wakeup_times).values.astype(np.int64)
+
+        self.sizes = self.random_state.randint(20, 50, size=num_members)
+
+    def nextWakeTimes(self, members, wake_times):
+        # Each member wakes once more, at its wakeup time, if that is still to come.
+        wakeup_times = self.wakeup_times[members]
+        return np.where(wakeup_times > wake_times, wakeup_times, NEVER)
+
+    def placeOrders(self, members, arrivals):
+        # Place orders in random directions at the inside quotes.
+        buy = self.random_state.randint(0, 1 + 1, size=len(members)).astype(bool)
+
+        bid, bid_vol, ask, ask_vol = self.getKnownBidAsk(self.symbol)
+
+        # As for a NoiseAgent, a member whose side of the book is empty places no order.
+        prices = np.where(buy, ask or 0, bid or 0)
+        quoted = prices > 0
+
+        self.placeMemberOrders(members[quoted], arrivals[quoted], buy[quoted], prices[quoted],
+                               self.sizes[members[quoted]])
+
+    def logMemberValuations(self):
+        # Noise trader surplus is marked to the end of day midpoint (or last trade).
+        bid, bid_vol, ask, ask_vol = self.getKnownBidAsk(self.symbol)
+
+        if bid and ask:
+            rT = int(bid + ask) / 2
+        else:
+            rT = self.last_trade[self.symbol]
+
+        surplus = rT * self.memberLots() + self.member_cash - self.member_starting_cash
+        surplus = surplus / self.member_starting_cash
+
+        log_print("{} mean relative surplus {}", self.name, surplus.mean())
+
+        self.logMemberEvent('FINAL_VALUATION', surplus)
@@ -0,0 +1,282 @@
+from agent.TradingAgent import TradingAgent
+from message.ExchangeMessages import LimitOrderMsg
+from util.order.LimitOrder import LimitOrder
+from util.util import log_print
+
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# A PopulationAgent is a single kernel agent standing for many agents ("members") of the same
+# class, so that large homogeneous populations of background traders can be simulated without
+# one Python object and one stream of kernel events per trader.  Member state (holdings, cash,
+# next wake time and any strategy state) is kept in numpy arrays indexed by member.
+#
+# The population asks the kernel for a wakeup at the earliest member arrival only, a member's
+# arrival being the time its spread query would reach the exchange: its wake time plus its own
+# latency to the exchange (see setMemberLatency).  When the population wakes, every member arriving
+# within batch_window is handled as one batch: subclasses schedule the members' next wakeups
+# (nextWakeTimes), the population queries the spread once for the batch, and on the reply
+# subclasses compute all the members' orders at once (placeOrders).  The orders are sent in
+# arrival order, staggered by the members' arrival offsets within the batch, and each travels its
+# member's latency back and forth, so it reaches the exchange when a per-object agent's would.
+#
+# A member may run several arrival chains (arrival_chains), each scheduling its own next wakeup,
+# as a per-object agent does when TradingAgent schedules its market open wakeup once per market
+# hours reply.  A member arriving on more than one chain within a batch acts once.
+#
+# Members have no agent id of their own.  Their orders are placed under the population's id, and
+# the population routes the exchange's replies to the member that placed each order.  Order ids
+# are allocated from a range of their own (see ORDER_ID_BASE), as a population may place far more
+# orders than the 1000 per agent that TradingAgent allows for.
+#
+# Member decisions use the population's random_state rather than one per member, so a population
+# produces order flow statistically equivalent to, not identical to, the per-object agents.
+
+# No (further) wakeup for a member.
+NEVER = np.iinfo(np.int64).max
+
+# Order ids of a population start at ORDER_ID_BASE + id * ORDER_ID_BLOCK.
+ORDER_ID_BASE = 2 ** 40
+ORDER_ID_BLOCK = 2 ** 32
+
+
+class PopulationAgent(TradingAgent):
+
+  def __init__(self, id, name, type, num_members, symbol='IBM', starting_cash=100000, batch_window='1ms',
+               arrival_chains=1, log_orders=False, log_to_file=True, random_state=None):
+
+    # The base TradingAgent tracks the holdings and open orders of the population as a whole.
+    super().__init__(id, name, type, starting_cash=starting_cash * num_members, log_orders=log_orders,
+                     log_to_file=log_to_file, random_state=random_state)
+
+    self.symbol = symbol
+    self.num_members = num_members
+    self.member_starting_cash = starting_cash
+    self.batch_window = pd.Timedelta(batch_window).value
+    self.arrival_chains = arrival_chains
+
+    self.order_num = ORDER_ID_BASE + id * ORDER_ID_BLOCK
+
+    # Per-member holdings (shares of symbol) and cash (in cents).
+    self.member_holdings = np.zeros(num_members, dtype=np.int64)
+    self.member_cash = np.full(num_members, starting_cash, dtype=np.int64)
+
+    # One-way latency in ns between each member and the exchange (see setMemberLatency).
+    self.member_latency = np.zeros(num_members, dtype=np.int64)
+
+    # Time in ns at which each arrival chain's next spread query reaches the exchange (NEVER if
+    # none).  Chain c of member m is at index c * num_members + m.  Set once the market hours are
+    # known.
+    self.next_wake = None
+
+    # The member that placed each order, and the open order ids of each member that has any.
+    self.order_members = {}
+    self.member_orders = {}
+
+    # Batches of members (indices and wake times, in wake time order) awaiting the spread.
+    self.pending = deque()
+
+    # Time in ns of the earliest wakeup requested and not yet received, if any.
+    self.requested_wake = None
+
+    self.state = 'AWAITING_WAKEUP'
+
+  def kernelStarting(self, startTime):
+    super().kernelStarting(startTime)
+
+    self.oracle = self.kernel.oracle
+
+    # The members act in parallel, so the replies to a batch of orders must not queue behind one
+    # another for the population's computation delay.  Each member still "thinks" for the usual
+    # computation delay before its messages go out (see sendMessage).
+    self.member_computation_delay = self.getComputationDelay()
+    self.setComputationDelay(0)
+
+  def kernelStopping(self):
+    # The base TradingAgent records the (linear) gain of the whole population as that of one agent
+    # of this type.  Count every member instead, then let subclasses log per-member valuations.
+    super().kernelStopping()
+
+    self.kernel.agentCountByType[self.type] += self.num_members - 1
+
+    self.logMemberValuations()
+
+  def sendMessage(self, recipientID, msg, delay=0):
+    super().sendMessage(recipientID, msg, delay=self.member_computation_delay + delay)
+
+  def getWakeFrequency(self):
+    # Members draw their own offsets from market open (see firstWakeTimes).
+    return pd.Timedelta(0)
+
+  def setMemberLatency(self, latency):
+    # Sets the one-way latency in ns between each member and the exchange.  The members' messages
+    # then carry their own latencies, so the population itself should reach the exchange with none.
+    self.member_latency = np.asarray(latency, dtype=np.int64)
+
+  def arrivalTimes(self, members, wake_times):
+    # Times in ns at which queries sent by the given members at wake_times reach the exchange.
+    return wake_times + np.where(wake_times == NEVER, 0, self.member_latency[members])
+
+  def firstWakeTimes(self):
+    # First wake time of each arrival chain in ns.  As for the per-object agents, members arrive up
+    # to 100 ns after market open.
+    return self.mkt_open.value + self.random_state.randint(low=0, high=100,
+                                                           size=self.num_members * self.arrival_chains)
+
+  def wakeup(self, currentTime):
+    # Parent class handles discovery of exchange times and market_open wakeup call.
+    super().wakeup(currentTime)
+
+    if not self.mkt_open or not self.mkt_close:
+      # TradingAgent handles discovery of exchange times.
+      return
+
+    # If we've been told the market has closed for the day, we will only request
+    # final price information, then stop.
+    if self.mkt_closed:
+      if self.symbol not in self.daily_close_price: self.getCurrentSpread(self.symbol)
+      return
+
+    if self.next_wake is None:
+      chains = np.arange(self.num_members * self.arrival_chains)
+      self.next_wake = self.arrivalTimes(chains % self.num_members, self.firstWakeTimes())
+
+    now = currentTime.value
+    if self.requested_wake is not None and self.requested_wake <= now: self.requested_wake = None
+
+    chains = np.flatnonzero(self.next_wake < now + self.batch_window)
+
+    if len(chains):
+      arrivals = self.next_wake[chains]
+      by_time = np.argsort(arrivals, kind='stable')
+      chains, arrivals = chains[by_time], arrivals[by_time]
+      members = chains % self.num_members
+
+      next_wake = self.nextWakeTimes(members, arrivals - self.member_latency[members])
+      self.next_wake[chains] = self.arrivalTimes(members, next_wake)
+
+      # A member woken again before the spread it asked for comes back places one order, like a
+      # per-object agent, so acts on its earliest chain in the batch only.
+      first = np.sort(np.unique(members, return_index=True)[1])
+      members, arrivals = members[first], arrivals[first]
+
+      log_print("{} waking {} members", self.name, len(members))
+
+      self.membersWaking(members, arrivals)
+
+      self.pending.append((members, arrivals))
+      self.getCurrentSpread(self.symbol)
+      self.state = 'AWAITING_SPREAD'
+
+    # Sleep until the next member is due.
+    next_wake = self.next_wake.min()
+    if next_wake != NEVER: self.requestWakeup(max(next_wake, now + 1))
+
+  def requestWakeup(self, time):
+    # Requests a wakeup at time (in ns) unless one at or before it is already pending.  This keeps
+    # a single chain of wakeups, even though TradingAgent schedules the market open wakeup on both
+    # market hours replies.
+    if self.requested_wake is not None and self.requested_wake <= time: return
+
+    self.requested_wake = time
+    self.setWakeup(pd.Timestamp(time))
+
+  def receiveMessage(self, currentTime, msg):
+    # Parent class schedules market open wakeup call once market open/close times are known.
+    super().receiveMessage(currentTime, msg)
+
+    # Each spread query is answered in turn, so each reply belongs to the oldest pending batch.
+    if msg.body['msg'] == 'QUERY_SPREAD' and self.pending:
+      members, arrivals = self.pending.popleft()
+      if not self.pending: self.state = 'AWAITING_WAKEUP'
+
+      # But if the market is now closed, don't advance to placing orders.
+      if self.mkt_closed: return
+
+      self.placeOrders(members, arrivals)
+
+  def nextWakeTimes(self, members, wake_times):
+    # Called when a batch of members wakes at wake_times.  Subclasses return the members' next
+    # wake times in ns (NEVER for none).
+    raise NotImplementedError
+
+  def membersWaking(self, members, arrivals):
+    # Called when a batch of members wakes.  Subclasses may e.g. cancel the members' open orders.
+    pass
+
+  def placeOrders(self, members, arrivals):
+    # Called with the current spread known for a batch of members, whose queries reached the
+    # exchange at arrivals.  Subclasses compute the members' orders and place them with
+    # placeMemberOrders.
+    raise NotImplementedError
+
+  def logMemberValuations(self):
+    # Called at the end of the simulation to log per-member results.
+    pass
+
+  def placeMemberOrders(self, members, arrivals, is_buy, prices, sizes):
+    # Places one limit order per member, in the order given (arrival order).  Each order is sent
+    # after the first by the difference between its member's arrival and the first member's, and
+    # travels the member's latency back and forth on top.
+    if not len(members): return
+
+    delays = arrivals - arrivals[0] + 2 * self.member_latency[members]
+
+    for m, delay, buy, price, size in zip(members.tolist(), delays.tolist(), is_buy.tolist(),
+                                          prices.tolist(), sizes.tolist()):
+      order = LimitOrder(self.id, self.currentTime + pd.Timedelta(delay), self.symbol, size, buy, price,
+                         self.order_num)
+      self.order_num += 1
+
+      self.orders[order.order_id] = order.snapshot()
+      self.all_orders[order.order_id] = self.orders[order.order_id]
+      self.order_members[order.order_id] = m
+      self.member_orders.setdefault(m, set()).add(order.order_id)
+
+      self.sendMessage(self.exchangeID, LimitOrderMsg(self.id, order), delay=delay)
+
+      if self.log_orders: self.logEvent('ORDER_SUBMITTED', order.to_dict())
+
+  def cancelMemberOrders(self, members):
+    # Cancel all open orders of the given members.
+    for m in members.tolist():
+      for order_id in self.member_orders.get(m, ()):
+        self.cancelOrder(self.orders[order_id])
+
+  def orderExecuted(self, order):
+    m = self.order_members.get(order.order_id)
+
+    if m is not None:
+      qty = order.quantity if order.is_buy_order else -1 * order.quantity
+      self.member_holdings[m] += qty
+      self.member_cash[m] -= qty * order.fill_price
+
+      open_order = self.orders.get(order.order_id)
+      if open_order is None or order.quantity >= open_order.quantity: self.closeMemberOrder(order.order_id)
+
+    super().orderExecuted(order)
+
+  def orderCancelled(self, order):
+    self.closeMemberOrder(order.order_id)
+
+    super().orderCancelled(order)
+
+  def closeMemberOrder(self, order_id):
+    m = self.order_members.get(order_id)
+    if m is None: return
+
+    orders = self.member_orders.get(m)
+    if orders is not None:
+      orders.discard(order_id)
+      if not orders: del self.member_orders[m]
+
+  def memberLots(self):
+    # Holdings of each member in round lots, as the per-object agents value them at the end of
+    # the day: rounded to the nearest hundred shares (half to even, like round()).
+    return (np.round(self.member_holdings, -2) // 100).astype(np.int64)
+
+  def logMemberEvent(self, eventType, values):
+    # Logs one event per member, each also appended to the summary log as the per-object agents do.
+    for value in values.tolist():
+      self.logEvent(eventType, value, True)
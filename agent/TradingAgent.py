@@ -1,12 +1,16 @@
 from agent.FinancialAgent import FinancialAgent
 from agent.FinancialAgent import dollarize
 from agent.ExchangeAgent import ExchangeAgent
-from message.Message import Message
+from message.Message import MessageKind
+from message.ExchangeMessages import (WhenMktOpenMsg, WhenMktCloseMsg, QueryLastTradeMsg, QuerySpreadMsg,
+                                      QueryOrderStreamMsg, QueryTransactedVolumeMsg,
+                                      MarketDataSubscriptionRequestMsg, MarketDataSubscriptionCancellationMsg,
+                                      LimitOrderMsg, MarketOrderMsg, CancelOrderMsg, ModifyOrderMsg)
 from util.order.LimitOrder import LimitOrder
 from util.order.MarketOrder import MarketOrder
+from util.MarketDataFeed import applyDepthDeltas
 from util.util import log_print
 
-from copy import deepcopy
 import sys
 import numpy as np
 
@@ -17,6 +21,24 @@ import numpy as np
 # implementing a strategy without too much bookkeeping.
 class TradingAgent(FinancialAgent):
 
+  # The messages from an exchange that every trading agent handles (see Agent.dispatch).
+  handlers = {
+    MessageKind.WHEN_MKT_OPEN: 'handleWhenMktOpen',
+    MessageKind.WHEN_MKT_CLOSE: 'handleWhenMktClose',
+    MessageKind.ORDER_EXECUTED: 'handleOrderExecuted',
+    MessageKind.ORDER_ACCEPTED: 'handleOrderAccepted',
+    MessageKind.ORDER_CANCELLED: 'handleOrderCancelled',
+    MessageKind.MKT_CLOSED: 'handleMktClosed',
+    MessageKind.FINAL_CLOSE: 'handleFinalClose',
+    MessageKind.QUERY_LAST_TRADE: 'handleLastTrade',
+    MessageKind.QUERY_SPREAD: 'handleSpread',
+    MessageKind.QUERY_ORDER_STREAM: 'handleOrderStream',
+    MessageKind.QUERY_TRANSACTED_VOLUME: 'handleTransactedVolume',
+    MessageKind.MARKET_DATA: 'handleMarketData',
+    MessageKind.FILLED: 'handleFilledOrder',
+    MessageKind.NEW_SPLIT_MARKET_ORDER: 'handleNewSplitMarketOrder',
+  }
+
   def __init__(self, id, name, type, random_state=None, starting_cash=100000, log_orders=False, log_to_file=True, execution=True):
     # Base class init.
     super().__init__(id, name, type, random_state, log_to_file)
@@ -79,6 +101,10 @@ class TradingAgent(FinancialAgent):
     self.known_bids = {}
     self.known_asks = {}
 
+    # For subscriptions to deltas of market data, the book (bids, asks) built up from the updates
+    # received, by symbol.
+    self.subscribed_books = {}
+
     # The agent remembers the order history communicated by the exchange
     # when such is requested by an agent (for example, a heuristic belief
     # learning agent).
@@ -222,8 +248,8 @@ class TradingAgent(FinancialAgent):
 
     if self.mkt_open is None:
       # Ask our exchange when it opens and closes.
-      self.sendMessage(self.exchangeID, Message({ "msg" : "WHEN_MKT_OPEN", "sender": self.id }))
-      self.sendMessage(self.exchangeID, Message({ "msg" : "WHEN_MKT_CLOSE", "sender": self.id }))
+      self.sendMessage(self.exchangeID, WhenMktOpenMsg(self.id))
+      self.sendMessage(self.exchangeID, WhenMktCloseMsg(self.id))
 
     elif self.mkt_closed:
       # Can only enter this after full market day - mkt_close only set at EOD 
@@ -240,16 +266,20 @@ class TradingAgent(FinancialAgent):
     # the market open and closed times, and is the market not already closed.
     return (self.mkt_open and self.mkt_close) and not self.mkt_closed
 
-  def requestDataSubscription(self, symbol, levels, freq):
+  # Used by any Trading Agent subclass to subscribe to market data from the Exchange Agent: the top levels of the book
+  # of symbol, at most once every freq ns (0 for every change).  With deltas, the exchange sends only the levels that
+  # changed since its last update, which handleMarketData applies to known_bids and known_asks.  Conflated, changes
+  # within freq ns of the last update are sent together (the latest state of the book) once freq ns have passed, and
+  # known_bids and known_asks are kept as read-only arrays of (price, volume) rows.
+  def requestDataSubscription(self, symbol, levels, freq, deltas = False, conflate = False):
+      self.subscribed_books.pop(symbol, None)
       self.sendMessage(recipientID = self.exchangeID,
-                       msg = Message({"msg": "MARKET_DATA_SUBSCRIPTION_REQUEST",
-                                      "sender": self.id, "symbol": symbol, "levels": levels, "freq": freq}))
+                       msg = MarketDataSubscriptionRequestMsg(self.id, symbol, levels, freq, deltas, conflate))
 
   # Used by any Trading Agent subclass to cancel subscription to market data from the Exchange Agent
   def cancelDataSubscription(self, symbol):
     self.sendMessage(recipientID=self.exchangeID,
-                     msg=Message({"msg": "MARKET_DATA_SUBSCRIPTION_CANCELLATION",
-                                  "sender": self.id, "symbol": symbol}))
+                     msg=MarketDataSubscriptionCancellationMsg(self.id, symbol))
 
 
   def receiveMessage (self, currentTime, msg):
@@ -259,137 +289,122 @@ class TradingAgent(FinancialAgent):
     had_mkt_hours = self.mkt_open is not None and self.mkt_close is not None
     initial_mkt_open = self.mkt_open
 
-    # Record market open or close times.
-    if msg.body['msg'] == "WHEN_MKT_OPEN":
-      self.mkt_open = msg.body['data']
+    # Hand the message to its handler (see handlers).
+    self.dispatch(msg)
 
-      log_print ("Recorded market open: {}", self.kernel.fmtTime(self.mkt_open))
+    # Now do we know the market hours?
+    have_mkt_hours = self.mkt_open is not None and self.mkt_close is not None
 
-    elif msg.body['msg'] == "WHEN_MKT_CLOSE":
-      self.mkt_close = msg.body['data']
+    # Once we know the market open and close times, schedule a wakeup call for market open.
+    # Also want to wake for next trading day - this is when we have received a different mkt_open
+    if (have_mkt_hours and not had_mkt_hours) or (initial_mkt_open != self.mkt_open):
+      # Agents are asked to generate a wake offset from the market open time.  We structure
+      # this as a subclass request so each agent can supply an appropriate offset relative
+      # to its trading frequency.
+      ns_offset = self.getWakeFrequency()
+     
+      self.setWakeup(self.mkt_open + ns_offset)
       
-      log_print ("Recorded market close: {}", self.kernel.fmtTime(self.mkt_close))
-
-    elif msg.body['msg'] == "ORDER_EXECUTED":
-      # Call the orderExecuted method, which subclasses should extend.  This parent
-      # class could implement default "portfolio tracking" or "returns tracking"
-      # behavior.
-      order = msg.body['order']
-
-      self.orderExecuted(order)
-
-    elif msg.body['msg'] == "ORDER_ACCEPTED":
-      # Call the orderAccepted method, which subclasses should extend.
-      order = msg.body['order']
-
-      self.orderAccepted(order)
+    #  if initial_mkt_open != self.mkt_open:
+     #   print(msg.body['msg'])
+      #  print(initial_mkt_open,self.mkt_open)
+       # print("DAY 2 ###############################################################################")
 
-    elif msg.body['msg'] == "ORDER_CANCELLED":
-      # Call the orderCancelled method, which subclasses should extend.
-      order = msg.body['order']
+  # Handlers of the messages from an exchange, each passed the message (see handlers).
 
-      self.orderCancelled(order)
+  # Record market open or close times.
+  def handleWhenMktOpen(self, msg):
+    self.mkt_open = msg.data
 
-    elif msg.body['msg'] == "MKT_CLOSED":
-      # We've tried to ask the exchange for something after it closed.  Remember this
-      # so we stop asking for things that can't happen.
+    log_print ("Recorded market open: {}", self.kernel.fmtTime(self.mkt_open))
 
-      self.marketClosed()
+  def handleWhenMktClose(self, msg):
+    self.mkt_close = msg.data
 
-    elif msg.body['msg'] == "FINAL_CLOSE":
-      # We've tried to ask the exchange for something after it closed.  Remember this
-      # so we stop asking for things that can't happen.
-      self.finalClose()
+    log_print ("Recorded market close: {}", self.kernel.fmtTime(self.mkt_close))
 
-    elif msg.body['msg'] == 'QUERY_LAST_TRADE':
-      # Call the queryLastTrade method, which subclasses may extend.
-      # Also note if the market is closed.
-      if msg.body['mkt_closed']: self.mkt_closed = True
+  def handleOrderExecuted(self, msg):
+    # Call the orderExecuted method, which subclasses should extend.  This parent
+    # class could implement default "portfolio tracking" or "returns tracking"
+    # behavior.
+    self.orderExecuted(msg.order)
 
-      self.queryLastTrade(msg.body['symbol'], msg.body['data'])
+  def handleOrderAccepted(self, msg):
+    # Call the orderAccepted method, which subclasses should extend.
+    self.orderAccepted(msg.order)
 
-    elif msg.body['msg'] == 'QUERY_SPREAD':
-      # Call the querySpread method, which subclasses may extend.
-      # Also note if the market is closed.
-      if msg.body['mkt_closed']: self.mkt_closed = True
+  def handleOrderCancelled(self, msg):
+    # Call the orderCancelled method, which subclasses should extend.
+    self.orderCancelled(msg.order)
 
-      self.querySpread(msg.body['symbol'], msg.body['data'], msg.body['bids'], msg.body['asks'], msg.body['book'])
+  def handleMktClosed(self, msg):
+    # We've tried to ask the exchange for something after it closed.  Remember this
+    # so we stop asking for things that can't happen.
+    self.marketClosed()
 
-    elif msg.body['msg'] == 'QUERY_ORDER_STREAM':
-      # Call the queryOrderStream method, which subclasses may extend.
-      # Also note if the market is closed.
-      if msg.body['mkt_closed']: self.mkt_closed = True
+  def handleFinalClose(self, msg):
+    # We've tried to ask the exchange for something after it closed.  Remember this
+    # so we stop asking for things that can't happen.
+    self.finalClose()
 
-      self.queryOrderStream(msg.body['symbol'], msg.body['orders'])
+  def handleLastTrade(self, msg):
+    # Call the queryLastTrade method, which subclasses may extend.
+    # Also note if the market is closed.
+    if msg.mkt_closed: self.mkt_closed = True
 
-    elif msg.body['msg'] == 'QUERY_TRANSACTED_VOLUME':
-      if msg.body['mkt_closed']: self.mkt_closed = True
-      self.query_transacted_volume(msg.body['symbol'], msg.body['transacted_volume'])
+    self.queryLastTrade(msg.symbol, msg.data)
 
-    elif msg.body['msg'] == 'MARKET_DATA':
-      self.handleMarketData(msg)
+  def handleSpread(self, msg):
+    # Call the querySpread method, which subclasses may extend.
+    # Also note if the market is closed.
+    if msg.mkt_closed: self.mkt_closed = True
 
-    elif msg.body['msg'] == 'FILLED':
-      self.handleFilledOrder(msg)
+    self.querySpread(msg.symbol, msg.data, msg.bids, msg.asks, msg.book)
 
-    elif msg.body['msg'] == 'NEW_SPLIT_MARKET_ORDER':
-      self.handleNewSplitMarketOrder(msg)
+  def handleOrderStream(self, msg):
+    # Call the queryOrderStream method, which subclasses may extend.
+    # Also note if the market is closed.
+    if msg.mkt_closed: self.mkt_closed = True
 
-    # Now do we know the market hours?
-    have_mkt_hours = self.mkt_open is not None and self.mkt_close is not None
+    self.queryOrderStream(msg.symbol, msg.orders)
 
-    # Once we know the market open and close times, schedule a wakeup call for market open.
-    # Also want to wake for next trading day - this is when we have received a different mkt_open
-    if (have_mkt_hours and not had_mkt_hours) or (initial_mkt_open != self.mkt_open):
-      # Agents are asked to generate a wake offset from the market open time.  We structure
-      # this as a subclass request so each agent can supply an appropriate offset relative
-      # to its trading frequency.
-      ns_offset = self.getWakeFrequency()
-     
-      self.setWakeup(self.mkt_open + ns_offset)
-      
-    #  if initial_mkt_open != self.mkt_open:
-     #   print(msg.body['msg'])
-      #  print(initial_mkt_open,self.mkt_open)
-       # print("DAY 2 ###############################################################################")
+  def handleTransactedVolume(self, msg):
+    if msg.mkt_closed: self.mkt_closed = True
+    self.query_transacted_volume(msg.symbol, msg.transacted_volume)
 
   # Used by any Trading Agent subclass to query the last trade price for a symbol.
   # This activity is not logged.
   def getLastTrade (self, symbol):
-    self.sendMessage(self.exchangeID, Message({ "msg" : "QUERY_LAST_TRADE", "sender": self.id,
-                                                "symbol" : symbol })) 
+    self.sendMessage(self.exchangeID, QueryLastTradeMsg(self.id, symbol))
 
   def handleNewSplitMarketOrder(self, msg):
-    order = msg.body['order']
+    order = msg.order
     self.all_orders[order.order_id] = order
     self.order_num += 1
 
   def handleFilledOrder(self, msg):
-    order_id = msg.body['order_id']
+    order_id = msg.order_id
     self.all_orders[order_id].filled = True
-    self.all_orders[order_id].fill_price = msg.body['fill_price']
-    self.all_orders[order_id].fill_time = msg.body['fill_time']
-    self.all_orders[order_id].fill_quantity = msg.body['quantity']
-    self.all_orders[order_id].fill_type = msg.body['fill_type']
+    self.all_orders[order_id].fill_price = msg.fill_price
+    self.all_orders[order_id].fill_time = msg.fill_time
+    self.all_orders[order_id].fill_quantity = msg.quantity
+    self.all_orders[order_id].fill_type = msg.fill_type
     # print("Agent " + str(self.id) + " filled order " + str(order_id))
     
 
   # Used by any Trading Agent subclass to query the current spread for a symbol.
   # This activity is not logged.
   def getCurrentSpread (self, symbol, depth=1):
-    self.sendMessage(self.exchangeID, Message({ "msg" : "QUERY_SPREAD", "sender": self.id,
-                                                "symbol" : symbol, "depth" : depth }))
+    self.sendMessage(self.exchangeID, QuerySpreadMsg(self.id, symbol, depth))
 
 
   # Used by any Trading Agent subclass to query the recent order stream for a symbol.
   def getOrderStream (self, symbol, length=1):
-    self.sendMessage(self.exchangeID, Message({ "msg" : "QUERY_ORDER_STREAM", "sender": self.id,
-                                                "symbol" : symbol, "length" : length }))
+    self.sendMessage(self.exchangeID, QueryOrderStreamMsg(self.id, symbol, length))
 
   def get_transacted_volume(self, symbol, lookback_period='10min'):
     """ Used by any trading agent subclass to query the total transacted volume in a given lookback period """
-    self.sendMessage(self.exchangeID, Message({ "msg": "QUERY_TRANSACTED_VOLUME", "sender": self.id,
-                                                "symbol": symbol, "lookback_period": lookback_period}))
+    self.sendMessage(self.exchangeID, QueryTransactedVolumeMsg(self.id, symbol, lookback_period))
 
   # Used by any Trading Agent subclass to place a limit order.  Parameters expect:
   # string (valid symbol), int (positive share quantity), bool (True == BUY), int (price in cents).
@@ -424,9 +439,10 @@ class TradingAgent(FinancialAgent):
       # it might be nice to make the whole history of the order into transaction
       # objects inside the order (we're halfway there) so there CAN be just a single
       # object per order, that never alters its original state, and eliminate all these copies.
-      self.orders[order.order_id] = deepcopy(order)
-      self.sendMessage(self.exchangeID, Message({ "msg" : "LIMIT_ORDER", "sender": self.id,
-                                                  "order" : order })) 
+      # The exchange takes ownership of the order we send (it is not copied again there), so this
+      # snapshot is the only copy made when placing an order.
+      self.orders[order.order_id] = order.snapshot()
+      self.sendMessage(self.exchangeID, LimitOrderMsg(self.id, order))
       self.all_orders[order.order_id] = self.orders[order.order_id]
       # Log this activity.
       if self.log_orders: self.logEvent('ORDER_SUBMITTED', order.to_dict())
@@ -465,8 +481,8 @@ class TradingAgent(FinancialAgent):
                     order, self.fmtHoldings(self.holdings))
           return
 
-      self.orders[order.order_id] = deepcopy(order)
-      self.sendMessage(self.exchangeID, Message({"msg" : "MARKET_ORDER", "sender": self.id, "order": order}), delay=delay)
+      self.orders[order.order_id] = order.snapshot()
+      self.sendMessage(self.exchangeID, MarketOrderMsg(self.id, order), delay=delay)
  
       if self.log_orders: self.logEvent('ORDER_SUBMITTED', order.to_dict())
     else:
@@ -476,8 +492,7 @@ class TradingAgent(FinancialAgent):
     """Used by any Trading Agent subclass to cancel any order.  The order must currently
     appear in the agent's open orders list."""
     if isinstance(order, LimitOrder):
-      self.sendMessage(self.exchangeID, Message({"msg": "CANCEL_ORDER", "sender": self.id,
-                                                 "order": order}))
+      self.sendMessage(self.exchangeID, CancelOrderMsg(self.id, order))
       # Log this activity.
       if self.log_orders: self.logEvent('CANCEL_SUBMITTED', order.to_dict())
     else:
@@ -487,8 +502,7 @@ class TradingAgent(FinancialAgent):
     """ Used by any Trading Agent subclass to modify any existing limit order.  The order must currently
         appear in the agent's open orders list.  Some additional tests might be useful here
         to ensure the old and new orders are the same in some way."""
-    self.sendMessage(self.exchangeID, Message({ "msg" : "MODIFY_ORDER", "sender": self.id,
-                                                "order" : order, "new_order" : newOrder}))
+    self.sendMessage(self.exchangeID, ModifyOrderMsg(self.id, order, newOrder))
 
     # Log this activity.
     if self.log_orders: self.logEvent('MODIFY_ORDER', order.to_dict())
@@ -573,8 +587,8 @@ class TradingAgent(FinancialAgent):
     self.mkt_closed = True
 
     # Query when market opens and closes next.
-    self.sendMessage(self.exchangeID, Message({"msg": "WHEN_MKT_OPEN", "sender": self.id }))
-    self.sendMessage(self.exchangeID, Message({"msg": "WHEN_MKT_CLOSE", "sender": self.id }))
+    self.sendMessage(self.exchangeID, WhenMktOpenMsg(self.id))
+    self.sendMessage(self.exchangeID, WhenMktCloseMsg(self.id))
 
   # Handles QUERY_LAST_TRADE messages from an exchange agent.
   def queryLastTrade (self, symbol, price):
@@ -620,11 +634,19 @@ class TradingAgent(FinancialAgent):
     '''
     Handles Market Data messages for agents using subscription mechanism
     '''
-    symbol = msg.body['symbol']
-    self.known_asks[symbol] = msg.body['asks']
-    self.known_bids[symbol] = msg.body['bids']
-    self.last_trade[symbol] = msg.body['last_transaction']
-    self.exchange_ts[symbol] = msg.body['exchange_ts']
+    symbol = msg.symbol
+    if hasattr(msg, 'bid_deltas'):
+      bids, asks = self.subscribed_books.get(symbol, ([], []))
+      bids = applyDepthDeltas(bids, msg.bid_deltas, True)
+      asks = applyDepthDeltas(asks, msg.ask_deltas, False)
+      self.subscribed_books[symbol] = (bids, asks)
+      self.known_asks[symbol] = asks
+      self.known_bids[symbol] = bids
+    else:
+      self.known_asks[symbol] = msg.asks
+      self.known_bids[symbol] = msg.bids
+    self.last_trade[symbol] = msg.last_transaction
+    self.exchange_ts[symbol] = msg.exchange_ts
 
 
   # Handles QUERY_ORDER_STREAM messages from an exchange agent.
@@ -645,15 +667,16 @@ class TradingAgent(FinancialAgent):
 
   # Extract the current known bid and asks. This does NOT request new information.
   def getKnownBidAsk (self, symbol, best=True):
+    # The known levels may be lists of (price, volume) tuples or, from a conflated subscription, arrays of such rows.
     if best:
-      bid = self.known_bids[symbol][0][0] if self.known_bids[symbol] else None
-      ask = self.known_asks[symbol][0][0] if self.known_asks[symbol] else None
-      bid_vol = self.known_bids[symbol][0][1] if self.known_bids[symbol] else 0
-      ask_vol = self.known_asks[symbol][0][1] if self.known_asks[symbol] else 0
+      bid = self.known_bids[symbol][0][0] if len(self.known_bids[symbol]) else None
+      ask = self.known_asks[symbol][0][0] if len(self.known_asks[symbol]) else None
+      bid_vol = self.known_bids[symbol][0][1] if len(self.known_bids[symbol]) else 0
+      ask_vol = self.known_asks[symbol][0][1] if len(self.known_asks[symbol]) else 0
       return bid, bid_vol, ask, ask_vol
     else:
-      bids = self.known_bids[symbol] if self.known_bids[symbol] else None
-      asks = self.known_asks[symbol] if self.known_asks[symbol] else None
+      bids = self.known_bids[symbol] if len(self.known_bids[symbol]) else None
+      asks = self.known_asks[symbol] if len(self.known_asks[symbol]) else None
       return bids, asks
 
 
@@ -727,8 +750,8 @@ class TradingAgent(FinancialAgent):
 
   # Get the known best bid, ask, and bid/ask midpoint from cached data.  No volume.
   def getKnownBidAskMidpoint (self, symbol) :
-    bid = self.known_bids[symbol][0][0] if self.known_bids[symbol] else None
-    ask = self.known_asks[symbol][0][0] if self.known_asks[symbol] else None
+    bid = self.known_bids[symbol][0][0] if len(self.known_bids[symbol]) else None
+    ask = self.known_asks[symbol][0][0] if len(self.known_asks[symbol]) else None
 
     midpoint = int(round((bid + ask) / 2)) if bid is not None and ask is not None else None
 
@@ -10,7 +10,8 @@ class ValueAgent(TradingAgent):
 
     def __init__(self, id, name, type, symbol='IBM', starting_cash=100000, sigma_n=10000,
                  r_bar=100000, kappa=0.05, sigma_s=100000,
-                 lambda_a=0.005, log_orders=False, log_to_file=True, random_state=None):
+                 lambda_a=0.005, subscribe=False, subscribe_freq=10e9, log_orders=False, log_to_file=True,
+                 random_state=None):
 
         # Base class init.
         super().__init__(id, name, type, starting_cash=starting_cash,
@@ -23,6 +24,8 @@ class ValueAgent(TradingAgent):
         self.kappa = kappa  # mean reversion parameter
         self.sigma_s = sigma_s  # shock variance
         self.lambda_a = lambda_a  # mean arrival rate of ZI agents
+        self.subscribe = subscribe  # Flag to determine whether to subscribe to the inside quote or query the spread
+        self.subscribe_freq = subscribe_freq  # Conflation window in ns of the inside quote in subscribe mode
 
         # The agent uses this to track whether it has begun its strategy or is still
         # handling pre-market tasks.
@@ -96,6 +99,10 @@ class ValueAgent(TradingAgent):
                 # Time to start trading!
                 log_print("{} is ready to start trading now.", self.name)
 
+                # In subscribe mode, the exchange keeps the agent's inside quote up to date instead.
+                if self.subscribe:
+                    self.requestDataSubscription(self.symbol, levels=1, freq=self.subscribe_freq, conflate=True)
+
         # Steady state wakeup behavior starts here.
 
         # If we've been told the market has closed for the day, we will only request
@@ -114,9 +121,15 @@ class ValueAgent(TradingAgent):
 
         self.cancelOrders()
 
+        # In subscribe mode the agent places its order at once from the last inside quote it was sent, once it has been
+        # sent one.
         if type(self) == ValueAgent:
-            self.getCurrentSpread(self.symbol)
-            self.state = 'AWAITING_SPREAD'
+            if self.subscribe and self.symbol in self.known_bids:
+                self.placeOrder()
+                self.state = 'AWAITING_WAKEUP'
+            else:
+                self.getCurrentSpread(self.symbol)
+                self.state = 'AWAITING_SPREAD'
         else:
             self.state = 'ACTIVE'
 
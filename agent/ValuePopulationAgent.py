@@ -0,0 +1,127 @@
+from agent.PopulationAgent import PopulationAgent
+from util.util import log_print
+
+import numpy as np
+import pandas as pd
+
+
+class ValuePopulationAgent(PopulationAgent):
+
+    # A population of ValueAgents (see agent.PopulationAgent).  Each member arrives at the market
+    # as a Poisson process, cancels its open orders, updates its Bayesian estimate of the final
+    # fundamental value from a noisy observation, and places an order on the side it believes the
+    # price will move toward.
+    #
+    # Like a ValueAgent, each member runs two arrival chains at lambda_a each: TradingAgent
+    # schedules the market open wakeup once per market hours reply, and every wakeup schedules the
+    # next.  Populations therefore take the same lambda_a as the per-object agents.
+
+    def __init__(self, id, name, type, num_members, symbol='IBM', starting_cash=100000, sigma_n=10000,
+                 r_bar=100000, kappa=0.05, sigma_s=100000, lambda_a=0.005, batch_window='1ms',
+                 log_orders=False, log_to_file=True, random_state=None):
+
+        # Base class init.
+        super().__init__(id, name, type, num_members, symbol=symbol, starting_cash=starting_cash,
+                         batch_window=batch_window, arrival_chains=2, log_orders=log_orders,
+                         log_to_file=log_to_file, random_state=random_state)
+
+        # Store important parameters particular to the value agents.
+        self.sigma_n = sigma_n  # observation noise variance
+        self.r_bar = r_bar  # true mean fundamental value
+        self.kappa = kappa  # mean reversion parameter
+        self.sigma_s = sigma_s  # shock variance
+        self.lambda_a = lambda_a  # mean arrival rate of each of a member's arrival chains
+
+        # Each member maintains two priors: r_t and sigma_t (value and error estimates), and its
+        # previous wake time in ns (None until the market open time is known).
+        self.r_t = np.full(num_members, r_bar, dtype=float)
+        self.sigma_t = np.zeros(num_members)
+        self.prev_wake_time = None
+
+        self.percent_aggr = 0.1                 #percent of time that a member will aggress the spread
+        self.sizes = self.random_state.randint(20, 50, size=num_members)   #size that each member will be placing
+        self.depth_spread = 2
+
+    def nextWakeTimes(self, members, wake_times):
+        # Members arrive according to a Poisson process.
+        delta_time = self.random_state.exponential(scale=1.0 / self.lambda_a, size=len(members))
+        return wake_times + np.round(delta_time).astype(np.int64)
+
+    def membersWaking(self, members, arrivals):
+        # Members cancel their open orders on arrival.
+        self.cancelMemberOrders(members)
+
+    def updateEstimates(self, members):
+        # Each member obtains a new noisy observation of the current fundamental value and uses it
+        # to update its internal estimates in a Bayesian manner, exactly as ValueAgent.updateEstimates
+        # does.  Returns the members' estimates of the final fundamental value.
+        obs_t = self.oracle.observe_many(self.symbol, self.currentTime, np.full(len(members), self.sigma_n),
+                                         self.random_state)
+
+        # If this is a member's first estimate, treat the previous wake time as "market open".
+        if self.prev_wake_time is None: self.prev_wake_time = np.full(self.num_members, self.mkt_open.value)
+
+        now = self.currentTime.value
+
+        # Advance the estimates from each member's previous wake time to now.
+        delta = (now - self.prev_wake_time[members]).astype(float)
+        decay = (1 - self.kappa) ** delta
+
+        r_tprime = (1 - decay) * self.r_bar + decay * self.r_t[members]
+
+        sigma_t = self.sigma_t[members]
+        sigma_tprime = (decay ** 2) * sigma_t
+        sigma_tprime += ((1 - decay ** 2) / (1 - (1 - self.kappa) ** 2)) * self.sigma_s
+
+        # Apply the new observation.
+        self.r_t[members] = (self.sigma_n / (self.sigma_n + sigma_tprime)) * r_tprime
+        self.r_t[members] += (sigma_tprime / (self.sigma_n + sigma_tprime)) * obs_t
+
+        self.sigma_t[members] = (self.sigma_n * sigma_t) / (self.sigma_n + sigma_t)
+
+        # Estimate the final fundamental (at market close), quantized to whole units of value.
+        delta = max(0, self.mkt_close.value - now)
+        decay = (1 - self.kappa) ** delta
+
+        r_T = np.round((1 - decay) * self.r_bar + decay * self.r_t[members]).astype(np.int64)
+
+        self.prev_wake_time[members] = now
+
+        log_print("{} estimates r_T = {} as of {}", self.name, r_T, self.currentTime)
+
+        return r_T
+
+    def placeOrders(self, members, arrivals):
+        # Estimate the final value of the fundamental price.
+        r_T = self.updateEstimates(members)
+
+        bid, bid_vol, ask, ask_vol = self.getKnownBidAsk(self.symbol)
+
+        if bid and ask:
+            mid = int((ask + bid) / 2)
+            spread = abs(ask - bid)
+
+            # Aggress the spread, or post inside the spread or deeper in the book as a passive order.
+            adjust = self.random_state.randint(0, max(1, self.depth_spread * spread), size=len(members))
+            adjust[self.random_state.rand(len(members)) < self.percent_aggr] = 0
+
+            # Buy if the fundamental belief is that the price will go up, otherwise sell.
+            buy = r_T >= mid
+            prices = np.where(buy, ask - adjust, bid + adjust)
+        else:
+            # initialize randomly
+            buy = self.random_state.randint(0, 1 + 1, size=len(members)).astype(bool)
+            prices = r_T
+
+        self.placeMemberOrders(members, arrivals, buy, prices, self.sizes[members])
+
+    def logMemberValuations(self):
+        # Value agents are marked to the final fundamental value.
+        rT = self.oracle.observePrice(self.symbol, self.currentTime, sigma_n=0, random_state=self.random_state)
+
+        surplus = rT * self.memberLots() + self.member_cash - self.member_starting_cash
+        surplus = surplus / self.member_starting_cash
+
+        log_print("{} mean relative surplus {}", self.name, surplus.mean())
+
+        self.logMemberEvent('FINAL_VALUATION', surplus)
@@ -11,7 +11,7 @@ class ZeroIntelligenceAgent(TradingAgent):
     def __init__(self, id, name, type, symbol='IBM', starting_cash=100000, sigma_n=1000,
                  r_bar=100000, kappa=0.05, sigma_s=100000, q_max=10,
                  sigma_pv=5000000, R_min=0, R_max=250, eta=1.0,
-                 lambda_a=0.005, log_orders=False, random_state=None):
+                 lambda_a=0.005, subscribe=False, subscribe_freq=10e9, log_orders=False, random_state=None):
 
         # Base class init.
         super().__init__(id, name, type, starting_cash=starting_cash, log_orders=log_orders, random_state=random_state)
@@ -28,6 +28,8 @@ class ZeroIntelligenceAgent(TradingAgent):
         self.R_max = R_max  # max requested surplus
         self.eta = eta  # strategic threshold
         self.lambda_a = lambda_a  # mean arrival rate of ZI agents
+        self.subscribe = subscribe  # Flag to determine whether to subscribe to the inside quote or query the spread
+        self.subscribe_freq = subscribe_freq  # Conflation window in ns of the inside quote in subscribe mode
 
         # The agent uses this to track whether it has begun its strategy or is still
         # handling pre-market tasks.
@@ -115,6 +117,10 @@ class ZeroIntelligenceAgent(TradingAgent):
                 # Time to start trading!
                 log_print("{} is ready to start trading now.", self.name)
 
+                # In subscribe mode, the exchange keeps the agent's inside quote up to date instead.
+                if self.subscribe:
+                    self.requestDataSubscription(self.symbol, levels=1, freq=self.subscribe_freq, conflate=True)
+
         # Steady state wakeup behavior starts here.
 
         # If we've been told the market has closed for the day, we will only request
@@ -157,9 +163,16 @@ class ZeroIntelligenceAgent(TradingAgent):
         # If the calling agent is a subclass, don't initiate the strategy section of wakeup(), as it
         # may want to do something different.
 
+        # In subscribe mode the agent places its order at once from the last inside quote it was sent, once it has been
+        # sent one.
+
         if type(self) == ZeroIntelligenceAgent:
-            self.getCurrentSpread(self.symbol)
-            self.state = 'AWAITING_SPREAD'
+            if self.subscribe and self.symbol in self.known_bids:
+                self.placeOrder()
+                self.state = 'AWAITING_WAKEUP'
+            else:
+                self.getCurrentSpread(self.symbol)
+                self.state = 'AWAITING_SPREAD'
         else:
             self.state = 'ACTIVE'
 
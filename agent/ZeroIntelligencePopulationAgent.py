@@ -0,0 +1,87 @@
+from agent.ValuePopulationAgent import ValuePopulationAgent
+from util.util import log_print
+
+from math import sqrt
+import numpy as np
+import pandas as pd
+
+
+class ZeroIntelligencePopulationAgent(ValuePopulationAgent):
+
+    # A population of ZeroIntelligenceAgents (see agent.PopulationAgent).  Members arrive and
+    # estimate the final fundamental value as value agents do, then trade one round lot at their
+    # private valuation less (or plus) a random requested surplus, or at the inside quote if that
+    # secures at least eta times the surplus.
+
+    def __init__(self, id, name, type, num_members, symbol='IBM', starting_cash=100000, sigma_n=1000,
+                 r_bar=100000, kappa=0.05, sigma_s=100000, q_max=10, sigma_pv=5000000, R_min=0, R_max=250,
+                 eta=1.0, lambda_a=0.005, batch_window='1ms', log_orders=False, log_to_file=True,
+                 random_state=None):
+
+        # Base class init.
+        super().__init__(id, name, type, num_members, symbol=symbol, starting_cash=starting_cash,
+                         sigma_n=sigma_n, r_bar=r_bar, kappa=kappa, sigma_s=sigma_s, lambda_a=lambda_a,
+                         batch_window=batch_window, log_orders=log_orders, log_to_file=log_to_file,
+                         random_state=random_state)
+
+        # Store important parameters particular to the ZI agents.
+        self.q_max = q_max  # max unit holdings
+        self.sigma_pv = sigma_pv  # private value variance
+        self.R_min = R_min  # min requested surplus
+        self.R_max = R_max  # max requested surplus
+        self.eta = eta  # strategic threshold
+
+        # Each member has a private value for each incremental unit, in decreasing order.
+        theta = np.round(self.random_state.normal(loc=0, scale=sqrt(sigma_pv), size=(num_members, q_max * 2)))
+        self.theta = -np.sort(-theta, axis=1).astype(np.int64)
+
+    def placeOrders(self, members, arrivals):
+        r_T = self.updateEstimates(members)
+
+        # Members at their holdings limit trade back toward it, the rest flip a coin.
+        q = np.trunc(self.member_holdings[members] / 100).astype(np.int64)
+
+        buy = self.random_state.randint(0, 2, size=len(members)).astype(bool)
+        buy[q >= self.q_max] = False
+        buy[q <= -self.q_max] = True
+
+        # Each member's total valuation of the unit it is considering.
+        unit = np.clip(q + self.q_max - 1 + buy, 0, 2 * self.q_max - 1)
+        v = r_T + self.theta[members, unit]
+
+        # Select a requested surplus for each trade, and the limit price.
+        R = self.random_state.randint(self.R_min, self.R_max + 1, size=len(members))
+        prices = np.where(buy, v - R, v + R)
+
+        # Take the inside bid/ask instead if it secures (eta * R) surplus immediately.
+        bid, bid_vol, ask, ask_vol = self.getKnownBidAsk(self.symbol)
+        if ask_vol > 0:
+            take = buy & (v - ask >= self.eta * R)
+            prices[take] = ask
+        if bid_vol > 0:
+            take = ~buy & (bid - v >= self.eta * R)
+            prices[take] = bid
+
+        log_print("{} limit prices {}", self.name, prices)
+
+        self.placeMemberOrders(members, arrivals, buy, prices, np.full(len(members), 100))
+
+    def logMemberValuations(self):
+        # Each member's surplus starts with its private valuation of the units held.
+        H = self.memberLots()
+        units = np.arange(1, self.q_max + 1)
+
+        held = np.zeros(self.num_members, dtype=np.int64)
+        for u in units:
+            long = H >= u
+            held[long] += self.theta[long, u + self.q_max - 1]
+            short = H <= -u
+            held[short] -= self.theta[short, self.q_max - u]
+
+        log_print("{} mean private surplus {}", self.name, held.mean())
+
+        # Profit marked to the last trade, as a percentage of starting cash.
+        cash = self.member_cash + self.member_holdings * self.last_trade[self.symbol]
+        percentage_profit = np.round(100 * (cash - self.member_starting_cash) / self.member_starting_cash, 5)
+
+        self.logMemberEvent('FINAL_PCT_PROFIT', percentage_profit)
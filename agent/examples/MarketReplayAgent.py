@@ -1,10 +1,8 @@
-import pickle
 import os.path
-from datetime import datetime
 import pandas as pd
-#from joblib import Memory
 
 from agent.TradingAgent import TradingAgent
+from util.L3ReplayStore import L3ReplayStore, convertL3Orders, isL3ReplayStore
 from util.order.LimitOrder import LimitOrder
 from util.util import log_print
 
@@ -13,7 +11,7 @@ class MarketReplayAgent(TradingAgent):
 
     def __init__(self, id, name, type, symbol, date, start_time, end_time,
                  orders_file_path, processed_orders_folder_path,
-                 starting_cash, log_orders=False, random_state=None):
+                 starting_cash, log_orders=False, random_state=None, max_lookahead=1000):
         super().__init__(id, name, type, starting_cash=starting_cash, log_orders=log_orders, random_state=random_state)
         self.symbol = symbol
         self.date = date
@@ -21,21 +19,58 @@ class MarketReplayAgent(TradingAgent):
         self.executed_trades = dict()
         self.state = 'AWAITING_WAKEUP'
 
+        # Most historical times replayed in a single wakeup.
+        self.max_lookahead = max_lookahead
+
         self.historical_orders = L3OrdersProcessor(self.symbol,
                                                    self.date, start_time, end_time,
                                                    orders_file_path, processed_orders_folder_path)
-        self.wakeup_times = self.historical_orders.wakeup_times
 
     def wakeup(self, currentTime):
         super().wakeup(currentTime)
         if not self.mkt_open or not self.mkt_close:
             return
-        try:
-            self.setWakeup(self.wakeup_times[0])
-            self.wakeup_times.pop(0)
-            self.placeOrder(currentTime, self.historical_orders.orders_dict[currentTime])
-        except IndexError:
-            log_print(f"Market Replay Agent submitted all orders - last order @ {currentTime}")
+
+        cursor = self.historical_orders.cursor
+        next_time = cursor.peekTime()
+        if next_time is None or currentTime.value < next_time:
+            # Nothing left to replay, or an extra wakeup before the next historical time (the
+            # replies with the market open and close each schedule one for the first).
+            return
+
+        # Replay the orders at the next historical time, then at as many following times as it is
+        # safe to replay now: while the agent would be free by then and the kernel has nothing at
+        # all to deliver up to and including that time, nothing can happen in between to change
+        # what gets sent, so the orders are sent now with their sending delayed to that time.
+        # This leaves a single wakeup in the queue for the replay, at the first historical time
+        # that cannot be replayed ahead.
+        time = currentTime.value
+        for _ in range(self.max_lookahead):
+            batch_time, order_ids, prices, sizes, sides = cursor.nextBatch()
+            if batch_time > time:
+                self.delay(batch_time - time)
+                time = batch_time
+                self.currentTime = pd.Timestamp(time)
+
+            self.placeOrders(self.currentTime, order_ids, prices, sizes, sides)
+
+            next_time = cursor.peekTime()
+            if next_time is None or not self.canReplayAt(next_time, time):
+                break
+
+        if next_time is None:
+            log_print("Market Replay Agent submitted all orders - last order @ {}", self.currentTime)
+        else:
+            self.setWakeup(pd.Timestamp(next_time))
+
+    def canReplayAt(self, next_time, time):
+        """ Whether the orders at next_time can be replayed by the agent acting (without waking) at time: it would be
+            free again by then, and there is no event in the kernel queue at or before it.
+        """
+        if next_time < time + self.getComputationDelay():
+            return False
+        next_event_time = self.kernel.nextEventTime()
+        return next_event_time is None or next_event_time > next_time
 
     def receiveMessage(self, currentTime, msg):
         super().receiveMessage(currentTime, msg)
@@ -44,38 +79,35 @@ class MarketReplayAgent(TradingAgent):
             self.executed_trades[currentTime] = [order.fill_price, order.quantity]
             self.last_trade[self.symbol] = order.fill_price
 
-    def placeOrder(self, currentTime, order):
-        if len(order) == 1:
-            order = order[0]
-            order_id = order['ORDER_ID']
+    def placeOrders(self, currentTime, order_ids, prices, sizes, sides):
+        """ Replay the historical orders at the current time, in the order they arrived: a new order for an order id
+            not seen yet, a cancellation for a size of zero, and a modification otherwise.
+        """
+        for order_id, price, size, side in zip(order_ids.tolist(), prices.tolist(), sizes.tolist(), sides.tolist()):
+            order_id = str(order_id)
+            is_buy_order = side == L3OrdersProcessor.BUY
             existing_order = self.orders.get(order_id)
-            if not existing_order and order['SIZE'] > 0:
-                self.placeLimitOrder(self.symbol, order['SIZE'], order['BUY_SELL_FLAG'] == 'BUY', order['PRICE'],
-                                     order_id=order_id)
-            elif existing_order and order['SIZE'] == 0:
+            if not existing_order and size > 0:
+                self.placeLimitOrder(self.symbol, size, is_buy_order, price, order_id=order_id)
+            elif existing_order and size == 0:
                 self.cancelOrder(existing_order)
             elif existing_order:
-                self.modifyOrder(existing_order, LimitOrder(self.id, currentTime, self.symbol, order['SIZE'],
-                                                            order['BUY_SELL_FLAG'] == 'BUY', order['PRICE'],
+                self.modifyOrder(existing_order, LimitOrder(self.id, currentTime, self.symbol, size, is_buy_order, price,
                                                             order_id=order_id))
-        else:
-            for ind_order in order:
-                self.placeOrder(currentTime, order=[ind_order])
 
     def getWakeFrequency(self):
-        log_print(f"Market Replay Agent first wake up: {self.historical_orders.first_wakeup}")
+        log_print("Market Replay Agent first wake up: {}", self.historical_orders.first_wakeup)
         return self.historical_orders.first_wakeup - self.mkt_open
 
 
-#mem = Memory(cachedir='./cache', verbose=0)
-
-
 class L3OrdersProcessor:
-    COLUMNS = ['TIMESTAMP', 'ORDER_ID', 'PRICE', 'SIZE', 'BUY_SELL_FLAG']
-    DIRECTION = {0: 'BUY', 1: 'SELL'}
+    BUY = 0
 
     # Class for reading historical exchange orders stream
     def __init__(self, symbol, date, start_time, end_time, orders_file_path, processed_orders_folder_path):
+        """ Open the L3 replay store of the symbol and date (see util/L3ReplayStore.py) for orders in
+            [start_time, end_time), converting the historical orders file into it first if it does not exist yet.
+        """
         self.symbol = symbol
         self.date = date
         self.start_time = start_time
@@ -83,43 +115,18 @@ class L3OrdersProcessor:
         self.orders_file_path = orders_file_path
         self.processed_orders_folder_path = processed_orders_folder_path
 
-        self.orders_dict = self.processOrders()
-        self.wakeup_times = [*self.orders_dict]
-        self.first_wakeup = self.wakeup_times[0]
+        self.store = self.processOrders()
+        self.cursor = self.store.cursor()
+        log_print("Number of Orders: {}", len(self.store))
+
+        self.first_wakeup = pd.Timestamp(self.store.firstTime())
 
     def processOrders(self):
-        def convertDate(date_str):
-            try:
-                return datetime.strptime(date_str, '%Y%m%d%H%M%S.%f')
-            except ValueError:
-                return convertDate(date_str[:-1])
-
-        #@mem.cache
-        def read_processed_orders_file(processed_orders_file):
-            with open(processed_orders_file, 'rb') as handle:
-                return pickle.load(handle)
-
-        processed_orders_file = f'{self.processed_orders_folder_path}marketreplay_{self.symbol}_{self.date.date()}.pkl'
-        if os.path.isfile(processed_orders_file):
-            print(f'Processed file exists for {self.symbol} and {self.date.date()}: {processed_orders_file}')
-            return read_processed_orders_file(processed_orders_file)
+        store_path = os.path.join(self.processed_orders_folder_path, f'marketreplay_{self.symbol}_{self.date.date()}')
+        if isL3ReplayStore(store_path):
+            print(f'Processed store exists for {self.symbol} and {self.date.date()}: {store_path}')
         else:
-            print(f'Processed file does not exist for {self.symbol} and {self.date.date()}, processing...')
-            orders_df = pd.read_csv(self.orders_file_path).iloc[1:]
-            all_columns = orders_df.columns[0].split('|')
-            orders_df = orders_df[orders_df.columns[0]].str.split('|', 16, expand=True)
-            orders_df.columns = all_columns
-            orders_df = orders_df[L3OrdersProcessor.COLUMNS]
-            orders_df['BUY_SELL_FLAG'] = orders_df['BUY_SELL_FLAG'].astype(int).replace(L3OrdersProcessor.DIRECTION)
-            orders_df['TIMESTAMP'] = orders_df['TIMESTAMP'].astype(str).apply(convertDate)
-            orders_df['SIZE'] = orders_df['SIZE'].astype(int)
-            orders_df['PRICE'] = orders_df['PRICE'].astype(float) * 100
-            orders_df['PRICE'] = orders_df['PRICE'].astype(int)
-            orders_df = orders_df.loc[(orders_df.TIMESTAMP >= self.start_time) & (orders_df.TIMESTAMP < self.end_time)]
-            orders_df.set_index('TIMESTAMP', inplace=True)
-            log_print(f"Number of Orders: {len(orders_df)}")
-            orders_dict = {k: g.to_dict(orient='records') for k, g in orders_df.groupby(level=0)}
-            with open(processed_orders_file, 'wb') as handle:
-                pickle.dump(orders_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                print(f'processed file created as {processed_orders_file}')
-            return orders_dict
+            print(f'Processed store does not exist for {self.symbol} and {self.date.date()}, processing...')
+            convertL3Orders(self.orders_file_path, store_path)
+            print(f'processed store created as {store_path}')
+        return L3ReplayStore(store_path, self.start_time, self.end_time)
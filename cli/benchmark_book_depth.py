@@ -0,0 +1,94 @@
+# Benchmark for the depth queries of the exchange order books (getInsideBids and getInsideAsks, behind
+# QUERY_SPREAD, MARKET_DATA, the BEST_BID / BEST_ASK log and the order book log).  Replays the random
+# order flow of cli/benchmark_order_book.py through each book type, querying the top level, the top
+# 10 levels and the full depth of both sides after every action, and times the queries answered from
+# the per-level volumes the books now keep against the original implementations, which added up
+# every resting order of each level on every query.  Every answer is checked against the original.
+#
+# Usage: python cli/benchmark_book_depth.py [num_orders] [seed]
+
+import sys
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import pandas as pd
+
+from agent.ExchangeAgent import ORDER_BOOK_TYPES
+from cli.benchmark_order_book import BenchmarkOwner, generate_order_flow
+from util import util
+from util.order import LimitOrder as limit_order
+from util.order.LimitOrder import LimitOrder
+from util.order.MarketOrder import MarketOrder
+
+DEPTHS = [1, 10, sys.maxsize]
+
+
+def summed_levels(book, is_buy_side, depth):
+  # The original implementations: the volume of each level added up from its orders.
+  if book.bids is not None:
+    side = book.bids if is_buy_side else book.asks
+    return [(level[0].limit_price, sum(o.quantity for o in level)) for level in side[:depth]]
+
+  keys, levels = book._side(is_buy_side)
+  prices = [key if is_buy_side else -key for key in keys[::-1][:depth]]
+  return [(price, sum(o.quantity for o in levels[price].values())) for price in prices]
+
+
+def run(book_type, flow):
+  # Returns the time taken by the original and the new queries, and the number of actions after which
+  # their answers differed.
+  owner = BenchmarkOwner(record=False)
+  book = ORDER_BOOK_TYPES[book_type](owner, 'ABM')
+  base_time = owner.currentTime
+  summed_s = volumes_s = 0
+  differ = 0
+
+  for action, args in flow:
+    if action == 'LIMIT':
+      oid, ns, qty, is_buy, price = args
+      owner.currentTime = base_time + pd.Timedelta(ns)
+      book.handleLimitOrder(LimitOrder(0, owner.currentTime, 'ABM', qty, is_buy, price, order_id=oid))
+    elif action == 'MARKET':
+      oid, ns, qty, is_buy = args
+      owner.currentTime = base_time + pd.Timedelta(ns)
+      book.handleMarketOrder(MarketOrder(0, owner.currentTime, 'ABM', qty, is_buy, order_id=oid))
+    elif action == 'CANCEL':
+      oid, ns, qty, is_buy, price = args
+      book.cancelOrder(LimitOrder(0, base_time + pd.Timedelta(ns), 'ABM', qty, is_buy, price, order_id=oid))
+    else:
+      (oid, ns, qty, is_buy, price), new_qty = args
+      placed = base_time + pd.Timedelta(ns)
+      book.modifyOrder(LimitOrder(0, placed, 'ABM', qty, is_buy, price, order_id=oid),
+                       LimitOrder(0, placed, 'ABM', new_qty, is_buy, price, order_id=oid))
+
+    start = time.perf_counter()
+    summed = [(summed_levels(book, True, depth), summed_levels(book, False, depth)) for depth in DEPTHS]
+    summed_s += time.perf_counter() - start
+
+    start = time.perf_counter()
+    volumes = [(book.getInsideBids(depth), book.getInsideAsks(depth)) for depth in DEPTHS]
+    volumes_s += time.perf_counter() - start
+
+    differ += summed != volumes
+
+  return summed_s, volumes_s, differ
+
+
+if __name__ == '__main__':
+  num_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+  seed = int(sys.argv[2]) if len(sys.argv) > 2 else 123456789
+
+  util.silent_mode = True
+  limit_order.silent_mode = True
+
+  flow = generate_order_flow(num_orders, seed)
+  print ("{} order book actions (seed {}), both sides queried at depths 1, 10 and full after each".format(
+         num_orders, seed))
+
+  for book_type in ORDER_BOOK_TYPES:
+    summed_s, volumes_s, differ = run(book_type, flow)
+    print ("  {:8} summed {:7.3f} s, volumes {:7.3f} s ({:4.1f}x), answers {}".format(
+           book_type, summed_s, volumes_s, summed_s / volumes_s, "identical" if not differ else "DIFFERENT"))
+    if differ: sys.exit(1)
@@ -0,0 +1,54 @@
+# Benchmark for util/formatting/convert_order_book.py.  Reads a full order book log (as written
+# by the ExchangeAgent with book_freq 0) and times converting it into the LOBSTER orderbook format
+# at several levels, to csv and to parquet, then times converting copies of it in several log
+# directories one after another and in parallel.
+#
+# Usage: python cli/benchmark_convert_order_book.py <ORDERBOOK_TICKER_FULL log> <ticker> [copies]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+from util.formatting.convert_order_book import save_formatted_order_book, save_formatted_order_books
+from util.LogFormat import readLog
+
+
+def timed(f):
+  start = time.perf_counter()
+  result = f()
+  return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+  book, ticker = sys.argv[1], sys.argv[2]
+  copies = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+  work_dir = tempfile.mkdtemp()
+
+  try:
+    df, read_s = timed(lambda: readLog(book))
+    print ("{} rows read in {:.2f} s".format(len(df), read_s))
+
+    for level in [1, 10, 50]:
+      for fmt in ['csv', 'parquet']:
+        filename, convert_s = timed(lambda: save_formatted_order_book(book, ticker, level, out_dir=work_dir, fmt=fmt))
+        print ("  level {:>2} {:8} {:6.2f} s (including reading the log)   {:6.1f} MB".format(level, fmt, convert_s,
+               os.path.getsize(filename) / 1e6))
+
+    log_dirs = []
+    for i in range(copies):
+      log_dir = os.path.join(work_dir, 'logs', 'run_{}'.format(i))
+      os.makedirs(log_dir)
+      shutil.copy(book, os.path.join(log_dir, 'ORDERBOOK_{}_FULL.bz2'.format(ticker)))
+      log_dirs.append(log_dir)
+
+    for jobs in [1, copies]:
+      _, convert_s = timed(lambda: save_formatted_order_books(log_dirs, ticker, 10, out_dir=work_dir, jobs=jobs))
+      print ("{} log directories, level 10 csv, {} jobs: {:.2f} s".format(copies, jobs, convert_s))
+  finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,77 @@
+# Benchmark for util/formatting/convert_order_stream.py.  Reads an Exchange Agent log (written with
+# log_orders) and times extracting the order events from it, through the original json round trip
+# per event type and through the vectorized extraction, then the whole conversion to each format,
+# and converting copies of it in several log directories one after another and in parallel.
+#
+# Usage: python cli/benchmark_convert_order_stream.py <EXCHANGE_AGENT log> <ticker> [copies]
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import pandas as pd
+
+from util.formatting.convert_order_stream import MARKET_EVENTS, extract_market_events, save_formatted_order_stream, \
+  save_formatted_order_streams
+from util.LogFormat import readLog
+
+
+def extract_json(stream_df):
+  # The original extraction: each event type's order dicts through to_json, json.loads and
+  # json_normalize.
+  event_dfs = []
+  for event_type in MARKET_EVENTS:
+    events = stream_df.loc[stream_df.EventType == event_type][['EventTime', 'Event']]
+    json_struct = json.loads(events['Event'].to_json(orient="records"))
+    event_extracted = pd.merge(events['EventTime'].reset_index(), pd.json_normalize(json_struct),
+                               left_index=True, right_index=True)
+    event_dfs.append(event_extracted[['EventTime', 'order_id', 'limit_price', 'quantity', 'is_buy_order']])
+  return pd.concat(event_dfs)
+
+
+def timed(f):
+  start = time.perf_counter()
+  result = f()
+  return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+  stream, ticker = sys.argv[1], sys.argv[2]
+  copies = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+  work_dir = tempfile.mkdtemp()
+
+  try:
+    stream_df, read_s = timed(lambda: readLog(stream).reset_index())
+    print ("{} rows read in {:.2f} s".format(len(stream_df), read_s))
+
+    events, extract_s = timed(lambda: extract_json(stream_df))
+    print ("  json round trip:       {} order events extracted in {:6.2f} s".format(len(events), extract_s))
+    events, extract_s = timed(lambda: extract_market_events(stream_df))
+    print ("  vectorized extraction: {} order events extracted in {:6.2f} s".format(len(events), extract_s))
+    del stream_df, events
+
+    for fmt in ['LOBSTER', 'plot-scripts']:
+      filename, convert_s = timed(lambda: save_formatted_order_stream(stream, ticker, 10, fmt, '', out_dir=work_dir))
+      print ("  {:12} {:6.2f} s (including reading the log)   {:6.1f} MB".format(fmt, convert_s,
+             os.path.getsize(filename) / 1e6))
+
+    log_dirs = []
+    for i in range(copies):
+      log_dir = os.path.join(work_dir, 'logs', 'run_{}'.format(i))
+      os.makedirs(log_dir)
+      shutil.copy(stream, os.path.join(log_dir, 'EXCHANGE_AGENT' + os.path.splitext(stream)[1]))
+      log_dirs.append(log_dir)
+
+    for jobs in [1, copies]:
+      _, convert_s = timed(lambda: save_formatted_order_streams(log_dirs, ticker, 10, 'LOBSTER', '', out_dir=work_dir,
+                                                                jobs=jobs))
+      print ("{} log directories, LOBSTER, {} jobs: {:.2f} s".format(copies, jobs, convert_s))
+  finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,125 @@
+# Micro-benchmark for agent event logging.  Logs the same stream of typical exchange events (order
+# dicts as logged with log_orders=True, best bid/ask strings, holdings dicts) through the original
+# list-of-dicts log (deepcopy per event, DataFrame built from the records) and through
+# util.EventLog, with and without spilling to a Parquet log file.  Reports the time spent logging (excluding the
+# time to generate the events), the time to build the final DataFrame (or write the last chunk), the
+# memory held by the log just before then, and the peak memory.  Also checks that all the
+# DataFrames (for the spilled log, as read back from its file) are equal.  Spilling needs pyarrow.
+#
+# Usage: python cli/benchmark_event_log.py [num_events]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from copy import deepcopy
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import pandas as pd
+
+from util.EventLog import EventLog, copyEvent
+from util.LogFormat import LOG_FORMATS, readLog
+from util.order.LimitOrder import LimitOrder
+
+
+def generate_events(num_events):
+  t = pd.Timestamp('2020-06-03 09:30:00')
+  holdings = {'CASH': 10000000}
+  for i in range(num_events):
+    t = t + pd.Timedelta(1000)
+    kind = i % 4
+    if kind == 0:
+      order = LimitOrder(i % 1000, t, 'ABM', 100, bool(i % 2), 100000 + i % 50, order_id=i + 1)
+      yield t, 'LIMIT_ORDER', order.to_dict()
+    elif kind == 1:
+      yield t, 'BEST_BID', "ABM,{},{}".format(100000 + i % 50, 100 * (i % 7))
+    elif kind == 2:
+      yield t, 'LAST_TRADE', "{},${:0.4f}".format(100, 100000 + i % 50)
+    else:
+      holdings['ABM'] = i
+      yield t, 'HOLDINGS_UPDATED', holdings
+
+
+def run_list(events):
+  log = []
+  for t, event_type, event in events:
+    log.append({'EventTime': t, 'EventType': event_type, 'Event': deepcopy(event)})
+  held.append(tracemalloc.get_traced_memory()[0])
+  start = time.perf_counter()
+  df = pd.DataFrame(log)
+  df.set_index('EventTime', inplace=True)
+  return df, time.perf_counter() - start
+
+
+def run_event_log(events):
+  log = EventLog()
+  for t, event_type, event in events:
+    log.append(t, event_type, copyEvent(event))
+  held.append(tracemalloc.get_traced_memory()[0])
+  start = time.perf_counter()
+  df = log.toDataFrame()
+  return df, time.perf_counter() - start
+
+
+def run_event_log_spilled(events, spill_rows, path):
+  # The log goes to path in chunks; returns path rather than a DataFrame.
+  log = EventLog()
+  writer = LOG_FORMATS['parquet'].openWriter(path, pickled=['Event'])
+  for t, event_type, event in events:
+    log.append(t, event_type, copyEvent(event))
+    if log.buffered() >= spill_rows: log.spill(writer)
+  held.append(tracemalloc.get_traced_memory()[0])
+  start = time.perf_counter()
+  log.spill(writer)
+  writer.close()
+  return path, time.perf_counter() - start
+
+
+# Memory traced just before each DataFrame is built (zero when tracemalloc is not running).
+held = []
+
+
+def measure(name, fn, num_events, generate):
+  start = time.perf_counter()
+  df, build = fn(generate_events(num_events))
+  total = time.perf_counter() - start
+
+  tracemalloc.start()
+  fn(generate_events(num_events))
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  print ("{:28s} logging {:5.2f} s, DataFrame {:5.2f} s, held {:6.1f} MiB, peak {:6.1f} MiB".format(
+         name, total - build - generate, build, held[-1] / 2**20, peak / 2**20))
+  return df
+
+
+if __name__ == '__main__':
+  num_events = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+  spill_dir = tempfile.mkdtemp()
+
+  start = time.perf_counter()
+  for _ in generate_events(num_events): pass
+  generate = time.perf_counter() - start
+
+  print ("{} events (generating them takes {:0.2f} s)\n".format(num_events, generate))
+
+  reference = measure('list of dicts + deepcopy', run_list, num_events, generate)
+  spill_path = os.path.join(spill_dir, "bench.parquet")
+  results = [measure('EventLog', run_event_log, num_events, generate),
+             readLog(measure('EventLog, spill every 50000',
+                             lambda e: run_event_log_spilled(e, 50000, spill_path), num_events, generate))]
+
+  shutil.rmtree(spill_dir)
+
+  for df in results:
+    if not (df.equals(reference) and list(df.dtypes) == list(reference.dtypes) and
+            df.index.equals(reference.index)):
+      print ("\nERROR: EventLog DataFrame differs from the list of dicts DataFrame.")
+      sys.exit(1)
+
+  print ("\nAll DataFrames are identical.")
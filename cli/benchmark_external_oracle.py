@@ -0,0 +1,78 @@
+# Benchmark for the ExternalFileOracle.  Writes a synthetic mid price series (as made by
+# util/formatting/mid_price_from_orderbook.py) and times interpolated price lookups at random
+# times, one at a time and all at once.  Then writes a large multi-day series and times starting
+# a four-symbol oracle over it and making its first query, without and with a cache directory.
+#
+# Usage: python cli/benchmark_external_oracle.py [num_points] [num_big_points] [seed]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+from util import util
+from util.oracle.ExternalFileOracle import ExternalFileOracle
+
+
+def timed(f):
+  start = time.perf_counter()
+  result = f()
+  return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+  num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+  num_big_points = int(sys.argv[2]) if len(sys.argv) > 2 else 50000000
+  seed = int(sys.argv[3]) if len(sys.argv) > 3 else 123456789
+  util.silent_mode = True
+
+  random_state = np.random.RandomState(seed)
+  work_dir = tempfile.mkdtemp()
+
+  try:
+    mkt_open, mkt_close = pd.Timestamp('2019-06-28 09:30:00'), pd.Timestamp('2019-06-28 16:00:00')
+    times = np.sort(random_state.randint(mkt_open.value, mkt_close.value, num_points))
+    mid_price = pd.Series(1e4 + np.round(np.cumsum(random_state.normal(size=num_points)) * 2) / 2,
+                          index=pd.to_datetime(times))
+    path = os.path.join(work_dir, 'ORDERBOOK_SYM_mid_price.bz2')
+    mid_price.to_pickle(path)
+
+    query_times = [pd.Timestamp(int(t)) for t in
+                   np.sort(random_state.randint(mkt_open.value, mkt_close.value, 20000))]
+
+    oracle = ExternalFileOracle({'SYM': {'fundamental_file_path': path}})
+    _, load_s = timed(lambda: oracle.getPriceAtTime('SYM', mkt_open))
+    scalar, scalar_s = timed(lambda: [oracle.getPriceAtTime('SYM', t) for t in query_times])
+    query_index = pd.DatetimeIndex(query_times)
+    vector, vector_s = timed(lambda: oracle.getPricesAtTimes('SYM', query_index))
+
+    print ("{} point series, loaded in {:.3f} s:".format(num_points, load_s))
+    print ("  getPriceAtTime:   {} lookups in {:.3f} s, {:.1f} us per lookup".format(len(query_times), scalar_s,
+           scalar_s / len(query_times) * 1e6))
+    print ("  getPricesAtTimes: {} lookups in {:.3f} s, {:.2f} us per lookup, identical: {}".format(len(query_times),
+           vector_s, vector_s / len(query_times) * 1e6, np.array_equal(scalar, vector)))
+
+    big = pd.Series(1e4 + np.cumsum(random_state.normal(size=num_big_points)),
+                    index=pd.date_range('2019-06-24 09:30:00', periods=num_big_points, freq='9ms'))
+    big_path = os.path.join(work_dir, 'ORDERBOOK_BIG_mid_price.pkl')
+    big.to_pickle(big_path)
+    del big
+
+    symbols = {symbol: {'fundamental_file_path': big_path} for symbol in ['A', 'B', 'C', 'D']}
+    cache_dir = os.path.join(work_dir, 'cache')
+    query = pd.Timestamp('2019-06-26 12:00:00.0041')
+
+    print ("{} point multi-day series, four symbols:".format(num_big_points))
+    for label, cache in [('no cache', None), ('cache write', cache_dir), ('cache read', cache_dir)]:
+      oracle, init_s = timed(lambda: ExternalFileOracle(symbols, cache_dir=cache))
+      _, query_s = timed(lambda: oracle.getPriceAtTime('A', query))
+      print ("  {:12} init {:.3f} s, first query {:.3f} s".format(label, init_s, query_s))
+  finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,137 @@
+# Benchmark for the L3 replay store of the MarketReplayAgent.  Writes a synthetic pipe-delimited
+# L3 orders file (new orders, modifications and cancellations, with some timestamps shared), then
+# times converting it into a store, opening it and stepping through every timestamp as the agent
+# does, against the original pickled dict of lists of order dicts, with the memory each takes
+# once open.
+#
+# Usage: python cli/benchmark_l3_replay_store.py [num_orders] [seed]
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+from util.L3ReplayStore import L3ReplayStore, convertL3Orders
+
+
+def write_orders_file(path, num_orders, random_state, seconds=7 * 3600):
+  # L3 orders over the first seconds of a day (by default, all of it) in the format of the
+  # historical files: a header, a line that is skipped, then one order message per line.
+  open_ns = pd.Timestamp('2019-06-04 09:00:00').value
+  times = np.sort(random_state.randint(open_ns, open_ns + seconds * 10**9, num_orders))
+  times[1::3] = times[0:-1:3]  # some orders share a timestamp
+  stamps = pd.to_datetime(times).strftime('%Y%m%d%H%M%S.%f') + pd.Series(times % 1000).astype(str).str.zfill(3)
+
+  order_ids = np.arange(num_orders) + 10**9
+  modified = random_state.rand(num_orders) < 0.3
+  order_ids[modified] = order_ids[np.maximum(np.arange(num_orders)[modified] - 5, 0)]
+  sizes = np.where(random_state.rand(num_orders) < 0.1, 0, random_state.randint(1, 500, num_orders))
+  prices = np.round(100 + random_state.normal(scale=0.5, size=num_orders), 2)
+  sides = random_state.randint(0, 2, num_orders)
+
+  filler = '|'.join(['0'] * 12)
+  with open(path, 'w') as f:
+    f.write('TIMESTAMP|ORDER_ID|PRICE|SIZE|BUY_SELL_FLAG|' + '|'.join('F{}'.format(i) for i in range(12)) + '\n')
+    f.write('|'.join(['x'] * 17) + '\n')
+    for row in zip(stamps, order_ids, prices, sizes, sides):
+      f.write('{}|{}|{}|{}|{}|{}\n'.format(*row, filler))
+
+
+def convert_pickle(orders_file_path, pickle_path):
+  # The original conversion: a row-by-row parse into a dict of lists of order dicts, pickled.
+  def convertDate(date_str):
+    try:
+      return datetime.strptime(date_str, '%Y%m%d%H%M%S.%f')
+    except ValueError:
+      return convertDate(date_str[:-1])
+
+  orders_df = pd.read_csv(orders_file_path).iloc[1:]
+  all_columns = orders_df.columns[0].split('|')
+  orders_df = orders_df[orders_df.columns[0]].str.split('|', n=16, expand=True)
+  orders_df.columns = all_columns
+  orders_df = orders_df[['TIMESTAMP', 'ORDER_ID', 'PRICE', 'SIZE', 'BUY_SELL_FLAG']]
+  orders_df['BUY_SELL_FLAG'] = orders_df['BUY_SELL_FLAG'].astype(int).replace({0: 'BUY', 1: 'SELL'})
+  orders_df['TIMESTAMP'] = orders_df['TIMESTAMP'].astype(str).apply(convertDate)
+  orders_df['SIZE'] = orders_df['SIZE'].astype(int)
+  orders_df['PRICE'] = (orders_df['PRICE'].astype(float) * 100).astype(int)
+  orders_df.set_index('TIMESTAMP', inplace=True)
+  orders_dict = {k: g.to_dict(orient='records') for k, g in orders_df.groupby(level=0)}
+  with open(pickle_path, 'wb') as handle:
+    pickle.dump(orders_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_pickle(pickle_path):
+  with open(pickle_path, 'rb') as handle:
+    return pickle.load(handle)
+
+
+def replay_pickle(orders_dict):
+  orders = 0
+  for t in orders_dict:
+    orders += len(orders_dict[t])
+  return orders
+
+
+def replay_store(store):
+  orders = 0
+  cursor = store.cursor()
+  while cursor.peekTime() is not None:
+    orders += len(cursor.nextBatch()[1])
+  return orders
+
+
+def timed(f):
+  start = time.perf_counter()
+  result = f()
+  return result, time.perf_counter() - start
+
+
+def allocated(f):
+  # The memory f allocates and keeps, in MB.
+  tracemalloc.start()
+  result = f()
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  del result
+  return size / 1e6
+
+
+if __name__ == '__main__':
+  num_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+  seed = int(sys.argv[2]) if len(sys.argv) > 2 else 123456789
+
+  work_dir = tempfile.mkdtemp()
+
+  try:
+    orders_file_path = os.path.join(work_dir, 'SYM.20190604')
+    write_orders_file(orders_file_path, num_orders, np.random.RandomState(seed))
+    print ("{} orders, {:.1f} MB orders file".format(num_orders, os.path.getsize(orders_file_path) / 1e6))
+
+    pickle_path = os.path.join(work_dir, 'marketreplay_SYM.pkl')
+    _, convert_s = timed(lambda: convert_pickle(orders_file_path, pickle_path))
+    orders_dict, open_s = timed(lambda: load_pickle(pickle_path))
+    num, replay_s = timed(lambda: replay_pickle(orders_dict))
+    del orders_dict
+    open_mb = allocated(lambda: load_pickle(pickle_path))
+    print ("  pickle: convert {:6.2f} s   open {:6.3f} s, {:7.1f} MB   step through {} orders {:6.3f} s".format(
+           convert_s, open_s, open_mb, num, replay_s))
+
+    store_path = os.path.join(work_dir, 'marketreplay_SYM')
+    _, convert_s = timed(lambda: convertL3Orders(orders_file_path, store_path))
+    store, open_s = timed(lambda: L3ReplayStore(store_path))
+    num, replay_s = timed(lambda: replay_store(store))
+    open_mb = allocated(lambda: L3ReplayStore(store_path))
+    print ("  store:  convert {:6.2f} s   open {:6.3f} s, {:7.1f} MB   step through {} orders {:6.3f} s".format(
+           convert_s, open_s, open_mb, num, replay_s))
+  finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,65 @@
+# Benchmark for the log file formats in util.LogFormat.  Reads every log in a log directory (e.g.
+# an rmsc03 day written with the default bz2 format) and, for each format, reports the time to
+# write all the logs, the time to read them back with readLog(), and the total size on disk.  Also
+# checks that every log reads back exactly as written.
+#
+# Usage: python cli/benchmark_log_formats.py <log directory> [format ...]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import LOG_FORMATS, isLogFile, readLog
+
+
+def identical(a, b):
+  return (a.equals(b) and list(a.dtypes) == list(b.dtypes) and list(a.columns) == list(b.columns) and
+          a.index.equals(b.index) and a.index.dtype == b.index.dtype and a.index.name == b.index.name)
+
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print ("Usage: python cli/benchmark_log_formats.py <log directory> [format ...]")
+    sys.exit()
+
+  log_dir = sys.argv[1]
+  formats = sys.argv[2:] if len(sys.argv) > 2 else list(LOG_FORMATS)
+
+  files = sorted(f for f in os.listdir(log_dir) if isLogFile(f))
+  logs = {os.path.splitext(f)[0]: readLog(os.path.join(log_dir, f)) for f in files}
+
+  print ("{} logs, {} rows in total\n".format(len(logs), sum(len(df) for df in logs.values())))
+  print ("{:12s} {:>8s} {:>8s} {:>10s}".format('format', 'write s', 'read s', 'size MiB'))
+
+  failed = []
+
+  for name in formats:
+    log_format = LOG_FORMATS[name]
+    out_dir = tempfile.mkdtemp()
+
+    start = time.perf_counter()
+    for stem, df in logs.items():
+      log_format.write(df, os.path.join(out_dir, stem + log_format.extension))
+    write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read = {stem: readLog(os.path.join(out_dir, stem + log_format.extension)) for stem in logs}
+    read_time = time.perf_counter() - start
+
+    size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    shutil.rmtree(out_dir)
+
+    print ("{:12s} {:8.2f} {:8.2f} {:10.2f}".format(name, write, read_time, size / 2**20))
+
+    failed += ["{} ({})".format(stem, name) for stem in logs if not identical(read[stem], logs[stem])]
+
+  if failed:
+    print ("\nERROR: logs differ after reading them back: {}".format(", ".join(failed)))
+    sys.exit(1)
+
+  print ("\nAll logs read back identical.")
@@ -0,0 +1,208 @@
+# Benchmark for the market data subscriptions of the ExchangeAgent.  Replays the random order flow
+# of cli/benchmark_order_book.py through an exchange with many subscribers (at a mix of depths and
+# frequencies, as market makers and OBI agents subscribe), publishing after every order event, and
+# times the MARKET_DATA fan-out through util.MarketDataFeed against the original implementation,
+# which checked every subscription and rebuilt the snapshots for each subscriber after every event.
+# Checks that both send exactly the same messages in the same order, that subscribers to deltas
+# rebuild the same books from them, and that conflated subscribers are sent updates no closer than
+# their frequency and always the last state of the book.
+#
+# Usage: python cli/benchmark_market_data_feed.py [num_orders] [num_subscribers] [seed]
+
+import heapq
+import sys
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+from agent.ExchangeAgent import ExchangeAgent
+from cli.benchmark_order_book import generate_order_flow
+from message.Message import Message
+from util import util
+from util.MarketDataFeed import applyDepthDeltas
+from util.order import LimitOrder as limit_order
+from util.order.LimitOrder import LimitOrder
+from util.order.MarketOrder import MarketOrder
+
+LEVELS = [1, 5, 10]
+FREQS = [0, int(1e3), int(1e4), int(1e5), int(1e6)]
+
+
+class OriginalFeed:
+  # The original implementation: a dict of agent id -> {symbol: [levels, freq, last update]}, all
+  # checked after every order event.
+
+  def __init__(self, exchange):
+    self.exchange = exchange
+    self.subscription_dict = {}
+
+  def subscribe(self, agent_id, symbol, levels, freq, currentTime, deltas = False, conflate = False):
+    self.subscription_dict[agent_id] = {symbol: [levels, freq, currentTime]}
+
+  def publish(self, symbol = None):
+    exchange = self.exchange
+    for agent_id, params in self.subscription_dict.items():
+      for symbol, values in params.items():
+        levels, freq, last_agent_update = values[0], values[1], values[2]
+        orderbook_last_update = exchange.order_books[symbol].last_update_ts
+        if (freq == 0) or \
+           ((orderbook_last_update > last_agent_update) and ((orderbook_last_update - last_agent_update).delta >= freq)):
+          exchange.sendMessage(agent_id, Message({"msg": "MARKET_DATA",
+                                                  "symbol": symbol,
+                                                  "bids": exchange.order_books[symbol].getInsideBids(levels),
+                                                  "asks": exchange.order_books[symbol].getInsideAsks(levels),
+                                                  "last_transaction": exchange.order_books[symbol].last_trade,
+                                                  "exchange_ts": exchange.currentTime}))
+          self.subscription_dict[agent_id][symbol][2] = orderbook_last_update
+
+
+class BenchmarkExchange(ExchangeAgent):
+  # An ExchangeAgent outside a kernel, which keeps (or just counts) the MARKET_DATA messages it sends.
+
+  def __init__(self, record):
+    mkt_open = pd.Timestamp('2020-06-03 09:30:00')
+    super().__init__(0, 'EXCHANGE_AGENT', 'ExchangeAgent', mkt_open, mkt_open + pd.Timedelta('8h'), ['ABM'],
+                     book_freq=None, stream_history=10, random_state=np.random.RandomState(1))
+    self.currentTime = mkt_open
+    self.record = record
+    self.sent = []
+    self.wakeups = []
+
+  def sendMessage(self, recipientID, msg, delay = 0):
+    if msg.body['msg'] != 'MARKET_DATA': return
+    self.sent.append((recipientID, dict(msg.body)) if self.record else recipientID)
+
+  def setWakeup(self, requestedTime):
+    heapq.heappush(self.wakeups, requestedTime)
+
+  def logEvent(self, eventType, event = '', appendSummaryLog = False):
+    pass
+
+  def wakeUntil(self, t):
+    # Wakes the exchange up at each time it asked to be before t (or all of them if t is None).
+    while self.wakeups and (t is None or self.wakeups[0] < t):
+      self.currentTime = heapq.heappop(self.wakeups)
+      self.market_data.flush()
+
+
+def subscribers(num_subscribers, seed, deltas = False, conflate = False):
+  # The same depths and frequencies with or without deltas or conflation, which half the
+  # subscribers ask for.
+  rs = np.random.RandomState(seed)
+  return [(agent_id, int(rs.choice(LEVELS)), int(rs.choice(FREQS)), deltas and agent_id % 2 == 0,
+           conflate and agent_id % 2 == 0) for agent_id in range(1, num_subscribers + 1)]
+
+
+def run(flow, subs, implementation, record):
+  exchange = BenchmarkExchange(record)
+  if implementation == 'original': exchange.market_data = OriginalFeed(exchange)
+  book = exchange.order_books['ABM']
+  base_time = exchange.currentTime
+
+  for agent_id, levels, freq, deltas, conflate in subs:
+    exchange.market_data.subscribe(agent_id, 'ABM', levels, freq, base_time, deltas=deltas, conflate=conflate)
+
+  publish_s = 0
+  for action, args in flow:
+    if action == 'LIMIT':
+      oid, ns, qty, is_buy, price = args
+      exchange.wakeUntil(base_time + pd.Timedelta(ns))
+      exchange.currentTime = base_time + pd.Timedelta(ns)
+      book.handleLimitOrder(LimitOrder(0, exchange.currentTime, 'ABM', qty, is_buy, price, order_id=oid))
+    elif action == 'MARKET':
+      oid, ns, qty, is_buy = args
+      exchange.wakeUntil(base_time + pd.Timedelta(ns))
+      exchange.currentTime = base_time + pd.Timedelta(ns)
+      book.handleMarketOrder(MarketOrder(0, exchange.currentTime, 'ABM', qty, is_buy, order_id=oid))
+    elif action == 'CANCEL':
+      oid, ns, qty, is_buy, price = args
+      book.cancelOrder(LimitOrder(0, base_time + pd.Timedelta(ns), 'ABM', qty, is_buy, price, order_id=oid))
+    else:
+      (oid, ns, qty, is_buy, price), new_qty = args
+      placed = base_time + pd.Timedelta(ns)
+      book.modifyOrder(LimitOrder(0, placed, 'ABM', qty, is_buy, price, order_id=oid),
+                       LimitOrder(0, placed, 'ABM', new_qty, is_buy, price, order_id=oid))
+
+    start = time.perf_counter()
+    exchange.publishOrderBookData('ABM')
+    publish_s += time.perf_counter() - start
+
+  exchange.wakeUntil(None)
+  return publish_s, exchange.sent, (book.getInsideBids(), book.getInsideAsks())
+
+
+def check_deltas(snapshots, updates):
+  # Whether the books rebuilt from the updates of subscribers to deltas equal the snapshots sent to
+  # the same subscribers without deltas, at the last update each was sent.
+  last = {agent_id: (body['bids'], body['asks']) for agent_id, body in snapshots}
+  books = {}
+  for agent_id, body in updates:
+    if 'bid_deltas' not in body: continue
+    bids, asks = books.get(agent_id, ([], []))
+    books[agent_id] = (applyDepthDeltas(bids, body['bid_deltas'], True),
+                       applyDepthDeltas(asks, body['ask_deltas'], False))
+  return all(book == last[agent_id] for agent_id, book in books.items()), len(books)
+
+
+def check_conflated(subs, updates, final_book):
+  # Whether every conflated subscriber was sent updates at least freq ns apart, the last of them
+  # the final state of the book.
+  times, last = {}, {}
+  for agent_id, body in updates:
+    if not isinstance(body['bids'], np.ndarray): continue
+    times.setdefault(agent_id, []).append(body['exchange_ts'].value)
+    last[agent_id] = (body['bids'].tolist(), body['asks'].tolist())
+
+  bids, asks = final_book
+  for agent_id, levels, freq, _, conflate in subs:
+    if not conflate: continue
+    if freq and np.any(np.diff(times[agent_id]) < freq): return False
+    if last[agent_id] != ([list(level) for level in bids[:levels]], [list(level) for level in asks[:levels]]):
+      return False
+  return True
+
+
+if __name__ == '__main__':
+  num_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+  num_subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+  seed = int(sys.argv[3]) if len(sys.argv) > 3 else 123456789
+
+  util.silent_mode = True
+  limit_order.silent_mode = True
+
+  flow = generate_order_flow(num_orders, seed)
+  subs = subscribers(num_subscribers, seed)
+  print ("{} order book actions (seed {}), {} subscribers at levels {} and freqs {} ns".format(
+         num_orders, seed, num_subscribers, LEVELS, FREQS))
+
+  # First pass: record and compare every message sent.
+  _, original, _ = run(flow, subs, 'original', record=True)
+  _, feed, _ = run(flow, subs, 'feed', record=True)
+  print ("  {} messages sent by the original, {} by the feed: {}".format(
+         len(original), len(feed), "identical" if original == feed else "DIFFERENT"))
+  if original != feed: sys.exit(1)
+  del original
+
+  _, updates, _ = run(flow, subscribers(num_subscribers, seed, deltas=True), 'feed', record=True)
+  rebuilt, num_deltas = check_deltas(feed, updates)
+  print ("  {} messages sent with {} of the subscribers asking for deltas, books rebuilt from them: {}".format(
+         len(updates), num_deltas, "identical" if rebuilt else "DIFFERENT"))
+  if not rebuilt: sys.exit(1)
+  del feed, updates
+
+  conflated_subs = subscribers(num_subscribers, seed, conflate=True)
+  _, updates, final_book = run(flow, conflated_subs, 'feed', record=True)
+  conflated = check_conflated(conflated_subs, updates, final_book)
+  print ("  {} messages sent with {} of the subscribers conflated, at least freq apart and ending on the final book: {}".format(
+         len(updates), sum(sub[4] for sub in conflated_subs), "yes" if conflated else "NO"))
+  if not conflated: sys.exit(1)
+
+  # Second pass: time the fan-out without keeping the messages.
+  for implementation in ['original', 'feed']:
+    publish_s, sent, _ = run(flow, subs, implementation, record=False)
+    print ("  {:8} {} messages in {:7.3f} s ({:6.1f} us per order event)".format(
+           implementation, len(sent), publish_s, 1e6 * publish_s / num_orders))
@@ -0,0 +1,80 @@
+# Benchmark for the MeanRevertingOracle fundamental value series.  Generates dense (one value per
+# nanosecond) series with the oracle and with the original per-nanosecond Python loop, checking
+# that they are identical, then times full-day series on coarser time grids: construction,
+# generation as far as the close, random observations, and reloading from the on-disk cache.
+#
+# Usage: python cli/benchmark_mean_reverting_oracle.py [seed]
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+from util import util
+from util.oracle.MeanRevertingOracle import MeanRevertingOracle
+
+
+def loop_series(n, r_bar, kappa, sigma_s):
+  # The original dense series: a Python loop over every nanosecond.
+  r = np.zeros(n)
+  r[0] = r_bar
+  shock = np.random.normal(scale=np.sqrt(sigma_s), size=n)
+  for t in range(1, n):
+    r[t] = max(0, (kappa * r_bar) + ((1 - kappa) * r[t-1]) + shock[t])
+  return np.round(r).astype(int)
+
+
+def timed(f):
+  start = time.perf_counter()
+  result = f()
+  return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+  seed = int(sys.argv[1]) if len(sys.argv) > 1 else 123456789
+  util.silent_mode = True
+
+  mkt_open = pd.Timestamp('2020-06-03 09:30:00')
+
+  print ("Dense series (one value per nanosecond), loop vs oracle:")
+  params = [('impact', {'r_bar': 100000, 'kappa': 0.05, 'sigma_s': 100000}),
+            ('clipped', {'r_bar': 1000, 'kappa': 0.001, 'sigma_s': 100000})]
+
+  for name, s in params:
+    for n in [10**4, 10**6]:
+      np.random.seed(seed)
+      loop, loop_s = timed(lambda: loop_series(n, **s))
+      np.random.seed(seed)
+      oracle, oracle_s = timed(lambda: MeanRevertingOracle(mkt_open, mkt_open + pd.Timedelta(n, unit='ns'),
+                                                           {'SYM': s}))
+      same = np.array_equal(loop, oracle.r['SYM'].values)
+      print ("  {:8} n={:>8}   loop {:7.3f} s   oracle {:7.3f} s   identical: {}".format(name, n, loop_s,
+             oracle_s, same))
+
+  print ()
+  print ("Full day (09:30-16:00), sparse-style parameters, lazy generation:")
+  mkt_close = pd.Timestamp('2020-06-03 16:00:00')
+  s = {'r_bar': 100000, 'kappa': 1.67e-16, 'sigma_s': 5e-5}
+  times = [mkt_open + pd.Timedelta(int(t), unit='ns')
+           for t in np.sort(np.random.RandomState(seed).randint(0, (mkt_close - mkt_open).value, 100000))]
+  cache_dir = tempfile.mkdtemp()
+
+  try:
+    for freq in ['1s', '1ms']:
+      for label, cache in [('no cache', None), ('cache write', cache_dir), ('cache read', cache_dir)]:
+        symbols = {'SYM': dict(s, random_state=np.random.RandomState(seed))}
+        oracle, init_s = timed(lambda: MeanRevertingOracle(mkt_open, mkt_close, symbols, freq=freq, cache_dir=cache))
+        _, close_s = timed(lambda: oracle.observePrice('SYM', mkt_close, sigma_n=0))
+        random_state = np.random.RandomState(seed)
+        _, observe_s = timed(lambda: [oracle.observePrice('SYM', t, 1000, random_state) for t in times])
+        print ("  freq {:>3} {:13} points {:>9}   init {:6.3f} s   to close {:6.3f} s   "
+               "{} observations {:6.3f} s".format(freq, '(' + label + ')',
+               oracle.r['SYM'].n, init_s, close_s, len(times), observe_s))
+  finally:
+    shutil.rmtree(cache_dir)
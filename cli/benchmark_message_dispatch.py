@@ -0,0 +1,299 @@
+# Benchmark for the dispatch of the messages between TradingAgents and the ExchangeAgent.  For each kind
+# of message, times building it and handing it to its handler: as the original dict-bodied Message
+# matched against the receiver's chain of msg.body['msg'] string comparisons (copied below from the
+# original receiveMessage methods), as the typed message (message.ExchangeMessages) looked up in the
+# receiver's handler table (Agent.dispatch), and as a dict-bodied Message looked up in the same table,
+# as messages from agents not using the typed messages are.  The handlers of the agents do their usual
+# bookkeeping; the methods they call for subclasses to extend (orderExecuted, querySpread...) and the
+# exchange's order book work do nothing here, so only the cost of the messages themselves is timed.
+#
+# Usage: python cli/benchmark_message_dispatch.py [num_messages]
+
+import gc
+import sys
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+from agent.ExchangeAgent import ExchangeAgent, ORDER_KINDS
+from agent.TradingAgent import TradingAgent
+from message.ExchangeMessages import (WhenMktOpenMsg, WhenMktCloseMsg, QueryLastTradeMsg, QuerySpreadMsg,
+                                      QueryOrderStreamMsg, QueryTransactedVolumeMsg,
+                                      MarketDataSubscriptionRequestMsg, LimitOrderMsg, MarketOrderMsg,
+                                      CancelOrderMsg, ModifyOrderMsg, WhenMktOpenReplyMsg, WhenMktCloseReplyMsg,
+                                      QueryLastTradeReplyMsg, QuerySpreadReplyMsg, QueryOrderStreamReplyMsg,
+                                      QueryTransactedVolumeReplyMsg, OrderAcceptedMsg, OrderExecutedMsg,
+                                      OrderCancelledMsg, FilledMsg, MarketDataMsg, MktClosedMsg)
+from message.Message import BodyFields, Message
+from util import util
+from util.order import LimitOrder as limit_order
+from util.order.LimitOrder import LimitOrder
+from util.util import log_print
+
+
+class OriginalMessage:
+  # The original Message: a body dict, numbered by a class attribute.
+  uniq = 0
+
+  def __init__ (self, body = None):
+    self.body = body
+    self.uniq = OriginalMessage.uniq
+    OriginalMessage.uniq += 1
+
+
+class BenchmarkTrader(TradingAgent):
+  # A TradingAgent outside a kernel, whose strategy does nothing with what it is told.
+
+  def __init__(self):
+    super().__init__(1, 'TRADER', 'TradingAgent', random_state=np.random.RandomState(1))
+    self.kernel = self
+
+  def fmtTime(self, t):
+    return t
+
+  def orderExecuted(self, order): pass
+  def orderAccepted(self, order): pass
+  def orderCancelled(self, order): pass
+  def marketClosed(self): pass
+  def finalClose(self): pass
+  def queryLastTrade(self, symbol, price): pass
+  def querySpread(self, symbol, price, bids, asks, book): pass
+  def queryOrderStream(self, symbol, orders): pass
+  def query_transacted_volume(self, symbol, transacted_volume): pass
+
+
+def original_trader_dispatch(self, msg):
+  # The original chain of TradingAgent.receiveMessage (and its handleX methods).
+  if msg.body['msg'] == "WHEN_MKT_OPEN":
+    self.mkt_open = msg.body['data']
+    log_print ("Recorded market open: {}", self.kernel.fmtTime(self.mkt_open))
+  elif msg.body['msg'] == "WHEN_MKT_CLOSE":
+    self.mkt_close = msg.body['data']
+    log_print ("Recorded market close: {}", self.kernel.fmtTime(self.mkt_close))
+  elif msg.body['msg'] == "ORDER_EXECUTED":
+    order = msg.body['order']
+    self.orderExecuted(order)
+  elif msg.body['msg'] == "ORDER_ACCEPTED":
+    order = msg.body['order']
+    self.orderAccepted(order)
+  elif msg.body['msg'] == "ORDER_CANCELLED":
+    order = msg.body['order']
+    self.orderCancelled(order)
+  elif msg.body['msg'] == "MKT_CLOSED":
+    self.marketClosed()
+  elif msg.body['msg'] == "FINAL_CLOSE":
+    self.finalClose()
+  elif msg.body['msg'] == 'QUERY_LAST_TRADE':
+    if msg.body['mkt_closed']: self.mkt_closed = True
+    self.queryLastTrade(msg.body['symbol'], msg.body['data'])
+  elif msg.body['msg'] == 'QUERY_SPREAD':
+    if msg.body['mkt_closed']: self.mkt_closed = True
+    self.querySpread(msg.body['symbol'], msg.body['data'], msg.body['bids'], msg.body['asks'], msg.body['book'])
+  elif msg.body['msg'] == 'QUERY_ORDER_STREAM':
+    if msg.body['mkt_closed']: self.mkt_closed = True
+    self.queryOrderStream(msg.body['symbol'], msg.body['orders'])
+  elif msg.body['msg'] == 'QUERY_TRANSACTED_VOLUME':
+    if msg.body['mkt_closed']: self.mkt_closed = True
+    self.query_transacted_volume(msg.body['symbol'], msg.body['transacted_volume'])
+  elif msg.body['msg'] == 'MARKET_DATA':
+    symbol = msg.body['symbol']
+    self.known_asks[symbol] = msg.body['asks']
+    self.known_bids[symbol] = msg.body['bids']
+    self.last_trade[symbol] = msg.body['last_transaction']
+    self.exchange_ts[symbol] = msg.body['exchange_ts']
+  elif msg.body['msg'] == 'FILLED':
+    order_id = msg.body['order_id']
+    self.all_orders[order_id].filled = True
+    self.all_orders[order_id].fill_price = msg.body['fill_price']
+    self.all_orders[order_id].fill_time = msg.body['fill_time']
+    self.all_orders[order_id].fill_quantity = msg.body['quantity']
+    self.all_orders[order_id].fill_type = msg.body['fill_type']
+  elif msg.body['msg'] == 'NEW_SPLIT_MARKET_ORDER':
+    order = msg.body['order']
+    self.all_orders[order.order_id] = order
+    self.order_num += 1
+
+
+class BenchmarkExchange(ExchangeAgent):
+  # An ExchangeAgent outside a kernel, whose handlers read the requests but do nothing with them.
+
+  def __init__(self):
+    mkt_open = pd.Timestamp('2020-06-03 09:30:00')
+    super().__init__(0, 'EXCHANGE_AGENT', 'ExchangeAgent', mkt_open, mkt_open + pd.Timedelta('8h'), ['ABM'],
+                     book_freq=None, random_state=np.random.RandomState(1))
+
+  def logEvent(self, eventType, event = '', appendSummaryLog = False): pass
+
+  def handleSubscription(self, msg): msg.sender, msg.symbol
+  def handleWhenMktOpen(self, msg): msg.sender
+  def handleWhenMktClose(self, msg): msg.sender
+  def handleQueryLastTrade(self, msg): msg.sender, msg.symbol
+  def handleQuerySpread(self, msg): msg.sender, msg.symbol, msg.depth
+  def handleQueryOrderStream(self, msg): msg.sender, msg.symbol, msg.length
+  def handleQueryTransactedVolume(self, msg): msg.sender, msg.symbol, msg.lookback_period
+  def handleLimitOrder(self, msg): msg.order
+  def handleMarketOrder(self, msg): msg.order
+  def handleCancelOrder(self, msg): msg.order
+  def handleModifyOrder(self, msg): msg.order, msg.new_order
+
+  def typed_dispatch(self, msg):
+    # ExchangeAgent.receiveMessage from the point the market is known to be open.
+    if msg.kind is None: msg = BodyFields(msg)
+    kind = msg.kind
+    if kind in ORDER_KINDS:
+      if self.log_orders: self.logEvent(str(kind), msg.order.to_dict())
+    else:
+      self.logEvent(str(kind), msg.sender)
+    self.dispatch(msg)
+
+
+def original_exchange_dispatch(self, msg):
+  # The original ExchangeAgent.receiveMessage from the same point, reading the same fields.
+  if msg.body['msg'] in ['LIMIT_ORDER', 'MARKET_ORDER', 'CANCEL_ORDER', 'MODIFY_ORDER']:
+    if self.log_orders: self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
+  else:
+    self.logEvent(msg.body['msg'], msg.body['sender'])
+
+  if msg.body['msg'] in ["MARKET_DATA_SUBSCRIPTION_REQUEST", "MARKET_DATA_SUBSCRIPTION_CANCELLATION"]:
+    msg.body['sender'], msg.body['symbol']
+
+  if msg.body['msg'] == "WHEN_MKT_OPEN":
+    msg.body['sender']
+  elif msg.body['msg'] == "WHEN_MKT_CLOSE":
+    msg.body['sender']
+  elif msg.body['msg'] == "QUERY_LAST_TRADE":
+    msg.body['sender'], msg.body['symbol']
+  elif msg.body['msg'] == "QUERY_SPREAD":
+    msg.body['sender'], msg.body['symbol'], msg.body['depth']
+  elif msg.body['msg'] == "QUERY_ORDER_STREAM":
+    msg.body['sender'], msg.body['symbol'], msg.body['length']
+  elif msg.body['msg'] == 'QUERY_TRANSACTED_VOLUME':
+    msg.body['sender'], msg.body['symbol'], msg.body['lookback_period']
+  elif msg.body['msg'] == "LIMIT_ORDER":
+    msg.body['order']
+  elif msg.body['msg'] == "MARKET_ORDER":
+    msg.body['order']
+  elif msg.body['msg'] == "CANCEL_ORDER":
+    msg.body['order']
+  elif msg.body['msg'] == 'MODIFY_ORDER':
+    msg.body['order'], msg.body['new_order']
+
+
+def message_kinds():
+  # (receiver, typed message factory, factory of the same message with a body dict, given the
+  # message class) for each kind of message.
+  now = pd.Timestamp('2020-06-03 10:00:00')
+  order = LimitOrder(1, now, 'ABM', 100, True, 100000, order_id=1000)
+  new_order = LimitOrder(1, now, 'ABM', 50, True, 100000, order_id=1000)
+  bids = [(100000 - i, 100 * (i + 1)) for i in range(5)]
+  asks = [(100001 + i, 100 * (i + 1)) for i in range(5)]
+
+  return [
+    ('exchange', lambda: WhenMktOpenMsg(1),
+                 lambda M: M({"msg": "WHEN_MKT_OPEN", "sender": 1})),
+    ('exchange', lambda: WhenMktCloseMsg(1),
+                 lambda M: M({"msg": "WHEN_MKT_CLOSE", "sender": 1})),
+    ('exchange', lambda: QueryLastTradeMsg(1, 'ABM'),
+                 lambda M: M({"msg": "QUERY_LAST_TRADE", "sender": 1, "symbol": 'ABM'})),
+    ('exchange', lambda: QuerySpreadMsg(1, 'ABM', 1),
+                 lambda M: M({"msg": "QUERY_SPREAD", "sender": 1, "symbol": 'ABM', "depth": 1})),
+    ('exchange', lambda: QueryOrderStreamMsg(1, 'ABM', 10),
+                 lambda M: M({"msg": "QUERY_ORDER_STREAM", "sender": 1, "symbol": 'ABM', "length": 10})),
+    ('exchange', lambda: QueryTransactedVolumeMsg(1, 'ABM', '10min'),
+                 lambda M: M({"msg": "QUERY_TRANSACTED_VOLUME", "sender": 1, "symbol": 'ABM',
+                              "lookback_period": '10min'})),
+    ('exchange', lambda: MarketDataSubscriptionRequestMsg(1, 'ABM', 1, 0, False, False),
+                 lambda M: M({"msg": "MARKET_DATA_SUBSCRIPTION_REQUEST", "sender": 1, "symbol": 'ABM',
+                              "levels": 1, "freq": 0, "deltas": False, "conflate": False})),
+    ('exchange', lambda: LimitOrderMsg(1, order),
+                 lambda M: M({"msg": "LIMIT_ORDER", "sender": 1, "order": order})),
+    ('exchange', lambda: MarketOrderMsg(1, order),
+                 lambda M: M({"msg": "MARKET_ORDER", "sender": 1, "order": order})),
+    ('exchange', lambda: CancelOrderMsg(1, order),
+                 lambda M: M({"msg": "CANCEL_ORDER", "sender": 1, "order": order})),
+    ('exchange', lambda: ModifyOrderMsg(1, order, new_order),
+                 lambda M: M({"msg": "MODIFY_ORDER", "sender": 1, "order": order, "new_order": new_order})),
+    ('trader', lambda: WhenMktOpenReplyMsg(now),
+               lambda M: M({"msg": "WHEN_MKT_OPEN", "data": now})),
+    ('trader', lambda: WhenMktCloseReplyMsg(now),
+               lambda M: M({"msg": "WHEN_MKT_CLOSE", "data": now})),
+    ('trader', lambda: QueryLastTradeReplyMsg('ABM', 100000, False),
+               lambda M: M({"msg": "QUERY_LAST_TRADE", "symbol": 'ABM', "data": 100000, "mkt_closed": False})),
+    ('trader', lambda: QuerySpreadReplyMsg('ABM', 1, bids, asks, 100000, False, ''),
+               lambda M: M({"msg": "QUERY_SPREAD", "symbol": 'ABM', "depth": 1, "bids": bids, "asks": asks,
+                            "data": 100000, "mkt_closed": False, "book": ''})),
+    ('trader', lambda: QueryOrderStreamReplyMsg('ABM', 10, False, []),
+               lambda M: M({"msg": "QUERY_ORDER_STREAM", "symbol": 'ABM', "length": 10, "mkt_closed": False,
+                            "orders": []})),
+    ('trader', lambda: QueryTransactedVolumeReplyMsg('ABM', 12345, False),
+               lambda M: M({"msg": "QUERY_TRANSACTED_VOLUME", "symbol": 'ABM', "transacted_volume": 12345,
+                            "mkt_closed": False})),
+    ('trader', lambda: OrderAcceptedMsg(order),
+               lambda M: M({"msg": "ORDER_ACCEPTED", "order": order})),
+    ('trader', lambda: OrderExecutedMsg(order),
+               lambda M: M({"msg": "ORDER_EXECUTED", "order": order})),
+    ('trader', lambda: OrderCancelledMsg(order),
+               lambda M: M({"msg": "ORDER_CANCELLED", "order": order})),
+    ('trader', lambda: FilledMsg(1000, 100000, now, 100, "BOOK"),
+               lambda M: M({"msg": "FILLED", "order_id": 1000, "fill_price": 100000, "fill_time": now,
+                            "quantity": 100, "fill_type": "BOOK"})),
+    ('trader', lambda: MarketDataMsg('ABM', bids, asks, 100000, now),
+               lambda M: M({"msg": "MARKET_DATA", "symbol": 'ABM', "bids": bids, "asks": asks,
+                            "last_transaction": 100000, "exchange_ts": now})),
+    ('trader', lambda: MktClosedMsg(),
+               lambda M: M({"msg": "MKT_CLOSED"})),
+  ]
+
+
+def timed(make, args, deliver, num_messages):
+  # The time (s) taken to build num_messages messages, and to deliver them (without garbage
+  # collection, which would otherwise mostly time the growing list of messages).
+  gc.disable()
+  start = time.perf_counter()
+  messages = [make(*args) for _ in range(num_messages)]
+  built = time.perf_counter()
+  for msg in messages:
+    deliver(msg)
+  delivered = time.perf_counter()
+  gc.enable()
+  return built - start, delivered - built
+
+
+if __name__ == '__main__':
+  num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+  util.silent_mode = True
+  limit_order.silent_mode = True
+
+  trader = BenchmarkTrader()
+  trader.all_orders[1000] = LimitOrder(1, pd.Timestamp('2020-06-03 10:00:00'), 'ABM', 100, True, 100000,
+                                       order_id=1000)
+  exchange = BenchmarkExchange()
+  receivers = {
+    'trader': (lambda msg: original_trader_dispatch(trader, msg), trader.dispatch),
+    'exchange': (lambda msg: original_exchange_dispatch(exchange, msg), exchange.typed_dispatch),
+  }
+
+  print ("{} messages of each kind, ns per message to build + to dispatch".format(num_messages))
+  print ("  {:9} {:38} {:>15} {:>15} {:>15}".format('to', 'kind', 'original', 'typed', 'dict via table'))
+
+  totals = np.zeros((3, 2))
+  kinds = message_kinds()
+  for receiver, make_typed, make_dict in kinds:
+    original, table = receivers[receiver]
+    name = make_typed().body['msg']
+
+    results = [timed(make_dict, (OriginalMessage,), original, num_messages),
+               timed(make_typed, (), table, num_messages),
+               timed(make_dict, (Message,), table, num_messages)]
+    totals += results
+    print ("  {:9} {:38} {}".format(receiver, name, " ".join("{:6.0f} +{:6.0f}".format(
+           1e9 * build / num_messages, 1e9 * deliver / num_messages) for build, deliver in results)))
+
+  totals /= len(kinds) * num_messages
+  print ("  {:48} {}".format('mean', " ".join("{:6.0f} +{:6.0f}".format(1e9 * build, 1e9 * deliver)
+                                               for build, deliver in totals)))
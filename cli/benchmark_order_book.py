@@ -0,0 +1,139 @@
+# Micro-benchmark for the exchange order book implementations.  Replays the same randomly
+# generated order flow (limit orders, market orders, cancellations and modifications) through
+# each book type, checks that every book sends exactly the same notifications (and therefore
+# produces identical fills), and reports the wall clock time taken by each.
+#
+# Usage: python cli/benchmark_order_book.py [num_orders] [seed]
+
+import sys
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+from agent.ExchangeAgent import ORDER_BOOK_TYPES
+from util import util
+from util.order import LimitOrder as limit_order
+from util.order.LimitOrder import LimitOrder
+from util.order.MarketOrder import MarketOrder
+
+
+class BenchmarkOwner:
+  # Stands in for the ExchangeAgent that owns an order book.  Records every message the book
+  # sends, as a plain tuple, so the outputs of different book types can be compared.
+
+  def __init__(self, record):
+    self.currentTime = pd.Timestamp('2020-06-03 09:30:00')
+    self.book_freq = None
+    self.stream_history = 10
+    self.volume_lookback = None
+    self.record = record
+    self.sent = []
+
+  def sendMessage(self, recipientID, msg):
+    if not self.record: return
+    body = msg.body
+    order = body.get('order', body.get('new_order'))
+    if order is not None:
+      self.sent.append((recipientID, body['msg'], order.order_id, order.quantity, order.fill_price))
+    else:
+      self.sent.append((recipientID, body['msg'], body['order_id'], body['quantity'], body['fill_price']))
+
+  def logEvent(self, eventType, event = ''):
+    pass
+
+
+def generate_order_flow(num_orders, seed):
+  # Returns a list of (action, args) tuples.  Orders cluster around a random-walking mid price
+  # so that the book builds up many levels, with frequent crossing, cancels and modifies.
+  rs = np.random.RandomState(seed)
+  flow = []
+  resting = []
+  mid = 100000
+  next_id = 1
+
+  for i in range(num_orders):
+    mid += rs.randint(-5, 6)
+    ns = i * 1000
+    r = rs.rand()
+
+    if r < 0.65 or not resting:
+      is_buy = bool(rs.randint(2))
+      offset = rs.randint(-20, 200)
+      price = mid - offset if is_buy else mid + offset
+      qty = int(rs.randint(1, 10) * 100)
+      flow.append(('LIMIT', (next_id, ns, qty, is_buy, price)))
+      resting.append((next_id, ns, qty, is_buy, price))
+      next_id += 1
+    elif r < 0.70:
+      is_buy = bool(rs.randint(2))
+      qty = int(rs.randint(1, 10) * 100)
+      flow.append(('MARKET', (next_id, ns, qty, is_buy)))
+      next_id += 1000
+    elif r < 0.95:
+      flow.append(('CANCEL', resting.pop(rs.randint(len(resting)))))
+    else:
+      oid, placed, qty, is_buy, price = resting[rs.randint(len(resting))]
+      flow.append(('MODIFY', ((oid, placed, qty, is_buy, price), max(100, qty - 100))))
+
+  return flow
+
+
+def run(book_type, flow, record):
+  owner = BenchmarkOwner(record)
+  book = ORDER_BOOK_TYPES[book_type](owner, 'ABM')
+  base_time = owner.currentTime
+
+  start = time.perf_counter()
+  for action, args in flow:
+    if action == 'LIMIT':
+      oid, ns, qty, is_buy, price = args
+      owner.currentTime = base_time + pd.Timedelta(ns)
+      book.handleLimitOrder(LimitOrder(0, owner.currentTime, 'ABM', qty, is_buy, price, order_id=oid))
+    elif action == 'MARKET':
+      oid, ns, qty, is_buy = args
+      owner.currentTime = base_time + pd.Timedelta(ns)
+      book.handleMarketOrder(MarketOrder(0, owner.currentTime, 'ABM', qty, is_buy, order_id=oid))
+    elif action == 'CANCEL':
+      oid, ns, qty, is_buy, price = args
+      book.cancelOrder(LimitOrder(0, base_time + pd.Timedelta(ns), 'ABM', qty, is_buy, price, order_id=oid))
+    else:
+      (oid, ns, qty, is_buy, price), new_qty = args
+      placed = base_time + pd.Timedelta(ns)
+      book.modifyOrder(LimitOrder(0, placed, 'ABM', qty, is_buy, price, order_id=oid),
+                       LimitOrder(0, placed, 'ABM', new_qty, is_buy, price, order_id=oid))
+  elapsed = time.perf_counter() - start
+
+  return elapsed, owner.sent, book.getInsideBids(), book.getInsideAsks()
+
+
+if __name__ == '__main__':
+  num_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+  seed = int(sys.argv[2]) if len(sys.argv) > 2 else 123456789
+
+  util.silent_mode = True
+  limit_order.silent_mode = True
+
+  print ("Generating {} order book actions (seed {})...".format(num_orders, seed))
+  flow = generate_order_flow(num_orders, seed)
+
+  # First pass: record and compare every notification sent by each book type.
+  reference = None
+  for book_type in ORDER_BOOK_TYPES:
+    _, sent, bids, asks = run(book_type, flow, record=True)
+    print ("{:10s} notifications: {}, final levels: {} bids, {} asks".format(book_type, len(sent), len(bids), len(asks)))
+    if reference is None:
+      reference = (sent, bids, asks)
+    elif (sent, bids, asks) != reference:
+      print ("ERROR: {} book output differs from {}".format(book_type, list(ORDER_BOOK_TYPES)[0]))
+      sys.exit(1)
+
+  print ("All book types produced identical notifications and final books.\n")
+
+  # Second pass: time each book type without recording.
+  for book_type in ORDER_BOOK_TYPES:
+    elapsed, _, _, _ = run(book_type, flow, record=False)
+    print ("{:10s} {:0.3f} s, {:0.1f} actions per second".format(book_type, elapsed, num_orders / elapsed))
@@ -0,0 +1,69 @@
+# Micro-benchmark for the order classes.  Reports the memory used per LimitOrder (including its
+# entry in the set of order ids, if ids are being checked) and the rate at which orders can be
+# constructed, copied with snapshot() and converted with to_dict() for logging.
+#
+# Usage: python cli/benchmark_orders.py [num_orders]
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import pandas as pd
+
+from util.order.Order import Order
+from util.order.LimitOrder import LimitOrder
+
+
+def make_orders(num_orders, first_id):
+  t = pd.Timestamp('2020-06-03 09:30:00')
+  return [LimitOrder(i % 1000, t, 'ABM', 100, bool(i % 2), 100000 + i % 50, order_id=first_id + i)
+          for i in range(num_orders)]
+
+
+def measure(num_orders, first_id):
+  # Memory: everything allocated (and still alive) while building the orders.
+  tracemalloc.start()
+  before, _ = tracemalloc.get_traced_memory()
+  orders = make_orders(num_orders, first_id)
+  after, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  bytes_per_order = (after - before) / num_orders
+  del orders
+
+  start = time.perf_counter()
+  orders = make_orders(num_orders, first_id + num_orders)
+  construct = num_orders / (time.perf_counter() - start)
+
+  start = time.perf_counter()
+  for o in orders: o.snapshot()
+  snapshot = num_orders / (time.perf_counter() - start)
+
+  start = time.perf_counter()
+  for o in orders: o.to_dict()
+  to_dict = num_orders / (time.perf_counter() - start)
+
+  return bytes_per_order, construct, snapshot, to_dict
+
+
+if __name__ == '__main__':
+  num_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+  # Orders share the timestamp and symbol objects, as they would within one simulation, so the
+  # memory figure is for the order object itself (plus its order id bookkeeping).
+  runs = [('check_order_ids = True', True)]
+  if hasattr(Order, 'check_order_ids'): runs.append(('check_order_ids = False', False))
+
+  print ("{} LimitOrders, has __dict__: {}\n".format(num_orders, hasattr(make_orders(1, 0)[0], '__dict__')))
+
+  for i, (label, check) in enumerate(runs):
+    if hasattr(Order, 'check_order_ids'): Order.check_order_ids = check
+    bytes_per_order, construct, snapshot, to_dict = measure(num_orders, (i + 1) * 10 * num_orders)
+
+    print (label)
+    print ("  memory per order:   {:8.1f} bytes".format(bytes_per_order))
+    print ("  construct:          {:8.0f} orders per second".format(construct))
+    print ("  snapshot():         {:8.0f} orders per second".format(snapshot))
+    print ("  to_dict():          {:8.0f} orders per second".format(to_dict))
@@ -0,0 +1,79 @@
+# Benchmark for the SparseMeanRevertingOracle.  Observes the fundamental value at random times
+# across a full day, as many agents would, with megashocks rare enough to miss the trading day
+# (as in rmsc03) and with about one an hour (as in rmsc01), and reports the observation rate, with
+# megashocks drawn as they are reached (the default) and with precompute_megashocks.
+# Then has groups of observers, each with its own random state, observe at the same times one
+# by one with observePrice and all at once with observe_many, checking they see the same values.
+#
+# Usage: python cli/benchmark_sparse_oracle.py [num_observations] [seed]
+
+import sys
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+from util import util
+from util.oracle.SparseMeanRevertingOracle import SparseMeanRevertingOracle
+
+
+def make_oracle(mkt_open, mkt_close, megashock_lambda_a, seed, precompute_megashocks=False):
+  np.random.seed(seed)
+  symbols = {'JPM': {'r_bar': 1e5, 'kappa': 1.67e-16, 'sigma_s': 0, 'fund_vol': 5e-5,
+                     'megashock_lambda_a': megashock_lambda_a, 'megashock_mean': 1e3, 'megashock_var': 5e4,
+                     'random_state': np.random.RandomState(seed), 'precompute_megashocks': precompute_megashocks}}
+  return SparseMeanRevertingOracle(mkt_open, mkt_close, symbols)
+
+
+if __name__ == '__main__':
+  num_observations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+  seed = int(sys.argv[2]) if len(sys.argv) > 2 else 123456789
+  util.silent_mode = True
+
+  mkt_open = pd.Timestamp('2020-06-03 09:30:00')
+  mkt_close = pd.Timestamp('2020-06-03 16:00:00')
+  times = [mkt_open + pd.Timedelta(int(t), unit='ns') for t in
+           np.sort(np.random.RandomState(seed).randint(0, (mkt_close - mkt_open).value, num_observations))]
+
+  for megashock_lambda_a in [2.77778e-18, 2.77778e-13]:
+    for precompute_megashocks in [False, True]:
+      oracle = make_oracle(mkt_open, mkt_close, megashock_lambda_a, seed, precompute_megashocks)
+      random_state = np.random.RandomState(seed)
+
+      start = time.perf_counter()
+      for t in times:
+        oracle.observePrice('JPM', t, sigma_n=1000, random_state=random_state)
+      elapsed = time.perf_counter() - start
+
+      megashocks = int((np.asarray(oracle.megashocks['JPM'][0]) < mkt_close.value).sum())
+      print ("megashock_lambda_a {:g}{} ({} megashocks in the day): {} observations in {:.3f} s, "
+             "{:.1f} per second".format(megashock_lambda_a, ', precomputed' if precompute_megashocks else '',
+                                        megashocks, num_observations, elapsed, num_observations / elapsed))
+
+  group = 100
+  random_states = [np.random.RandomState(seed + i) for i in range(group)]
+  sigma_n = np.full(group, 1000)
+
+  for batched in [False, True]:
+    oracle = make_oracle(mkt_open, mkt_close, 2.77778e-13, seed)
+    for i, random_state in enumerate(random_states): random_state.seed(seed + i)
+
+    start = time.perf_counter()
+    if batched:
+      observations = [oracle.observe_many('JPM', t, sigma_n, random_states) for t in times[::group]]
+    else:
+      observations = [[oracle.observePrice('JPM', t, sigma_n=1000, random_state=random_state)
+                       for random_state in random_states] for t in times[::group]]
+    elapsed = time.perf_counter() - start
+
+    if batched:
+      print ("  observe_many: identical observations: {}".format(np.array_equal(observations, unbatched)))
+    else:
+      unbatched = observations
+
+    num = len(observations) * group
+    print ("{} observers at each of {} times, {}: {} observations in {:.3f} s, {:.1f} per second".format(
+           group, len(observations), 'observe_many' if batched else 'observePrice', num, elapsed, num / elapsed))
@@ -0,0 +1,139 @@
+# Benchmark for the transacted volume queries of the exchange order book.  Replays the random order
+# flow of cli/benchmark_order_book.py through an order book, querying the transacted volume over a
+# lookback period every few actions (as POV market makers and execution agents do all day), and
+# times the queries through the executions index against the original implementation, which
+# rebuilt DataFrames from the order history on every query.  The answers of the index are checked
+# against those of the original, and both are compared with a brute force sum over every fill.
+#
+# Usage: python cli/benchmark_transacted_volume.py [num_orders] [query_every] [seed]
+
+import sys
+import time
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import pandas as pd
+
+from cli.benchmark_order_book import BenchmarkOwner, generate_order_flow
+from util import util
+from util.OrderBook import OrderBook
+from util.order import LimitOrder as limit_order
+from util.order.LimitOrder import LimitOrder
+from util.order.MarketOrder import MarketOrder
+
+LOOKBACK = '10ms'
+
+
+class HistoryTransactedVolume:
+  # The original implementation: executions unrolled from the order history into a DataFrame,
+  # concatenated with those of earlier queries.
+
+  def __init__(self, book):
+    self.book = book
+    self.unrolled_transactions = None
+    self.history_previous_length = 0
+
+  def recent_history(self):
+    history = self.book.history
+    if self.history_previous_length == 0:
+      self.history_previous_length = len(history)
+      return history
+    elif self.history_previous_length == len(history):
+      return {}
+    else:
+      idx = len(history) - self.history_previous_length - 1
+      self.history_previous_length = len(history)
+      return history[0:idx]
+
+  def unrolled(self, history):
+    unrolled_history = [val for elem in history for val in elem.values()]
+    unrolled_history_df = pd.DataFrame(unrolled_history, columns=[
+      'entry_time', 'quantity', 'is_buy_order', 'limit_price', 'transactions', 'modifications', 'cancellations'])
+    if unrolled_history_df.empty:
+      return pd.DataFrame(columns=['execution_time', 'quantity'])
+    executed = unrolled_history_df[unrolled_history_df['transactions'].map(lambda d: len(d)) > 0]
+    transaction_list = [element for list_ in executed['transactions'].values for element in list_]
+    unrolled_transactions = pd.DataFrame(transaction_list, columns=['execution_time', 'quantity'])
+    unrolled_transactions = unrolled_transactions.sort_values(by=['execution_time'])
+    return unrolled_transactions.drop_duplicates(keep='last')
+
+  def get_transacted_volume(self, lookback_period):
+    self.unrolled_transactions = pd.concat([self.unrolled_transactions, self.unrolled(self.recent_history())],
+                                           ignore_index=True)
+    window_start = self.book.owner.currentTime - pd.to_timedelta(lookback_period)
+    txn = self.unrolled_transactions
+    return txn[txn['execution_time'] >= window_start]['quantity'].sum()
+
+
+class FillRecordingOwner(BenchmarkOwner):
+  # Also keeps the time and quantity of every fill sent to the agent whose order was in the book.
+
+  def __init__(self):
+    super().__init__(record=False)
+    self.fills = []
+
+  def sendMessage(self, recipientID, msg):
+    if msg.body['msg'] == 'FILLED' and msg.body['fill_type'] == 'BOOK':
+      self.fills.append((self.currentTime, msg.body['quantity']))
+
+
+def run(flow, query_every, implementation):
+  owner = FillRecordingOwner()
+  book = OrderBook(owner, 'ABM')
+  query = book.get_transacted_volume if implementation == 'index' else HistoryTransactedVolume(book).get_transacted_volume
+  base_time = owner.currentTime
+  answers = []
+  query_s = 0
+
+  for i, (action, args) in enumerate(flow):
+    if action == 'LIMIT':
+      oid, ns, qty, is_buy, price = args
+      owner.currentTime = base_time + pd.Timedelta(ns)
+      book.handleLimitOrder(LimitOrder(0, owner.currentTime, 'ABM', qty, is_buy, price, order_id=oid))
+    elif action == 'MARKET':
+      oid, ns, qty, is_buy = args
+      owner.currentTime = base_time + pd.Timedelta(ns)
+      book.handleMarketOrder(MarketOrder(0, owner.currentTime, 'ABM', qty, is_buy, order_id=oid))
+    elif action == 'CANCEL':
+      oid, ns, qty, is_buy, price = args
+      book.cancelOrder(LimitOrder(0, base_time + pd.Timedelta(ns), 'ABM', qty, is_buy, price, order_id=oid))
+    else:
+      (oid, ns, qty, is_buy, price), new_qty = args
+      placed = base_time + pd.Timedelta(ns)
+      book.modifyOrder(LimitOrder(0, placed, 'ABM', qty, is_buy, price, order_id=oid),
+                       LimitOrder(0, placed, 'ABM', new_qty, is_buy, price, order_id=oid))
+
+    if i % query_every == 0:
+      start = time.perf_counter()
+      volume = query(LOOKBACK)
+      query_s += time.perf_counter() - start
+      window_start = owner.currentTime - pd.to_timedelta(LOOKBACK)
+      expected = sum(q for t, q in owner.fills if t >= window_start)
+      answers.append((volume, expected))
+
+  return query_s, answers
+
+
+if __name__ == '__main__':
+  num_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+  query_every = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+  seed = int(sys.argv[3]) if len(sys.argv) > 3 else 123456789
+
+  util.silent_mode = True
+  limit_order.silent_mode = True
+
+  flow = generate_order_flow(num_orders, seed)
+  print ("{} order book actions (seed {}), transacted volume over {} queried every {} actions".format(
+         num_orders, seed, LOOKBACK, query_every))
+
+  results = {}
+  for implementation in ['history', 'index']:
+    query_s, answers = run(flow, query_every, implementation)
+    results[implementation] = answers
+    matches = sum(volume == expected for volume, expected in answers)
+    print ("  {:8} {} queries in {:7.3f} s ({:8.1f} us each), {} of them equal to the volume of the fills".format(
+           implementation, len(answers), query_s, 1e6 * query_s / len(answers), matches))
+
+  same = sum(a[0] == b[0] for a, b in zip(results['history'], results['index']))
+  print ("  {} of {} answers of the index equal to those of the original".format(same, len(results['index'])))
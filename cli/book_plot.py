@@ -11,6 +11,11 @@ import sys
 from matplotlib.colors import LogNorm
 
 from joblib import Memory
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -34,7 +39,7 @@ PLOT_HISTORICAL = False
 #@mem.cache
 def read_book_quotes (file):
   print ("Simulated quotes were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
 
   if len(df) <= 0:
     print ("There appear to be no simulated quotes.")
@@ -48,7 +53,7 @@ def read_book_quotes (file):
 @mem_hist.cache
 def read_historical_quotes (file, symbol):
   print ("Historical quotes were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
 
   if len(df) <= 0:
     print ("There appear to be no historical quotes.")
@@ -1,5 +1,10 @@
 import pandas as pd
 import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -12,7 +17,7 @@ if len(sys.argv) < 2:
 
 file = sys.argv[1]
 
-df = pd.read_pickle(file, compression='bz2')
+df = readLog(file)
 
 if len(sys.argv) > 2:
   events = sys.argv[2:]
@@ -8,6 +8,11 @@ import re
 import sys
 
 from joblib import Memory
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -31,7 +36,7 @@ SIM_WINDOW = 1
 #@mem_sim.cache
 def read_simulated_trades (file, symbol):
   #print ("Simulated trades were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
   df = df[df['EventType'] == 'LAST_TRADE']
 
   if len(df) <= 0:
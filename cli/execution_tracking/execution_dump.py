@@ -1,6 +1,11 @@
 import pandas as pd
 import sys
 import os
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[2])  # directory two levels up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 # Auto-detect terminal width.
 pd.options.display.width = None
 pd.options.display.max_rows = 500000
@@ -12,7 +17,7 @@ if len(sys.argv) < 2:
 
 file = sys.argv[1]
 
-df = pd.read_pickle(file, compression='bz2')
+df = readLog(file)
 
 df2 = df.reset_index(drop=True)
 
@@ -38,5 +43,5 @@ if not os.path.isdir(path):
 
 # drop log directory from file
 file = '\\' + file.split("\\")[2]
-file = file.split('.bz2')[0]
+file = os.path.splitext(file)[0]
 df2.to_csv(path + file + '_DUMP.csv', index=False)
\ No newline at end of file
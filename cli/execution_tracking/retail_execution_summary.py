@@ -1,6 +1,11 @@
 import os
 import pandas as pd
 import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[2])  # directory two levels up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -26,7 +31,7 @@ for log_dir in log_dirs:
   dir_count += 1
   for file in os.listdir(log_dir):
     try:
-      df = pd.read_pickle(os.path.join(log_dir,file), compression='bz2')
+      df = readLog(os.path.join(log_dir,file))
       # print(df)
       events = [ 'AGENT_TYPE', 'TOTAL_ORDERS', 'AVG_ABS_SLIPPAGE', 'NET_SLIPPAGE', 'MAX_ABS_SLIPPAGE', 'PCT_IN', 'PCT_OUT', 'AVG_TIME', 'FINAL_PCT_PROFIT', 'SLIP_ADJ_PCT_PROFIT', 'AVG_SIZE']
       event = "|".join(events)
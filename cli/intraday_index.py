@@ -14,6 +14,11 @@ import sys
 import numpy as np
 
 from joblib import Memory
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -39,7 +44,7 @@ LW = 2
 #@mem_sim.cache
 def read_simulated_quotes (file):
   print ("Simulated quotes were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
   df['Timestamp'] = df.index
 
   df_bid = df[df['EventType'] == 'BEST_BID'].copy()
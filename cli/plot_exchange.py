@@ -3,6 +3,11 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import pandas as pd
 import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -23,7 +28,7 @@ if len(sys.argv) < 2:
 
 sim_file = sys.argv[1]
 
-df_sim = pd.read_pickle(sim_file, compression='bz2')
+df_sim = readLog(sim_file)
 
 #print(df_sim)
 
@@ -0,0 +1,79 @@
+# Counts the order objects allocated while running a simulation config, to profile the order
+# matching path (orders, copies of orders and fill records).  Each allocation is counted by class,
+# and the totals are reported per message sent during the simulation.
+#
+# Usage: python cli/profile_allocations.py -c <config> [config args]
+#   e.g. python cli/profile_allocations.py -c sparse_zi_1000 -s 123456789 -l profile_alloc
+#
+# Pass --tracemalloc to also report the peak memory allocated by Python during the run (slow).
+
+import importlib
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+from message.Message import Message
+from util.order.Order import Order
+
+counts = Counter()
+
+
+def counting_new(cls, *args, **kwargs):
+  counts[cls.__name__] += 1
+  return object.__new__(cls)
+
+
+if __name__ == '__main__':
+  if '-c' not in sys.argv:
+    print ("Usage: python cli/profile_allocations.py -c <config> [config args] [--tracemalloc]")
+    sys.exit()
+
+  trace = '--tracemalloc' in sys.argv
+  if trace: sys.argv.remove('--tracemalloc')
+
+  config = sys.argv[sys.argv.index('-c') + 1]
+
+  # Count every object created by the order classes, including copies which bypass __init__.
+  Order.__new__ = staticmethod(counting_new)
+  try:
+    from util.order.Fill import Fill
+  except ImportError:
+    Fill = None
+
+  # Fill uses __slots__, so wrap its constructor instead.
+  if Fill is not None:
+    fill_init = Fill.__init__
+
+    def counting_init(self, *args, **kwargs):
+      counts['Fill'] += 1
+      fill_init(self, *args, **kwargs)
+
+    Fill.__init__ = counting_init
+
+  if trace: tracemalloc.start()
+  start = time.perf_counter()
+  first_message = Message().uniq
+
+  # Config files run the simulation at import time, parsing sys.argv themselves.
+  importlib.import_module('config.{}'.format(config), package=None)
+
+  elapsed = time.perf_counter() - start
+  if trace:
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+  total = sum(counts.values())
+  num_messages = Message().uniq - first_message - 1  # messages are numbered as they are created
+
+  print ()
+  print ("Order object allocations ({}, {:0.1f} s):".format(config, elapsed))
+  for name, n in sorted(counts.items()):
+    print ("  {:12s} {:>10d}".format(name, n))
+  print ("  {:12s} {:>10d}".format('total', total))
+  print ("Messages sent: {}, order objects per message: {:0.3f}".format(num_messages, total / max(num_messages, 1)))
+  if trace:
+    print ("Peak traced memory: {:0.1f} MiB".format(peak / 2**20))
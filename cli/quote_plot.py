@@ -5,6 +5,11 @@ import pandas as pd
 import sys
 
 from joblib import Memory
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -20,7 +25,7 @@ mem_sim = Memory(location='./.cached_plot_sim', verbose=0)
 #@mem_sim.cache
 def read_simulated_quotes (file, symbol):
   print ("Simulated quotes were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
   df['Timestamp'] = df.index
 
   # Keep only the last bid and last ask event at each timestamp.
@@ -1,6 +1,11 @@
 import os
 import pandas as pd
 import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -29,7 +34,7 @@ for log_dir in log_dirs:
   dir_count += 1
   for file in os.listdir(log_dir):
     try:
-      df = pd.read_pickle(os.path.join(log_dir,file), compression='bz2')
+      df = readLog(os.path.join(log_dir,file))
       # print(df)
       events = [ 'AGENT_TYPE', 'STARTING_CASH', 'ENDING_CASH', 'FINAL_CASH_POSITION', 'MARKED_TO_MARKET' ]
       event = "|".join(events)
@@ -8,6 +8,11 @@ import re
 import sys
 
 from joblib import Memory
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -40,7 +45,7 @@ if not m:
 symbol = m.group(1)
 
 print ("Visualizing simulated fundamental from {}".format(sim_file))
-df_sim = pd.read_pickle(sim_file, compression='bz2')
+df_sim = readLog(sim_file)
 
 
 # dollarize value column
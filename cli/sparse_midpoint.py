@@ -7,6 +7,11 @@ import os
 import sys
 
 from joblib import Memory
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -32,7 +37,7 @@ LW = 2
 #@mem_sim.cache
 def read_simulated_quotes (file, symbol):
   print ("Simulated quotes were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
   df['Timestamp'] = df.index
 
   # Keep only the last bid and last ask event at each timestamp.
@@ -7,6 +7,11 @@ import os
 import sys
 
 from joblib import Memory
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 # Auto-detect terminal width.
 pd.options.display.width = None
@@ -33,7 +38,7 @@ LW = 2
 #@mem_hist.cache
 def read_historical_trades (file, symbol):
   print ("Historical trades were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
 
   df = df.loc[symbol]
   df = df.between_time('9:30', '16:00')
@@ -46,7 +51,7 @@ def read_historical_trades (file, symbol):
 #@mem_sim.cache
 def read_simulated_trades (file, symbol):
   print ("Simulated trades were not cached.  This will take a minute.")
-  df = pd.read_pickle(file, compression='bz2')
+  df = readLog(file)
   df = df[df['EventType'] == 'LAST_TRADE']
 
   if len(df) <= 0:
@@ -176,7 +181,7 @@ else:
 # Superimpose a particular trading agent's trade decisions on top of the ticker
 # plot to make it easy to visually see if it is making sensible choices.
 if agent_log:
-  df_agent = pd.read_pickle(agent_log, compression='bz2')
+  df_agent = readLog(agent_log)
   df_agent = df_agent.between_time(BETWEEN_START, BETWEEN_END)
   df_agent = df_agent[df_agent.EventType == 'HOLDINGS_UPDATED']
 
@@ -119,7 +119,7 @@ symbols = {
     }
 }
 oracle = ExternalFileOracle(symbols)
-r_bar = oracle.fundamentals[symbol].values[0]
+r_bar = oracle.getFundamentalSeries(symbol).values[0]
 """
 
 # Agents:
@@ -38,6 +38,9 @@ parser.add_argument('-f',
                     '--fundamental-file-path',
                     required=True,
                     help="Path to external fundamental file.")
+parser.add_argument('--fundamental-cache-dir',
+                    default=None,
+                    help='Directory in which to cache the fundamental as memory-mapped arrays (default: no cache)')
 parser.add_argument('-l',
                     '--log_dir',
                     default=None,
@@ -95,9 +98,9 @@ symbols = {
         'random_state': np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64'))
     }
 }
-oracle = ExternalFileOracle(symbols)
+oracle = ExternalFileOracle(symbols, cache_dir=args.fundamental_cache_dir)
 
-r_bar = oracle.fundamentals[symbol].values[0]
+r_bar = oracle.getFundamentalSeries(symbol).values[0]
 sigma_n = r_bar / 10
 kappa = 1.67e-15
 lambda_a = 1e-12
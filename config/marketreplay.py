@@ -27,6 +27,21 @@ parser.add_argument('-d',
                     '--date',
                     required=True,
                     help='Historical date')
+parser.add_argument('-f',
+                    '--orders-file-path',
+                    default=None,
+                    help='Historical L3 orders file (default: /efs/data/DOW30/<ticker>/<ticker>.<date>)')
+parser.add_argument('--processed-orders-folder',
+                    default='/efs/data/marketreplay/',
+                    help='Folder of the L3 replay stores converted from historical orders files')
+parser.add_argument('--max-lookahead',
+                    type=int,
+                    default=1000,
+                    help='Most historical timestamps the replay agent replays in a single wakeup')
+parser.add_argument('--latency',
+                    type=int,
+                    default=0,
+                    help='One-way latency between the agents, in ns')
 parser.add_argument('-l',
                     '--log_dir',
                     default=None,
@@ -91,7 +106,7 @@ agents.extend([ExchangeAgent(id=0,
                              pipeline_delay=0,
                              computation_delay=0,
                              stream_history=10,
-                             book_freq='all',
+                             book_freq=0,
                              random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32,
                                                                                        dtype='uint64')))])
 agent_types.extend("ExchangeAgent")
@@ -99,7 +114,7 @@ agent_count += 1
 
 # 2) Market Replay Agent
 file_name = f'DOW30/{symbol}/{symbol}.{historical_date}'
-orders_file_path = f'/efs/data/{file_name}'
+orders_file_path = args.orders_file_path if args.orders_file_path else f'/efs/data/{file_name}'
 
 agents.extend([MarketReplayAgent(id=1,
                                  name="MARKET_REPLAY_AGENT",
@@ -110,8 +125,9 @@ agents.extend([MarketReplayAgent(id=1,
                                  start_time=mkt_open,
                                  end_time=mkt_close,
                                  orders_file_path=orders_file_path,
-                                 processed_orders_folder_path='/efs/data/marketreplay/',
+                                 processed_orders_folder_path=args.processed_orders_folder,
                                  starting_cash=0,
+                                 max_lookahead=args.max_lookahead,
                                  random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32,
                                                                                            dtype='uint64')))])
 agent_types.extend("MarketReplayAgent")
@@ -127,7 +143,7 @@ kernelStartTime = historical_date_pd
 kernelStopTime = historical_date_pd + pd.to_timedelta('17:00:00')
 
 defaultComputationDelay = 0
-latency = np.zeros((agent_count, agent_count))
+latency = np.full((agent_count, agent_count), args.latency)
 noise = [0.0]
 
 kernel.runner(agents=agents,
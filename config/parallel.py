@@ -1,25 +1,35 @@
 import argparse
 import os
-from multiprocessing import Pool
+import sys
 import psutil
 import datetime as dt
-import numpy as np
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
 
+from util.ExperimentRunner import ExperimentRunner, Run, generateSeeds
 
-def run_in_parallel(num_simulations, num_parallel, config, log_folder, verbose):
 
-    global_seeds = np.random.randint(0, 2 ** 32, num_simulations)
+def run_in_parallel(num_simulations, num_parallel, config, log_folder, verbose, seed=None, timeout=None,
+                    resume=True, config_args=()):
+
+    global_seeds = generateSeeds(seed, num_simulations)
     print(f'Global Seeds: {global_seeds}')
 
-    processes = [f'python -u abides.py -c {config} -l {log_folder}_seed_{seed} {"-v" if verbose else ""} -s {seed}'
-                 for seed in global_seeds]
+    config_args = list(config_args) + (['-v'] if verbose else [])
+    runs = [Run(config, f'{log_folder}_seed_{s}', s, config_args) for s in global_seeds]
 
-    pool = Pool(processes=num_parallel)
-    pool.map(run_process, processes)
+    runner = ExperimentRunner(num_parallel=num_parallel, timeout=timeout, resume=resume)
 
+    results = []
+    for result in runner.iterResults(runs):
+        run = result['run']
+        elapsed = '' if result['elapsed'] is None else f' in {result["elapsed"]:.1f} s'
+        print(f'Seed {run.seed}: {result["status"]}{elapsed}', flush=True)
+        if result['error']: print(result['error'], flush=True)
+        results.append(result)
 
-def run_process(process):
-    os.system(process)
+    return results
 
 
 if __name__ == "__main__":
@@ -36,6 +46,10 @@ if __name__ == "__main__":
                         help='Name of config file to execute')
     parser.add_argument('--log_folder', required=True,
                         help='Log directory name')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Seconds after which a simulation is stopped and counted as failed')
+    parser.add_argument('--rerun', action='store_true',
+                        help='Rerun simulations already completed in an earlier (interrupted) run')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Maximum verbosity!')
 
@@ -52,13 +66,21 @@ if __name__ == "__main__":
     print(f'Number of simulations to run in parallel: {num_parallel}')
     print(f'Configuration: {config}')
 
-    np.random.seed(seed)
+    # Simulations run from the repository root, as with abides.py, so that logs go to ./log.
+    os.chdir(p)
+
+    results = run_in_parallel(num_simulations=num_simulations,
+                              num_parallel=num_parallel,
+                              config=config,
+                              log_folder=log_folder,
+                              verbose=verbose,
+                              seed=seed,
+                              timeout=args.timeout,
+                              resume=not args.rerun,
+                              config_args=remaining_args)
 
-    run_in_parallel(num_simulations=num_simulations,
-                    num_parallel=num_parallel,
-                    config=config,
-                    log_folder=log_folder,
-                    verbose=verbose)
+    failed = [result for result in results if result['status'] in ('failed', 'timeout')]
+    print(f'Simulations completed: {len(results) - len(failed)}, failed: {len(failed)}')
 
     end_time = dt.datetime.now()
-    print(f'Total time taken to run in parallel: {end_time - start_time}')
\ No newline at end of file
+    print(f'Total time taken to run in parallel: {end_time - start_time}')
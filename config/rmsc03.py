@@ -16,11 +16,15 @@ from dateutil.parser import parse
 from Kernel import Kernel
 from util import util
 from util.order import LimitOrder
+from util.order.Order import Order
 from util.oracle.SparseMeanRevertingOracle import SparseMeanRevertingOracle
 
 from agent.ExchangeAgent import ExchangeAgent
 from agent.NoiseAgent import NoiseAgent
 from agent.ValueAgent import ValueAgent
+from agent.PopulationAgent import PopulationAgent
+from agent.NoisePopulationAgent import NoisePopulationAgent
+from agent.ValuePopulationAgent import ValuePopulationAgent
 from agent.market_makers.AdaptiveMarketMakerAgent import AdaptiveMarketMakerAgent
 from agent.examples.MomentumAgent import MomentumAgent
 from agent.execution.POVExecutionAgent import POVExecutionAgent
@@ -69,6 +73,42 @@ parser.add_argument('-v',
 parser.add_argument('--config_help',
                     action='store_true',
                     help='Print argument options for this config file')
+parser.add_argument('--event-queue',
+                    default='priority',
+                    choices=['priority', 'heap'],
+                    help='Kernel event queue engine')
+parser.add_argument('--book-type',
+                    default='list',
+                    choices=['list', 'indexed'],
+                    help='Exchange order book implementation')
+parser.add_argument('--book-log-depth',
+                    type=int,
+                    default=None,
+                    help='Price levels per side to keep in the order book log (default: full depth)')
+parser.add_argument('--log-spill-rows',
+                    type=int,
+                    default=None,
+                    help='Write agent event logs to disk every N events to bound memory use (not with --log-format bz2)')
+parser.add_argument('--log-format',
+                    default='bz2',
+                    choices=['bz2', 'parquet', 'parquet-lz4', 'feather'],
+                    help='File format for the agent and summary logs')
+# Background agent config
+parser.add_argument('--agent-populations',
+                    action='store_true',
+                    help='Simulate the noise and value agents as one population agent each')
+parser.add_argument('--num-noise-agents',
+                    type=int,
+                    default=5000,
+                    help='Number of noise agents')
+parser.add_argument('--num-value-agents',
+                    type=int,
+                    default=100,
+                    help='Number of value agents')
+parser.add_argument('--value-subscribe-freq',
+                    default=None,
+                    help='Conflation window (e.g. 10s) of an inside quote subscription for the value agents to trade '
+                         'on, instead of querying the spread on every wakeup (default: query the spread)')
 # Execution agent config
 parser.add_argument('-e',
                     '--execution-agents',
@@ -136,6 +176,10 @@ np.random.seed(seed)
 util.silent_mode = not args.verbose
 LimitOrder.silent_mode = not args.verbose
 
+# Every order in this config is placed through TradingAgent with an explicit order id, so there is
+# no need to record every id to check automatically generated ones against.
+Order.check_order_ids = False
+
 exchange_log_orders = True
 log_orders = None
 book_freq = 0
@@ -191,42 +235,74 @@ agents.extend([ExchangeAgent(id=0,
                              stream_history=stream_history_length,
                              book_freq=book_freq,
                              wide_book=True,
+                             book_type=args.book_type,
+                             book_log_depth=args.book_log_depth,
                              random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 16, dtype='uint64')))])
 agent_types.extend("ExchangeAgent")
 agent_count += 1
 
 # 2) Noise Agents
-num_noise = 5000
+num_noise = args.num_noise_agents
 noise_mkt_open = historical_date + pd.to_timedelta("09:00:00")  # These times needed for distribution of arrival times
                                                                 # of Noise Agents
 noise_mkt_close = historical_date + pd.to_timedelta("16:00:00")
-agents.extend([NoiseAgent(id=j,
-                          name="NoiseAgent {}".format(j),
-                          type="NoiseAgent",
-                          symbol=symbol,
-                          starting_cash=starting_cash,
-                          wakeup_time=util.get_wake_time(noise_mkt_open, noise_mkt_close),
-                          log_orders=log_orders,
-                          random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64')))
-               for j in range(agent_count, agent_count + num_noise)])
-agent_count += num_noise
+if args.agent_populations:
+    agents.append(NoisePopulationAgent(id=agent_count,
+                                       name="NoiseAgent population {}".format(agent_count),
+                                       type="NoiseAgent",
+                                       num_members=num_noise,
+                                       symbol=symbol,
+                                       starting_cash=starting_cash,
+                                       wakeup_times=[util.get_wake_time(noise_mkt_open, noise_mkt_close)
+                                                     for _ in range(num_noise)],
+                                       log_orders=log_orders,
+                                       random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64'))))
+    agent_count += 1
+else:
+    agents.extend([NoiseAgent(id=j,
+                              name="NoiseAgent {}".format(j),
+                              type="NoiseAgent",
+                              symbol=symbol,
+                              starting_cash=starting_cash,
+                              wakeup_time=util.get_wake_time(noise_mkt_open, noise_mkt_close),
+                              log_orders=log_orders,
+                              random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64')))
+                   for j in range(agent_count, agent_count + num_noise)])
+    agent_count += num_noise
 agent_types.extend(['NoiseAgent'])
 
 # 3) Value Agents
-num_value = 100
-agents.extend([ValueAgent(id=j,
-                          name="Value Agent {}".format(j),
-                          type="ValueAgent",
-                          symbol=symbol,
-                          starting_cash=starting_cash,
-                          sigma_n=sigma_n,
-                          r_bar=r_bar,
-                          kappa=kappa,
-                          lambda_a=lambda_a,
-                          log_orders=log_orders,
-                          random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 16, dtype='uint64')))
-               for j in range(agent_count, agent_count + num_value)])
-agent_count += num_value
+num_value = args.num_value_agents
+if args.agent_populations:
+    agents.append(ValuePopulationAgent(id=agent_count,
+                                       name="Value Agent population {}".format(agent_count),
+                                       type="ValueAgent",
+                                       num_members=num_value,
+                                       symbol=symbol,
+                                       starting_cash=starting_cash,
+                                       sigma_n=sigma_n,
+                                       r_bar=r_bar,
+                                       kappa=kappa,
+                                       lambda_a=lambda_a,
+                                       log_orders=log_orders,
+                                       random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 16, dtype='uint64'))))
+    agent_count += 1
+else:
+    agents.extend([ValueAgent(id=j,
+                              name="Value Agent {}".format(j),
+                              type="ValueAgent",
+                              symbol=symbol,
+                              starting_cash=starting_cash,
+                              sigma_n=sigma_n,
+                              r_bar=r_bar,
+                              kappa=kappa,
+                              lambda_a=lambda_a,
+                              subscribe=args.value_subscribe_freq is not None,
+                              subscribe_freq=pd.Timedelta(args.value_subscribe_freq or 0).value,
+                              log_orders=log_orders,
+                              random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 16, dtype='uint64')))
+                   for j in range(agent_count, agent_count + num_value)])
+    agent_count += num_value
 agent_types.extend(['ValueAgent'])
 
 # 4) Market Maker Agents
@@ -329,7 +405,10 @@ agent_count += 1
 ########################################### KERNEL AND OTHER CONFIG ####################################################
 
 kernel = Kernel("RMSC03 Kernel", random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 16,
-                                                                                                  dtype='uint64')))
+                                                                                                  dtype='uint64')),
+                event_queue=args.event_queue,
+                log_spill_rows=args.log_spill_rows,
+                log_format=args.log_format)
 
 kernelStartTime = historical_date
 kernelStopTime = mkt_close + pd.to_timedelta('00:01:00')
@@ -343,9 +422,18 @@ pairwise = (agent_count, agent_count)
 
 # All agents sit on line from Seattle to NYC
 nyc_to_seattle_meters = 3866660
-pairwise_distances = util.generate_uniform_random_pairwise_dist_on_line(0.0, nyc_to_seattle_meters, agent_count,
-                                                                        random_state=latency_rstate)
-pairwise_latencies = util.meters_to_light_ns(pairwise_distances)
+agent_coords = util.generate_uniform_random_points_on_line(0.0, nyc_to_seattle_meters, agent_count,
+                                                          random_state=latency_rstate)
+pairwise_latencies = util.meters_to_light_ns(util.pairwise_dist_on_line(agent_coords))
+
+# The members of a population sit on the line too, each with its own latency to the exchange (agent 0).  Their
+# messages carry those latencies, so the population itself reaches the exchange with none.
+for agent in agents:
+    if isinstance(agent, PopulationAgent):
+        member_coords = util.generate_uniform_random_points_on_line(0.0, nyc_to_seattle_meters, agent.num_members,
+                                                                    random_state=latency_rstate)
+        agent.setMemberLatency(util.meters_to_light_ns(np.abs(member_coords - agent_coords[0])))
+        pairwise_latencies[agent.id, 0] = pairwise_latencies[0, agent.id] = 0
 
 model_args = {
     'connected': True,
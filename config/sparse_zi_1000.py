@@ -1,7 +1,9 @@
 from Kernel import Kernel
 from agent.ExchangeAgent import ExchangeAgent
 from agent.ZeroIntelligenceAgent import ZeroIntelligenceAgent
+from agent.ZeroIntelligencePopulationAgent import ZeroIntelligencePopulationAgent
 from util.order import LimitOrder
+from util.order.Order import Order
 from util.oracle.SparseMeanRevertingOracle import SparseMeanRevertingOracle
 from util import util
 
@@ -29,6 +31,10 @@ parser.add_argument('-s', '--seed', type=int, default=None,
                     help='numpy.random.seed() for simulation')
 parser.add_argument('-v', '--verbose', action='store_true',
                     help='Maximum verbosity!')
+parser.add_argument('--event_queue', default='priority', choices=['priority', 'heap'],
+                    help='Kernel event queue engine')
+parser.add_argument('--agent_populations', action='store_true',
+                    help='Simulate each ZI strategy group as one population agent')
 parser.add_argument('--config_help', action='store_true',
                     help='Print argument options for this config file')
 
@@ -74,6 +80,10 @@ np.random.seed(seed)
 util.silent_mode = not args.verbose
 LimitOrder.silent_mode = not args.verbose
 
+# Every order in this config is placed through TradingAgent with an explicit order id, so there is
+# no need to record every id to check automatically generated ones against.
+Order.check_order_ids = False
+
 # Config parameter that causes every order-related action to be logged by
 # every agent.  Activate only when really needed as there is a significant
 # time penalty to all that object serialization!
@@ -130,7 +140,7 @@ symbols = { 'JPM' : { 'r_bar' : 1e5, 'kappa' : 1.67e-12, 'agent_kappa' : 1.67e-1
  
 
 ### Configure the Kernel.
-kernel = Kernel("Base Kernel", random_state = np.random.RandomState(seed=np.random.randint(low=0,high=2**32, dtype='uint64')))
+kernel = Kernel("Base Kernel", random_state = np.random.RandomState(seed=np.random.randint(low=0,high=2**32, dtype='uint64')), event_queue = args.event_queue)
 
 
 
@@ -185,6 +195,12 @@ zi = [ (143, 0, 250, 1), (143, 0, 500, 1), (143, 0, 1000, 0.8), (143, 0, 1000, 1
 # minutes.
 for i,x in enumerate(zi):
   strat_name = "Type {} [{} <= R <= {}, eta={}]".format(i+1, x[1], x[2], x[3])
+  if args.agent_populations:
+    agents.append(ZeroIntelligencePopulationAgent(agent_count, "ZI Agent population {} {}".format(agent_count, strat_name), "ZeroIntelligenceAgent {}".format(strat_name), x[0], random_state = np.random.RandomState(seed=np.random.randint(low=0,high=2**32, dtype='uint64')),log_orders=log_orders, symbol=symbol, starting_cash=starting_cash, sigma_n=sigma_n, r_bar=s['r_bar'], kappa=s['agent_kappa'], sigma_s=s['fund_vol'], q_max=10, sigma_pv=5e6, R_min=x[1], R_max=x[2], eta=x[3], lambda_a=1e-12))
+    agent_types.append("ZeroIntelligenceAgent {}".format(strat_name))
+    agent_count += 1
+    continue
+
   agents.extend([ ZeroIntelligenceAgent(j, "ZI Agent {} {}".format(j, strat_name), "ZeroIntelligenceAgent {}".format(strat_name), random_state = np.random.RandomState(seed=np.random.randint(low=0,high=2**32, dtype='uint64')),log_orders=log_orders, symbol=symbol, starting_cash=starting_cash, sigma_n=sigma_n, r_bar=s['r_bar'], kappa=s['agent_kappa'], sigma_s=s['fund_vol'], q_max=10, sigma_pv=5e6, R_min=x[1], R_max=x[2], eta=x[3], lambda_a=1e-12) for j in range(agent_count,agent_count+x[0]) ])
   agent_types.extend([ "ZeroIntelligenceAgent {}".format(strat_name) for j in range(x[0]) ])
   agent_count += x[0]
@@ -219,6 +235,13 @@ for i, t1 in zip(range(latency.shape[0]), agent_types):
       # takes about 20 microseconds.
       latency[i,j] = 20000
 
+# The members of a population are drawn their own latencies to the exchange (agent 0) in the same way.  Their
+# messages carry those latencies, so the population itself reaches the exchange with none.
+for agent in agents:
+  if isinstance(agent, ZeroIntelligencePopulationAgent):
+    agent.setMemberLatency(np.random.uniform(low = 21000, high = 13000000, size = agent.num_members))
+    latency[agent.id, 0] = latency[0, agent.id] = 0
+
 
 # Configure a simple latency noise model for the agents.
 # Index is ns extra delay, value is probability of this delay being applied.
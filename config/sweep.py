@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import psutil
+import datetime as dt
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+from util.ParameterSweep import ParameterSweep, SWEEP_METHODS
+from util.util import numeric
+
+
+def option(name):
+    # Config option for a parameter name: "fund-vol" -> "--fund-vol", "b" -> "-b".
+    if name.startswith('-'): return name
+    return '-' + name if len(name) == 1 else '--' + name
+
+
+if __name__ == "__main__":
+    start_time = dt.datetime.now()
+
+    parser = argparse.ArgumentParser(description='Runs an ABIDES config over a space of parameter values in parallel',
+                                     allow_abbrev=False)
+    parser.add_argument('-c', '--config', required=True,
+                        help='Name of config file to execute')
+    parser.add_argument('--name', required=True,
+                        help='Name of the sweep (log directory of its runs and results table)')
+    parser.add_argument('-p', '--param', nargs='+', action='append', required=True, metavar=('NAME', 'VALUE'),
+                        help='Config option (without leading dashes) followed by its values, e.g. -p fund-vol 1e-8 1e-7')
+    parser.add_argument('--method', default='grid', choices=SWEEP_METHODS,
+                        help='Full grid, or points sampled uniformly at random, by Latin hypercube or by Sobol sequence')
+    parser.add_argument('--num_samples', type=int, default=None,
+                        help='Number of points to sample (all methods but grid)')
+    parser.add_argument('--sample_seed', type=int, default=12345,
+                        help='Seed for sampling points')
+    parser.add_argument('--seeds', type=int, nargs='+', default=None,
+                        help='Simulation seeds to run every point with')
+    parser.add_argument('--num_seeds', type=int, default=1,
+                        help='Number of simulation seeds to draw for every point (if --seeds is not given)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed controlling the drawn simulation seeds')
+    parser.add_argument('--num_parallel', type=int, default=None,
+                        help='Number of simulations to run in parallel')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Seconds after which a simulation is stopped and counted as failed')
+    parser.add_argument('--results', default=None,
+                        help='Path of the Parquet results table (default: log/<name>/results.parquet)')
+
+    args, config_args = parser.parse_known_args()
+
+    params = {option(param[0]): [numeric(v) for v in param[1:]] for param in args.param}
+    num_parallel = args.num_parallel if args.num_parallel else psutil.cpu_count() # count of the CPUs on the machine
+
+    # Simulations run from the repository root, as with abides.py, so that logs go to ./log.
+    os.chdir(p)
+
+    sweep = ParameterSweep(args.config, params, args.name, method=args.method, num_samples=args.num_samples,
+                           sample_seed=args.sample_seed, seeds=args.seeds, num_seeds=args.num_seeds, seed=args.seed,
+                           config_args=config_args, results_path=args.results, num_parallel=num_parallel,
+                           timeout=args.timeout)
+
+    print(f'Configuration: {args.config}')
+    print(f'Parameters: {params}')
+    print(f'Seeds: {sweep.seeds}')
+    print(f'Number of simulations to run in parallel: {num_parallel}')
+
+    results = sweep.run()
+
+    print(f'Results table: {sweep.results_path} ({len(results)} runs)')
+
+    end_time = dt.datetime.now()
+    print(f'Total time taken to run the sweep: {end_time - start_time}')
@@ -0,0 +1,302 @@
+# Typed messages (see message.Message.TypedMessage) exchanged between a TradingAgent and an ExchangeAgent:
+# the requests agents send to an exchange, the exchange's replies to them (of the same kind as the
+# request), and the notifications of order activity it sends.  Each has the fields its body dict had,
+# in the same order.  Being built for nearly every message of a simulation, they number themselves
+# (as Message.__init__ does) rather than calling up to TypedMessage.__init__.
+
+from message.Message import MessageKind, TypedMessage, next_uniq
+
+
+### Requests to an exchange.
+
+class WhenMktOpenMsg(TypedMessage):
+  kind = MessageKind.WHEN_MKT_OPEN
+  __slots__ = fields = ('sender',)
+
+  def __init__ (self, sender):
+    self.uniq = next_uniq()
+    self.sender = sender
+
+
+class WhenMktCloseMsg(TypedMessage):
+  kind = MessageKind.WHEN_MKT_CLOSE
+  __slots__ = fields = ('sender',)
+
+  def __init__ (self, sender):
+    self.uniq = next_uniq()
+    self.sender = sender
+
+
+class QueryLastTradeMsg(TypedMessage):
+  kind = MessageKind.QUERY_LAST_TRADE
+  __slots__ = fields = ('sender', 'symbol')
+
+  def __init__ (self, sender, symbol):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.symbol = symbol
+
+
+class QuerySpreadMsg(TypedMessage):
+  kind = MessageKind.QUERY_SPREAD
+  __slots__ = fields = ('sender', 'symbol', 'depth')
+
+  def __init__ (self, sender, symbol, depth):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.symbol = symbol
+    self.depth = depth
+
+
+class QueryOrderStreamMsg(TypedMessage):
+  kind = MessageKind.QUERY_ORDER_STREAM
+  __slots__ = fields = ('sender', 'symbol', 'length')
+
+  def __init__ (self, sender, symbol, length):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.symbol = symbol
+    self.length = length
+
+
+class QueryTransactedVolumeMsg(TypedMessage):
+  kind = MessageKind.QUERY_TRANSACTED_VOLUME
+  __slots__ = fields = ('sender', 'symbol', 'lookback_period')
+
+  def __init__ (self, sender, symbol, lookback_period):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.symbol = symbol
+    self.lookback_period = lookback_period
+
+
+class MarketDataSubscriptionRequestMsg(TypedMessage):
+  kind = MessageKind.MARKET_DATA_SUBSCRIPTION_REQUEST
+  __slots__ = fields = ('sender', 'symbol', 'levels', 'freq', 'deltas', 'conflate')
+
+  def __init__ (self, sender, symbol, levels, freq, deltas = False, conflate = False):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.symbol = symbol
+    self.levels = levels
+    self.freq = freq
+    self.deltas = deltas
+    self.conflate = conflate
+
+
+class MarketDataSubscriptionCancellationMsg(TypedMessage):
+  kind = MessageKind.MARKET_DATA_SUBSCRIPTION_CANCELLATION
+  __slots__ = fields = ('sender', 'symbol')
+
+  def __init__ (self, sender, symbol):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.symbol = symbol
+
+
+class LimitOrderMsg(TypedMessage):
+  kind = MessageKind.LIMIT_ORDER
+  __slots__ = fields = ('sender', 'order')
+
+  def __init__ (self, sender, order):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.order = order
+
+
+class MarketOrderMsg(TypedMessage):
+  kind = MessageKind.MARKET_ORDER
+  __slots__ = fields = ('sender', 'order')
+
+  def __init__ (self, sender, order):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.order = order
+
+
+class CancelOrderMsg(TypedMessage):
+  kind = MessageKind.CANCEL_ORDER
+  __slots__ = fields = ('sender', 'order')
+
+  def __init__ (self, sender, order):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.order = order
+
+
+class ModifyOrderMsg(TypedMessage):
+  kind = MessageKind.MODIFY_ORDER
+  __slots__ = fields = ('sender', 'order', 'new_order')
+
+  def __init__ (self, sender, order, new_order):
+    self.uniq = next_uniq()
+    self.sender = sender
+    self.order = order
+    self.new_order = new_order
+
+
+### Replies from an exchange.
+
+class WhenMktOpenReplyMsg(TypedMessage):
+  kind = MessageKind.WHEN_MKT_OPEN
+  __slots__ = fields = ('data',)
+
+  def __init__ (self, data):
+    self.uniq = next_uniq()
+    self.data = data
+
+
+class WhenMktCloseReplyMsg(TypedMessage):
+  kind = MessageKind.WHEN_MKT_CLOSE
+  __slots__ = fields = ('data',)
+
+  def __init__ (self, data):
+    self.uniq = next_uniq()
+    self.data = data
+
+
+class QueryLastTradeReplyMsg(TypedMessage):
+  kind = MessageKind.QUERY_LAST_TRADE
+  __slots__ = fields = ('symbol', 'data', 'mkt_closed')
+
+  def __init__ (self, symbol, data, mkt_closed):
+    self.uniq = next_uniq()
+    self.symbol = symbol
+    self.data = data
+    self.mkt_closed = mkt_closed
+
+
+class QuerySpreadReplyMsg(TypedMessage):
+  kind = MessageKind.QUERY_SPREAD
+  __slots__ = fields = ('symbol', 'depth', 'bids', 'asks', 'data', 'mkt_closed', 'book')
+
+  def __init__ (self, symbol, depth, bids, asks, data, mkt_closed, book = ''):
+    self.uniq = next_uniq()
+    self.symbol = symbol
+    self.depth = depth
+    self.bids = bids
+    self.asks = asks
+    self.data = data
+    self.mkt_closed = mkt_closed
+    self.book = book
+
+
+class QueryOrderStreamReplyMsg(TypedMessage):
+  kind = MessageKind.QUERY_ORDER_STREAM
+  __slots__ = fields = ('symbol', 'length', 'mkt_closed', 'orders')
+
+  def __init__ (self, symbol, length, mkt_closed, orders):
+    self.uniq = next_uniq()
+    self.symbol = symbol
+    self.length = length
+    self.mkt_closed = mkt_closed
+    self.orders = orders
+
+
+class QueryTransactedVolumeReplyMsg(TypedMessage):
+  kind = MessageKind.QUERY_TRANSACTED_VOLUME
+  __slots__ = fields = ('symbol', 'transacted_volume', 'mkt_closed')
+
+  def __init__ (self, symbol, transacted_volume, mkt_closed):
+    self.uniq = next_uniq()
+    self.symbol = symbol
+    self.transacted_volume = transacted_volume
+    self.mkt_closed = mkt_closed
+
+
+### Notifications from an exchange.
+
+class MktClosedMsg(TypedMessage):
+  kind = MessageKind.MKT_CLOSED
+  __slots__ = fields = ()
+
+
+class FinalCloseMsg(TypedMessage):
+  kind = MessageKind.FINAL_CLOSE
+  __slots__ = fields = ()
+
+
+class OrderAcceptedMsg(TypedMessage):
+  kind = MessageKind.ORDER_ACCEPTED
+  __slots__ = fields = ('order',)
+
+  def __init__ (self, order):
+    self.uniq = next_uniq()
+    self.order = order
+
+
+class OrderExecutedMsg(TypedMessage):
+  kind = MessageKind.ORDER_EXECUTED
+  __slots__ = fields = ('order',)
+
+  def __init__ (self, order):
+    self.uniq = next_uniq()
+    self.order = order
+
+
+class OrderCancelledMsg(TypedMessage):
+  kind = MessageKind.ORDER_CANCELLED
+  __slots__ = fields = ('order',)
+
+  def __init__ (self, order):
+    self.uniq = next_uniq()
+    self.order = order
+
+
+class OrderModifiedMsg(TypedMessage):
+  kind = MessageKind.ORDER_MODIFIED
+  __slots__ = fields = ('new_order',)
+
+  def __init__ (self, new_order):
+    self.uniq = next_uniq()
+    self.new_order = new_order
+
+
+class FilledMsg(TypedMessage):
+  kind = MessageKind.FILLED
+  __slots__ = fields = ('order_id', 'fill_price', 'fill_time', 'quantity', 'fill_type')
+
+  def __init__ (self, order_id, fill_price, fill_time, quantity, fill_type):
+    self.uniq = next_uniq()
+    self.order_id = order_id
+    self.fill_price = fill_price
+    self.fill_time = fill_time
+    self.quantity = quantity
+    self.fill_type = fill_type
+
+
+class NewSplitMarketOrderMsg(TypedMessage):
+  kind = MessageKind.NEW_SPLIT_MARKET_ORDER
+  __slots__ = fields = ('order',)
+
+  def __init__ (self, order):
+    self.uniq = next_uniq()
+    self.order = order
+
+
+class MarketDataMsg(TypedMessage):
+  # A snapshot of the top levels of a book, for a market data subscription (see util.MarketDataFeed).
+  kind = MessageKind.MARKET_DATA
+  __slots__ = fields = ('symbol', 'bids', 'asks', 'last_transaction', 'exchange_ts')
+
+  def __init__ (self, symbol, bids, asks, last_transaction, exchange_ts):
+    self.uniq = next_uniq()
+    self.symbol = symbol
+    self.bids = bids
+    self.asks = asks
+    self.last_transaction = last_transaction
+    self.exchange_ts = exchange_ts
+
+
+class MarketDataDeltasMsg(TypedMessage):
+  # The levels of a book changed since the last update, for a subscription to deltas.
+  kind = MessageKind.MARKET_DATA
+  __slots__ = fields = ('symbol', 'bid_deltas', 'ask_deltas', 'last_transaction', 'exchange_ts')
+
+  def __init__ (self, symbol, bid_deltas, ask_deltas, last_transaction, exchange_ts):
+    self.uniq = next_uniq()
+    self.symbol = symbol
+    self.bid_deltas = bid_deltas
+    self.ask_deltas = ask_deltas
+    self.last_transaction = last_transaction
+    self.exchange_ts = exchange_ts
@@ -1,4 +1,5 @@
 from enum import Enum, unique
+import itertools
 
 @unique
 class MessageType(Enum):
@@ -6,12 +7,57 @@ class MessageType(Enum):
   WAKEUP = 2
 
   def __lt__(self, other):
-    return self.value < other.value 
+    return self.value < other.value
+
+
+@unique
+class MessageKind(str, Enum):
+  # The kinds of message understood by the ExchangeAgent and TradingAgent.  Each kind is also the
+  # string it has always been sent as in body['msg'], and compares and hashes equal to it, so a
+  # table keyed by MessageKind can be looked up with the body['msg'] of a message with a body dict.
+
+  # Requests to an exchange (the replies to queries are of the same kind).
+  WHEN_MKT_OPEN = "WHEN_MKT_OPEN"
+  WHEN_MKT_CLOSE = "WHEN_MKT_CLOSE"
+  QUERY_LAST_TRADE = "QUERY_LAST_TRADE"
+  QUERY_SPREAD = "QUERY_SPREAD"
+  QUERY_ORDER_STREAM = "QUERY_ORDER_STREAM"
+  QUERY_TRANSACTED_VOLUME = "QUERY_TRANSACTED_VOLUME"
+  MARKET_DATA_SUBSCRIPTION_REQUEST = "MARKET_DATA_SUBSCRIPTION_REQUEST"
+  MARKET_DATA_SUBSCRIPTION_CANCELLATION = "MARKET_DATA_SUBSCRIPTION_CANCELLATION"
+  LIMIT_ORDER = "LIMIT_ORDER"
+  MARKET_ORDER = "MARKET_ORDER"
+  CANCEL_ORDER = "CANCEL_ORDER"
+  MODIFY_ORDER = "MODIFY_ORDER"
+
+  # Notifications from an exchange.
+  MKT_CLOSED = "MKT_CLOSED"
+  FINAL_CLOSE = "FINAL_CLOSE"
+  ORDER_ACCEPTED = "ORDER_ACCEPTED"
+  ORDER_EXECUTED = "ORDER_EXECUTED"
+  ORDER_CANCELLED = "ORDER_CANCELLED"
+  ORDER_MODIFIED = "ORDER_MODIFIED"
+  FILLED = "FILLED"
+  NEW_SPLIT_MARKET_ORDER = "NEW_SPLIT_MARKET_ORDER"
+  MARKET_DATA = "MARKET_DATA"
+
+  # Print as the string, as body['msg'] always has.
+  __str__ = str.__str__
+  __format__ = str.__format__
+
+
+# Returns the uniq of the next message created (see Message.__init__).  The count is kept outside the
+# Message class, as assigning a class attribute for every message would invalidate the attribute
+# caches of every message class.
+next_uniq = itertools.count().__next__
 
 
 class Message:
 
-  uniq = 0
+  __slots__ = ('body', 'uniq')
+
+  # The MessageKind of a typed message (see TypedMessage), None for any other.
+  kind = None
 
   def __init__ (self, body = None):
     # The base Message class no longer holds envelope/header information,
@@ -29,8 +75,7 @@ class Message:
     # but guarantee uniqueness somehow, to make delivery of orders at the same
     # exact timestamp "random" instead of "arbitrary" (FIFO among tied times)
     # as it currently is.
-    self.uniq = Message.uniq
-    Message.uniq += 1
+    self.uniq = next_uniq()
 
     # The base Message class can no longer do any real error checking.
     # Subclasses are strongly encouraged to do so based on their body.
@@ -48,3 +93,70 @@ class Message:
   def __str__(self):
     # Make a printable representation of this message.
     return str(self.body)
+
+
+class TypedMessage(Message):
+  # A message of a single kind, whose body fields are slots of the message rather than entries of
+  # a body dict: subclasses set kind and fields (the names of the body fields, in the order they
+  # had in the body dict), and take the fields as arguments.  Handlers read them as attributes.
+  #
+  # For code written against body dicts, the message is its own body and answers the read-only
+  # dict API: msg.body['msg'] is the kind (as a plain string), msg.body['order'] the order field,
+  # and dict(msg.body), msg.body.get(...), 'order' in msg.body and str(msg) work as they did.
+  # As for Message, two messages never compare equal unless they are the same message.
+
+  __slots__ = ()
+
+  fields = ()
+
+  def __init__ (self):
+    self.uniq = next_uniq()
+
+  @property
+  def body(self):
+    return self
+
+  def __getitem__(self, key):
+    if key == 'msg': return self.kind.value
+    if key in self.fields: return getattr(self, key)
+    raise KeyError(key)
+
+  def get(self, key, default = None):
+    try: return self[key]
+    except KeyError: return default
+
+  def __contains__(self, key):
+    return key == 'msg' or key in self.fields
+
+  def keys(self):
+    return ['msg', *self.fields]
+
+  def __iter__(self):
+    return iter(self.keys())
+
+  def __len__(self):
+    return len(self.fields) + 1
+
+  def items(self):
+    return [(key, self[key]) for key in self.keys()]
+
+  def values(self):
+    return [self[key] for key in self.keys()]
+
+  def __str__(self):
+    return str(dict(self))
+
+
+class BodyFields:
+  # A message with a body dict as seen by the handlers of typed messages: its body entries read as
+  # attributes (msg.order for msg.body['order']), its kind is body['msg'], and msg.body is the
+  # body dict.  The entries are copied once, so that reading them costs no more than reading the
+  # fields of a typed message.
+
+  def __init__ (self, message):
+    self.__dict__.update(message.body)
+    self.body = message.body
+    self.kind = message.body.get('msg')
+
+  def __str__(self):
+    return str(self.body)
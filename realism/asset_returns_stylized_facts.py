@@ -16,6 +16,7 @@ p = str(Path(__file__).resolve().parents[1])  # directory one level up from this
 sys.path.append(p)
 from realism_utils import get_plot_colors
 from util.formatting.convert_order_stream import dir_path
+from util.LogFormat import isLogFile
 
 # Create cache folder if it does not exist
 try: os.mkdir("cache")
@@ -34,7 +35,7 @@ all_metrics = [MinutelyReturns, AggregationNormality, Autocorrelation, Volatilit
 
 def get_sims(sim_dir, my_metric, ohlcv_dict):
     sims = []
-    exchanges = [a for a in Path(sim_dir).rglob('*.bz2') if "exchange" in str(a).lower()]
+    exchanges = [a for a in Path(sim_dir).rglob('*') if isLogFile(a) and "exchange" in str(a).lower()]
 
     for exchange in exchanges:
         ohlcv = ohlcv_dict[exchange]
@@ -50,7 +51,7 @@ def get_ohlcvs(sim_dirs, recompute):
     print("Loading simulation data...")
     exchanges = []
     for sim_dir in sim_dirs:
-        exchanges += [a for a in Path(sim_dir).rglob('*.bz2') if "exchange" in str(a).lower()]
+        exchanges += [a for a in Path(sim_dir).rglob('*') if isLogFile(a) and "exchange" in str(a).lower()]
 
     pickled_ohclv = "cache/{}_ohclv.pickle".format("_".join(sim_dirs).replace("/", ""))
     if (not os.path.exists(pickled_ohclv)) or recompute:  # Pickled simulated metric not found in cache.
@@ -99,7 +100,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Processes historical data and simulated stream files and produce plots'
                                                  ' of stylized fact metrics for asset return distributions.')
     parser.add_argument('-s', '--simulated-data-dir', type=dir_path, action='append', required=True,
-                        help="Directory containing .bz2 output log files from ABIDES Exchange Agent. Note that the "
+                        help="Directory containing output log files from ABIDES Exchange Agent. Note that the "
                              "filenames MUST contain the word 'Exchange' in any case. One can add many simulated data "
                              "directories")
     parser.add_argument('-z', '--recompute', action="store_true", help="Rerun computations without caching.")
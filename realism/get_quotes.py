@@ -1,8 +1,13 @@
 import sys
 import pandas as pd
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # directory one level up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 def read_simulated_quotes (file):
-    df = pd.read_pickle(file, compression='bz2')
+    df = readLog(file)
     df['Timestamp'] = df.index
 
     # Keep only the last bid and last ask event at each timestamp.
@@ -1,6 +1,12 @@
 import argparse
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[2])  # directory two levels up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 num_levels = 50
 columns = [[f'ask_price_{level}', f'ask_size_{level}', f'bid_price_{level}', f'bid_size_{level}'] for level in range(1, num_levels+1)]
@@ -13,7 +19,7 @@ def process_data(abides_log_folder, stock, date):
     # Orderbook snapshots
     ob_df = pd.read_csv(csv_orderbooks_parent_folder + f'orderbook_{stock}_{date}.csv')
     ob_df.columns = columns
-    ob_df.index = pd.read_pickle(abides_log_folder + f'ORDERBOOK_{stock}_FREQ_ALL_{date.replace("-", "")}.bz2').index[1:]
+    ob_df.index = readLog(abides_log_folder + f'ORDERBOOK_{stock}_FREQ_ALL_{date.replace("-", "")}.bz2').index[1:]
 
     start_time = pd.Timestamp(date) + pd.to_timedelta('09:30:00')
     end_time = pd.Timestamp(date) + pd.to_timedelta('16:00:00')
@@ -21,7 +27,7 @@ def process_data(abides_log_folder, stock, date):
 
 
     # Transacted Orders
-    ea_df = pd.read_pickle(abides_log_folder + 'EXCHANGE_AGENT.bz2')
+    ea_df = readLog(abides_log_folder + 'EXCHANGE_AGENT.bz2')
     ea_df = ea_df.loc[ea_df.EventType == 'ORDER_EXECUTED']
 
     transacted_orders_df = pd.DataFrame(columns=['TIMESTAMP', 'ORDER_ID', 'PRICE', 'SIZE', 'BUY_SELL_FLAG'])
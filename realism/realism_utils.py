@@ -12,6 +12,7 @@ from matplotlib.cm import get_cmap
 import os
 import warnings
 from util.util import get_value_from_timestamp
+from util.LogFormat import readLog
 
 
 MID_PRICE_CUTOFF = 10000  # Price above which mid price is set as `NaN` and subsequently forgotten. WARNING: This
@@ -23,7 +24,7 @@ def get_trades(sim_file):
   
   # Code taken from `read_simulated_trades`
   try:
-    df = pd.read_pickle(sim_file, compression='bz2')
+    df = readLog(sim_file)
   except (OSError, EOFError):
       return None
   
@@ -116,8 +117,8 @@ def make_orderbook_for_analysis(stream_path, orderbook_path, num_levels=5, ignor
 
     """
 
-    stream_df = pd.read_pickle(stream_path)
-    orderbook_df = pd.read_pickle(orderbook_path)
+    stream_df = readLog(stream_path)
+    orderbook_df = readLog(orderbook_path)
 
     stream_processed = convert_stream_to_format(stream_df.reset_index(), fmt='plot-scripts')
     stream_processed = stream_processed.set_index('TIMESTAMP')
@@ -227,7 +228,7 @@ def get_execution_agent_vwap(experiment_name, agent_name, date, seed, pov, log_d
 
     """
     file_path = f'{log_dir}/{experiment_name}_yes_{seed}_{pov}_{date}/{agent_name}.bz2'
-    exec_df = pd.read_pickle(file_path)
+    exec_df = readLog(file_path)
 
     executed_orders = exec_df.loc[exec_df['EventType'] == 'ORDER_EXECUTED']
     executed_orders['PRICE'] = executed_orders['Event'].apply(lambda x: x['fill_price'])
@@ -0,0 +1,23 @@
+#!/bin/bash
+
+# Compares per-object background agents with population agents (see agent/PopulationAgent.py).
+# Runs the same seeded rmsc03 morning and sparse_zi_1000 day once with one agent object per trader
+# and once with --agent-populations, reporting the wall-clock time of each run.
+
+seed=1234
+TIMEFORMAT="wall clock: %R s"
+
+echo "=== rmsc03, per-object agents ==="
+time python -u abides.py -c rmsc03 -t ABM -d 20200603 --end-time 10:00:00 -s ${seed} \
+            -l benchmark_populations_rmsc03 | grep -A6 "Event Queue"
+
+echo "=== rmsc03, population agents ==="
+time python -u abides.py -c rmsc03 -t ABM -d 20200603 --end-time 10:00:00 -s ${seed} \
+            -l benchmark_populations_rmsc03_pop --agent-populations | grep -A6 "Event Queue"
+
+echo "=== sparse_zi_1000, per-object agents ==="
+time python -u abides.py -c sparse_zi_1000 -s 123456789 -l benchmark_populations_zi | grep -A8 "Event Queue"
+
+echo "=== sparse_zi_1000, population agents ==="
+time python -u abides.py -c sparse_zi_1000 -s 123456789 -l benchmark_populations_zi_pop \
+            --agent_populations | grep -A8 "Event Queue"
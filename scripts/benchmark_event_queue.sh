@@ -0,0 +1,18 @@
+#!/bin/bash
+
+# Compares Kernel event queue engines (messages per second) on the same seeded
+# simulations.  Both engines deliver events in the same order, so the mean ending
+# values printed for each pair of runs should be identical.
+
+rmsc03_seed=1234
+sparse_zi_seed=123456789
+
+for queue in priority heap; do
+  echo "=== rmsc03, event queue: ${queue} ==="
+  python -u abides.py -c rmsc03 -t ABM -d 20200603 --end-time 10:00:00 -s ${rmsc03_seed} \
+         -l benchmark_event_queue_rmsc03_${queue} --event-queue ${queue} | grep -A 10 "Event Queue elapsed"
+
+  echo "=== sparse_zi_1000, event queue: ${queue} ==="
+  python -u abides.py -c sparse_zi_1000 -s ${sparse_zi_seed} -l benchmark_event_queue_sparse_zi_1000_${queue} \
+         --event_queue ${queue} | grep -A 10 "Event Queue elapsed"
+done
@@ -0,0 +1,18 @@
+#!/bin/bash
+
+# Compares the log file formats (see util/LogFormat.py) on a full rmsc03 day.
+# Runs the same seeded simulation once per format, reporting the wall-clock
+# time of each run and the size of its log directory, then times writing and
+# reading every log of the bz2 run in each format.
+
+seed=123456789
+TIMEFORMAT="wall clock: %R s"
+
+for format in bz2 parquet parquet-lz4 feather; do
+  echo "=== rmsc03, log format: ${format} ==="
+  time python -u abides.py -c rmsc03 -t ABM -d 20200603 -s ${seed} \
+              -l benchmark_log_formats_${format} --log-format ${format} > /dev/null 2>&1
+  du -sh log/benchmark_log_formats_${format}
+done
+
+python -u cli/benchmark_log_formats.py log/benchmark_log_formats_bz2
@@ -0,0 +1,21 @@
+#!/bin/bash
+
+# Compares the market replay with one historical timestamp per wakeup (--max-lookahead 1)
+# against replaying ahead (the default), with and without latency between the agents.  The
+# exchange receives the same messages at the same times either way, so its logs should be
+# identical for each pair of runs; only the number of kernel events differs.
+#
+# Usage: ./scripts/benchmark_market_replay.sh <L3 orders file> <processed orders folder>
+
+seed=123456789
+orders_file=$1
+processed_folder=$2
+
+for latency in 0 1000000; do
+  for lookahead in 1 1000; do
+    echo "=== marketreplay, latency: ${latency} ns, max lookahead: ${lookahead} ==="
+    python -u abides.py -c marketreplay -t MSFT -d 20190604 -s ${seed} -f ${orders_file} \
+           --processed-orders-folder ${processed_folder} --latency ${latency} --max-lookahead ${lookahead} \
+           -l benchmark_market_replay_${latency}_${lookahead} | grep "Event Queue elapsed"
+  done
+done
@@ -0,0 +1,18 @@
+#!/bin/bash
+
+# Example script to run an ABIDES config over a space of parameter values in parallel.
+# Each -p gives a config option (without leading dashes) and its values; other arguments
+# (here -t, -d and --end-time) are passed to every simulation.  Results are collected in
+# log/${name}/results.parquet; rerunning the script skips the simulations already completed.
+
+name=rmsc03_sweep
+num_parallel=4
+
+python -u config/sweep.py \
+       -c rmsc03 \
+       --name ${name} \
+       -p fund-vol 1e-8 5e-8 1e-7 \
+       -p mm-pov 0.025 0.05 0.1 \
+       --seeds 1234 5678 \
+       --num_parallel ${num_parallel} \
+       -t ABM -d 20200603 --end-time 10:00:00
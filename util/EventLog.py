@@ -0,0 +1,140 @@
+# Columnar, append-only event log for agents.  Each agent records events (EventTime, EventType,
+# Event) during the simulation, and at termination the Kernel writes them to disk as a DataFrame
+# indexed by EventTime, with EventType and Event columns.
+#
+# Rather than one dict per event, the log keeps three growable columns:
+#
+#   - EventTime as integer nanoseconds in a numpy int64 array (NaT for events logged before the
+#     agent has a current time, e.g. AGENT_TYPE in the constructor),
+#   - EventType as an interned integer code in a numpy int32 array.  The codes are shared by all
+#     agents, so each event type string is stored once per process,
+#   - Event as a numpy object array, since events may be any Python object.
+#
+# At the end of the run, toDataFrame() returns exactly the DataFrame the original list-of-dicts log
+# produced.  Alternatively, the log can spill its rows during the simulation (see spill()) as
+# chunks written straight to the log file by a util.LogFormat.LogWriter, so the memory held by
+# long-running agents stays bounded, at the end of the run too.
+
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+
+NAT = np.iinfo(np.int64).min
+
+# Event values that can never change after they are logged, so they need not be copied.
+IMMUTABLE_TYPES = {str, int, float, bool, type(None), pd.Timestamp, pd.Timedelta,
+                   np.int64, np.int32, np.float64, np.bool_}
+
+
+def isImmutable(value):
+  t = type(value)
+  return t in IMMUTABLE_TYPES or (t is tuple and all(isImmutable(v) for v in value))
+
+
+def copyEvent(event):
+  # Returns a copy of event that later changes to the original object cannot alter.  Immutable
+  # values, and dicts or lists holding only immutable values (the vast majority of events), need
+  # at most a shallow copy.  Anything else is deep copied, as before.
+  if isImmutable(event): return event
+
+  t = type(event)
+  if t is dict and all(isImmutable(v) for v in event.values()): return dict(event)
+  if t is list and all(isImmutable(v) for v in event): return list(event)
+
+  return deepcopy(event)
+
+
+class EventLog:
+
+  # Interned event type names, shared by every EventLog in the process.
+  _type_codes = {}
+  _type_names = []
+
+  def __init__(self, capacity = 64):
+    self._times = np.empty(capacity, dtype=np.int64)
+    self._types = np.empty(capacity, dtype=np.int32)
+    self._events = np.empty(capacity, dtype=object)
+    self._size = 0
+
+    # Number of times rows have been spilled, and the total row count spilled.
+    self._spills = 0
+    self._spilled_rows = 0
+
+  def __len__(self):
+    return self._spilled_rows + self._size
+
+  def __bool__(self):
+    return len(self) > 0
+
+  def buffered(self):
+    # Number of rows currently held in memory.
+    return self._size
+
+  def spills(self):
+    # Number of times the log has been spilled to disk.
+    return self._spills
+
+  @classmethod
+  def typeCode(cls, eventType):
+    code = cls._type_codes.get(eventType)
+    if code is None:
+      code = cls._type_codes[eventType] = len(cls._type_names)
+      cls._type_names.append(eventType)
+    return code
+
+  def append(self, eventTime, eventType, event):
+    # Adds one event.  The caller is responsible for copying event if it may later change.
+    if self._size == len(self._times): self._grow()
+
+    i = self._size
+    if eventTime is None: self._times[i] = NAT
+    elif type(eventTime) is pd.Timestamp: self._times[i] = eventTime.value
+    else: self._times[i] = pd.Timestamp(eventTime).value
+
+    self._types[i] = self.typeCode(eventType)
+    self._events[i] = event
+    self._size += 1
+
+  def _grow(self):
+    capacity = 2 * len(self._times)
+    self._times = np.resize(self._times, capacity)
+    self._types = np.resize(self._types, capacity)
+
+    events = np.empty(capacity, dtype=object)
+    events[:self._size] = self._events[:self._size]
+    self._events = events
+
+  def spill(self, writer):
+    # Writes the rows currently held in memory as the next chunk of writer (a
+    # util.LogFormat.LogWriter, which must pickle the Event column) and empties the buffers.
+    if not self._size: return
+
+    writer.write(self._frame(self._times[:self._size], self._types[:self._size], self._events[:self._size],
+                             datetime_index=True))
+
+    self._spills += 1
+    self._spilled_rows += self._size
+
+    capacity = len(self._times)
+    self._times = np.empty(capacity, dtype=np.int64)
+    self._types = np.empty(capacity, dtype=np.int32)
+    self._events = np.empty(capacity, dtype=object)
+    self._size = 0
+
+  def toDataFrame(self):
+    # Returns the log as a DataFrame indexed by EventTime, with EventType and Event columns.  Rows
+    # already spilled are in the spill writer's file, so only those since the last spill are here.
+    return self._frame(self._times[:self._size], self._types[:self._size], self._events[:self._size])
+
+  def _frame(self, times, types, events, datetime_index=False):
+    if (times == NAT).all() and not datetime_index:
+      # With no valid times at all, the original log had an object index of None values.  The
+      # chunks of a spilled log always have a DatetimeIndex, so that every chunk has the same type.
+      index = pd.Index([None] * len(times), dtype=object, name='EventTime')
+    else:
+      index = pd.DatetimeIndex(times.view('datetime64[ns]'), name='EventTime')
+
+    type_names = np.array(self._type_names, dtype=object)
+
+    return pd.DataFrame({'EventType': type_names[types], 'Event': list(events)}, index=index)
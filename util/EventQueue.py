@@ -0,0 +1,80 @@
+# Event queue implementations for the simulation Kernel.  Each queue holds
+# items of the form (deliverAt, (recipient, msg_type, msg)), where deliverAt
+# is the delivery time in integer nanoseconds since the epoch.  The Kernel
+# converts back to pd.Timestamp only when handing the current time to an agent.
+#
+# All queues must dequeue items in exactly the order the original
+# queue.PriorityQueue of tuples did: by delivery time, then by recipient
+# agent id, then by message type (MESSAGE before WAKEUP), then by message
+# creation order (Message.uniq).  This keeps simulations bit-identical for a
+# given seed regardless of which queue is selected.
+
+import heapq
+import queue
+
+
+class PriorityEventQueue:
+
+  # The thread-safe queue.PriorityQueue the Kernel has always used.  The tuples
+  # themselves are compared, so ties fall through to the Message.__lt__ method.
+  def __init__(self):
+    self._queue = queue.PriorityQueue()
+
+  def put(self, item):
+    self._queue.put(item)
+
+  def get(self):
+    return self._queue.get()
+
+  def empty(self):
+    return self._queue.empty()
+
+  def peekTime(self):
+    # Delivery time of the next item, without removing it (None if empty).
+    with self._queue.mutex:
+      return self._queue.queue[0][0] if self._queue.queue else None
+
+  def qsize(self):
+    return self._queue.qsize()
+
+
+class HeapEventQueue:
+
+  # A plain (not thread-safe) binary heap on flat tuples of integers.  The
+  # tiebreak fields are extracted once at insertion time, so heap sifting only
+  # ever compares ints and never calls back into Python-level __lt__ methods.
+  # The final sequence number guarantees a total order, so the payload itself
+  # is never compared.
+  def __init__(self):
+    self._heap = []
+    self._seq = 0
+
+  def put(self, item):
+    deliverAt, (recipient, msg_type, msg) = item
+
+    # Wakeups carry no message, and two wakeups for the same agent at the same
+    # time are indistinguishable, so any stable value will do for uniq.
+    uniq = msg.uniq if msg is not None else -1
+
+    heapq.heappush(self._heap, (deliverAt, recipient, msg_type.value, uniq, self._seq, msg_type, msg))
+    self._seq += 1
+
+  def get(self):
+    deliverAt, recipient, _, _, _, msg_type, msg = heapq.heappop(self._heap)
+    return deliverAt, (recipient, msg_type, msg)
+
+  def empty(self):
+    return not self._heap
+
+  def peekTime(self):
+    return self._heap[0][0] if self._heap else None
+
+  def qsize(self):
+    return len(self._heap)
+
+
+# Available event queue engines, selectable via Kernel(event_queue=...).
+EVENT_QUEUES = {
+  'priority': PriorityEventQueue,
+  'heap': HeapEventQueue,
+}
@@ -0,0 +1,247 @@
+import contextlib
+import importlib
+import os
+import pickle
+import sys
+import time
+import traceback
+from collections import namedtuple
+from multiprocessing import connection, get_context
+
+import numpy as np
+
+from util.LogFormat import readLog
+
+# Runs many simulations of a config in parallel, in-process, returning each run's Kernel
+# custom_state and summary log to the caller.
+#
+# Each run executes the config module exactly as abides.py does (with the run's log directory,
+# seed and config arguments on sys.argv), in a child process forked from this one.  Modules
+# imported here before the runs start, and anything loaded by the preload callable (e.g.
+# historical data read into a module-level cache), are therefore shared by every run without
+# being imported or loaded again.  As every run gets a fresh fork, module state changed by one
+# run (the global numpy seed, class-level settings such as LimitOrder.silent_mode, ...) never
+# leaks into the next, and each run gives the same result as running its config with abides.py.
+#
+# At most num_parallel runs execute at once.  A run that raises, crashes its process or exceeds
+# the per-run timeout is reported as failed, without affecting the other runs.  The result of a
+# completed run is stored in its log directory (see RESULT_FILE), so an interrupted set of runs
+# can be resumed, skipping the runs that completed.
+
+# A simulation to run: config name (as for abides.py -c), log directory, seed and any further
+# config arguments.
+Run = namedtuple('Run', ['config', 'log_dir', 'seed', 'args'], defaults=[()])
+
+# Name of the file in a run's log directory holding its result.
+RESULT_FILE = 'run_result.pkl'
+
+# Name of the file in a run's log directory capturing its standard output.
+OUTPUT_FILE = 'simulation.out'
+
+# Modules imported before any run starts, unless the caller gives its own list.
+PRELOAD_MODULES = ['numpy', 'pandas', 'scipy.spatial', 'Kernel', 'agent.ExchangeAgent', 'agent.TradingAgent',
+                   'util.OrderBook', 'util.IndexedOrderBook', 'util.oracle.SparseMeanRevertingOracle',
+                   'util.oracle.MeanRevertingOracle', 'model.LatencyModel']
+
+
+def generateSeeds(seed, num_runs):
+  # Per-run seeds derived from one global seed, as config/parallel.py always drew them.
+  return np.random.RandomState(seed).randint(0, 2 ** 32, num_runs)
+
+
+def normalRun(run):
+  # The run with its seed and arguments in a canonical form, so that equal runs compare equal.
+  return run._replace(seed=int(run.seed), args=tuple(str(a) for a in run.args))
+
+
+def runPath(log_dir):
+  # The directory the Kernel writes a run's logs to.
+  return os.path.join(".", "log", log_dir)
+
+
+def loadResult(log_dir):
+  # The stored result of a completed run, or None.
+  path = os.path.join(runPath(log_dir), RESULT_FILE)
+  if not os.path.exists(path): return None
+
+  with open(path, 'rb') as f:
+    return pickle.load(f)
+
+
+def runConfig(config, log_dir, seed, args=()):
+  # Runs a config in this process, as abides.py would, and returns the custom_state returned by
+  # its (last) Kernel.runner() call and the Kernel, or (None, None) if it never ran a kernel.
+  from Kernel import Kernel
+
+  kernels = []
+  runner = Kernel.runner
+
+  def recordingRunner(kernel, *runner_args, **runner_kwargs):
+    custom_state = runner(kernel, *runner_args, **runner_kwargs)
+    kernels.append((custom_state, kernel))
+    return custom_state
+
+  sys.argv = ['abides.py', '-c', config, '-l', log_dir, '-s', str(seed)] + [str(a) for a in args]
+
+  Kernel.runner = recordingRunner
+  try:
+    importlib.import_module('config.{}'.format(config))
+  finally:
+    Kernel.runner = runner
+
+  return kernels[-1] if kernels else (None, None)
+
+
+def _runChild(run, conn):
+  # Child process: runs one simulation and sends its result to the parent.
+  result = {'run': run, 'status': 'failed', 'custom_state': None, 'summary': None, 'error': None,
+            'elapsed': None}
+  start = time.perf_counter()
+
+  path = runPath(run.log_dir)
+  os.makedirs(path, exist_ok=True)
+
+  try:
+    with open(os.path.join(path, OUTPUT_FILE), 'w') as out, contextlib.redirect_stdout(out):
+      custom_state, kernel = runConfig(run.config, run.log_dir, run.seed, run.args)
+
+    if kernel is None: raise RuntimeError("Config {} did not run a kernel".format(run.config))
+
+    result['custom_state'] = custom_state
+    result['summary'] = readLog(os.path.join(runPath(kernel.log_dir), 'summary_log'))
+    result['status'] = 'ok'
+  except BaseException:
+    # Including SystemExit, e.g. a config printing its help.
+    result['error'] = traceback.format_exc()
+
+  result['elapsed'] = time.perf_counter() - start
+
+  try:
+    payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+  except Exception:
+    result.update(status='failed', custom_state=None, summary=None,
+                  error="Result could not be pickled:\n" + traceback.format_exc())
+    payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+  if result['status'] == 'ok':
+    # Written atomically, so a run interrupted here is simply run again on resume.
+    tmp_path = os.path.join(path, RESULT_FILE + '.tmp')
+    with open(tmp_path, 'wb') as f:
+      f.write(payload)
+    os.replace(tmp_path, os.path.join(path, RESULT_FILE))
+
+  conn.send_bytes(payload)
+  conn.close()
+
+
+class ExperimentRunner:
+
+  def __init__(self, num_parallel=None, timeout=None, resume=True, preload_modules=None, preload=None):
+    # num_parallel: maximum number of simulations running at once (default: one per CPU).
+    # timeout: seconds after which a run is stopped and reported as failed (default: none).
+    # resume: return the stored result of runs that already completed instead of running them.
+    # preload_modules: modules to import before forking (default: PRELOAD_MODULES).
+    # preload: callable run once before the first run is forked, e.g. to load shared data.
+    self.num_parallel = num_parallel or os.cpu_count()
+    self.timeout = timeout
+    self.resume = resume
+    self.preload_modules = PRELOAD_MODULES if preload_modules is None else preload_modules
+    self.preload = preload
+
+    self.context = get_context('fork')
+    self.preloaded = False
+
+  def warmUp(self):
+    # Imports and loads everything to be shared with the runs.  Called before the first run.
+    if self.preloaded: return
+
+    for module in self.preload_modules:
+      importlib.import_module(module)
+
+    if self.preload is not None: self.preload()
+
+    self.preloaded = True
+
+  def iterResults(self, runs):
+    # Runs the given Runs, yielding the result of each as it completes (not in the order given).
+    # A result is a dict with keys run, status ('ok', 'failed', 'timeout' or 'cached'),
+    # custom_state, summary (the summary log DataFrame), error (a traceback) and elapsed (s).
+    self.warmUp()
+
+    queue = []
+    for run in map(normalRun, runs):
+      cached = loadResult(run.log_dir) if self.resume else None
+      if cached is not None and cached['run'] == run:
+        cached['status'] = 'cached'
+        yield cached
+      else:
+        queue.append(run)
+
+    queue.reverse()
+    running = {}  # connection -> (process, run, start time)
+
+    try:
+      while queue or running:
+        while queue and len(running) < self.num_parallel:
+          run = queue.pop()
+
+          reader, writer = self.context.Pipe(duplex=False)
+
+          # Flush first, or the child inherits (and prints again) anything still buffered.
+          sys.stdout.flush()
+          sys.stderr.flush()
+
+          process = self.context.Process(target=_runChild, args=(run, writer), daemon=True)
+          process.start()
+          writer.close()
+
+          running[reader] = (process, run, time.perf_counter())
+
+        wait_for = None
+        if self.timeout is not None:
+          oldest = min(start for process, run, start in running.values())
+          wait_for = max(0, oldest + self.timeout - time.perf_counter())
+
+        for reader in connection.wait(list(running), timeout=wait_for):
+          process, run, start = running.pop(reader)
+
+          try:
+            result = pickle.loads(reader.recv_bytes())
+          except EOFError:
+            # The process ended without sending a result.
+            process.join()
+            result = self.failure(run, 'failed', start,
+                                  "Process exited with code {}".format(process.exitcode))
+
+          reader.close()
+          process.join()
+          yield result
+
+        if self.timeout is not None:
+          now = time.perf_counter()
+          for reader, (process, run, start) in list(running.items()):
+            if now - start < self.timeout: continue
+
+            process.kill()
+            process.join()
+            reader.close()
+            del running[reader]
+
+            yield self.failure(run, 'timeout', start, "Run exceeded timeout of {} s".format(self.timeout))
+    finally:
+      # If the caller stops early (or is interrupted), stop any runs still in progress.
+      for reader, (process, run, start) in running.items():
+        process.kill()
+        process.join()
+        reader.close()
+
+  def runAll(self, runs):
+    # Runs the given Runs, returning their results in the order given.
+    runs = [normalRun(run) for run in runs]
+    results = {result['run']: result for result in self.iterResults(runs)}
+    return [results[run] for run in runs]
+
+  @staticmethod
+  def failure(run, status, start, error):
+    return {'run': run, 'status': status, 'custom_state': None, 'summary': None, 'error': error,
+            'elapsed': time.perf_counter() - start}
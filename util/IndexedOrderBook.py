@@ -0,0 +1,169 @@
+# Price-indexed order book for one symbol.  Same matching rules, notifications, history and
+# logging as util.OrderBook (which it extends), but with a different underlying book structure:
+#
+#   - Each side keeps a sorted list of its price levels, with the best price at the END of the
+#     list, so the best level is found in O(1) and new levels are placed by binary search.
+#   - Each price level is an insertion-ordered dict of resting orders (oldest first), keyed by
+#     a per-book entry number, so orders can be removed from anywhere in the queue in O(1).
+#   - An order_id -> entry numbers index lets cancelOrder and modifyOrder go straight to the
+#     resting order instead of scanning every level and every order.
+#   - A price -> total shares resting at that price dict per side (in place of the base class's
+#     bid_volumes and ask_volumes) means depth queries never add up individual orders.
+#
+# The list-of-lists self.bids and self.asks of the base class (and their volumes) are NOT maintained.  Use
+# getInsideBids() and getInsideAsks() to inspect the book.
+from util.OrderBook import OrderBook
+
+from bisect import bisect_left, insort
+import sys
+
+
+class IndexedOrderBook(OrderBook):
+
+    def __init__(self, owner, symbol):
+        super().__init__(owner, symbol)
+        self.bids = None
+        self.asks = None
+        self.bid_volumes = None
+        self.ask_volumes = None
+
+        # Sorted price keys per side, best price last.  Bid keys are the prices themselves;
+        # ask keys are the negated prices, so that the lowest ask is the largest key.
+        self._bid_keys = []
+        self._ask_keys = []
+
+        # Price -> level dict (entry number -> LimitOrder, oldest first) per side.
+        self._bid_levels = {}
+        self._ask_levels = {}
+
+        # Price -> total shares resting at that price, per side.
+        self._bid_volumes = {}
+        self._ask_volumes = {}
+
+        # Order id -> list of entry numbers of resting orders with that id.  Order ids are
+        # nearly always unique, but nothing in the simulator enforces it, so duplicates must
+        # behave as they do in the base OrderBook (oldest matching order first).
+        self._entries = {}
+        self._next_entry = 0
+
+    def _side(self, is_buy_side):
+        if is_buy_side:
+            return self._bid_keys, self._bid_levels
+        return self._ask_keys, self._ask_levels
+
+    def _volumes(self, is_buy_side):
+        return self._bid_volumes if is_buy_side else self._ask_volumes
+
+    def _removeLevel(self, is_buy_side, price):
+        keys, levels = self._side(is_buy_side)
+        del levels[price]
+        del self._volumes(is_buy_side)[price]
+
+        key = price if is_buy_side else -price
+        if keys[-1] == key:
+            keys.pop()
+        else:
+            del keys[bisect_left(keys, key)]
+
+    def _unindex(self, order_id, entry):
+        entries = self._entries[order_id]
+        if len(entries) == 1:
+            del self._entries[order_id]
+        else:
+            entries.remove(entry)
+
+    def _findEntry(self, order):
+        # Returns (level, entry) for the oldest resting order with the same side, price and
+        # order id as order, or (None, None).
+        entries = self._entries.get(order.order_id)
+        if not entries: return None, None
+
+        level = self._side(order.is_buy_order)[1].get(order.limit_price)
+        if level is None: return None, None
+
+        for entry in entries:
+            if entry in level: return level, entry
+
+        return None, None
+
+    def hasOrders(self, is_buy_side):
+        return bool(self._side(is_buy_side)[0])
+
+    def peekBestOrder(self, is_buy_side):
+        keys, levels = self._side(is_buy_side)
+        if not keys: return None
+
+        price = keys[-1] if is_buy_side else -keys[-1]
+        return next(iter(levels[price].values()))
+
+    def popBestOrder(self, is_buy_side):
+        keys, levels = self._side(is_buy_side)
+        price = keys[-1] if is_buy_side else -keys[-1]
+        level = levels[price]
+
+        entry = next(iter(level))
+        order = level.pop(entry)
+        self._unindex(order.order_id, entry)
+        self._volumes(is_buy_side)[price] -= order.quantity
+
+        # If the best price now has no orders, remove it completely.
+        if not level:
+            self._removeLevel(is_buy_side, price)
+
+        return order
+
+    def reduceBestOrder(self, is_buy_side, quantity):
+        keys, levels = self._side(is_buy_side)
+        price = keys[-1] if is_buy_side else -keys[-1]
+
+        next(iter(levels[price].values())).quantity -= quantity
+        self._volumes(is_buy_side)[price] -= quantity
+
+    def enterOrder(self, order):
+        keys, levels = self._side(order.is_buy_order)
+        price = order.limit_price
+
+        volumes = self._volumes(order.is_buy_order)
+
+        level = levels.get(price)
+        if level is None:
+            level = levels[price] = {}
+            volumes[price] = 0
+            insort(keys, price if order.is_buy_order else -price)
+
+        entry = self._next_entry
+        self._next_entry += 1
+
+        level[entry] = order
+        volumes[price] += order.quantity
+        self._entries.setdefault(order.order_id, []).append(entry)
+
+    def removeOrder(self, order):
+        level, entry = self._findEntry(order)
+        if level is None: return None
+
+        removed_order = level.pop(entry)
+        self._unindex(order.order_id, entry)
+        self._volumes(order.is_buy_order)[order.limit_price] -= removed_order.quantity
+
+        # If the price now has no orders, remove it completely.
+        if not level:
+            self._removeLevel(order.is_buy_order, order.limit_price)
+
+        return removed_order
+
+    def replaceOrder(self, order, new_order):
+        level, entry = self._findEntry(order)
+        if level is None: return False
+
+        self._volumes(order.is_buy_order)[order.limit_price] += new_order.quantity - level[entry].quantity
+        level[entry] = new_order
+        return True
+
+    def getInsideBids(self, depth=sys.maxsize):
+        keys, volumes = self._bid_keys, self._bid_volumes
+        return [(keys[-i], volumes[keys[-i]]) for i in range(1, min(depth, len(keys)) + 1)]
+
+    def getInsideAsks(self, depth=sys.maxsize):
+        keys, volumes = self._ask_keys, self._ask_volumes
+        return [(-keys[-i], volumes[-keys[-i]]) for i in range(1, min(depth, len(keys)) + 1)]
@@ -0,0 +1,194 @@
+# Binary columnar store of historical L3 orders (every new order, modification and cancellation
+# of a day), replayed into the simulation by the MarketReplayAgent.
+#
+# A store is a directory of numpy .npy columns, one row per historical order message, sorted by
+# time (stably, so messages at the same time keep their order in the source file):
+#
+#   timestamp  int64  ns since the epoch
+#   order_id   int64
+#   price      int64  cents
+#   size       int64  shares (0 for a cancellation)
+#   side       int8   0 for buy, 1 for sell
+#
+# together with the distinct timestamps (times) and the row at which the orders of each begin
+# (offsets, one longer than times, ending with the number of rows).  Columns are memory-mapped
+# when a store is opened, so opening one takes the same time whatever the size of the day, and
+# only the pages of the orders actually replayed are ever read.
+#
+# convertL3Orders() builds a store from a pipe-delimited L3 orders file, once, reading it in
+# chunks with vectorized parsing.  L3ReplayStore opens a store (optionally for a window of time),
+# and its cursor() steps through the window one timestamp at a time, in time order.
+#
+# Usage: python util/L3ReplayStore.py <orders file> <store directory>
+
+import argparse
+import os
+import shutil
+import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+sys.path.append(p)
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['timestamp', 'order_id', 'price', 'size', 'side']
+DTYPES = {'timestamp': np.int64, 'order_id': np.int64, 'price': np.int64, 'size': np.int64, 'side': np.int8}
+
+# Columns of the source file used for each store column.
+SOURCE_COLUMNS = {'timestamp': 'TIMESTAMP', 'order_id': 'ORDER_ID', 'price': 'PRICE', 'size': 'SIZE',
+                  'side': 'BUY_SELL_FLAG'}
+
+# Rows of the source file parsed at a time.
+CHUNK_SIZE = 10**6
+
+
+def parseTimestamps(timestamps):
+  # Source timestamps (YYYYmmddHHMMSS.fffffffff, as strings) to int64 ns.  Like the
+  # datetime.strptime('%Y%m%d%H%M%S.%f') parsing the replay has always used, only the first six
+  # digits of the fraction (microseconds) are kept.
+  timestamps = pd.Series(timestamps, dtype=str)
+  seconds = pd.to_datetime(timestamps.str[:14], format='%Y%m%d%H%M%S').values.astype(np.int64)
+  micros = timestamps.str[15:21].str.ljust(6, '0').astype(np.int64).values
+  return seconds + micros * 1000
+
+
+def parseL3Orders(chunk):
+  # The store columns of a chunk of the source file (as strings).
+  return {'timestamp': parseTimestamps(chunk['TIMESTAMP']),
+          'order_id': chunk['ORDER_ID'].astype(np.int64).values,
+          'price': (chunk['PRICE'].astype(float) * 100).astype(np.int64).values,
+          'size': chunk['SIZE'].astype(np.int64).values,
+          'side': chunk['BUY_SELL_FLAG'].astype(np.int8).values}
+
+
+def convertL3Orders(orders_file_path, store_path, chunk_size=CHUNK_SIZE):
+  # Converts a pipe-delimited L3 orders file (a header line, then a line that is skipped, then
+  # one order message per line) into a store at store_path.  The store is built in a temporary
+  # directory and moved into place once complete, so an interrupted conversion leaves nothing
+  # behind that could be mistaken for a store.  Returns the number of orders.
+  partial_path = '{}.{}.partial'.format(store_path.rstrip(os.sep), os.getpid())
+  os.makedirs(partial_path)
+
+  try:
+    # Parse the file a chunk at a time, appending each column to a raw binary file.
+    raw = {c: open(os.path.join(partial_path, c + '.bin'), 'wb') for c in COLUMNS}
+    rows = 0
+
+    reader = pd.read_csv(orders_file_path, sep='|', usecols=list(SOURCE_COLUMNS.values()), dtype=str,
+                         skiprows=[1], chunksize=chunk_size)
+    for chunk in reader:
+      for c, values in parseL3Orders(chunk).items():
+        raw[c].write(np.ascontiguousarray(values, dtype=DTYPES[c]).tobytes())
+      rows += len(chunk)
+
+    for f in raw.values(): f.close()
+
+    # Sort by time, stably, if the file is not in time order already.
+    timestamps = np.fromfile(os.path.join(partial_path, 'timestamp.bin'), dtype=np.int64)
+    order = None if np.all(timestamps[1:] >= timestamps[:-1]) else np.argsort(timestamps, kind='stable')
+    if order is not None: timestamps = timestamps[order]
+
+    for c in COLUMNS:
+      bin_path = os.path.join(partial_path, c + '.bin')
+      values = np.memmap(bin_path, dtype=DTYPES[c], mode='r') if rows else np.empty(0, dtype=DTYPES[c])
+      column = np.lib.format.open_memmap(os.path.join(partial_path, c + '.npy'), mode='w+', dtype=DTYPES[c],
+                                         shape=(rows,))
+      column[:] = values if order is None else values[order]
+      column.flush()
+      del column, values
+      os.remove(bin_path)
+
+    # The distinct timestamps, and the row at which the orders of each begin.
+    starts = np.flatnonzero(np.diff(timestamps, prepend=timestamps[:1] - 1)) if rows else np.empty(0, dtype=np.int64)
+    np.save(os.path.join(partial_path, 'times.npy'), timestamps[starts])
+    np.save(os.path.join(partial_path, 'offsets.npy'), np.append(starts, rows).astype(np.int64))
+
+    os.replace(partial_path, store_path)
+  except BaseException:
+    shutil.rmtree(partial_path, ignore_errors=True)
+    raise
+
+  return rows
+
+
+def isL3ReplayStore(path):
+  return os.path.isfile(os.path.join(path, 'offsets.npy'))
+
+
+class L3ReplayStore:
+
+  def __init__(self, path, start_time=None, end_time=None):
+    # Opens the store at path, memory-mapping its columns.  Only the orders at times in
+    # [start_time, end_time) are replayed (by default, all of them).  The maps are held as plain
+    # ndarray views, since slicing an np.memmap costs far more than the few orders in a slice.
+    self.path = path
+    load = lambda name: np.asarray(np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+    self.columns = {c: load(c) for c in COLUMNS}
+    self.times = load('times')
+    self.offsets = load('offsets')
+
+    # The window of distinct times to replay, as indices into times.
+    self.first = 0 if start_time is None else int(self.times.searchsorted(pd.Timestamp(start_time).value))
+    self.last = len(self.times) if end_time is None else int(self.times.searchsorted(pd.Timestamp(end_time).value))
+
+  def __len__(self):
+    # Number of orders in the window.
+    return int(self.offsets[self.last] - self.offsets[self.first])
+
+  def numTimes(self):
+    # Number of distinct times in the window.
+    return self.last - self.first
+
+  def firstTime(self):
+    # The first time in the window, in ns (None if there are no orders in it).
+    return int(self.times[self.first]) if self.last > self.first else None
+
+  def batch(self, i):
+    # The orders at distinct time i, as (order_id, price, size, side) arrays.
+    start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+    return tuple(self.columns[c][start:end] for c in COLUMNS[1:])
+
+  def ordersAt(self, time):
+    # The orders at a time in the window (ns or pd.Timestamp), as (order_id, price, size, side)
+    # arrays, empty if there are none.
+    t = time.value if isinstance(time, pd.Timestamp) else int(time)
+    i = int(self.times.searchsorted(t))
+    if i < self.first or i >= self.last or self.times[i] != t:
+      return tuple(self.columns[c][:0] for c in COLUMNS[1:])
+    return self.batch(i)
+
+  def cursor(self):
+    return L3ReplayCursor(self)
+
+
+class L3ReplayCursor:
+
+  # Steps through the distinct times of a store's window in time order.
+
+  def __init__(self, store):
+    self.store = store
+    self.next = store.first
+
+  def peekTime(self):
+    # The next time, in ns, or None once the window is exhausted.
+    return int(self.store.times[self.next]) if self.next < self.store.last else None
+
+  def nextBatch(self):
+    # The next time (ns) and its orders, as (time, order_id, price, size, side), moving past them.
+    # Raises IndexError once the window is exhausted.
+    if self.next >= self.store.last: raise IndexError("L3 replay cursor exhausted")
+    i = self.next
+    self.next += 1
+    return (int(self.store.times[i]),) + self.store.batch(i)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Converts a pipe-delimited L3 orders file into an L3 replay store.')
+  parser.add_argument('orders_file', help='L3 orders file')
+  parser.add_argument('store', help='Directory of the store to create')
+  parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows of the orders file parsed at a time')
+  args = parser.parse_args()
+
+  rows = convertL3Orders(args.orders_file, args.store, chunk_size=args.chunk_size)
+  print("{} orders written to {}".format(rows, args.store))
@@ -0,0 +1,312 @@
+# File formats for the logs written by the Kernel (agent logs and the summary log).  The format is
+# selected with the Kernel's log_format parameter, from LOG_FORMATS:
+#
+#   - 'bz2': a bz2-compressed pickle of the DataFrame, as ABIDES has always written (the default),
+#   - 'parquet': Apache Parquet with zstd compression,
+#   - 'parquet-lz4': Apache Parquet with lz4 compression (faster to write, somewhat larger),
+#   - 'feather': Arrow IPC (Feather v2) with lz4 compression (fastest to read and write).
+#
+# The Parquet and Feather formats need pyarrow, which is only imported when they are used.  They
+# can be read column by column (e.g. only EventType) and by tools outside Python.
+#
+# Arrow columns must have a single type, which the logs do not always have, so two kinds of column
+# are stored specially.  The details are kept in the file's schema metadata, and readLog() undoes
+# them, so it returns exactly the DataFrame that was written:
+#
+#   - Object columns holding anything other than strings (e.g. the Event column, which may hold
+#     dicts, numbers and strings) are stored with each value pickled to bytes.
+#   - Sparse DataFrames (the order book logs) are stored as one row per index entry holding a list
+#     of (column position, value) pairs for the values that differ from the fill value.  Storing them
+#     densely would take (rows x price levels) memory when writing.
+#
+# The Parquet and Feather formats can also be written in chunks through a LogWriter (openWriter()),
+# each chunk becoming a Parquet row group or an Arrow record batch of the same file, so a log can be
+# written as it grows without ever being held in memory whole.  The bz2 pickle cannot be appended
+# to, so it can only be written whole.
+#
+# readLog() detects the format from the file contents, so tools can read logs written in any
+# format.  Given a file name that does not exist, it looks for the same log under the extension of
+# each format, so that tools which build log paths such as EXCHANGE_AGENT.bz2 keep working.
+
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# Key under which the details of specially stored columns are kept in the schema metadata.
+METADATA_KEY = b'abides'
+
+
+class PickleLogFormat:
+
+  extension = '.bz2'
+  streaming = False
+
+  def write(self, dfLog, path):
+    dfLog.to_pickle(path, compression='bz2')
+
+  def read(self, path, columns=None):
+    dfLog = pd.read_pickle(path, compression='bz2')
+    return dfLog if columns is None else dfLog[columns]
+
+
+class ArrowLogFormat:
+
+  # Base class for the formats written through pyarrow.
+
+  streaming = True
+
+  def openWriter(self, path, pickled=()):
+    return LogWriter(self, path, pickled)
+
+  def write(self, dfLog, path):
+    self.writeTable(toArrow(dfLog), path)
+
+  def read(self, path, columns=None):
+    if columns is None: return fromArrow(self.readTable(path))
+
+    # Read only the requested columns, plus those holding the index.  A sparse log is a single
+    # column of entries, so it is always read whole.
+    schema = self.readSchema(path)
+    if 'sparse' in readMetadata(schema): return fromArrow(self.readTable(path))[columns]
+
+    index_columns = [c for c in schema.pandas_metadata['index_columns'] if isinstance(c, str)]
+    return fromArrow(self.readTable(path, [str(c) for c in columns] + index_columns))[columns]
+
+
+class ParquetLogFormat(ArrowLogFormat):
+
+  extension = '.parquet'
+
+  def __init__(self, compression = 'zstd'):
+    self.compression = compression
+
+  def writeTable(self, table, path):
+    import pyarrow.parquet as pq
+    pq.write_table(table, path, compression=self.compression)
+
+  def openTableWriter(self, path, schema):
+    import pyarrow.parquet as pq
+    return pq.ParquetWriter(path, schema, compression=self.compression)
+
+  def readTable(self, path, columns=None):
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns=columns)
+
+  def readSchema(self, path):
+    import pyarrow.parquet as pq
+    return pq.read_schema(path)
+
+
+class FeatherLogFormat(ArrowLogFormat):
+
+  extension = '.feather'
+
+  def __init__(self, compression = 'lz4'):
+    self.compression = compression
+
+  def writeTable(self, table, path):
+    import pyarrow.feather as feather
+    feather.write_feather(table, path, compression=self.compression)
+
+  def openTableWriter(self, path, schema):
+    import pyarrow as pa
+    return pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression=self.compression))
+
+  def readTable(self, path, columns=None):
+    import pyarrow.feather as feather
+    return feather.read_table(path, columns=columns)
+
+  def readSchema(self, path):
+    import pyarrow as pa
+    return pa.ipc.open_file(path).schema
+
+
+class LogWriter:
+
+  # Writes a log to one file in chunks: DataFrames with the same columns, index and column types,
+  # in order.  Reading the file returns their concatenation.  Object columns that may hold anything
+  # other than strings must be named in pickled, as their type cannot be told from the first chunk.
+
+  def __init__(self, log_format, path, pickled=()):
+    self.log_format = log_format
+    self.path = path
+    self.pickled = list(pickled)
+    self.writer = None
+
+  def write(self, dfLog):
+    table = toArrow(dfLog, self.pickled)
+    if self.writer is None: self.writer = self.log_format.openTableWriter(self.path, table.schema)
+    self.writer.write_table(table)
+
+  def close(self):
+    if self.writer is not None: self.writer.close()
+    self.writer = None
+
+
+LOG_FORMATS = {
+  'bz2': PickleLogFormat(),
+  'parquet': ParquetLogFormat('zstd'),
+  'parquet-lz4': ParquetLogFormat('lz4'),
+  'feather': FeatherLogFormat('lz4'),
+}
+
+# Leading bytes of a file in each format.  Anything else is passed to pd.read_pickle.
+MAGIC_NUMBERS = [
+  (b'BZh', LOG_FORMATS['bz2']),
+  (b'PAR1', LOG_FORMATS['parquet']),
+  (b'ARROW1', LOG_FORMATS['feather']),
+]
+
+LOG_EXTENSIONS = sorted({f.extension for f in LOG_FORMATS.values()})
+
+
+def checkLogFormat(log_format):
+  # Raises a ValueError for an unknown format, or an ImportError if the format needs pyarrow and it
+  # is not installed, so that a bad choice fails before the simulation rather than after it.
+  if log_format not in LOG_FORMATS:
+    raise ValueError("Unknown log format requested", "log_format:", log_format, "options:", list(LOG_FORMATS))
+
+  if isinstance(LOG_FORMATS[log_format], ArrowLogFormat):
+    try:
+      import pyarrow
+    except ImportError:
+      raise ImportError("The {} log format requires pyarrow (pip install pyarrow)".format(log_format))
+
+
+def isLogFile(path):
+  return os.path.splitext(str(path))[1] in LOG_EXTENSIONS
+
+
+def findLog(path):
+  # Returns path if it exists, otherwise the same path with the extension of any log format for
+  # which a file exists.  If there is none, returns path unchanged (and reading it will fail).
+  path = str(path)
+  if os.path.exists(path): return path
+
+  stem, extension = os.path.splitext(path)
+  if extension not in LOG_EXTENSIONS: stem = path
+
+  for extension in LOG_EXTENSIONS:
+    if os.path.exists(stem + extension): return stem + extension
+
+  return path
+
+
+def readLog(path, columns=None):
+  # Reads a log DataFrame written in any format, detected from the file contents.  If columns is
+  # given, only those columns are returned (and, for Parquet and Feather, only those are read).
+  path = findLog(path)
+
+  with open(path, 'rb') as f:
+    head = f.read(8)
+
+  for magic, log_format in MAGIC_NUMBERS:
+    if head.startswith(magic): return log_format.read(path, columns)
+
+  dfLog = pd.read_pickle(path)
+  return dfLog if columns is None else dfLog[columns]
+
+
+def isStringColumn(values):
+  return all(type(v) is str or v is None for v in values)
+
+
+def isSparseLog(dfLog):
+  # The order book logs: every column sparse, with zero as the fill value.
+  return len(dfLog.columns) > 0 and all(isinstance(dtype, pd.SparseDtype) and dtype.fill_value == 0
+                                        for dtype in dfLog.dtypes)
+
+
+def toArrow(dfLog, pickle_columns=()):
+  # Converts a log DataFrame to a pyarrow Table, storing the columns Arrow cannot hold directly as
+  # described at the top of this file.  The columns named in pickle_columns are pickled in
+  # any case.
+  import pyarrow as pa
+
+  metadata = {}
+
+  if isSparseLog(dfLog):
+    table, metadata['sparse'] = packSparse(dfLog)
+  else:
+    pickled = [c for c in dfLog.columns
+               if c in pickle_columns or (dfLog[c].dtype == object and not isStringColumn(dfLog[c].values))]
+    sparse = [c for c in dfLog.columns if isinstance(dfLog[c].dtype, pd.SparseDtype)]
+
+    if pickled or sparse:
+      dfLog = dfLog.copy()
+      for c in pickled:
+        dfLog[c] = [pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL) for v in dfLog[c].values]
+      for c in sparse:
+        # Any other sparse columns are stored (and read back) dense.
+        dfLog[c] = dfLog[c].sparse.to_dense()
+      metadata['pickled'] = [str(c) for c in pickled]
+
+    table = pa.Table.from_pandas(dfLog, preserve_index=None)
+
+  schema_metadata = dict(table.schema.metadata or {})
+  schema_metadata[METADATA_KEY] = json.dumps(metadata).encode()
+
+  return table.replace_schema_metadata(schema_metadata)
+
+
+def readMetadata(schema):
+  return json.loads((schema.metadata or {}).get(METADATA_KEY, b'{}'))
+
+
+def fromArrow(table):
+  # Converts a pyarrow Table written by toArrow() back to the original DataFrame.
+  metadata = readMetadata(table.schema)
+
+  if 'sparse' in metadata:
+    return unpackSparse(table, metadata['sparse'])
+
+  dfLog = table.to_pandas()
+
+  for c in dfLog.columns:
+    if str(c) in metadata.get('pickled', ()):
+      dfLog[c] = [pickle.loads(v) for v in dfLog[c].values]
+
+  return dfLog
+
+
+def packSparse(dfLog):
+  # Returns a Table holding the index of the sparse dfLog and an 'entries' column with a list of
+  # (column position, value) pairs per row, plus the metadata needed to rebuild dfLog.
+  import pyarrow as pa
+  from scipy.sparse import csr_matrix
+
+  S = csr_matrix(dfLog.sparse.to_coo())
+  S.eliminate_zeros()
+
+  entries = pa.StructArray.from_arrays([pa.array(S.indices.astype(np.int32)), pa.array(S.data)],
+                                       names=['column', 'value'])
+  entries = pa.ListArray.from_arrays(pa.array(S.indptr.astype(np.int32)), entries)
+
+  table = pa.Table.from_pandas(pd.DataFrame(index=dfLog.index), preserve_index=None)
+  table = table.append_column('entries', entries)
+
+  metadata = {'columns': [c.item() if isinstance(c, np.generic) else c for c in dfLog.columns],
+              'columns_name': dfLog.columns.name, 'subtype': str(dfLog.dtypes.iloc[0].subtype)}
+
+  return table, metadata
+
+
+def unpackSparse(table, metadata):
+  # Rebuilds the sparse DataFrame stored by packSparse().
+  from scipy.sparse import csr_matrix
+
+  entries = table.column('entries').combine_chunks()
+  index = table.drop(['entries']).to_pandas().index
+
+  offsets = entries.offsets.to_numpy()
+  values = entries.flatten()
+  indices = values.field('column').to_numpy(zero_copy_only=False)
+  data = values.field('value').to_numpy(zero_copy_only=False).astype(metadata['subtype'])
+
+  columns = pd.Index(metadata['columns'], name=metadata['columns_name'])
+  S = csr_matrix((data, indices, offsets - offsets[0]), shape=(len(index), len(columns)))
+
+  return pd.DataFrame.sparse.from_spmatrix(S.tocsc(), index=index, columns=columns)
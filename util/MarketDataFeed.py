@@ -0,0 +1,288 @@
+# Market data subscriptions of an ExchangeAgent (MARKET_DATA_SUBSCRIPTION_REQUEST), and the fan-out
+# of MARKET_DATA messages to the subscribers after every order event.
+#
+# A subscriber asks for the top levels of one symbol's book, at most once every freq ns (or after
+# every order event if freq is 0).  It is sent an update when the book has changed at least freq ns
+# after the last update it was sent.  Rather than checking every subscription after every order
+# event, the feed keeps:
+#
+#   - the subscriptions with freq 0, which are all sent an update after every order event,
+#   - a timer queue per symbol of the other subscriptions, ordered by the time from which a change
+#     to the book makes them due, so only the subscriptions actually due are ever looked at,
+#   - the snapshot (bids and asks) of each (symbol, levels) pair, computed once per change to the
+#     book and shared by every subscriber asking for the same depth.
+#
+# Updates due at the same event are sent in the order the subscribers first subscribed, as they
+# always have been (the order of sendMessage calls can affect the latency drawn for each).
+#
+# A subscription may ask for deltas rather than snapshots.  Its first update is then the full
+# snapshot, and each later update only the levels that changed since the last update it was sent,
+# as (price, volume) pairs with volume 0 for a level no longer among the top levels.  Updates in
+# which nothing changed are not sent.  TradingAgent applies the deltas to its known_bids and
+# known_asks.
+#
+# A subscription may instead ask to be conflated.  Changes to the book within freq ns of its last
+# update are then not dropped but held back: the subscriber is sent the latest state of the book
+# once freq ns have passed (the exchange wakes up to send it), so a burst of order events costs it
+# a single update, and it never misses the last change of a burst.  Conflated updates carry the
+# levels as read-only numpy arrays of (price, volume) rows, shared by every subscriber at that depth.
+# With levels 1 this is a top of book (L1) feed, which agents that would otherwise poll the spread
+# before acting (QUERY_SPREAD and its reply) can keep up to date without a round trip.
+
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from message.ExchangeMessages import MarketDataDeltasMsg, MarketDataMsg
+
+
+class Subscription:
+
+  __slots__ = ('agent_id', 'symbol', 'levels', 'freq', 'deltas', 'conflate', 'seq', 'last_update', 'bids', 'asks')
+
+  def __init__(self, agent_id, symbol, levels, freq, deltas, conflate, seq, last_update):
+    self.agent_id = agent_id
+    self.symbol = symbol
+    self.levels = levels
+    self.freq = pd.Timedelta(freq).value
+    self.deltas = deltas
+    self.conflate = conflate
+    self.seq = seq
+    self.last_update = last_update
+
+    # The last snapshot sent, for subscriptions to deltas.
+    self.bids = []
+    self.asks = []
+
+
+def depthDeltas(old, new):
+  # The (price, volume) of the levels of new that differ from old, then (price, 0) for the levels
+  # of old that are no longer in new.
+  old_volumes = dict(old)
+  new_prices = {price for price, _ in new}
+  return [(price, volume) for price, volume in new if old_volumes.get(price) != volume] + \
+         [(price, 0) for price, _ in old if price not in new_prices]
+
+
+def levelArray(levels):
+  # The (price, volume) levels of one side of a book as a read-only array with a row per level.
+  array = np.array(levels, dtype=np.int64).reshape(-1, 2)
+  array.flags.writeable = False
+  return array
+
+
+def applyDepthDeltas(book, deltas, is_bid, levels = None):
+  # The levels of one side of a book (best first) after applying deltas to them.
+  volumes = dict(book)
+  for price, volume in deltas:
+    if volume: volumes[price] = volume
+    else: volumes.pop(price, None)
+  return sorted(volumes.items(), reverse=is_bid)[:levels]
+
+
+class MarketDataFeed:
+
+  def __init__(self, exchange):
+    self.exchange = exchange
+
+    # Agent id -> {symbol: Subscription}.  An agent keeps its place in the order of subscribers
+    # (its seq) for the whole day.
+    self.subscriptions = {}
+    self._seq = {}
+
+    # The subscriptions with freq 0, in order of seq.
+    self._every = []
+
+    # Symbol -> timer queue of (due time in ns, seq, Subscription) for the other subscriptions.  A
+    # subscription replaced or cancelled is left in its queue and skipped when it comes out.
+    self._timers = {}
+
+    # Symbol -> the conflated subscriptions with freq > 0 that have been sent every change to the
+    # book so far, and timer queue of (due time in ns, seq, Subscription) for those holding back a
+    # change until it is due.  As for _timers, a subscription replaced or cancelled is left in the
+    # queue and skipped when it comes out.
+    self._idle = {}
+    self._held = {}
+
+    # Times (ns) at which the exchange has been asked to wake up to send held back updates.
+    self._flushes = set()
+
+    # (symbol, levels) -> (bids, asks) snapshots of the books as they are now, as lists of tuples
+    # and as arrays.
+    self._snapshots = {}
+    self._arrays = {}
+
+  def subscribe(self, agent_id, symbol, levels, freq, currentTime, deltas = False, conflate = False):
+    # Subscribes the agent to updates of symbol, replacing any subscription it already has.
+    if deltas and conflate:
+      raise ValueError("A market data subscription cannot be both conflated and sent as deltas",
+                       "agent:", agent_id, "symbol:", symbol)
+
+    seq = self._seq.setdefault(agent_id, len(self._seq))
+    for subscription in self.subscriptions.get(agent_id, {}).values():
+      self._remove(subscription)
+
+    subscription = Subscription(agent_id, symbol, levels, freq, deltas, conflate, seq, currentTime)
+    self.subscriptions[agent_id] = {symbol: subscription}
+
+    if subscription.freq == 0:
+      self._every.append(subscription)
+      self._every.sort(key=lambda s: s.seq)
+    elif conflate:
+      self._idle.setdefault(symbol, []).append(subscription)
+    else:
+      self._schedule(subscription)
+
+  def unsubscribe(self, agent_id, symbol):
+    # Cancels the agent's subscription to updates of symbol.
+    self._remove(self.subscriptions[agent_id].pop(symbol))
+
+  def _remove(self, subscription):
+    if subscription.freq == 0: self._every.remove(subscription)
+    elif subscription.conflate and subscription in self._idle[subscription.symbol]:
+      self._idle[subscription.symbol].remove(subscription)
+
+  def _schedule(self, subscription):
+    due = subscription.last_update.value + subscription.freq
+    heapq.heappush(self._timers.setdefault(subscription.symbol, []), (due, subscription.seq, subscription))
+
+  def _isCurrent(self, subscription):
+    return self.subscriptions.get(subscription.agent_id, {}).get(subscription.symbol) is subscription
+
+  def snapshot(self, symbol, levels):
+    # The (bids, asks) of the top levels of the symbol's book, computed once per change to it.
+    key = (symbol, levels)
+    snapshot = self._snapshots.get(key)
+    if snapshot is None:
+      book = self.exchange.order_books[symbol]
+      snapshot = self._snapshots[key] = (book.getInsideBids(levels), book.getInsideAsks(levels))
+    return snapshot
+
+  def arrays(self, symbol, levels):
+    # The snapshot of the symbol's book as a pair of read-only arrays (see levelArray).
+    key = (symbol, levels)
+    arrays = self._arrays.get(key)
+    if arrays is None:
+      bids, asks = self.snapshot(symbol, levels)
+      arrays = self._arrays[key] = (levelArray(bids), levelArray(asks))
+    return arrays
+
+  def bookChanged(self, symbol = None):
+    # Forgets the snapshots of the symbol's book (or of every book), which may have changed.
+    for snapshots in (self._snapshots, self._arrays):
+      if symbol is None:
+        snapshots.clear()
+      else:
+        for key in [key for key in snapshots if key[0] == symbol]:
+          del snapshots[key]
+
+  def _due(self, symbol):
+    # The subscriptions due an update after an order event on symbol's book (None for any book),
+    # in order of seq.  Those with freq > 0 are due if their book has changed at least freq ns
+    # after their last update; they are marked as updated at the time of that change, and
+    # scheduled again from it.  Conflated subscriptions not yet due hold the change back instead.
+    due = self._conflated(list(self._idle) if symbol is None else [symbol])
+    for symbol, timers in self._timers.items():
+      book_update = self.exchange.order_books[symbol].last_update_ts
+      if book_update is None: continue
+      t = book_update.value
+
+      while timers and timers[0][0] <= t:
+        _, _, subscription = heapq.heappop(timers)
+        if not self._isCurrent(subscription): continue
+        subscription.last_update = book_update
+        self._schedule(subscription)
+        due.append(subscription)
+
+    if not due: return self._every
+    due.sort(key=lambda s: s.seq)
+    return list(heapq.merge(self._every, due, key=lambda s: s.seq)) if self._every else due
+
+  def _conflated(self, symbols):
+    # The conflated subscriptions with freq > 0 due an update after an order event on the books of
+    # symbols.  Any held back update due by now is sent with this one, and subscriptions that have
+    # been sent every change so far hold this change back until freq ns after their last update.
+    due = []
+    for symbol in symbols:
+      idle = self._idle.get(symbol, [])
+      book_update = self.exchange.order_books[symbol].last_update_ts
+      if not idle and not self._held.get(symbol) or book_update is None: continue
+      t = book_update.value
+
+      sent = self._release(symbol, t)
+      for subscription in idle:
+        if subscription.last_update.value + subscription.freq <= t: sent.append(subscription)
+        else: self._hold(subscription)
+
+      for subscription in sent:
+        subscription.last_update = book_update
+      self._idle[symbol] = sent
+      due.extend(sent)
+    return due
+
+  def _hold(self, subscription):
+    # Holds back a change to the book of a conflated subscription until it is due, waking the
+    # exchange up then to send it.
+    due = subscription.last_update.value + subscription.freq
+    heapq.heappush(self._held.setdefault(subscription.symbol, []), (due, subscription.seq, subscription))
+    if due not in self._flushes:
+      self._flushes.add(due)
+      self.exchange.setWakeup(pd.Timestamp(due))
+
+  def _release(self, symbol, t):
+    # The conflated subscriptions holding back a change to symbol's book that are due by time t.
+    held = self._held.get(symbol)
+    released = []
+    while held and held[0][0] <= t:
+      _, _, subscription = heapq.heappop(held)
+      if self._isCurrent(subscription): released.append(subscription)
+    return released
+
+  def flush(self):
+    # Called when the exchange wakes up: sends each conflated subscriber due the update it held
+    # back the latest state of the book, as of now.
+    exchange = self.exchange
+    now = exchange.currentTime
+    self._flushes = {t for t in self._flushes if t > now.value}
+
+    due = []
+    for symbol in self._held:
+      released = self._release(symbol, now.value)
+      for subscription in released:
+        subscription.last_update = now
+      self._idle[symbol].extend(released)
+      due.extend(released)
+
+    due.sort(key=lambda s: s.seq)
+    self._send(due)
+
+  def publish(self, symbol = None):
+    # Called after every order event (on symbol's book, or on any book if None): sends an update
+    # to each subscriber due one.
+    self.bookChanged(symbol)
+    self._send(self._due(symbol))
+
+  def _send(self, subscriptions):
+    exchange = self.exchange
+
+    for subscription in subscriptions:
+      if subscription.freq == 0:
+        subscription.last_update = exchange.order_books[subscription.symbol].last_update_ts
+
+      symbol = subscription.symbol
+      last_trade = exchange.order_books[symbol].last_trade
+
+      if subscription.deltas:
+        bids, asks = self.snapshot(symbol, subscription.levels)
+        bid_deltas = depthDeltas(subscription.bids, bids)
+        ask_deltas = depthDeltas(subscription.asks, asks)
+        if not bid_deltas and not ask_deltas: continue
+        subscription.bids, subscription.asks = bids, asks
+        msg = MarketDataDeltasMsg(symbol, bid_deltas, ask_deltas, last_trade, exchange.currentTime)
+      else:
+        if subscription.conflate: bids, asks = self.arrays(symbol, subscription.levels)
+        else: bids, asks = self.snapshot(symbol, subscription.levels)
+        msg = MarketDataMsg(symbol, bids, asks, last_trade, exchange.currentTime)
+
+      exchange.sendMessage(subscription.agent_id, msg)
@@ -3,16 +3,16 @@
 # List of ask prices (index zero is best ask), each with a list of LimitOrders.
 import sys
 
-from message.Message import Message
+from message.ExchangeMessages import (FilledMsg, NewSplitMarketOrderMsg, OrderAcceptedMsg, OrderCancelledMsg,
+                                      OrderExecutedMsg, OrderModifiedMsg)
+from util.order.Fill import Fill
 from util.order.LimitOrder import LimitOrder
-from util.util import log_print, be_silent
+from util.OrderBookLog import OrderBookLog
+from util.OrderHistory import OrderHistory
+from util.TransactedVolume import TransactedVolume
+from util.util import log_print, log_enabled, be_silent
 
-from copy import deepcopy
 import pandas as pd
-from pandas.io.json import json_normalize
-from functools import reduce
-from scipy.sparse import dok_matrix
-from tqdm import tqdm
 
 
 class OrderBook:
@@ -27,21 +27,29 @@ class OrderBook:
         self.asks = []
         self.last_trade = None
 
-        # Create an empty list of dictionaries to log the full order book depth (price and volume) each time it changes.
-        self.book_log = []
-        self.quotes_seen = set()
+        # Total shares resting at each price level of self.bids and self.asks (in the same order), kept up to date
+        # as orders enter, execute, are cancelled or are modified, so that depth queries (getInsideBids and
+        # getInsideAsks) need not add up the individual orders.  (The number of orders at a level is the length
+        # of its list.)  Only the book changes the quantity of a resting order: agents hold snapshots of theirs.
+        self.bid_volumes = []
+        self.ask_volumes = []
 
-        # Create an order history for the exchange to report to certain agent types.
-        self.history = [{}]
+        # If the owner archives its order books, record snapshots of the order book depth (price and volume)
+        # as it changes, sampled at the owner's book_freq (see util.OrderBookLog).
+        self.book_log = None
+        if owner.book_freq is not None:
+            self.book_log = OrderBookLog(owner.book_freq, owner.mkt_open, owner.book_log_depth)
+
+        # Create an order history for the exchange to report to certain agent types, holding the orders that led to
+        # the last stream_history trades (see util.OrderHistory).
+        self.history = OrderHistory(owner.stream_history)
 
         # Last timestamp the orderbook for that symbol was updated
         self.last_update_ts = None
 
-        # Internal variable used for computing transacted volumes
-        self._transacted_volume = {
-            "unrolled_transactions": None,
-            "self.history_previous_length": 0
-        }
+        # Every execution (time and shares traded), for the transacted volume over a lookback period (see
+        # util.TransactedVolume).  Executions further back than the owner's volume_lookback are discarded.
+        self.transacted_volume = TransactedVolume(owner.volume_lookback)
 
     def handleLimitOrder(self, order):
 
@@ -57,12 +65,14 @@ class OrderBook:
             log_print("{} order discarded.  Quantity ({}) must be a positive integer.", order.symbol, order.quantity)
             return
 
+        if self.book_log is not None: self.observeBook()
+
         # Add the order under index 0 of history: orders since the most recent trade.
-        self.history[0][order.order_id] = {'entry_time': self.owner.currentTime,
-                                           'quantity': order.quantity, 'is_buy_order': order.is_buy_order,
-                                           'limit_price': order.limit_price, 'transactions': [],
-                                           'modifications': [],
-                                           'cancellations': []}
+        self.history.add(order.order_id, {'entry_time': self.owner.currentTime,
+                                          'quantity': order.quantity, 'is_buy_order': order.is_buy_order,
+                                          'limit_price': order.limit_price, 'transactions': [],
+                                          'modifications': [],
+                                          'cancellations': []})
 
         matching = True
 
@@ -71,42 +81,34 @@ class OrderBook:
         executed = []
 
         while matching:
-            matched_order = deepcopy(self.executeOrder(order))  
+            matched_order = self.executeOrder(order)
 
             if matched_order:
-                # Decrement quantity on new order and notify traders of execution.
-                filled_order = deepcopy(order)
-                filled_order.quantity = matched_order.quantity
-                filled_order.fill_price = matched_order.fill_price
-                filled_order.fill_time = self.owner.currentTime - filled_order.time_placed
+                # Record the executed portion of the new order and notify traders of execution.
+                # Both notifications carry lightweight Fill records rather than copies of the orders.
+                filled_order = Fill(order, matched_order.quantity, matched_order.fill_price,
+                                    self.owner.currentTime - order.time_placed)
 
-                filled_order.filled = True
                 # ensure change is permeated through all copies
                 id = filled_order.order_id 
                 a_id = filled_order.agent_id
-                self.owner.sendMessage(a_id, Message({"msg": "FILLED", "order_id": id, 
-                                                    "fill_price": filled_order.fill_price, 
-                                                    "fill_time": filled_order.fill_time, 
-                                                    "quantity": filled_order.quantity,
-                                                    "fill_type": "INSTANT"}))
+                self.owner.sendMessage(a_id, FilledMsg(id, filled_order.fill_price, filled_order.fill_time,
+                                                       filled_order.quantity, "INSTANT"))
 
                 id = matched_order.order_id 
                 a_id = matched_order.agent_id
-                self.owner.sendMessage(a_id, Message({"msg": "FILLED", "order_id": id, 
-                                                    "fill_price": filled_order.fill_price, 
-                                                    "fill_time": filled_order.fill_time, 
-                                                    "quantity": filled_order.quantity,
-                                                    "fill_type": "BOOK"}))
+                self.owner.sendMessage(a_id, FilledMsg(id, filled_order.fill_price, filled_order.fill_time,
+                                                       filled_order.quantity, "BOOK"))
 
                 order.quantity -= filled_order.quantity
 
-                log_print("MATCHED: new order {} vs old order {}", filled_order, matched_order)
-                log_print("SENT: notifications of order execution to agents {} and {} for orders {} and {}",
-                          filled_order.agent_id, matched_order.agent_id, filled_order.order_id, matched_order.order_id)
+                if log_enabled():
+                    log_print("MATCHED: new order {} vs old order {}", filled_order, matched_order)
+                    log_print("SENT: notifications of order execution to agents {} and {} for orders {} and {}",
+                              filled_order.agent_id, matched_order.agent_id, filled_order.order_id, matched_order.order_id)
 
-                self.owner.sendMessage(order.agent_id, Message({"msg": "ORDER_EXECUTED", "order": filled_order}))
-                self.owner.sendMessage(matched_order.agent_id,
-                                       Message({"msg": "ORDER_EXECUTED", "order": matched_order}))
+                self.owner.sendMessage(order.agent_id, OrderExecutedMsg(filled_order))
+                self.owner.sendMessage(matched_order.agent_id, OrderExecutedMsg(matched_order))
 
                 # Accumulate the volume and average share price of the currently executing inbound trade.
                 executed.append((filled_order.quantity, filled_order.fill_price))
@@ -118,28 +120,29 @@ class OrderBook:
 
 
             else:
-                # No matching order was found, so the new order enters the order book.  Notify the agent.
-                self.enterOrder(deepcopy(order))
+                # No matching order was found, so the new order enters the order book.  The book now
+                # owns the order (and will change its quantity as it executes), so notify the agent
+                # with a snapshot of the order as accepted.
+                self.enterOrder(order)
 
-                log_print("ACCEPTED: new order {}", order)
-                log_print("SENT: notifications of order acceptance to agent {} for order {}",
-                          order.agent_id, order.order_id)
+                if log_enabled():
+                    log_print("ACCEPTED: new order {}", order)
+                    log_print("SENT: notifications of order acceptance to agent {} for order {}",
+                              order.agent_id, order.order_id)
 
-                self.owner.sendMessage(order.agent_id, Message({"msg": "ORDER_ACCEPTED", "order": order}))
+                self.owner.sendMessage(order.agent_id, OrderAcceptedMsg(order.snapshot()))
 
                 matching = False
 
         if not matching:
             # Now that we are done executing or accepting this order, log the new best bid and ask.
-            if self.bids:
-                self.owner.logEvent('BEST_BID', "{},{},{}".format(self.symbol,
-                                                                  self.bids[0][0].limit_price,
-                                                                  sum([o.quantity for o in self.bids[0]])))
+            best_bids = self.getInsideBids(1)
+            if best_bids:
+                self.owner.logEvent('BEST_BID', "{},{},{}".format(self.symbol, best_bids[0][0], best_bids[0][1]))
 
-            if self.asks:
-                self.owner.logEvent('BEST_ASK', "{},{},{}".format(self.symbol,
-                                                                  self.asks[0][0].limit_price,
-                                                                  sum([o.quantity for o in self.asks[0]])))
+            best_asks = self.getInsideAsks(1)
+            if best_asks:
+                self.owner.logEvent('BEST_ASK', "{},{},{}".format(self.symbol, best_asks[0][0], best_asks[0][1]))
 
             # Also log the last trade (total share quantity, average share price).
             if executed:
@@ -156,27 +159,9 @@ class OrderBook:
 
                 self.last_trade = avg_price
 
-                # Transaction occurred, so advance indices.
-                self.history.insert(0, {})
-
-                # Truncate history to required length.
-                self.history = self.history[:self.owner.stream_history + 1]
-
-            # Finally, log the full depth of the order book, ONLY if we have been requested to store the order book
-            # for later visualization.  (This is slow.)
-            if self.owner.book_freq is not None:
-                row = {'QuoteTime': self.owner.currentTime}
-                for quote, volume in self.getInsideBids():
-                    row[quote] = -volume
-                    self.quotes_seen.add(quote)
-                for quote, volume in self.getInsideAsks():
-                    if quote in row:
-                        if row[quote] is not None:
-                            print(
-                                "WARNING: THIS IS A REAL PROBLEM: an order book contains bids and asks at the same quote price!")
-                    row[quote] = volume
-                    self.quotes_seen.add(quote)
-                self.book_log.append(row)
+                # Transaction occurred, so advance indices, dropping the oldest if the history is full.
+                self.history.newLevel()
+
         self.last_update_ts = self.owner.currentTime
         self.prettyPrint()
 
@@ -224,8 +209,7 @@ class OrderBook:
                     slippage = best - p
 
             limit_order = LimitOrder(order.agent_id, order.time_placed, order.symbol, q, order.is_buy_order, p, order_id=order_num, slippage=slippage)
-            self.owner.sendMessage(order.agent_id,
-                                    Message({"msg": "NEW_SPLIT_MARKET_ORDER", "order": limit_order}))
+            self.owner.sendMessage(order.agent_id, NewSplitMarketOrderMsg(limit_order))
             order_num += 1
             self.handleLimitOrder(limit_order)
 
@@ -235,20 +219,16 @@ class OrderBook:
         # or decrement quantity from, the matched order from the order book
         # (i.e. executes at least a partial trade, if possible).
 
-        # Track which (if any) existing order was matched with the current order.
-        if order.is_buy_order:
-            book = self.asks
-        else:
-            book = self.bids
-
         # TODO: Simplify?  It is ever possible to actually select an execution match
         # other than the best bid or best ask?  We may not need these execute loops.
 
-        # First, examine the correct side of the order book for a match.
-        if not book:
+        # First, examine the correct (opposite) side of the order book for a match.
+        best_order = self.peekBestOrder(not order.is_buy_order)
+
+        if best_order is None:
             # No orders on this side.
             return None
-        elif not self.isMatch(order, book[0][0]):
+        elif not self.isMatch(order, best_order):
             # There were orders on the right side, but the prices do not overlap.
             # Or: bid could not match with best ask, or vice versa.
             # Or: bid offer is below the lowest asking price, or vice versa.
@@ -258,31 +238,26 @@ class OrderBook:
             # somewhere within them.  We can/will only match against the oldest order
             # among those with the best price.  (i.e. best price, then FIFO)
 
-            # Note that book[i] is a LIST of all orders (oldest at index book[i][0]) at the same price.
-
             # The matched order might be only partially filled. (i.e. new order is smaller)
            # TODO: what is fill price for a partial fill?
-            if order.quantity >= book[0][0].quantity:
+            if order.quantity >= best_order.quantity:
                 # Consumed entire matched order.
-                matched_order = book[0].pop(0)
-
-                # If the matched price now has no orders, remove it completely.
-                if not book[0]:
-                    del book[0]
+                matched_order = self.popBestOrder(not order.is_buy_order)
+                quantity = matched_order.quantity
 
             else:
                 # Consumed only part of matched order.
-                matched_order = deepcopy(book[0][0])
-                matched_order.quantity = order.quantity
+                matched_order = best_order
+                quantity = order.quantity
 
-                book[0][0].quantity -= matched_order.quantity
+                self.reduceBestOrder(not order.is_buy_order, quantity)
 
             # When two limit orders are matched, they execute at the price that
-            # was being "advertised" in the order book.
-            matched_order.fill_price = matched_order.limit_price
-            matched_order.fill_time = self.owner.currentTime - matched_order.time_placed
-            matched_order.slippage = 0
-            
+            # was being "advertised" in the order book.  The executed portion is
+            # described by a Fill record, so the matched order is never copied.
+            fill = Fill(matched_order, quantity, matched_order.limit_price,
+                        self.owner.currentTime - matched_order.time_placed, matched_order.filled)
+
             # Record the transaction in the order history and push the indices
             # out one, possibly truncating to the maximum history length.
 
@@ -290,15 +265,12 @@ class OrderBook:
             self.history[0][order.order_id]['transactions'].append((self.owner.currentTime, order.quantity))
 
             # The pre-existing order may or may not still be in the recent history.
-            for idx, orders in enumerate(self.history):
-                if matched_order.order_id not in orders: continue
+            self.recordHistory(fill.order_id, 'transactions', fill.quantity)
 
-                # Found the matched order in history.  Update it with this transaction.
-                self.history[idx][matched_order.order_id]['transactions'].append(
-                    (self.owner.currentTime, matched_order.quantity))
+            self.transacted_volume.record(self.owner.currentTime, fill.quantity)
 
             # Return (only the executed portion of) the matched order.
-            return matched_order
+            return fill
 
     def isMatch(self, order, o):
         # Returns True if order 'o' can be matched against input 'order'.
@@ -314,206 +286,194 @@ class OrderBook:
 
         return False
 
+    # The methods from here through replaceOrder are the only ones which touch the underlying book
+    # structure (self.bids and self.asks, and their volumes).  Alternative book implementations (see util.IndexedOrderBook)
+    # override exactly these, and inherit the matching, notification and history logic.
+
+    def hasOrders(self, is_buy_side):
+        # Returns True if there are any resting orders on the requested side of the book.
+        return bool(self.bids if is_buy_side else self.asks)
+
+    def peekBestOrder(self, is_buy_side):
+        # Returns the oldest order at the best price on the requested side of the book,
+        # without removing it, or None if that side is empty.
+        book = self.bids if is_buy_side else self.asks
+        return book[0][0] if book else None
+
+    def popBestOrder(self, is_buy_side):
+        # Removes and returns the oldest order at the best price on the requested side of the book.
+        book, volumes = (self.bids, self.bid_volumes) if is_buy_side else (self.asks, self.ask_volumes)
+        order = book[0].pop(0)
+        volumes[0] -= order.quantity
+
+        # If the best price now has no orders, remove it completely.
+        if not book[0]:
+            del book[0]
+            del volumes[0]
+
+        return order
+
+    def reduceBestOrder(self, is_buy_side, quantity):
+        # Reduces the quantity of the oldest order at the best price on the requested side of the book
+        # (by less than all of it).
+        book, volumes = (self.bids, self.bid_volumes) if is_buy_side else (self.asks, self.ask_volumes)
+        book[0][0].quantity -= quantity
+        volumes[0] -= quantity
+
     def enterOrder(self, order):
         # Enters a limit order into the OrderBook in the appropriate location.
         # This does not test for matching/executing orders -- this function
         # should only be called after a failed match/execution attempt.
 
         if order.is_buy_order:
-            book = self.bids
+            book, volumes = self.bids, self.bid_volumes
         else:
-            book = self.asks
+            book, volumes = self.asks, self.ask_volumes
 
         if not book:
             # There were no orders on this side of the book.
             book.append([order])
+            volumes.append(order.quantity)
         elif not self.isBetterPrice(order, book[-1][0]) and not self.isEqualPrice(order, book[-1][0]):
             # There were orders on this side, but this order is worse than all of them.
             # (New lowest bid or highest ask.)
             book.append([order])
+            volumes.append(order.quantity)
         else:
             # There are orders on this side.  Insert this order in the correct position in the list.
             # Note that o is a LIST of all orders (oldest at index 0) at this same price.
             for i, o in enumerate(book):
                 if self.isBetterPrice(order, o[0]):
                     book.insert(i, [order])
+                    volumes.insert(i, order.quantity)
                     break
                 elif self.isEqualPrice(order, o[0]):
                     book[i].append(order)
+                    volumes[i] += order.quantity
                     break
 
-    def cancelOrder(self, order):
-        # Attempts to cancel (the remaining, unexecuted portion of) a trade in the order book.
-        # By definition, this pretty much has to be a limit order.  If the order cannot be found
-        # in the order book (probably because it was already fully executed), presently there is
-        # no message back to the agent.  This should possibly change to some kind of failed
-        # cancellation message.  (?)  Otherwise, the agent receives ORDER_CANCELLED with the
-        # order as the message body, with the cancelled quantity correctly represented as the
-        # number of shares that had not already been executed.
-
-        if order.is_buy_order:
-            book = self.bids
-        else:
-            book = self.asks
-
-        # If there are no orders on this side of the book, there is nothing to do.
-        if not book: return
+    def removeOrder(self, order):
+        # Removes and returns the resting order with the same side, price and order id as order,
+        # or returns None if there is no such order in the book.
+        book, volumes = (self.bids, self.bid_volumes) if order.is_buy_order else (self.asks, self.ask_volumes)
 
-        # There are orders on this side.  Find the price level of the order to cancel,
-        # then find the exact order and cancel it.
         # Note that o is a LIST of all orders (oldest at index 0) at this same price.
         for i, o in enumerate(book):
             if self.isEqualPrice(order, o[0]):
                 # This is the correct price level.
-                for ci, co in enumerate(book[i]):
+                for ci, co in enumerate(o):
                     if order.order_id == co.order_id:
-                        # Cancel this order.
-                        cancelled_order = book[i].pop(ci)
-
-                        # Record cancellation of the order if it is still present in the recent history structure.
-                        for idx, orders in enumerate(self.history):
-                            if cancelled_order.order_id not in orders: continue
-
-                            # Found the cancelled order in history.  Update it with the cancelation.
-                            self.history[idx][cancelled_order.order_id]['cancellations'].append(
-                                (self.owner.currentTime, cancelled_order.quantity))
+                        removed_order = o.pop(ci)
+                        volumes[i] -= removed_order.quantity
 
-                        # If the cancelled price now has no orders, remove it completely.
-                        if not book[i]:
+                        # If the price now has no orders, remove it completely.
+                        if not o:
                             del book[i]
+                            del volumes[i]
 
-                        log_print("CANCELLED: order {}", order)
-                        log_print("SENT: notifications of order cancellation to agent {} for order {}",
-                                  cancelled_order.agent_id, cancelled_order.order_id)
+                        return removed_order
 
-                        self.owner.sendMessage(order.agent_id,
-                                               Message({"msg": "ORDER_CANCELLED", "order": cancelled_order}))
-                        # We found the order and cancelled it, so stop looking.
-                        self.last_update_ts = self.owner.currentTime
-                        return
+        return None
+
+    def replaceOrder(self, order, new_order):
+        # Replaces the resting order with the same side, price and order id as order by new_order,
+        # keeping its place in the queue.  Returns True if the order was found.
+        book, volumes = (self.bids, self.bid_volumes) if order.is_buy_order else (self.asks, self.ask_volumes)
 
-    def modifyOrder(self, order, new_order):
-        # Modifies the quantity of an existing limit order in the order book
-        if not self.isSameOrder(order, new_order): return
-        book = self.bids if order.is_buy_order else self.asks
-        if not book: return
         for i, o in enumerate(book):
             if self.isEqualPrice(order, o[0]):
-                for mi, mo in enumerate(book[i]):
+                for mi, mo in enumerate(o):
                     if order.order_id == mo.order_id:
-                        book[i][0] = new_order
-                        for idx, orders in enumerate(self.history):
-                            if new_order.order_id not in orders: continue
-                            self.history[idx][new_order.order_id]['modifications'].append(
-                                (self.owner.currentTime, new_order.quantity))
-                            log_print("MODIFIED: order {}", order)
-                            log_print("SENT: notifications of order modification to agent {} for order {}",
-                                      new_order.agent_id, new_order.order_id)
-                            self.owner.sendMessage(order.agent_id,
-                                                   Message({"msg": "ORDER_MODIFIED", "new_order": new_order}))
-        if order.is_buy_order:
-            self.bids = book
-        else:
-            self.asks = book
-        self.last_update_ts = self.owner.currentTime
+                        o[mi] = new_order
+                        volumes[i] += new_order.quantity - mo.quantity
+                        return True
 
-    # Get the inside bid price(s) and share volume available at each price, to a limit
-    # of "depth".  (i.e. inside price, inside 2 prices)  Returns a list of tuples:
-    # list index is best bids (0 is best); each tuple is (price, total shares).
-    def getInsideBids(self, depth=sys.maxsize):
-        book = []
-        for i in range(min(depth, len(self.bids))):
-            qty = 0
-            price = self.bids[i][0].limit_price
-            for o in self.bids[i]:
-                qty += o.quantity
-            book.append((price, qty))
+        return False
 
-        return book
+    def cancelOrder(self, order):
+        # Attempts to cancel (the remaining, unexecuted portion of) a trade in the order book.
+        # By definition, this pretty much has to be a limit order.  If the order cannot be found
+        # in the order book (probably because it was already fully executed), presently there is
+        # no message back to the agent.  This should possibly change to some kind of failed
+        # cancellation message.  (?)  Otherwise, the agent receives ORDER_CANCELLED with the
+        # order as the message body, with the cancelled quantity correctly represented as the
+        # number of shares that had not already been executed.
 
-    # As above, except for ask price(s).
-    def getInsideAsks(self, depth=sys.maxsize):
-        book = []
-        for i in range(min(depth, len(self.asks))):
-            qty = 0
-            price = self.asks[i][0].limit_price
-            for o in self.asks[i]:
-                qty += o.quantity
-            book.append((price, qty))
+        if self.book_log is not None: self.observeBook()
 
-        return book
+        # Find the exact resting order (same side, price and order id) and remove it.
+        cancelled_order = self.removeOrder(order)
 
-    def _get_recent_history(self):
-        """ Gets portion of self.history that has arrived since last call of self.get_transacted_volume.
+        # If the order is not in the book (or this side of the book is empty), there is nothing to do.
+        if cancelled_order is None: return
 
-            Also updates self._transacted_volume[self.history_previous_length]
-        :return:
-        """
-        if self._transacted_volume["self.history_previous_length"] == 0:
-            self._transacted_volume["self.history_previous_length"] = len(self.history)
-            return self.history
-        elif self._transacted_volume["self.history_previous_length"] == len(self.history):
-            return {}
-        else:
-            idx = len(self.history) - self._transacted_volume["self.history_previous_length"] - 1
-            recent_history = self.history[0:idx]
-            self._transacted_volume["self.history_previous_length"] = len(self.history)
-            return recent_history
+        # Record cancellation of the order if it is still present in the recent history structure.
+        self.recordHistory(cancelled_order.order_id, 'cancellations', cancelled_order.quantity)
 
-    def _update_unrolled_transactions(self, recent_history):
-        """ Updates self._transacted_volume["unrolled_transactions"] with data from recent_history
+        if log_enabled():
+            log_print("CANCELLED: order {}", order)
+            log_print("SENT: notifications of order cancellation to agent {} for order {}",
+                      cancelled_order.agent_id, cancelled_order.order_id)
 
-        :return:
-        """
-        new_unrolled_txn = self._unrolled_transactions_from_order_history(recent_history)
-        old_unrolled_txn = self._transacted_volume["unrolled_transactions"]
-        total_unrolled_txn = pd.concat([old_unrolled_txn, new_unrolled_txn], ignore_index=True)
-        self._transacted_volume["unrolled_transactions"] = total_unrolled_txn
-
-    def _unrolled_transactions_from_order_history(self, history):
-        """ Returns a DataFrame with columns ['execution_time', 'quantity'] from a dictionary with same format as
-            self.history, describing executed transactions.
-        """
-        # Load history into DataFrame
-        unrolled_history = []
-        for elem in history:
-            for _, val in elem.items():
-                unrolled_history.append(val)
+        self.owner.sendMessage(order.agent_id, OrderCancelledMsg(cancelled_order))
+        self.last_update_ts = self.owner.currentTime
 
-        unrolled_history_df = pd.DataFrame(unrolled_history, columns=[
-            'entry_time', 'quantity', 'is_buy_order', 'limit_price', 'transactions', 'modifications', 'cancellations'
-        ])
+    def modifyOrder(self, order, new_order):
+        # Modifies the quantity of an existing limit order in the order book
+        if not self.isSameOrder(order, new_order): return
+        if not self.hasOrders(order.is_buy_order): return
 
-        if unrolled_history_df.empty:
-            return pd.DataFrame(columns=['execution_time', 'quantity'])
+        if self.book_log is not None: self.observeBook()
 
-        executed_transactions = unrolled_history_df[unrolled_history_df['transactions'].map(lambda d: len(d)) > 0]  # remove cells that are an empty list
+        # The new order takes the place (including time priority) of the old one.
+        if self.replaceOrder(order, new_order):
+            if self.recordHistory(new_order.order_id, 'modifications', new_order.quantity):
+                if log_enabled():
+                    log_print("MODIFIED: order {}", order)
+                    log_print("SENT: notifications of order modification to agent {} for order {}",
+                              new_order.agent_id, new_order.order_id)
+                self.owner.sendMessage(order.agent_id, OrderModifiedMsg(new_order))
 
-        #  Reshape into DataFrame with columns ['execution_time', 'quantity']
-        transaction_list = [element for list_ in executed_transactions['transactions'].values for element in list_]
-        unrolled_transactions = pd.DataFrame(transaction_list, columns=['execution_time', 'quantity'])
-        unrolled_transactions = unrolled_transactions.sort_values(by=['execution_time'])
-        unrolled_transactions = unrolled_transactions.drop_duplicates(keep='last')
+        self.last_update_ts = self.owner.currentTime
 
-        return unrolled_transactions
+    def observeBook(self):
+        # Called before any change to the book, so the book log can record a snapshot if one is due.  If
+        # the owner spills its logs during the simulation (see Kernel.log_spill_rows), so does the book log,
+        # although its snapshots are all read back into memory when it is archived.
+        if not self.book_log.observe(self, self.owner.currentTime): return
+
+        spill_rows = self.owner.log_spill_rows
+        if spill_rows and self.book_log.buffered() >= spill_rows:
+            part = "{}_BOOK.{}".format(self.symbol, self.book_log.spills())
+            self.book_log.spill(self.owner.kernel.logSpillPath(self.owner.id, part))
+
+    def recordHistory(self, order_id, field, quantity):
+        # Appends a (time, quantity) entry to the transactions, modifications or cancellations of
+        # order_id everywhere it appears in the recent order history.  Returns True if found.
+        entries = self.history.entries(order_id)
+        for entry in entries:
+            entry[field].append((self.owner.currentTime, quantity))
+
+        return len(entries) > 0
+
+    # Get the inside bid price(s) and share volume available at each price, to a limit
+    # of "depth".  (i.e. inside price, inside 2 prices)  Returns a list of tuples:
+    # list index is best bids (0 is best); each tuple is (price, total shares).
+    def getInsideBids(self, depth=sys.maxsize):
+        bids, volumes = self.bids, self.bid_volumes
+        return [(bids[i][0].limit_price, volumes[i]) for i in range(min(depth, len(bids)))]
+
+    # As above, except for ask price(s).
+    def getInsideAsks(self, depth=sys.maxsize):
+        asks, volumes = self.asks, self.ask_volumes
+        return [(asks[i][0].limit_price, volumes[i]) for i in range(min(depth, len(asks)))]
 
     def get_transacted_volume(self, lookback_period='10min'):
         """ Method retrieves the total transacted volume for a symbol over a lookback period finishing at the current
             simulation time.
         """
-
-        # Update unrolled transactions DataFrame
-        recent_history = self._get_recent_history()
-        self._update_unrolled_transactions(recent_history)
-        unrolled_transactions = self._transacted_volume["unrolled_transactions"]
-
-        #  Get transacted volume in time window
-        lookback_pd = pd.to_timedelta(lookback_period)
-        window_start = self.owner.currentTime - lookback_pd
-        executed_within_lookback_period = unrolled_transactions[unrolled_transactions['execution_time'] >= window_start]
-        transacted_volume = executed_within_lookback_period['quantity'].sum()
-
-        return transacted_volume
+        window_start = self.owner.currentTime - pd.to_timedelta(lookback_period)
+        return self.transacted_volume.volume(window_start)
 
     # These could be moved to the LimitOrder class.  We could even operator overload them
     # into >, <, ==, etc.
@@ -538,42 +498,6 @@ class OrderBook:
     def isSameOrder(self, order, new_order):
         return order.order_id == new_order.order_id
 
-    def book_log_to_df(self):
-        """ Returns a pandas DataFrame constructed from the order book log, to be consumed by
-            agent.ExchangeAgent.logOrderbookSnapshots.
-
-            The first column of the DataFrame is `QuoteTime`. The succeeding columns are prices quoted during the
-            simulation (as taken from self.quotes_seen).
-
-            Each row is a snapshot at a specific time instance. If there is volume at a certain price level (negative
-            for bids, positive for asks) this volume is written in the column corresponding to the price level. If there
-            is no volume at a given price level, the corresponding column has a `0`.
-
-            The data is stored in a sparse format, such that a value of `0` takes up no space.
-
-        :return:
-        """
-        quotes = sorted(list(self.quotes_seen))
-        log_len = len(self.book_log)
-        quote_idx_dict = {quote: idx for idx, quote in enumerate(quotes)}
-        quotes_times = []
-
-
-        # Construct sparse matrix, where rows are timesteps, columns are quotes and elements are volume.
-        S = dok_matrix((log_len, len(quotes)), dtype=int)  # Dictionary Of Keys based sparse matrix.
-
-        for i, row in enumerate(tqdm(self.book_log, desc="Processing orderbook log")):
-            quotes_times.append(row['QuoteTime'])
-            for quote, vol in row.items():
-                if quote == "QuoteTime":
-                    continue
-                S[i, quote_idx_dict[quote]] = vol
-
-        S = S.tocsc()  # Convert this matrix to Compressed Sparse Column format for pandas to consume.
-        df = pd.DataFrame.sparse.from_spmatrix(S, columns=quotes)
-        df.insert(0, 'QuoteTime', quotes_times, allow_duplicates=True)
-        return df
-
     # Print a nicely-formatted view of the current order book.
     def prettyPrint(self, silent=False):
         # Start at the highest ask price and move down.  Then switch to the highest bid price and move down.
@@ -0,0 +1,185 @@
+# Incremental recorder of order book snapshots, for the order book logs archived by the
+# ExchangeAgent when book_freq is set.  Each OrderBook owns one, and calls observe() before every
+# change to the book (limit orders, cancellations and modifications).
+#
+# Snapshots are sampled on simulation time rather than taken on every order:
+#
+#   - With book_freq 0, one snapshot is kept per distinct time at which the book changed (the
+#     state after the last change at that time).
+#   - Otherwise, one snapshot is kept per book_freq interval (counted from market open) in which
+#     the book changed: the state just before the first change after an interval boundary, which
+#     is the state of the book at that boundary.
+#
+# A snapshot holds the (price, volume) of the levels on each side of the book, bids with negative
+# volume, up to a fixed depth per side if one is given (otherwise the full depth).  The time and
+# first level of each snapshot, and the price and volume of every level, are appended to growable
+# numpy arrays.  Together they form a compressed sparse row matrix built as we go, so turning the
+# log into a DataFrame at the end of the day is a single vectorized step.
+#
+# The log can spill its snapshots to temporary files in chunks during the simulation (see spill()),
+# which keeps the memory held while the simulation runs bounded on busy days.  It does not bound the
+# memory at the end of the day: the archived log has one column per price quoted on any snapshot,
+# and is resampled to book_freq by the ExchangeAgent, so toDataFrame() reads every spilled chunk
+# back (removing its file) and builds the whole log in memory.
+
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from scipy.sparse import csr_matrix
+
+
+class OrderBookLog:
+
+  def __init__(self, book_freq, mkt_open, depth = None, capacity = 1024):
+    # Sampling interval in ns (0 to keep every change) and the time from which it is counted.
+    self.freq = 0 if str(book_freq).isdigit() and int(book_freq) == 0 else to_offset(book_freq).nanos
+    self.origin = pd.Timestamp(mkt_open).value
+
+    # Levels to keep on each side of the book.
+    self.depth = depth
+
+    # Time of the most recent (possible) change to the book, in ns, or None before the first.
+    self.last_time = None
+
+    # One entry per snapshot: its time, and the offset of its first level in the level columns.
+    self._times = np.empty(capacity, dtype=np.int64)
+    self._offsets = np.zeros(capacity + 1, dtype=np.int64)
+    self._size = 0
+
+    # One entry per level of each snapshot.
+    self._prices = np.empty(capacity, dtype=np.int64)
+    self._volumes = np.empty(capacity, dtype=np.int64)
+
+    # Files holding snapshots already spilled to disk, oldest first, and their total count.
+    self._spilled = []
+    self._spilled_rows = 0
+
+  def __len__(self):
+    return self._spilled_rows + self._size
+
+  def __bool__(self):
+    return len(self) > 0
+
+  def buffered(self):
+    # Number of snapshots currently held in memory.
+    return self._size
+
+  def spills(self):
+    # Number of times the log has been spilled to disk.
+    return len(self._spilled)
+
+  def _interval(self, t):
+    # Index of the first sampling time at or after t.
+    return -((self.origin - t) // self.freq)
+
+  def observe(self, book, time):
+    # Called by the book before it may change at the given time.  Records the current state of
+    # the book if it is the last state at some sampling time.  Returns True if it did.
+    t = time.value if type(time) is pd.Timestamp else pd.Timestamp(time).value
+    last = self.last_time
+
+    if last is not None and t <= last: return False
+    self.last_time = t
+
+    if last is None: return False
+    if self.freq and self._interval(last) == self._interval(t): return False
+
+    self.record(book, last)
+    return True
+
+  def finish(self, book):
+    # Records the final state of the book, as of its last change.
+    if self.last_time is not None:
+      self.record(book, self.last_time)
+      self.last_time = None
+
+  def record(self, book, t):
+    bids = book.getInsideBids() if self.depth is None else book.getInsideBids(self.depth)
+    asks = book.getInsideAsks() if self.depth is None else book.getInsideAsks(self.depth)
+
+    if self._size == len(self._times): self._growSnapshots()
+
+    start = self._offsets[self._size]
+    end = start + len(bids) + len(asks)
+    while end > len(self._prices): self._growLevels()
+
+    if bids:
+      levels = np.array(bids, dtype=np.int64)
+      self._prices[start:start + len(bids)] = levels[:, 0]
+      self._volumes[start:start + len(bids)] = -levels[:, 1]
+    if asks:
+      levels = np.array(asks, dtype=np.int64)
+      self._prices[start + len(bids):end] = levels[:, 0]
+      self._volumes[start + len(bids):end] = levels[:, 1]
+
+    self._times[self._size] = t
+    self._size += 1
+    self._offsets[self._size] = end
+
+  def _growSnapshots(self):
+    capacity = 2 * len(self._times)
+    self._times = np.resize(self._times, capacity)
+    self._offsets = np.resize(self._offsets, capacity + 1)
+
+  def _growLevels(self):
+    capacity = 2 * len(self._prices)
+    self._prices = np.resize(self._prices, capacity)
+    self._volumes = np.resize(self._volumes, capacity)
+
+  def _chunk(self):
+    end = self._offsets[self._size]
+    return (self._times[:self._size].copy(), self._offsets[:self._size + 1].copy(),
+            self._prices[:end].copy(), self._volumes[:end].copy())
+
+  def spill(self, path):
+    # Writes the snapshots currently held in memory to a new file at path and empties the buffers.
+    # The file is temporary: toDataFrame() reads it back.
+    if not self._size: return
+
+    with open(path, 'wb') as f:
+      pickle.dump(self._chunk(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    self._spilled.append(path)
+    self._spilled_rows += self._size
+    self._size = 0
+
+  def toDataFrame(self):
+    # Returns every snapshot (including any spilled ones, whose files are removed) as a sparse
+    # DataFrame indexed by QuoteTime, with one int64 column per price quoted in any snapshot,
+    # holding the volume at that price (negative for bids, zero where there was none).
+    chunks = []
+
+    for path in self._spilled:
+      with open(path, 'rb') as f:
+        chunks.append(pickle.load(f))
+      os.remove(path)
+
+    chunks.append(self._chunk())
+
+    self._spilled = []
+    self._spilled_rows = 0
+    self._size = 0
+
+    times = np.concatenate([c[0] for c in chunks])
+    prices = np.concatenate([c[2] for c in chunks])
+    volumes = np.concatenate([c[3] for c in chunks])
+
+    # Chain the offsets of the chunks, each of which starts at zero.
+    offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for c in chunks:
+      offsets.append(c[1][1:] + base)
+      base += c[1][-1]
+    offsets = np.concatenate(offsets)
+
+    quotes, columns = np.unique(prices, return_inverse=True)
+
+    S = csr_matrix((volumes, columns, offsets), shape=(len(times), len(quotes)))
+    S.sum_duplicates()
+    S.eliminate_zeros()
+
+    index = pd.DatetimeIndex(times.view('datetime64[ns]'), name='QuoteTime')
+    return pd.DataFrame.sparse.from_spmatrix(S.tocsc(), index=index, columns=pd.Index(quotes.tolist()))
@@ -0,0 +1,69 @@
+# Recent order history of an order book, reported by the ExchangeAgent to agents that query the
+# order stream (QUERY_ORDER_STREAM), such as the HeuristicBeliefLearningAgent.
+#
+# The history is a sequence of levels, newest first.  Level 0 holds the orders entered since the
+# most recent trade, and level i the orders entered between the i-th and (i+1)-th most recent
+# trades.  Each level maps order ids to an entry dict recording the order's entry time, quantity,
+# side and limit price, and the (time, quantity) of each of its transactions, modifications and
+# cancellations.  Only the levels leading to the last length trades are kept.
+#
+# The levels are held in a deque bounded to length + 1, so starting a new level after a trade
+# drops the oldest one in O(1), and an index from order id to the entries of that id in the levels
+# still held lets the book record executions, modifications and cancellations without searching
+# the history.  Reading a level or a slice of levels (as the exchange does to answer a query)
+# returns the level dicts themselves, as lists did before.
+
+import sys
+from collections import deque
+from itertools import islice
+
+
+class OrderHistory:
+
+  def __init__(self, length):
+    # Keeps level 0 and the levels leading to the last length trades (all of them if length is
+    # sys.maxsize or more).
+    self._levels = deque([{}], maxlen = length + 1 if length < sys.maxsize else None)
+
+    # Order id -> entries of that order id in the levels held, oldest first.
+    self._index = {}
+
+  def __len__(self):
+    return len(self._levels)
+
+  def __iter__(self):
+    return iter(self._levels)
+
+  def __getitem__(self, i):
+    # A level, or a list of the levels in a slice.
+    if isinstance(i, slice):
+      start, stop, step = i.indices(len(self._levels))
+      if step < 0: return list(self._levels)[i]
+      return list(islice(self._levels, start, max(start, stop), step))
+    return self._levels[i]
+
+  def add(self, order_id, entry):
+    # Records the entry of a new order in level 0, replacing any entry of the same id there.
+    level = self._levels[0]
+    if order_id in level: self._unindex(order_id, level[order_id])
+    level[order_id] = entry
+    self._index.setdefault(order_id, []).append(entry)
+
+  def entries(self, order_id):
+    # The entries of order_id in the levels held (empty if there are none).
+    return self._index.get(order_id, ())
+
+  def newLevel(self):
+    # Starts a new level 0 after a trade, dropping the oldest level if the history is full.
+    if len(self._levels) == self._levels.maxlen:
+      for order_id, entry in self._levels[-1].items():
+        self._unindex(order_id, entry)
+    self._levels.appendleft({})
+
+  def _unindex(self, order_id, entry):
+    entries = self._index[order_id]
+    for i, e in enumerate(entries):
+      if e is entry:
+        del entries[i]
+        break
+    if not entries: del self._index[order_id]
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from util.ExperimentRunner import ExperimentRunner, Run, generateSeeds, runPath
+from util.grid_search import grid
+from util.random_search import sample_tuples
+
+# Runs a config over a space of parameter values (and seeds) in parallel, collecting metrics of
+# every run into one results table.
+#
+# Parameters are config command line options, each with a list of values: e.g.
+# {'--fund-vol': [1e-8, 1e-7], '--mm-pov': [0.025, 0.05]} for rmsc03.  The points of the sweep are
+# the full grid of the lists (util.grid_search), or num_samples points drawn from it uniformly at
+# random, by Latin hypercube or by Sobol sequence (util.random_search); each point runs once per
+# seed.  Runs go to util.ExperimentRunner, which starts the next waiting run whenever one of its
+# num_parallel slots frees up, so long runs do not hold up the rest of the sweep.
+#
+# Every run is identified by a key hashing its config, arguments and seed, and logs to
+# log/<name>/<key>.  A run whose key already has a result there (from an earlier or interrupted
+# sweep) is not run again.  As each run completes, a row of its parameters and metrics is written
+# to a Parquet table (log/<name>/results.parquet by default), one row group per run, so the
+# results of a long sweep are saved as it goes.
+
+SWEEP_METHODS = ['grid', 'random', 'lhs', 'sobol']
+
+# Columns of the results table before the parameter and metric columns.
+RESULT_COLUMNS = ['key', 'log_dir', 'seed', 'status', 'elapsed']
+
+
+def runKey(config, args, seed):
+  # Identifies a run by its config, arguments (in order) and seed.
+  spec = json.dumps([config, [str(a) for a in args], int(seed)])
+  return hashlib.sha1(spec.encode()).hexdigest()[:16]
+
+
+def summaryMetrics(result):
+  # Default metrics of a run: the kernel's event queue wall clock time, and the mean of each
+  # numeric summary log event (e.g. ENDING_CASH) by agent strategy.
+  metrics = {}
+
+  elapsed = result['custom_state'].get('kernel_event_queue_elapsed_wallclock')
+  if elapsed is not None: metrics['event_queue_elapsed'] = pd.Timedelta(elapsed).total_seconds()
+
+  summary = result['summary']
+  values = pd.to_numeric(summary['Event'], errors='coerce')
+  means = values.groupby([summary['AgentStrategy'], summary['EventType']]).mean().dropna()
+
+  for (strategy, event_type), mean in means.items():
+    metrics['{} {}'.format(strategy, event_type)] = mean
+
+  return metrics
+
+
+class ParameterSweep:
+
+  def __init__(self, config, params, name, method='grid', num_samples=None, sample_seed=12345, seeds=None,
+               num_seeds=1, seed=None, config_args=(), metrics=summaryMetrics, results_path=None, **runner_args):
+    # config: config name, as for abides.py -c.
+    # params: dict of config option -> list of values.
+    # name: name of the sweep, the log directory under which its runs log.
+    # method: one of SWEEP_METHODS; all but 'grid' draw num_samples points using sample_seed.
+    # seeds: the seeds to run each point with, or else num_seeds seeds drawn from seed.
+    # config_args: further config arguments, the same for every run.
+    # metrics: function of a run's result (see ExperimentRunner.iterResults) returning a dict of
+    #          metric name -> number.
+    # runner_args: passed to ExperimentRunner (num_parallel, timeout, preload, ...).
+    if method not in SWEEP_METHODS: raise ValueError(f"Option not in {SWEEP_METHODS}")
+    if method != 'grid' and not num_samples: raise ValueError("num_samples is required for method " + method)
+
+    # Fail before any run starts rather than when the first result is written.
+    try:
+      import pyarrow.parquet
+    except ImportError:
+      raise ImportError("ParameterSweep writes its results table with pyarrow: pip install pyarrow")
+    if method == 'sobol':
+      try:
+        from scipy.stats import qmc
+      except ImportError:
+        raise ImportError("The sobol method needs scipy >= 1.7 (scipy.stats.qmc)")
+
+    self.config = config
+    self.params = dict(params)
+    self.name = name
+    self.method = method
+    self.num_samples = num_samples
+    self.sample_seed = sample_seed
+    self.seeds = [int(s) for s in (generateSeeds(seed, num_seeds) if seeds is None else seeds)]
+    self.config_args = [str(a) for a in config_args]
+    self.metrics = metrics
+    self.results_path = results_path or os.path.join(runPath(name), 'results.parquet')
+    self.runner = ExperimentRunner(**runner_args)
+
+  def points(self):
+    # The parameter values of each point of the sweep, as a list of dicts.
+    names, values = list(self.params), list(self.params.values())
+
+    if self.method == 'grid':
+      tuples = grid(values)
+    else:
+      tuples = sample_tuples(values, self.num_samples, self.sample_seed, self.method)
+
+    return [dict(zip(names, t)) for t in tuples]
+
+  def runs(self):
+    # The Run of each point and seed, and its point.
+    runs = []
+    for point in self.points():
+      args = [str(a) for item in point.items() for a in item] + self.config_args
+      for seed in self.seeds:
+        key = runKey(self.config, args, seed)
+        runs.append((Run(self.config, os.path.join(self.name, key), seed, args), point))
+
+    return runs
+
+  def run(self, verbose=True):
+    # Runs the sweep, returning the results table as a DataFrame (also written to results_path).
+    import pyarrow.parquet as pq
+
+    runs = self.runs()
+    points = {run.log_dir: point for run, point in runs}
+
+    # Parameter columns are typed from all of their values, so that every row fits the schema.
+    param_types = {name: self.columnType(values) for name, values in self.params.items()}
+
+    rows, writer, schema = [], None, None
+    os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+
+    start = time.perf_counter()
+    done = 0
+
+    try:
+      for result in self.runner.iterResults([run for run, point in runs]):
+        run = result['run']
+        done += 1
+
+        row = {'key': os.path.basename(run.log_dir), 'log_dir': run.log_dir, 'seed': run.seed,
+               'status': result['status'], 'elapsed': result['elapsed']}
+        row.update(points[run.log_dir])
+
+        if result['status'] in ('ok', 'cached'):
+          try:
+            row.update({name: float(value) for name, value in self.metrics(result).items()})
+          except Exception as e:
+            row['status'] = 'metrics failed: {}'.format(e)
+
+        if verbose:
+          print("[{}/{}] {} seed {}: {} ({:.1f} s elapsed)".format(done, len(runs), row['key'], run.seed,
+                row['status'], time.perf_counter() - start), flush=True)
+
+        rows.append(row)
+
+        # The table's metric columns are those of the first run with metrics.
+        if schema is None and len(row) > len(RESULT_COLUMNS) + len(self.params):
+          metric_names = [c for c in row if c not in RESULT_COLUMNS and c not in self.params]
+          schema = self.schema(param_types, metric_names)
+          writer = pq.ParquetWriter(self.results_path, schema)
+
+          for pending in rows:
+            writer.write_table(self.toTable([pending], schema))
+        elif writer is not None:
+          writer.write_table(self.toTable([row], schema))
+    finally:
+      if writer is None:
+        # No run had metrics: the table only has the parameter columns.
+        schema = self.schema(param_types, [])
+        pq.write_table(self.toTable(rows, schema), self.results_path)
+      else:
+        writer.close()
+
+    return pq.read_table(self.results_path).to_pandas()
+
+  @staticmethod
+  def columnType(values):
+    import pyarrow as pa
+
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values): return pa.int64()
+    if all(isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool) for v in values):
+      return pa.float64()
+    return pa.string()
+
+  def schema(self, param_types, metric_names):
+    import pyarrow as pa
+
+    fields = [('key', pa.string()), ('log_dir', pa.string()), ('seed', pa.int64()), ('status', pa.string()),
+              ('elapsed', pa.float64())]
+    fields += [(name, param_types[name]) for name in self.params]
+    fields += [(name, pa.float64()) for name in metric_names]
+    return pa.schema(fields)
+
+  @staticmethod
+  def conform(row, schema):
+    # The row with exactly the schema's columns (missing metrics as nulls, string parameters as
+    # strings).  Metrics not in the schema are dropped.
+    import pyarrow as pa
+    return {f.name: (str(row[f.name]) if f.type == pa.string() and row.get(f.name) is not None
+                     else row.get(f.name)) for f in schema}
+
+  def toTable(self, rows, schema):
+    # Built column by column, as Table.from_pylist needs pyarrow >= 7.
+    import pyarrow as pa
+    rows = [self.conform(row, schema) for row in rows]
+    return pa.Table.from_pydict({f.name: [row[f.name] for row in rows] for f in schema}, schema=schema)
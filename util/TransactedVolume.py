@@ -0,0 +1,79 @@
+# Incremental index of the executions of an order book, for the transacted volume queries
+# (QUERY_TRANSACTED_VOLUME) answered by the ExchangeAgent.  Each OrderBook owns one, and records
+# every execution (its time and the number of shares traded) as it happens.
+#
+# Executions are recorded in time order, so the index is just two growable numpy arrays: the time
+# of each execution and the total shares traded up to and including it.  The volume traded in any
+# window of time is then two binary searches and a subtraction, however long the day has been.
+#
+# If a horizon is given, the index is a ring buffer: executions more than horizon before the
+# latest one are discarded whenever the arrays fill up, so the memory held stays bounded by the
+# busiest horizon of the day.  Windows must then start no more than horizon before the latest
+# execution.  Without a horizon, every execution of the day is kept (16 bytes each).
+
+import numpy as np
+import pandas as pd
+
+
+class TransactedVolume:
+
+  def __init__(self, horizon = None, capacity = 1024):
+    # Length of time (anything pd.to_timedelta accepts, or None) for which executions are kept.
+    self.horizon = None if horizon is None else pd.to_timedelta(horizon).value
+
+    # One entry per execution held: its time in ns, and the cumulative shares traded.
+    self._times = np.empty(capacity, dtype=np.int64)
+    self._volumes = np.empty(capacity, dtype=np.int64)
+    self._size = 0
+
+    # Shares traded in the executions already discarded.
+    self._discarded = 0
+
+  def __len__(self):
+    # Number of executions held.
+    return self._size
+
+  def total(self):
+    # Shares traded in all executions recorded.
+    return int(self._volumes[self._size - 1]) if self._size else self._discarded
+
+  def record(self, time, quantity):
+    # Records an execution of quantity shares at time (ns or pd.Timestamp), no earlier than the
+    # last one recorded.
+    if self._size == len(self._times): self._grow()
+
+    t = time.value if type(time) is pd.Timestamp else int(time)
+    self._times[self._size] = t
+    self._volumes[self._size] = self.total() + quantity
+    self._size += 1
+
+  def _grow(self):
+    # Makes room for at least one more execution, first by discarding those past the horizon, and
+    # only if that frees less than a quarter of the arrays by doubling their capacity.
+    size = self._size
+    if self.horizon is not None:
+      keep = int(self._times[:size].searchsorted(self._times[size - 1] - self.horizon, side='left'))
+      if keep > 0:
+        self._discarded = int(self._volumes[keep - 1])
+        self._times[:size - keep] = self._times[keep:size]
+        self._volumes[:size - keep] = self._volumes[keep:size]
+        self._size = size = size - keep
+
+    if size >= len(self._times) * 3 // 4:
+      capacity = 2 * len(self._times)
+      self._times = np.resize(self._times, capacity)
+      self._volumes = np.resize(self._volumes, capacity)
+
+  def _before(self, t):
+    # Shares traded in the executions before time t (ns).
+    i = int(self._times[:self._size].searchsorted(t, side='left'))
+    return int(self._volumes[i - 1]) if i else self._discarded
+
+  def volume(self, start, end = None):
+    # Shares traded in the executions at times in [start, end] (ns or pd.Timestamp), or from start
+    # onwards if end is None.
+    start = start.value if type(start) is pd.Timestamp else int(start)
+    if end is None: return self.total() - self._before(start)
+
+    end = end.value if type(end) is pd.Timestamp else int(end)
+    return max(self._before(end + 1) - self._before(start), 0)
@@ -4,6 +4,11 @@ import numpy as np
 import os
 from random import sample
 from dateutil.parser import parse
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[2])  # directory two levels up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
 
 """ Clean OHLC WRDS data series into historical fundamental format."""
 
@@ -11,7 +16,7 @@ directory = sys.argv[1]
 files = os.listdir(directory)
 filename = os.path.join(directory, sample(files, 1)[0])
 
-df = pd.read_pickle(filename, compression="bz2")
+df = readLog(filename)
 df.reset_index(level=-1, inplace=True)
 df.level_1 = pd.to_datetime(df.level_1)
 
@@ -1,5 +1,6 @@
 import argparse
 import os
+from multiprocessing import Pool
 import pandas as pd
 import numpy as np
 
@@ -9,112 +10,157 @@ p = str(Path(__file__).resolve().parents[2])  # directory two levels up from thi
 sys.path.append(p)
 
 from util.formatting.convert_order_stream import get_year_month_day, get_start_end_time, dir_path, check_positive
-from tqdm import tqdm
+from util.LogFormat import readLog
+from scipy.sparse import csr_matrix
 
 
-def get_larger_int_and_gap(a, b):
-    return (True, a - b) if a >= b else (False, b - a)
+# Output columns for each level of the book, in the order of the LOBSTER orderbook file.
+LEVEL_COLUMNS = ['ask_price', 'ask_size', 'bid_price', 'bid_size']
 
+# Values standing in for missing levels, as in the LOBSTER orderbook file.
+MISSING_BID = -9999999999
+MISSING_ASK = 9999999999
 
-def get_int_from_string(s):
-    int_list = [int(s) for s in s.split('_') if s.isdigit()]
-    return int_list[0]
+# Snapshots converted at a time.
+CHUNK_SIZE = 100000
 
 
-def process_row(row, quote_levels):
-    """ Method takes row of unstacked orderbook log and processes into a dictionary representing a row of the LOBSTER-
-        ised DataFrame.
-    """
-
-    row_arr = row[1].to_numpy()
-
-    bid_orders_idx = np.nonzero(row_arr < 0)
-    ask_orders_idx = np.nonzero(row_arr > 0)
-
-    ask_values = quote_levels[ask_orders_idx].to_numpy()
-    ask_volumes = row_arr[ask_orders_idx]
-
-    bid_values = quote_levels[bid_orders_idx].to_numpy()
-    bid_values = np.flip(bid_values)
-    bid_volumes = row_arr[bid_orders_idx]
-    bid_volumes = np.flip(-bid_volumes)
-
-    num_bids = bid_values.size
-    num_asks = ask_values.size
-
-    more_bids_then_asks, difference = get_larger_int_and_gap(num_bids, num_asks)
-
-    if more_bids_then_asks:
-        ask_values = np.pad(ask_values.astype(np.float32), (0, difference), 'constant', constant_values=np.nan)
-        ask_volumes = np.pad(ask_volumes.astype(np.float32), (0, difference), 'constant', constant_values=np.nan)
+def is_wide_book(df):
+    """ Checks if orderbook dataframe is in wide or skinny format. """
+    if isinstance(df.index, pd.MultiIndex):
+        return False
     else:
-        bid_values = np.pad(bid_values.astype(np.float32), (0, difference), 'constant', constant_values=np.nan)
-        bid_volumes = np.pad(bid_volumes.astype(np.float32), (0, difference), 'constant', constant_values=np.nan)
-
-    ask_volumes_dict = {f"ask_size_{idx + 1}": ask_volumes[idx] for idx in range(len(ask_volumes))}
-    ask_values_dict = {f"ask_price_{idx + 1}": ask_values[idx] for idx in range(len(ask_values))}
-    bid_volumes_dict = {f"bid_size_{idx + 1}": bid_volumes[idx] for idx in range(len(bid_volumes))}
-    bid_values_dict = {f"bid_price_{idx + 1}": bid_values[idx] for idx in range(len(bid_values))}
-
-    row_dict = {**ask_volumes_dict, **ask_values_dict, **bid_volumes_dict, **bid_values_dict}
-    return row_dict
-
-
-def reorder_columns(unordered_cols):
-    """ Reorders column list to coincide with columns of LOBSTER csv file format. """
-
-    ask_price_cols = [label for label in unordered_cols if 'ask_price' in label]
-    ask_size_cols = [label for label in unordered_cols if 'ask_size' in label]
-    bid_price_cols = [label for label in unordered_cols if 'bid_price' in label]
-    bid_size_cols = [label for label in unordered_cols if 'bid_size' in label]
-
-    bid_price_cols.sort(key=get_int_from_string)
-    bid_size_cols.sort(key=get_int_from_string)
-    ask_price_cols.sort(key=get_int_from_string)
-    ask_size_cols.sort(key=get_int_from_string)
-
-    bid_price_cols = np.array(bid_price_cols)
-    bid_size_cols = np.array(bid_size_cols)
-    ask_price_cols = np.array(ask_price_cols)
-    ask_size_cols = np.array(ask_size_cols)
-
-    new_col_list_size = ask_price_cols.size + ask_size_cols.size + bid_price_cols.size + bid_size_cols.size
-    new_col_list = np.empty((new_col_list_size,), dtype='<U16')
-
-    new_col_list[0::4] = ask_price_cols
-    new_col_list[1::4] = ask_size_cols
-    new_col_list[2::4] = bid_price_cols
-    new_col_list[3::4] = bid_size_cols
-    return new_col_list
-
+        return True
 
-def finalise_processing(orderbook_df, level):
-    """ Clip to requested level and fill NaNs according to LOBSTER spec. """
 
-    bid_columns = [col for col in orderbook_df.columns if "bid" in col]
-    ask_columns = [col for col in orderbook_df.columns if "ask" in col]
+def book_matrix(df):
+    """ The volumes of an orderbook log as a sparse matrix with one row per snapshot and one column per quote, holding
+        only the non-zero volumes (negative for bids) of each snapshot.
 
-    orderbook_df[bid_columns] = orderbook_df[bid_columns].fillna(value=-9999999999)
-    orderbook_df[ask_columns] = orderbook_df[ask_columns].fillna(value=9999999999)
+    :param df: pd.DataFrame orderbook output by ABIDES, in skinny or wide format, sparse or dense
+    :return: (scipy.sparse.csr_matrix of volumes, np.ndarray of quotes, dtype of the volumes as logged)
+    """
+    if not is_wide_book(df):  # orderbook skinny format
+        volumes = df.iloc[:, 0]
+        times, quotes = df.index.levels
+        rows, columns = df.index.codes
+        dtype = volumes.dtype.subtype if isinstance(volumes.dtype, pd.SparseDtype) else volumes.dtype
+        if isinstance(volumes.dtype, pd.SparseDtype):
+            # Only the entries differing from the fill value are stored.
+            sp_index = volumes.array.sp_index.indices
+            values = volumes.array.sp_values
+            rows, columns = rows[sp_index], columns[sp_index]
+        else:
+            values = volumes.to_numpy()
+        shape = (len(times), len(quotes))
+    else:  # orderbook wide format
+        quotes = df.columns
+        dtype = np.result_type(*[d.subtype if isinstance(d, pd.SparseDtype) else d for d in df.dtypes])
+        if all(isinstance(d, pd.SparseDtype) for d in df.dtypes):
+            coo = df.sparse.to_coo()
+            rows, columns, values = coo.row, coo.col, coo.data
+        else:
+            rows, columns = np.nonzero(df.to_numpy() != 0)
+            values = df.to_numpy()[rows, columns]
+        shape = df.shape
+
+    # Levels with no volume (zero or missing) are not in the book.
+    keep = (values < 0) | (values > 0)
+    matrix = csr_matrix((values[keep], (rows[keep], columns[keep])), shape=shape)
+    matrix.sum_duplicates()
+    return matrix, np.asarray(quotes), dtype
+
+
+def level_counts(matrix):
+    """ Number of bid and ask levels in each snapshot. """
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    bids = np.bincount(rows[matrix.data < 0], minlength=matrix.shape[0])
+    asks = np.bincount(rows[matrix.data > 0], minlength=matrix.shape[0])
+    return bids, asks
+
+
+def column_dtypes(bids, asks, quote_dtype, volume_dtype, levels):
+    """ The dtype of each output column, as the LOBSTER-ised DataFrame has always had them: the side of each snapshot
+        with fewer levels (the asks, on a tie) was padded to the length of the other as float32, so a column keeps the
+        integer type of the log only if every snapshot has that level, on a side that was never padded.
+    """
+    dtypes = {}
+    for level in range(1, levels + 1):
+        exact = {'ask': np.all((asks >= level) & (bids < asks)), 'bid': np.all((bids >= level) & (bids >= asks))}
+        for column in LEVEL_COLUMNS:
+            side, name = column.split('_')
+            source = quote_dtype if name == 'price' else volume_dtype
+            integer = exact[side] and np.issubdtype(source, np.integer)
+            dtypes[f'{column}_{level}'] = np.int64 if integer else np.float64
+    return dtypes
+
+
+def top_levels(matrix, quotes, bids, asks, levels):
+    """ Prices and sizes of the best levels on each side of the book in each snapshot, keyed by LEVEL_COLUMNS, as
+        float64 arrays of shape (snapshots, levels), NaN where there are fewer levels.  Bids are the negative volumes,
+        best (highest quote) first, and asks the positive ones, best (lowest quote) first; the side with fewer levels is
+        rounded through float32, as it always has been.
+    """
+    n = matrix.shape[0]
+    matrix.sort_indices()
+    data, indices, indptr = matrix.data, matrix.indices, matrix.indptr
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+
+    is_ask = data > 0
+    is_bid = data < 0
+
+    # Rank of each level on its side of its snapshot (1 for the best), counting asks up from the lowest quote and
+    # bids down from the highest.
+    ask_seen = np.concatenate([[0], np.cumsum(is_ask)])
+    bid_seen = np.concatenate([[0], np.cumsum(is_bid)])
+    ask_rank = ask_seen[1:] - ask_seen[indptr[rows]]
+    bid_rank = bids[rows] - (bid_seen[1:] - bid_seen[indptr[rows]]) + 1
+
+    result = {}
+    for side, mask, rank, sign in [('ask', is_ask, ask_rank, 1), ('bid', is_bid, bid_rank, -1)]:
+        shown = mask & (rank <= levels)
+        price = np.full((n, levels), np.nan)
+        size = np.full((n, levels), np.nan)
+        price[rows[shown], rank[shown] - 1] = quotes[indices[shown]]
+        size[rows[shown], rank[shown] - 1] = sign * data[shown]
+        result[f'{side}_price'], result[f'{side}_size'] = price, size
+
+    # The padded side of each snapshot went through float32.
+    for column in LEVEL_COLUMNS:
+        padded = bids >= asks if column.startswith('ask') else bids < asks
+        result[column][padded] = result[column][padded].astype(np.float32)
+
+    return result
+
+
+def iter_orderbook(df, level, chunk_size=CHUNK_SIZE):
+    """ Transforms an orderbook log into the LOBSTER format a chunk of snapshots at a time, yielding a DataFrame for
+        each chunk.  The chunks together are exactly the DataFrame process_orderbook returns.
 
-    num_levels = int((len(orderbook_df.columns) - 1) / 4) + 1
-    columns_to_drop = []
-    columns_to_drop.extend([f'ask_price_{idx}' for idx in range(1, num_levels + 1) if idx > level])
-    columns_to_drop.extend([f'ask_size_{idx}' for idx in range(1, num_levels + 1) if idx > level])
-    columns_to_drop.extend([f'bid_price_{idx}' for idx in range(1, num_levels + 1) if idx > level])
-    columns_to_drop.extend([f'bid_size_{idx}' for idx in range(1, num_levels + 1) if idx > level])
+    :param df: pd.DataFrame orderbook output by ABIDES
+    :param level: Maximum displayed level in book
+    :param chunk_size: Snapshots per chunk
+    """
+    matrix, quotes, volume_dtype = book_matrix(df)
+    bids, asks = level_counts(matrix)
 
-    orderbook_df = orderbook_df.drop(columns=columns_to_drop)
+    # The book is shown to the requested level, or as deep as it ever went if that is less.
+    levels = min(level, int(max(bids.max(initial=0), asks.max(initial=0))))
+    dtypes = column_dtypes(bids, asks, quotes.dtype, volume_dtype, levels)
 
-    return orderbook_df
+    for start in range(0, max(matrix.shape[0], 1), chunk_size):
+        end = min(start + chunk_size, matrix.shape[0])
+        result = top_levels(matrix[start:end], quotes, bids[start:end], asks[start:end], levels)
 
+        columns = {}
+        for i in range(levels):
+            for column in LEVEL_COLUMNS:
+                label = f'{column}_{i + 1}'
+                values = result[column][:, i]
+                values = np.where(np.isnan(values), MISSING_BID if column.startswith('bid') else MISSING_ASK, values)
+                columns[label] = values.astype(dtypes[label])
 
-def is_wide_book(df):
-    """ Checks if orderbook dataframe is in wide or skinny format. """
-    if isinstance(df.index, pd.core.index.MultiIndex):
-        return False
-    else:
-        return True
+        yield pd.DataFrame(columns, index=pd.RangeIndex(start, end))
 
 
 def process_orderbook(df, level):
@@ -124,34 +170,34 @@ def process_orderbook(df, level):
     :param level: Maximum displayed level in book
     :return:
     """
+    return pd.concat(iter_orderbook(df, level))
 
-    if not is_wide_book(df):  # orderbook skinny format
-        unstacked = df.unstack(level=-1)
-        quote_levels = unstacked.columns.levels[1]
-    else:  # orderbook wide format
-        unstacked = df
-        quote_levels = df.columns
-
-    # Make DataFrame reshaped to LOBSTER format
-    rows_list = []
-    for row in tqdm(unstacked.iterrows(), total=len(unstacked.index), desc="Processing order book"):
-        row_dict = process_row(row, quote_levels)
-        rows_list.append(row_dict)
-
-    nearly_lobster = pd.DataFrame(rows_list)
 
-    # Reorder columns
-    unordered_cols = list(nearly_lobster.columns)
-    new_col_list = reorder_columns(unordered_cols)
-    nearly_lobster = nearly_lobster[new_col_list]
-
-    # Clip to requested level and fill NaNs
-    orderbook_df = finalise_processing(nearly_lobster, level)
-
-    return orderbook_df
+def write_orderbook(chunks, filename, fmt='csv'):
+    """ Writes the chunks of a LOBSTER-ised orderbook to a file as they come, without a header or index in csv format,
+        or with the column names in parquet format.
+    """
+    if fmt == 'csv':
+        with open(filename, 'w') as f:
+            for chunk in chunks:
+                chunk.to_csv(f, index=False, header=False)
+    elif fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None: writer = pq.ParquetWriter(filename, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None: writer.close()
+    else:
+        raise ValueError('Format needs to be "csv" or "parquet"')
 
 
-def save_formatted_order_book(orderbook_bz2, ticker, level, out_dir='.'):
+def save_formatted_order_book(orderbook_bz2, ticker, level, out_dir='.', fmt='csv', chunk_size=CHUNK_SIZE):
     """ Saves orderbook data from ABIDES in LOBSTER format.
 
         :param orderbook_bz2: file path of order book bz2 output file.
@@ -162,6 +208,12 @@ def save_formatted_order_book(orderbook_bz2, ticker, level, out_dir='.'):
         :type level: int
         :param out_dir: path to output directory
         :type out_dir: str
+        :param fmt: output file format, "csv" or "parquet"
+        :type fmt: str
+        :param chunk_size: snapshots converted and written at a time
+        :type chunk_size: int
+
+        :return: path of the file written
 
         :return:
 
@@ -184,7 +236,7 @@ def save_formatted_order_book(orderbook_bz2, ticker, level, out_dir='.'):
 
     """
 
-    orderbook_df = pd.read_pickle(orderbook_bz2)
+    orderbook_df = readLog(orderbook_bz2)
 
     if not is_wide_book(orderbook_df):  # skinny format
         trading_day = get_year_month_day(pd.Series(orderbook_df.index.levels[0]))
@@ -193,26 +245,71 @@ def save_formatted_order_book(orderbook_bz2, ticker, level, out_dir='.'):
         trading_day = get_year_month_day(pd.Series(orderbook_df.index))
         start_time, end_time = get_start_end_time(orderbook_df, 'orderbook_wide')
 
-    orderbook_df = process_orderbook(orderbook_df, level)
-
-    # Save to file
+    # Save to file, a chunk at a time
 
     #filename = f'{ticker}_{trading_day}_{start_time}_{end_time}_orderbook_{str(level)}.csv'
-    filename = f'orderbook.csv'
+    filename = f'orderbook.{fmt}'
     filename = os.path.join(out_dir, filename)
 
-    orderbook_df.to_csv(filename, index=False, header=False)
+    write_orderbook(iter_orderbook(orderbook_df, level, chunk_size), filename, fmt)
+    return filename
+
+
+def orderbook_path(book, ticker):
+    """ The order book log given on the command line: the path itself if it is a file, or the full order book log of
+        the ticker if it is a log directory.
+    """
+    if os.path.isdir(book):
+        return os.path.join(book, f'ORDERBOOK_{ticker}_FULL.bz2')
+    return book
+
+
+def save_formatted_order_books(books, ticker, level, out_dir='.', fmt='csv', chunk_size=CHUNK_SIZE, jobs=1):
+    """ Saves many orderbook logs in LOBSTER format, in parallel over jobs processes. Each is written to a directory
+        under out_dir named for its log directory.
+
+        :param books: order book log files, or log directories holding the full order book log of the ticker
+        :type books: list of str
+        :param jobs: number of processes
+        :type jobs: int
+
+        :return: list of the paths of the files written
+    """
+    tasks = []
+    for book in books:
+        path = orderbook_path(book, ticker)
+        book_out_dir = os.path.join(out_dir, os.path.basename(os.path.dirname(os.path.abspath(path))))
+        os.makedirs(book_out_dir, exist_ok=True)
+        tasks.append((path, ticker, level, book_out_dir, fmt, chunk_size))
+
+    if jobs == 1:
+        return [save_formatted_order_book(*task) for task in tasks]
+
+    with Pool(jobs) as p:
+        return p.starmap(save_formatted_order_book, tasks)
 
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Process ABIDES order book data into the LOBSTER format.')
-    parser.add_argument('book', type=str, help='ABIDES order book in bz2 format. '
-                                               'Typical example is `orderbook_TICKER.bz2`')
+    parser.add_argument('book', type=str, nargs='+', help='ABIDES order book in bz2 format, or a log directory holding '
+                                                          '`ORDERBOOK_TICKER_FULL.bz2`. Given several, each is written '
+                                                          'to a directory under the output directory named for its log '
+                                                          'directory.')
     parser.add_argument('-o', '--output-dir', default='.', help='Path to output directory', type=dir_path)
     parser.add_argument('ticker', type=str, help="Ticker label")
     parser.add_argument('level', type=check_positive, help="Maximum orderbook level.")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Output file format")
+    parser.add_argument('--chunk-size', type=check_positive, default=CHUNK_SIZE,
+                        help="Snapshots converted and written at a time")
+    parser.add_argument('-j', '--jobs', type=check_positive, default=1,
+                        help="Number of order books to convert in parallel")
 
     args, remaining_args = parser.parse_known_args()
 
-    save_formatted_order_book(args.book, args.ticker, args.level, out_dir=args.output_dir)
+    if len(args.book) == 1:
+        save_formatted_order_book(orderbook_path(args.book[0], args.ticker), args.ticker, args.level,
+                                  out_dir=args.output_dir, fmt=args.format, chunk_size=args.chunk_size)
+    else:
+        save_formatted_order_books(args.book, args.ticker, args.level, out_dir=args.output_dir, fmt=args.format,
+                                   chunk_size=args.chunk_size, jobs=args.jobs)
@@ -1,37 +1,50 @@
 import argparse
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
-from pandas.io.json import json_normalize
-import json
 import os
+import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[2])  # directory two levels up from this file
+sys.path.append(p)
+
+from util.LogFormat import readLog
+
+
+# LOBSTER message type of each logged order event converted.
+MARKET_EVENTS = {
+    "LIMIT_ORDER": 1,
+    # "MODIFY_ORDER": 2, # causing errors in market replay
+    "ORDER_CANCELLED": 3,
+    "ORDER_EXECUTED": 4
+}
+
+# Fields of the logged order dicts extracted, and their output column names.
+ORDER_FIELDS = {'order_id': 'ORDER_ID', 'limit_price': 'PRICE', 'quantity': 'SIZE', 'is_buy_order': 'BUY_SELL_FLAG'}
+
+# Rows of a message file written at a time.
+CHUNK_SIZE = 100000
+
+
+def extract_order_fields(events):
+    """ Extracts the fields of ORDER_FIELDS from a Series of logged order dicts into columns, NaN where a dict has no
+        such field.
+
+    :param events: pd.Series of dicts, as logged by the Exchange Agent
+    :return: pd.DataFrame with one column per field, named as in ORDER_FIELDS, indexed like events
+    """
+    fields = pd.DataFrame.from_records(list(events.values), columns=list(ORDER_FIELDS))
+    fields.index = events.index
+    return fields.rename(columns=ORDER_FIELDS)
 
 
 def extract_events_from_stream(stream_df, event_type):
     """ Extracts specific event from stream.
 
     """
-    events = stream_df.loc[stream_df.EventType == event_type][['EventTime', 'Event']]
-    events_json = events['Event'].to_json(orient="records")
-    json_struct = json.loads(events_json)
-    # TODO : get rid of structs containing all `int` types
-    event_extracted = json_normalize(json_struct)
-    event_extracted = pd.merge(events['EventTime'].reset_index(), event_extracted, left_index=True, right_index=True)
-
-    if not event_extracted.empty:
-        event_extracted = event_extracted[['EventTime', 'order_id', 'limit_price', 'quantity', 'is_buy_order']]
-        event_extracted.rename(columns={'EventTime': 'TIMESTAMP',
-                                        'order_id': 'ORDER_ID',
-                                        'limit_price': 'PRICE',
-                                        'quantity': 'SIZE',
-                                        'is_buy_order': 'BUY_SELL_FLAG'}, inplace=True)
-    else:
-        event_extracted = pd.DataFrame({
-            'TIMESTAMP': [],
-            'ORDER_ID': [],
-            'PRICE': [],
-            'SIZE': [],
-            'BUY_SELL_FLAG': []
-        })
-
+    events = stream_df.loc[stream_df.EventType == event_type]
+    event_extracted = extract_order_fields(events['Event']).reset_index(drop=True)
+    event_extracted.insert(0, 'TIMESTAMP', events['EventTime'].values)
     return event_extracted
 
 
@@ -40,39 +53,38 @@ def seconds_since_midnight(s):
 
         Inspired by https://stackoverflow.com/a/38050344
     """
-    d = pd.to_datetime(s.dt.date)
-    delta_t = s - d
+    delta_t = s - s.dt.normalize()
     return delta_t.dt.total_seconds()
 
 
+def extract_market_events(stream_df):
+    """ Extracts every order event of MARKET_EVENTS from the stream in a single pass, in the order logged.
+
+    :param stream_df: pd.DataFrame of the Exchange Agent log, with an EventTime column
+    :return: pd.DataFrame with columns TIMESTAMP, ORDER_ID, PRICE, SIZE, BUY_SELL_FLAG, Time and Type
+    """
+    types = stream_df['EventType'].map(MARKET_EVENTS)
+    events = stream_df.loc[types.notna()]
+
+    market_df = extract_order_fields(events['Event']).reset_index(drop=True)
+    market_df.insert(0, 'TIMESTAMP', events['EventTime'].values)
+    market_df['Time'] = seconds_since_midnight(market_df['TIMESTAMP'])
+    market_df['Type'] = types[types.notna()].values.astype(np.int64)
+    return market_df
+
+
 def convert_stream_to_format(stream_df, fmt="LOBSTER"):
     """ Converts imported ABIDES DataFrame into LOBSTER FORMAT.
+
+        Events are sorted by time; events at the same time stay in the order they were logged.
     """
-    event_dfs = []
-    market_events = {
-        "LIMIT_ORDER": 1,
-        # "MODIFY_ORDER": 2, # causing errors in market replay
-        "ORDER_CANCELLED": 3,
-        "ORDER_EXECUTED": 4
-    }
-    reversed_market_events = {val: key for key, val in market_events.items()}
-
-    for event_name, lobster_code in market_events.items():
-        event_df = extract_events_from_stream(stream_df, event_name)
-        if event_df.empty:
-            continue
-        else:
-            event_df["Time"] = seconds_since_midnight(event_df["TIMESTAMP"])
-            event_df["Type"] = lobster_code
-            event_dfs.append(event_df)
-
-    lobster_df = pd.concat(event_dfs)
+    lobster_df = extract_market_events(stream_df)
 
     if fmt == "plot-scripts":
 
-        lobster_df["Type"].replace(reversed_market_events, inplace=True)
-        lobster_df.rename(columns={'Type': "TYPE"}, inplace=True)
-        lobster_df = lobster_df.sort_values(by=['TIMESTAMP'])
+        reversed_market_events = {val: key for key, val in MARKET_EVENTS.items()}
+        lobster_df["TYPE"] = lobster_df["Type"].map(reversed_market_events)
+        lobster_df = lobster_df.sort_values(by=['TIMESTAMP'], kind='stable')
         lobster_df = lobster_df[['TIMESTAMP', 'ORDER_ID', 'PRICE', 'SIZE', 'BUY_SELL_FLAG', 'TYPE']]
         return lobster_df
 
@@ -83,7 +95,7 @@ def convert_stream_to_format(stream_df, fmt="LOBSTER"):
         lobster_df["Direction"] = (lobster_df["BUY_SELL_FLAG"] * 2) - 1
 
         lobster_df = lobster_df[["Time", "Type", "Order ID", "Size", "Price", "Direction"]]
-        lobster_df = lobster_df.sort_values(by=['Time'])
+        lobster_df = lobster_df.sort_values(by=['Time'], kind='stable')
         return lobster_df
 
     else:
@@ -121,7 +133,14 @@ def get_start_end_time(df, fmt):
         raise ValueError('Format needs to be "plot-scripts" or "LOBSTER" or "orderbook_skinny" or "orderbook_wide"')
 
 
-def save_formatted_order_stream(stream_bz2, ticker, level, fmt, suffix, out_dir='.'):
+def write_stream(write_df, filename, chunk_size=CHUNK_SIZE):
+    """ Writes LOBSTER messages to a csv file without a header or index, a chunk of rows at a time. """
+    with open(filename, 'w') as f:
+        for start in range(0, len(write_df), chunk_size):
+            write_df.iloc[start:start + chunk_size].to_csv(f, index=False, header=False)
+
+
+def save_formatted_order_stream(stream_bz2, ticker, level, fmt, suffix, out_dir='.', chunk_size=CHUNK_SIZE):
     """ Saves ABIDES logged order stream into csv in requested format.
 
         :param stream_bz2: file path of Exchange Agent bz2 output file.
@@ -136,8 +155,10 @@ def save_formatted_order_stream(stream_bz2, ticker, level, fmt, suffix, out_dir=
         :type suffix: str
         :param out_dir: path to output directory
         :type out_dir: str
+        :param chunk_size: rows of the LOBSTER message file written at a time
+        :type chunk_size: int
 
-        :return:
+        :return: path of the file written
 
         =============
 
@@ -206,7 +227,7 @@ def save_formatted_order_stream(stream_bz2, ticker, level, fmt, suffix, out_dir=
 
     """
 
-    stream_df = pd.read_pickle(stream_bz2).reset_index()
+    stream_df = readLog(stream_bz2, columns=['EventType', 'Event']).reset_index()
     write_df = convert_stream_to_format(stream_df, fmt=fmt)
 
     # Save to file
@@ -222,11 +243,45 @@ def save_formatted_order_stream(stream_bz2, ticker, level, fmt, suffix, out_dir=
     elif fmt == "LOBSTER":
         filename = f'{ticker}_{trading_day}_{start_time}_{end_time}_message_{str(level)}{suffix}.csv'
         filename = os.path.join(out_dir, filename)
-        write_df.to_csv(filename, index=False, header=False)
+        write_stream(write_df, filename, chunk_size)
     else:
         raise ValueError('Format needs to be "plot-scripts" or "LOBSTER"')
 
+    return filename
+
+
+def stream_path(stream):
+    """ The order stream given on the command line: the path itself if it is a file, or the Exchange Agent log if it is
+        a log directory.
+    """
+    if os.path.isdir(stream):
+        return os.path.join(stream, 'EXCHANGE_AGENT.bz2')
+    return stream
+
 
+def save_formatted_order_streams(streams, ticker, level, fmt, suffix, out_dir='.', chunk_size=CHUNK_SIZE, jobs=1):
+    """ Saves many ABIDES logged order streams in the requested format, in parallel over jobs processes. Each is written
+        to a directory under out_dir named for its log directory.
+
+        :param streams: Exchange Agent log files, or log directories holding `EXCHANGE_AGENT.bz2`
+        :type streams: list of str
+        :param jobs: number of processes
+        :type jobs: int
+
+        :return: list of the paths of the files written
+    """
+    tasks = []
+    for stream in streams:
+        path = stream_path(stream)
+        stream_out_dir = os.path.join(out_dir, os.path.basename(os.path.dirname(os.path.abspath(path))))
+        os.makedirs(stream_out_dir, exist_ok=True)
+        tasks.append((path, ticker, level, fmt, suffix, stream_out_dir, chunk_size))
+
+    if jobs == 1:
+        return [save_formatted_order_stream(*task) for task in tasks]
+
+    with Pool(jobs) as p:
+        return p.starmap(save_formatted_order_stream, tasks)
 
 
 def dir_path(string):
@@ -248,16 +303,26 @@ def check_positive(value):
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Process ABIDES stream data into either plotting or LOBSTER formats.')
-    parser.add_argument('stream', type=str, help='ABIDES order stream in bz2 format. '
-                                                 'Typical example is `ExchangeAgent.bz2`')
+    parser.add_argument('stream', type=str, nargs='+', help='ABIDES order stream in bz2 format, or a log directory '
+                                                            'holding `EXCHANGE_AGENT.bz2`. Given several, each is '
+                                                            'written to a directory under the output directory named '
+                                                            'for its log directory.')
     parser.add_argument('-o', '--output-dir', default='.', help='Path to output directory', type=dir_path)
     parser.add_argument('ticker', type=str, help="Ticker label")
     parser.add_argument('level', type=check_positive, help="Maximum orderbook level.")
     parser.add_argument('format', choices=['plot-scripts', 'LOBSTER'], type=str,
                         help="Output format of stream")
     parser.add_argument('--suffix', type=str, help="optional suffix to add to filename.", default="")
-
+    parser.add_argument('--chunk-size', type=check_positive, default=CHUNK_SIZE,
+                        help="Rows of the LOBSTER message file written at a time")
+    parser.add_argument('-j', '--jobs', type=check_positive, default=1,
+                        help="Number of order streams to convert in parallel")
 
     args, remaining_args = parser.parse_known_args()
 
-    save_formatted_order_stream(args.stream, args.ticker, args.level, args.format, args.suffix, out_dir=args.output_dir)
+    if len(args.stream) == 1:
+        save_formatted_order_stream(stream_path(args.stream[0]), args.ticker, args.level, args.format, args.suffix,
+                                    out_dir=args.output_dir, chunk_size=args.chunk_size)
+    else:
+        save_formatted_order_streams(args.stream, args.ticker, args.level, args.format, args.suffix,
+                                     out_dir=args.output_dir, chunk_size=args.chunk_size, jobs=args.jobs)
@@ -4,11 +4,12 @@ import argparse
 from dateutil.parser import parse
 from util.formatting.convert_order_stream import dir_path
 import pandas as pd
+from util.LogFormat import readLog
 
 
 def process_abides_order_stream(stream_bz2, symbol, out_dir, date):
     """ Writes ABIDES stream data into pandas DataFrame required by plotting programs. """
-    stream_df = pd.read_pickle(stream_bz2, compression='bz2').reset_index()
+    stream_df = readLog(stream_bz2).reset_index()
     write_df = convert_stream_to_format(stream_df, fmt="plot-scripts")
     write_df = write_df.set_index('TIMESTAMP')
     date_str = date.strftime('%Y%m%d')
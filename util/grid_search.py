@@ -1,6 +1,16 @@
 import argparse
 import itertools
-from util import numeric
+import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+if p not in sys.path: sys.path.insert(0, p)
+
+from util.util import numeric
+
+
+def grid(list_of_lists):
+    """ Returns the Cartesian product of a group of lists, as an iterator of tuples. """
+    return itertools.product(*list_of_lists)
 
 
 def parse_cli():
@@ -8,8 +18,7 @@ def parse_cli():
     parser.add_argument('-l', '--list', nargs='+', action='append',
                         help='Start of list', required=True, type=numeric)
     args = parser.parse_args()
-    prod = itertools.product(*args.list)
-    for items in prod:
+    for items in grid(args.list):
         print(','.join(str(s) for s in items))
 
 
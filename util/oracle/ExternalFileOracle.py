@@ -1,34 +1,116 @@
+import hashlib
+import os
+
+import numpy as np
 import pandas as pd
+from util.oracle.MeanRevertingOracle import noisy_observations
 from util.util import log_print
-from bisect import bisect_left
 from math import sqrt
 
 
+def interpolate_prices(times, prices, query_times):
+    """ Prices linearly interpolated in time between the fundamental values either side of each query time, and the
+        first (last) fundamental value before (after) the series.
+        :param times: times of the fundamental values, in ns, sorted
+        :type times: np.ndarray of int64
+        :param prices: fundamental values
+        :type prices: np.ndarray of float
+        :param query_times: times at which to interpolate, in ns
+        :type query_times: np.ndarray of int64
+        :return: np.ndarray of float
+    """
+    query_times = np.asarray(query_times, dtype=np.int64)
+
+    # The fundamental values either side of each query time (the same one outside the series).
+    upper = np.clip(np.searchsorted(times, query_times, side='left'), 1, len(times) - 1)
+    lower = upper - 1
+
+    time_low, time_high = times[lower], times[upper]
+    price_low, price_high = prices[lower], prices[upper]
+
+    # Interpolate in int64 ns, so that nothing is lost to float times.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(price_low != price_high, (price_high - price_low) / (time_high - time_low), 0)
+    interpolated = price_low + (query_times - time_low) * slope
+
+    interpolated = np.where(query_times <= times[0], prices[0], interpolated)
+    return np.where(query_times >= times[-1], prices[-1], interpolated)
+
+
 class ExternalFileOracle:
     """ Oracle using an external price series as the fundamental. The external series are specified files in the ABIDES
         config. If an agent requests the fundamental value in between two timestamps the returned fundamental value is
         linearly interpolated.
+
+        Each series is loaded the first time it is needed, into numpy arrays of times (int64 ns) and prices (float64),
+        which are searched in O(log n). If a cache directory is given, the arrays are written there as .npy files the
+        first time a file is loaded, and memory-mapped from there afterwards, so that even large multi-day series start
+        instantly and are only paged in where they are queried.
     """
-    def __init__(self, symbols):
+    def __init__(self, symbols, cache_dir=None):
         self.mkt_open = None
         self.symbols = symbols
-        self.fundamentals = self.load_fundamentals()
+        self.cache_dir = cache_dir
         self.f_log = {symbol: [] for symbol in symbols}
 
-    def load_fundamentals(self):
-        """ Method extracts fundamentals for each symbol into DataFrames. Note that input files must be of the form
-            generated by util/formatting/mid_price_from_orderbook.py.
+        # The (times, prices) arrays of each symbol loaded so far.
+        self.series = {}
+
+        # The most recently observed time and fundamental value of each symbol, shared by all the
+        # observations made at that time.
+        self.fundamental_cache = {}
+
+    @property
+    def fundamentals(self):
+        """ The fundamental price series of every symbol, as pd.Series. Loads any not loaded yet. """
+        return {symbol: self.getFundamentalSeries(symbol) for symbol in self.symbols}
+
+    def getFundamentalSeries(self, symbol):
+        """ The fundamental price series of a symbol, as a pd.Series over the (possibly memory-mapped) arrays. """
+        times, prices = self.loadFundamental(symbol)
+        return pd.Series(prices, index=pd.DatetimeIndex(times.view('datetime64[ns]')), copy=False)
+
+    def loadFundamental(self, symbol):
+        """ Get the (times, prices) arrays of a symbol, loading them on first use. Note that input files must be of the
+            form generated by util/formatting/mid_price_from_orderbook.py.
         """
-        fundamentals = dict()
-        log_print("Oracle: loading fundamental price series...")
-        for symbol, params_dict in self.symbols.items():
-            fundamental_file_path = params_dict['fundamental_file_path']
+        series = self.series.get(symbol)
+        if series is not None: return series
+
+        fundamental_file_path = self.symbols[symbol]['fundamental_file_path']
+        cache_paths = self.cachePaths(fundamental_file_path)
+
+        if cache_paths is not None and all(os.path.exists(path) for path in cache_paths):
+            log_print("Oracle: memory-mapping {}", fundamental_file_path)
+            series = tuple(np.load(path, mmap_mode='r') for path in cache_paths)
+        else:
             log_print("Oracle: loading {}", fundamental_file_path)
-            fundamental_df = pd.read_pickle(fundamental_file_path)
-            fundamentals.update({symbol: fundamental_df})
+            fundamental_series = pd.read_pickle(fundamental_file_path)
+            series = (fundamental_series.index.values.astype('datetime64[ns]').view(np.int64),
+                      fundamental_series.values.astype(np.float64))
+
+            if cache_paths is not None:
+                # Write each array to a temporary file first, so a concurrent or interrupted run never sees a partial one.
+                for path, values in zip(cache_paths, series):
+                    partial_path = '{}.{}.partial'.format(path, os.getpid())
+                    np.save(partial_path, values)
+                    os.replace(partial_path + '.npy', path)
+
+        self.series[symbol] = series
+        return series
+
+    def cachePaths(self, fundamental_file_path):
+        """ Paths of the cached time and price arrays of a fundamental file, named for the file and identified by its
+            path, size and modification time, or None without a cache directory.
+        """
+        if self.cache_dir is None: return None
+        os.makedirs(self.cache_dir, exist_ok=True)
 
-        log_print("Oracle: loading fundamental price series complete!")
-        return fundamentals
+        path = os.path.abspath(fundamental_file_path)
+        stat = os.stat(path)
+        key = hashlib.sha1(repr((path, stat.st_size, stat.st_mtime_ns)).encode()).hexdigest()[:16]
+        base = os.path.join(self.cache_dir, '{}_{}'.format(os.path.basename(path), key))
+        return base + '_times.npy', base + '_prices.npy'
 
     def getDailyOpenPrice(self, symbol, mkt_open):
 
@@ -53,37 +135,43 @@ class ExternalFileOracle:
 
         log_print("Oracle: client requested {} as of {}", symbol, query_time)
 
-        fundamental_series = self.fundamentals[symbol]
-        time_of_query = pd.Timestamp(query_time)
-
-        series_open_time = fundamental_series.index[0]
-        series_close_time = fundamental_series.index[-1]
+        times, prices = self.loadFundamental(symbol)
+        t = pd.Timestamp(query_time).value
 
-        if time_of_query < series_open_time:  # time queried before open
-            return fundamental_series[0]
-        elif time_of_query > series_close_time:  # time queried after close
-            return fundamental_series[-1]
+        if t <= times[0]:  # time queried before open
+            return prices[0]
+        elif t >= times[-1]:  # time queried after close
+            return prices[-1]
         else:  # time queried during trading
 
             # find indices either side of requested time
-            lower_idx = bisect_left(fundamental_series.index, time_of_query) - 1
-            upper_idx = lower_idx + 1 if lower_idx < len(fundamental_series.index) - 1 else lower_idx
+            upper_idx = int(times.searchsorted(t, side='left'))
+            lower_idx = upper_idx - 1
 
-            # interpolate between values
-            lower_val = fundamental_series[lower_idx]
-            upper_val = fundamental_series[upper_idx]
+            # interpolate between values (as interpolate_prices does, without array overhead)
+            time_low, time_high = int(times[lower_idx]), int(times[upper_idx])
+            price_low, price_high = float(prices[lower_idx]), float(prices[upper_idx])
 
-            log_print(f"DEBUG: lower_idx: {lower_idx}, lower_val: {lower_val}, upper_idx: {upper_idx}, upper_val: {upper_val}")
+            slope = (price_high - price_low) / (time_high - time_low) if price_low != price_high else 0
+            interpolated_price = price_low + (t - time_low) * slope
 
-            interpolated_price = self.getInterpolatedPrice(query_time, fundamental_series.index[lower_idx],
-                                                           fundamental_series.index[upper_idx], lower_val, upper_val)
-            log_print("Oracle: latest historical trade was {} at {}. Next historical trade is {}. "
-                      "Interpolated price is {}", lower_val, query_time, upper_val, interpolated_price)
+            log_print("Oracle: interpolated price at {} is {}", query_time, interpolated_price)
 
             self.f_log[symbol].append({'FundamentalTime': query_time, 'FundamentalValue': interpolated_price})
 
             return interpolated_price
 
+    def getPricesAtTimes(self, symbol, query_times):
+        """ Get the true prices of a symbol at many times at once (without logging them).
+            :param symbol: which symbol to query
+            :type symbol: str
+            :param query_times: at these times
+            :type query_times: pd.DatetimeIndex or array-like of datetime64
+            :return: np.ndarray of float
+        """
+        times, prices = self.loadFundamental(symbol)
+        return interpolate_prices(times, prices, pd.DatetimeIndex(query_times).asi8)
+
     def observePrice(self, symbol, currentTime, sigma_n=0.0001, random_state=None):
         """ Make observation of price at a given time.
         :param symbol: symbol for which to observe price
@@ -96,7 +184,7 @@ class ExternalFileOracle:
         :type random_state: np.RandomState
         :return: int, price in cents
         """
-        true_price = self.getPriceAtTime(symbol, currentTime)
+        true_price = self.getFundamental(symbol, currentTime)
         if sigma_n == 0:
             observed = true_price
         else:
@@ -104,26 +192,34 @@ class ExternalFileOracle:
 
         return int(round(observed))
 
-    def getInterpolatedPrice(self, current_time, time_low, time_high, price_low, price_high):
-        """ Get the price at current_time, linearly interpolated between price_low and price_high measured at times
-            time_low and time_high
-            :param current_time: time for which price is to be interpolated
-            :type current_time: pd.Timestamp
-            :param time_low: time of first fundamental value
-            :type time_low: pd.Timestamp
-            :param time_high: time of first fundamental value
-            :type time_high: pd.Timestamp
-            :param price_low: first fundamental value
-            :type price_low: float
-            :param price_high: first fundamental value
-            :type price_high: float
-            :return float of interpolated price:
+    def observe_many(self, symbol, currentTime, sigma_n, random_states):
+        """ Make observations of price at a given time for many observers at once. The price is looked up once for
+            all of them, and each observation is exactly what observePrice would return for the same sigma_n and random
+            state.
+        :param symbol: symbol for which to observe price
+        :type symbol: str
+        :param currentTime: time of observation
+        :type currentTime: pd.Timestamp
+        :param sigma_n: Observation noise parameter of each observer, or one for all
+        :type sigma_n: np.ndarray or float
+        :param random_states: random state of each observer, or one random state drawing all observations in turn
+        :type random_states: list of np.RandomState or np.RandomState
+        :return: np.ndarray of int, prices in cents
         """
-        log_print(f'DEBUG: current_time: {current_time} time_low {time_low} time_high: {time_high} price_low:  {price_low} price_high: {price_high}' )
-        delta_y = price_high - price_low
-        delta_x = (time_high - time_low).total_seconds()
+        return noisy_observations(self.getFundamental(symbol, currentTime), sigma_n, random_states)
 
-        slope = delta_y / delta_x if price_low != price_high else 0
-        x_fwd = (current_time - time_low).total_seconds()
+    def getFundamental(self, symbol, currentTime):
+        """ Get the true price of a symbol at the requested time, computing it only once for all the observations made
+            at the same time.
+            :param symbol: which symbol to query
+            :type symbol: str
+            :param currentTime: at this time
+            :type currentTime: pd.Timestamp
+        """
+        cached = self.fundamental_cache.get(symbol)
+        if cached is not None and cached[0] == currentTime:
+            return cached[1]
 
-        return price_low + (x_fwd * slope)
+        true_price = self.getPriceAtTime(symbol, currentTime)
+        self.fundamental_cache[symbol] = (currentTime, true_price)
+        return true_price
@@ -9,29 +9,198 @@
 ### Historical dates are effectively meaningless to this oracle.  It is driven by
 ### the numpy random number seed contained within the experimental config file.
 ### This oracle uses the nanoseconds portion of the current simulation time as
-### discrete "time steps".  A suggestion: to keep wallclock runtime reasonable,
-### have the agents operate for only ~1000 nanoseconds, but interpret nanoseconds
-### as seconds or minutes.
+### discrete "time steps".  By default the series holds every nanosecond of the
+### day, so agents should operate for only ~1000 nanoseconds, interpreting
+### nanoseconds as seconds or minutes.  For realistic market hours, give the
+### oracle a coarser time grid (freq, e.g. '1s'): the series then takes exact
+### multi-nanosecond steps of the same process and is generated lazily, so any
+### nanosecond of a full day can be observed cheaply.
 
 import datetime as dt
+import hashlib
 import numpy as np
 import pandas as pd
 import os, random, sys
 
 from math import sqrt
+from scipy.signal import lfilter
 from util.util import log_print
 
 
+# Number of grid points generated at a time by a lazily generated fundamental series.
+CHUNK_SIZE = 2**20
+
+# Most and fewest values filtered at a time when generating a chunk.
+FILTER_BLOCK = 2**12
+MIN_FILTER_BLOCK = 2**8
+
+
+def noisy_observations(r_t, sigma_n, random_states):
+  # Noisy observations of the fundamental value r_t with observation variances sigma_n, made
+  # exactly as the same observePrice calls in order would make them.  random_states is either a
+  # sequence of random states, one per observation (sigma_n may then be a single variance for
+  # all), or one random state shared by all the observations, which draws them at once.  An
+  # observation with sigma_n 0 is the fundamental value itself and draws nothing.
+  if isinstance(random_states, np.random.RandomState):
+    sigma_n = np.asarray(sigma_n, dtype=float)
+    obs = np.full(len(sigma_n), r_t, dtype=float)
+    noisy = sigma_n != 0
+    obs[noisy] = random_states.normal(loc=r_t, scale=np.sqrt(sigma_n[noisy]))
+  else:
+    sigma_n = np.broadcast_to(np.asarray(sigma_n, dtype=float), (len(random_states),))
+    obs = np.array([r_t if sigma == 0 else random_state.normal(loc=r_t, scale=sqrt(sigma))
+                    for sigma, random_state in zip(sigma_n.tolist(), random_states)], dtype=float)
+
+  # Reminder: all simulator prices are specified in integer cents.
+  return np.round(obs).astype(np.int64)
+
+
+class FundamentalSeries:
+
+  # The mean-reverting fundamental value series of one symbol, on a regular time grid from
+  # start (inclusive) to end (exclusive) with the given step, in integer nanoseconds.  The
+  # value at any time is the value at the latest grid point at or before it.
+  #
+  # The underlying process takes one step per nanosecond:
+  #
+  #   r[t] = max(0, kappa * r_bar + (1 - kappa) * r[t-1] + shock[t]),  shock[t] ~ N(0, sigma_s)
+  #
+  # Between grid points k nanoseconds apart, the exact k-step transition is used instead:
+  #
+  #   r[t] = max(0, r_bar + phi * (r[t-k] - r_bar) + shock[t]),  phi = (1 - kappa)^k,
+  #   shock[t] ~ N(0, sigma_s * (1 - phi^2) / (1 - (1 - kappa)^2))
+  #
+  # (exact apart from the floor at zero), which with k = 1 is the one-step process itself.
+  # The recursion is an AR(1) filter, computed with lfilter a chunk at a time; the rare steps
+  # clipped at zero restart the filter from the clipped value.
+  #
+  # If chunk_size is None, the whole series is generated at once on construction.  Otherwise
+  # it is generated chunk_size grid points at a time, as far as the latest time requested.
+  # Either way the shocks are drawn in grid order from random_state, so the series does not
+  # depend on the chunk size or the pattern of requests.
+  #
+  # If cache_path is given, the completed series is kept there as a .npy file and later
+  # series with the same cache_path are memory-mapped from it rather than generated.  (A
+  # series never generated to its end leaves only a .partial file, ignored by later runs.)
+
+  def __init__(self, r_bar, kappa, sigma_s, start, end, step, random_state, chunk_size=CHUNK_SIZE,
+               cache_path=None):
+    self.r_bar = r_bar
+    self.start = start
+    self.step = step
+    self.n = max(1, -(-(end - start) // step))
+    self.random_state = random_state
+    self.chunk_size = chunk_size
+
+    # Exact step coefficient and shock standard deviation over step nanoseconds, computed in
+    # log space so that very small kappa (per nanosecond) keeps its precision.
+    log_decay = np.log1p(-kappa)
+    self.phi = np.exp(step * log_decay)
+    if step == 1:
+      self.shock_std = sqrt(sigma_s)
+    else:
+      self.shock_std = sqrt(sigma_s * np.expm1(2 * step * log_decay) / np.expm1(2 * log_decay))
+
+    self.cache_path = cache_path
+    self.partial_path = None
+
+    if cache_path is not None and os.path.exists(cache_path):
+      self.values = np.load(cache_path, mmap_mode='r')
+      self.generated = self.n
+      return
+
+    if cache_path is not None:
+      # The series is generated into a temporary file, which replaces cache_path once complete.
+      self.partial_path = '{}.{}.partial'.format(cache_path, os.getpid())
+      os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+      self.values = np.lib.format.open_memmap(self.partial_path, mode='w+', dtype=np.int64, shape=(self.n,))
+    else:
+      self.values = np.empty(self.n, dtype=np.int64)
+
+    # The first value is the mean, unshocked.  last is the unrounded latest value.
+    self.values[0] = round(r_bar)
+    self.last = float(r_bar)
+    self.generated = 1
+
+    if chunk_size is None: self.generate(self.n)
+
+  def generate(self, n):
+    # Extends the series to (at least) its first n grid points.
+    while self.generated < n:
+      size = self.n - self.generated
+      if self.chunk_size is not None: size = min(size, self.chunk_size)
+
+      # A shock is drawn for the first grid point too, though it is not applied, as the dense
+      # MeanRevertingOracle always has, so that whole-day series keep their values.
+      first = 1 if self.generated == 1 else 0
+      shock = self.random_state.normal(scale=self.shock_std, size=size + first)[first:]
+
+      x = shock + (1 - self.phi) * self.r_bar
+      r = self.filter(x, self.last)
+
+      self.values[self.generated:self.generated + size] = np.round(r)
+      self.last = r[-1]
+      self.generated += size
+
+    if self.generated == self.n and self.partial_path is not None:
+      self.values.flush()
+      os.replace(self.partial_path, self.cache_path)
+      self.partial_path = None
+
+  def filter(self, x, previous):
+    # r[i] = max(0, x[i] + phi * r[i-1]) with r[-1] = previous.  The filter runs a block at a
+    # time, restarting after each clipped value.  Blocks start small after a clipped value,
+    # since clipping tends to recur nearby, and double up to FILTER_BLOCK otherwise.
+    r = np.empty(len(x))
+    i, block = 0, FILTER_BLOCK
+    while i < len(x):
+      j = min(i + block, len(x))
+      r[i:j] = lfilter([1.0], [1.0, -self.phi], x[i:j], zi=[self.phi * previous])[0]
+      negative = np.flatnonzero(r[i:j] < 0)
+
+      if len(negative) == 0:
+        i, block = j, min(2 * block, FILTER_BLOCK)
+      else:
+        # Floor the first negative value at zero and continue the filter from there.
+        i += negative[0]
+        r[i] = 0
+        i, block = i + 1, MIN_FILTER_BLOCK
+
+      previous = r[i-1]
+
+    return r
+
+  def index(self, time):
+    # Grid index of a time in integer nanoseconds (clamped to the series).
+    return min(max(0, (time - self.start) // self.step), self.n - 1)
+
+  def valueAt(self, time):
+    i = self.index(time)
+    if i >= self.generated: self.generate(i + 1)
+    return int(self.values[i])
+
+
 class MeanRevertingOracle:
 
-  def __init__(self, mkt_open, mkt_close, symbols):
+  def __init__(self, mkt_open, mkt_close, symbols, freq=None, chunk_size=CHUNK_SIZE, cache_dir=None):
     # Symbols must be a dictionary of dictionaries with outer keys as symbol names and
     # inner keys: r_bar, kappa, sigma_s.
+    #
+    # freq is the time grid of the fundamental value series (e.g. '1s' or '1ms'), by default
+    # one nanosecond.  With the default grid each series is generated in full up front from
+    # the global np.random PRNG, as it always has been.  With a coarser grid each symbol gets
+    # its own PRNG, seeded from the symbol's random_state (if given) or np.random here, and
+    # its series is generated lazily, chunk_size grid points at a time, as agents observe it.
+    # cache_dir, if given, keeps each completed series on disk for reuse by later runs with
+    # the same parameters and seed (see FundamentalSeries).
     self.mkt_open = mkt_open
     self.mkt_close = mkt_close
     self.symbols = symbols
+    self.step = 1 if freq is None else int(pd.Timedelta(freq) / np.timedelta64(1, 'ns'))
+    self.chunk_size = chunk_size
+    self.cache_dir = cache_dir
 
-    # The dictionary r holds the fundamenal value series for each symbol.
+    # The dictionary r holds the fundamenal value series (a FundamentalSeries) for each symbol.
     self.r = {}
 
     then = dt.datetime.now()
@@ -46,39 +215,39 @@ class MeanRevertingOracle:
     log_print ("MeanRevertingOracle initialized for symbols {}", symbols)
     log_print ("MeanRevertingOracle initialization took {}", now - then)
 
-  def generate_fundamental_value_series(self, symbol, r_bar, kappa, sigma_s):
+  def generate_fundamental_value_series(self, symbol, r_bar, kappa, sigma_s, random_state=None, **kwargs):
     # Generates the fundamental value series for a single stock symbol.  r_bar is the
     # mean fundamental value, kappa is the mean reversion coefficient, and sigma_s
     # is the shock variance.  (Note: NOT STANDARD DEVIATION.)
 
     # Because the oracle uses the global np.random PRNG to create the fundamental value
-    # series, it is important to create the oracle BEFORE the agents.  In this way the
-    # addition of a new agent will not affect the sequence created.  (Observations using
-    # the oracle will use an agent's PRNG and thus not cause a problem.)
+    # series (or to seed its per-symbol PRNG), it is important to create the oracle BEFORE
+    # the agents.  In this way the addition of a new agent will not affect the sequence
+    # created.  (Observations using the oracle will use an agent's PRNG and thus not cause
+    # a problem.)
+    start, end = self.mkt_open.value, self.mkt_close.value
 
-    # Turn variance into std.
-    sigma_s = sqrt(sigma_s)
-
-    # Create the time series into which values will be projected and initialize the first value.
-    date_range = pd.date_range(self.mkt_open, self.mkt_close, closed='left', freq='N')
-
-    s = pd.Series(index=date_range)
-    r = np.zeros(len(s.index))
-    r[0] = r_bar
+    if self.step == 1:
+      # Dense series: the whole day up front, as before.
+      state, chunk_size = np.random, None
+    else:
+      rng = random_state if random_state is not None else np.random
+      seed = rng.randint(low=0, high=2**32)
+      state, chunk_size = np.random.RandomState(seed=seed), self.chunk_size
 
-    # Predetermine the random shocks for all time steps (at once, for computation speed).
-    shock = np.random.normal(scale=sigma_s, size=(r.shape[0]))
+    cache_path = None
+    if self.cache_dir is not None:
+      # The series is determined by its parameters, grid and the state of its PRNG.
+      key = hashlib.sha1(repr((r_bar, kappa, sigma_s, start, end, self.step)).encode())
+      for part in state.get_state(): key.update(np.asarray(part).tobytes())
+      cache_path = os.path.join(self.cache_dir, '{}_{}.npy'.format(symbol, key.hexdigest()[:16]))
 
-    # Compute the mean reverting fundamental value series.
-    for t in range(1, r.shape[0]):
-      r[t] = max(0, (kappa * r_bar) + ( (1 - kappa) * r[t-1] ) + shock[t])
+      # A cached dense series must still consume its draws from the global PRNG.
+      if chunk_size is None and os.path.exists(cache_path):
+        state.normal(size=-(-(end - start) // self.step))
 
-    # Replace the series values with the fundamental value series.  Round and convert to
-    # integer cents.
-    s[:] = np.round(r)
-    s = s.astype(int)
-    
-    return (s)
+    return FundamentalSeries(r_bar, kappa, sigma_s, start, end, self.step, state, chunk_size=chunk_size,
+                             cache_path=cache_path)
 
 
   # Return the daily open price for the symbol given.  In the case of the MeanRevertingOracle,
@@ -92,12 +261,20 @@ class MeanRevertingOracle:
   
     log_print ("Oracle: client requested {} at market open: {}", symbol, self.mkt_open)
   
-    open = self.r[symbol].loc[self.mkt_open]
+    open = self.r[symbol].valueAt(self.mkt_open.value)
     log_print ("Oracle: market open price was was {}", open)
   
     return open
 
 
+  # Return the true fundamental value of a symbol at the given time.  If the request is made
+  # after market close, return the close price.  (The series ends at the last grid point
+  # before the close.)  Looking up the series is O(1), so repeated requests for the same
+  # time need no further caching.
+  def getFundamental(self, symbol, currentTime):
+    return self.r[symbol].valueAt(currentTime.value)
+
+
   # Return a noisy observation of the current fundamental value.  While the fundamental
   # value for a given equity at a given time step does not change, multiple agents
   # observing that value will receive different observations.
@@ -110,11 +287,7 @@ class MeanRevertingOracle:
   # each agent will receive the same answers across multiple same-seed simulations
   # even if a new agent has been added to the experiment.
   def observePrice(self, symbol, currentTime, sigma_n = 1000, random_state = None):
-    # If the request is made after market close, return the close price.
-    if currentTime >= self.mkt_close:
-      r_t = self.r[symbol].loc[self.mkt_close - pd.Timedelta('1ns')]
-    else:
-      r_t = self.r[symbol].loc[currentTime]
+    r_t = self.getFundamental(symbol, currentTime)
  
     # Generate a noisy observation of fundamental value at the current time.
     if sigma_n == 0:
@@ -126,4 +299,18 @@ class MeanRevertingOracle:
     log_print ("Oracle: giving client value observation {}", obs)
  
     # Reminder: all simulator prices are specified in integer cents.
-    return obs
\ No newline at end of file
+    return obs
+
+
+  # Return noisy observations of the current fundamental value for many observers at once,
+  # as an array of integer cents.  The fundamental is computed once for all of them, and each
+  # observation is exactly what observePrice would return for the same sigma_n and random
+  # state (see noisy_observations for the forms sigma_n and random_states may take).
+  def observe_many(self, symbol, currentTime, sigma_n, random_states):
+    r_t = self.getFundamental(symbol, currentTime)
+    obs = noisy_observations(r_t, sigma_n, random_states)
+
+    log_print ("Oracle: current fundamental value is {} at {}", r_t, currentTime)
+    log_print ("Oracle: giving clients value observations {}", obs)
+
+    return obs
@@ -19,6 +19,14 @@
 ### agents each acting at realistic "retail" intervals, on the order of seconds
 ### or minutes, spread out across the day.
 
+### Megashocks are drawn one at a time as the fundamental passes them, with the
+### interval to the next one taken from the global np.random PRNG, as they always
+### have been.  A symbol may instead set 'precompute_megashocks': True to draw its
+### whole schedule for the day from its own random_state at construction (only the
+### first interval still comes from np.random).  Its fundamental then no longer
+### depends on the draws agents make from np.random, and advancing it is a lookup,
+### but the fundamental path differs from the default for the same seed.
+
 from util.oracle.MeanRevertingOracle import MeanRevertingOracle
 
 import datetime as dt
@@ -38,39 +46,50 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     self.mkt_open = mkt_open
     self.mkt_close = mkt_close
     self.symbols = symbols
-    self.f_log = {}
 
-    # The dictionary r holds the most recent fundamental values for each symbol.
+    # Times are kept as integer nanoseconds.
+    self.open_ns = mkt_open.value
+    self.close_ns = mkt_close.value
+
+    # The dictionary r holds the most recent fundamental values for each symbol, as a 2-tuple
+    # of the time (ns) at which the series was computed and the true fundamental value then.
     self.r = {}
 
-    # The dictionary megashocks holds the time series of megashocks for each symbol.
-    # The last one will always be in the future (relative to the current simulation time).
+    # The log of computed fundamental values for each symbol, as growable columns of times and
+    # values, and the number of entries in each.  (See f_log.)
+    self.f_times = {}
+    self.f_values = {}
+    self.f_size = {}
+
+    # The dictionary megashocks holds the megashocks drawn so far for each symbol, as a 2-tuple of
+    # lists of times (ns) and values, the last of which is always still to be applied.  With
+    # precompute_megashocks, it holds the full-day schedule as arrays instead, the last megashock
+    # at or after the close.  next_megashock holds the index of the next megashock to be applied.
     #
     # Without these, the OU process just makes a noisy return to the mean and then stays there
     # with relatively minor noise.  Here we want them to follow a Poisson process, so we sample
     # from an exponential distribution for the separation intervals.
     self.megashocks = {}
+    self.next_megashock = {}
 
     then = dt.datetime.now()
 
-    # Note that each value in the self.r dictionary is a 2-tuple of the timestamp at
-    # which the series was computed and the true fundamental value at that time.
     for symbol in symbols:
       s = symbols[symbol]
       log_print ("SparseMeanRevertingOracle computing initial fundamental value for {}", symbol)
-      self.r[symbol] = (mkt_open, s['r_bar'])
-      self.f_log[symbol] = [{ 'FundamentalTime' : mkt_open, 'FundamentalValue' : s['r_bar'] }]
-
-      # Compute the time and value of the first megashock.  Note that while the values are
-      # mean-zero, they are intentionally bimodal (i.e. we always want to push the stock
-      # some, but we will tend to cancel out via pushes in opposite directions).
-      ms_time_delta = np.random.exponential(scale=1.0 / s['megashock_lambda_a'])
-      mst = self.mkt_open + pd.Timedelta(ms_time_delta, unit='ns')
-      msv = s['random_state'].normal(loc = s['megashock_mean'], scale = sqrt(s['megashock_var']))
-      msv = msv if s['random_state'].randint(2) == 0 else -msv
+      self.r[symbol] = (self.open_ns, s['r_bar'])
 
-      self.megashocks[symbol] = [{ 'MegashockTime' : mst, 'MegashockValue' : msv }]
+      self.f_times[symbol] = np.empty(1024, dtype=np.int64)
+      self.f_values[symbol] = np.empty(1024, dtype=np.asarray(s['r_bar']).dtype)
+      self.f_size[symbol] = 0
+      self.log_fundamental(symbol, self.open_ns, s['r_bar'])
 
+      if s.get('precompute_megashocks', False):
+        self.megashocks[symbol] = self.generate_megashocks(s)
+      else:
+        mst = self.open_ns + pd.Timedelta(np.random.exponential(scale=1.0 / s['megashock_lambda_a']), unit='ns').value
+        self.megashocks[symbol] = ([mst], [self.draw_megashock_value(s)])
+      self.next_megashock[symbol] = 0
 
     now = dt.datetime.now()
 
@@ -78,9 +97,63 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     log_print ("SparseMeanRevertingOracle initialization took {}", now - then)
 
 
-  # This method takes a requested timestamp to which we should advance the fundamental,
+  # This method draws the value of a megashock.  Note that while the values are mean-zero,
+  # they are intentionally bimodal (i.e. we always want to push the stock some, but we will
+  # tend to cancel out via pushes in opposite directions).
+  def draw_megashock_value(self, s):
+    msv = s['random_state'].normal(loc = s['megashock_mean'], scale = sqrt(s['megashock_var']))
+    return msv if s['random_state'].randint(2) == 0 else -msv
+
+
+  # This method computes the megashock schedule of a symbol for the whole day (for
+  # precompute_megashocks), up to and including the first megashock at or after the close.
+  def generate_megashocks(self, s):
+    # The first megashock time comes from the global np.random PRNG, as always; the rest of
+    # the schedule comes from the symbol's own random state, so that it does not depend on
+    # the draws agents make from np.random during the simulation.
+    random_state = s['random_state']
+    times, values = [], []
+
+    mst = self.open_ns + pd.Timedelta(np.random.exponential(scale=1.0 / s['megashock_lambda_a']), unit='ns').value
+
+    while True:
+      msv = self.draw_megashock_value(s)
+
+      times.append(mst)
+      values.append(msv)
+
+      if mst >= self.close_ns: break
+
+      mst += int(random_state.exponential(scale = 1.0 / s['megashock_lambda_a']))
+
+    return (np.array(times, dtype=np.int64), np.array(values))
+
+
+  # Appends a computed value to the log of fundamental values for a symbol.
+  def log_fundamental(self, symbol, ts, v):
+    n = self.f_size[symbol]
+
+    if n == len(self.f_times[symbol]):
+      self.f_times[symbol] = np.resize(self.f_times[symbol], 2 * n)
+      self.f_values[symbol] = np.resize(self.f_values[symbol], 2 * n)
+
+    self.f_times[symbol][n] = ts
+    self.f_values[symbol][n] = v
+    self.f_size[symbol] = n + 1
+
+
+  # The permanent log of computed fundamental values for each symbol, as columns FundamentalTime
+  # and FundamentalValue (archived by the ExchangeAgent at the end of the simulation).
+  @property
+  def f_log(self):
+    return { symbol : { 'FundamentalTime' : pd.to_datetime(self.f_times[symbol][:n]),
+                        'FundamentalValue' : self.f_values[symbol][:n] }
+             for symbol, n in self.f_size.items() }
+
+
+  # This method takes a requested timestamp (ns) to which we should advance the fundamental,
   # a value adjustment to apply after advancing time (must pass zero if none),
-  # a symbol for which to advance time, a previous timestamp, and a previous fundamental
+  # a symbol for which to advance time, a previous timestamp (ns), and a previous fundamental
   # value.  The last two parameters should relate to the most recent time this method
   # was invoked.  It returns the new value.  As a side effect, it updates the log of
   # computed fundamental values.
@@ -93,7 +166,7 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     # (dense) MeanRevertingOracle.
 
     # Compute the time delta from the previous time to the requested time.
-    d = int((ts - pt) / np.timedelta64(1, 'ns'))
+    d = ts - pt
 
     # Extract the parameters for the OU process update.
     mu = s['r_bar']
@@ -118,23 +191,17 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     self.r[symbol] = (ts, v)
     
     # Append the change to the permanent log of fundamental values for this symbol.
-    self.f_log[symbol].append({ 'FundamentalTime' : ts, 'FundamentalValue' : v })
+    self.log_fundamental(symbol, ts, v)
 
     # Return the new value for the requested timestamp.
     return v
 
 
-  # This method advances the fundamental value series for a single stock symbol,
-  # using the OU process.  It may proceed in several steps due to our periodic
-  # application of "megashocks" to push the stock price around, simulating
-  # exogenous forces.
+  # This method advances the fundamental value series for a single stock symbol to a time
+  # (ns), using the OU process.  It may proceed in several steps due to our periodic
+  # application of "megashocks" to push the stock price around, simulating exogenous forces.
   def advance_fundamental_value_series(self, currentTime, symbol):
 
-    # Generation of the fundamental value series uses a separate random state object
-    # per symbol, which is part of the dictionary we maintain for each symbol.
-    # Agent observations using the oracle will use an agent's random state object.
-    s = self.symbols[symbol]
-
     # This is the previous fundamental time and value.
     pt, pv = self.r[symbol]
 
@@ -147,32 +214,33 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     # megashocks to push the series around (not always away from the mean) and we need
     # to compute OU at each of those times, so the aftereffects of the megashocks
     # properly affect the remaining OU interval.
+    s = self.symbols[symbol]
+    times, values = self.megashocks[symbol]
+    i = self.next_megashock[symbol]
 
-    mst = self.megashocks[symbol][-1]['MegashockTime']
-    msv = self.megashocks[symbol][-1]['MegashockValue']
-
-    while mst < currentTime:
-      # A megashock is scheduled to occur before the new time to which we are advancing.  Handle it.
-
-      # Advance time from the previous time to the time of the megashock using the OU process and
-      # then applying the next megashock value.
-      v = self.compute_fundamental_at_timestamp(mst, msv, symbol, pt, pv)
-
-      # Update our "previous" values for the next computation.
-      pt, pv = mst, v
-
-      # Since we just surpassed the last megashock time, compute the next one, which we might or
-      # might not immediately consume.  This works just like the first time (in __init__()).
+    if s.get('precompute_megashocks', False):
+      if times[i] < currentTime:
+        # Megashocks are scheduled to occur before the new time to which we are advancing.
+        # Advance time from the previous time to the time of each megashock using the OU
+        # process and then apply the megashock value.
+        end = np.searchsorted(times, currentTime, side='left')
 
-      mst = pt + pd.Timedelta('{}ns'.format(np.random.exponential(scale = 1.0 / s['megashock_lambda_a'])))
-      msv = s['random_state'].normal(loc = s['megashock_mean'], scale = sqrt(s['megashock_var']))
-      msv = msv if s['random_state'].randint(2) == 0 else -msv
+        for mst, msv in zip(times[i:end].tolist(), values[i:end].tolist()):
+          pt, pv = mst, self.compute_fundamental_at_timestamp(mst, msv, symbol, pt, pv)
 
-      self.megashocks[symbol].append({ 'MegashockTime' : mst, 'MegashockValue' : msv })
+        self.next_megashock[symbol] = end
 
-      # The loop will continue until there are no more megashocks before the time requested
-      # by the calling method.
+    else:
+      while times[-1] < currentTime:
+        # As above, but each megashock is drawn only once the one before it has been applied.
+        mst, msv = times[-1], values[-1]
+        pt, pv = mst, self.compute_fundamental_at_timestamp(mst, msv, symbol, pt, pv)
 
+        # The interval to the next one comes from np.random (through a formatted string), as ever.
+        interval = pd.Timedelta('{}ns'.format(np.random.exponential(scale = 1.0 / s['megashock_lambda_a'])))
+        times.append(mst + interval.value)
+        values.append(self.draw_megashock_value(s))
+        self.next_megashock[symbol] = len(times) - 1
 
     # Once there are no more megashocks to apply (i.e. the next megashock is in the future, after
     # currentTime), then finally advance using the OU process to the requested time.
@@ -198,32 +266,9 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     return open
 
 
-  # Return a noisy observation of the current fundamental value.  While the fundamental
-  # value for a given equity at a given time step does not change, multiple agents
-  # observing that value will receive different observations.
-  #
-  # Only the Exchange or other privileged agents should use sigma_n==0.
-  #
-  # sigma_n is experimental observation variance.  NOTE: NOT STANDARD DEVIATION.
-  #
-  # Each agent must pass its RandomState object to observePrice.  This ensures that
-  # each agent will receive the same answers across multiple same-seed simulations
-  # even if a new agent has been added to the experiment.
-  def observePrice(self, symbol, currentTime, sigma_n = 1000, random_state = None):
-    # If the request is made after market close, return the close price.
-    if currentTime >= self.mkt_close:
-      r_t = self.advance_fundamental_value_series(self.mkt_close - pd.Timedelta('1ns'), symbol)
-    else:
-      r_t = self.advance_fundamental_value_series(currentTime, symbol)
- 
-    # Generate a noisy observation of fundamental value at the current time.
-    if sigma_n == 0:
-      obs = r_t
-    else:
-      obs = int(round(random_state.normal(loc=r_t, scale=sqrt(sigma_n))))
- 
-    log_print ("Oracle: current fundamental value is {} at {}", r_t, currentTime)
-    log_print ("Oracle: giving client value observation {}", obs)
- 
-    # Reminder: all simulator prices are specified in integer cents.
-    return obs
\ No newline at end of file
+  # Return the true fundamental value of a symbol at the given time, advancing the series to
+  # it.  If the request is made after market close, return the close price.  The most recent
+  # time and value are kept (in r), so all requests for the same time share one advancement,
+  # however many agents make them.
+  def getFundamental(self, symbol, currentTime):
+    return self.advance_fundamental_value_series(min(currentTime.value, self.close_ns - 1), symbol)
@@ -0,0 +1,84 @@
+# Fill class, a lightweight record of the executed portion of a LimitOrder.  The OrderBook sends
+# one of these to each party in an ORDER_EXECUTED notification instead of a full copy of the order.
+#
+# A Fill only stores the values that belong to the execution itself (quantity, price, time).  Every
+# other attribute is read through to the order that was executed, which never changes after the
+# order is placed, so a Fill can be handed to agents without copying anything.  Agents can treat a
+# Fill like the (read-only) order it came from: it has the same attributes, __str__ and to_dict().
+
+from util.order.LimitOrder import LimitOrder
+
+
+class Fill:
+
+    __slots__ = ('order', 'quantity', 'fill_price', 'fill_time', 'filled')
+
+    def __init__(self, order, quantity, fill_price, fill_time, filled=True):
+        # The LimitOrder which was (partially) executed.
+        self.order = order
+
+        # Number of shares executed, and the price and time taken (since the order was placed)
+        # to execute them.
+        self.quantity = quantity
+        self.fill_price = fill_price
+        self.fill_time = fill_time
+
+        # Whether the execution marks the order as filled.  The resting side of a match reports
+        # the flag of the order in the book, exactly as a copy of that order would.
+        self.filled = filled
+
+    @property
+    def agent_id(self):
+        return self.order.agent_id
+
+    @property
+    def time_placed(self):
+        return self.order.time_placed
+
+    @property
+    def symbol(self):
+        return self.order.symbol
+
+    @property
+    def is_buy_order(self):
+        return self.order.is_buy_order
+
+    @property
+    def order_id(self):
+        return self.order.order_id
+
+    @property
+    def limit_price(self):
+        return self.order.limit_price
+
+    @property
+    def tag(self):
+        return self.order.tag
+
+    @property
+    def fill_percentage(self):
+        return self.order.fill_percentage
+
+    @property
+    def fill_quantity(self):
+        return None
+
+    @property
+    def fill_type(self):
+        return None
+
+    @property
+    def slippage(self):
+        # Matched orders always execute at the price advertised in the book.
+        return 0
+
+    def to_dict(self):
+        # Same keys, in the same order, as LimitOrder.to_dict().
+        return {'agent_id': self.agent_id, 'time_placed': self.time_placed.isoformat(), 'symbol': self.symbol,
+                'quantity': self.quantity, 'is_buy_order': self.is_buy_order, 'order_id': self.order_id,
+                'filled': self.filled, 'fill_price': self.fill_price, 'fill_time': self.fill_time,
+                'fill_quantity': None, 'fill_type': None, 'fill_percentage': self.fill_percentage,
+                'tag': self.tag, 'limit_price': self.limit_price, 'slippage': 0}
+
+    __str__ = LimitOrder.__str__
+    __repr__ = LimitOrder.__repr__
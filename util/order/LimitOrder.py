@@ -14,6 +14,8 @@ silent_mode = False
 
 class LimitOrder(Order):
 
+    __slots__ = ('limit_price', 'slippage')
+
     def __init__(self, agent_id, time_placed, symbol, quantity, is_buy_order, limit_price, order_id=None, tag=None, slippage=0):
 
         super().__init__(agent_id, time_placed, symbol, quantity, is_buy_order, order_id, tag=tag)
@@ -43,19 +45,6 @@ class LimitOrder(Order):
         if silent_mode: return ''
         return self.__str__()
 
-    def __copy__(self):
-        order = LimitOrder(self.agent_id, self.time_placed, self.symbol, self.quantity, self.is_buy_order,
-                           self.limit_price,
-                           order_id=self.order_id,
-                           tag=self.tag)
-        Order._order_ids.pop()  # remove duplicate agent ID
-        order.fill_price = self.fill_price
-        order.filled = self.filled
-        order.fill_time = self.fill_time
-        order.fill_percentage = self.fill_percentage
-        
-        return order
-
     def __deepcopy__(self, memodict={}):
         # Deep copy instance attributes
         agent_id = deepcopy(self.agent_id, memodict)
@@ -10,6 +10,8 @@ silent_mode = False
 
 class MarketOrder(Order):
 
+    __slots__ = ('best',)
+
     def __init__(self, agent_id, time_placed, symbol, quantity, is_buy_order, order_id=None, tag=None, best=None):
         super().__init__(agent_id, time_placed, symbol, quantity, is_buy_order, order_id=order_id, tag=tag)
         self.best = best
@@ -24,15 +26,6 @@ class MarketOrder(Order):
         if silent_mode: return ''
         return self.__str__()
 
-    def __copy__(self):
-        order = MarketOrder(self.agent_id, self.time_placed, self.symbol, self.quantity, self.is_buy_order,
-                            order_id=self.order_id,
-                            tag=self.tag,
-                            best=self.best)
-        Order._order_ids.pop()  # remove duplicate agent ID
-        order.fill_price = self.fill_price
-        return order
-
     def __deepcopy__(self, memodict={}):
         # Deep copy instance attributes
         agent_id = deepcopy(self.agent_id, memodict)
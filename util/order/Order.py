@@ -1,13 +1,34 @@
 # A basic Order type used by an Exchange to conduct trades or maintain an order book.
 # This should not be confused with order Messages agents send to request an Order.
 # Specific order types will inherit from this (like LimitOrder).
+#
+# Orders use __slots__ rather than a per-instance __dict__, as simulations create millions of them.
+# Subclasses must declare __slots__ for any attributes they add (otherwise every instance gets a
+# __dict__ again).  All slots, in declaration order from Order down, are the fields reported by
+# to_dict() and copied by snapshot().
 
-from copy import deepcopy
+from operator import attrgetter
 
 
 class Order:
-    order_id = 0
+
+    __slots__ = ('agent_id', 'time_placed', 'symbol', 'quantity', 'is_buy_order', 'order_id', 'filled',
+                 'fill_price', 'fill_time', 'fill_quantity', 'fill_type', 'fill_percentage', 'tag')
+
+    # Next candidate for an automatically generated order id.
+    _next_order_id = 0
+
+    # Every order id used so far, so that generated ids never collide with an existing order.  This
+    # grows with every order created.  Config files in which every order is given an explicit id
+    # (e.g. all orders placed through TradingAgent) may set check_order_ids = False to stop recording
+    # ids; generated ids are then simply sequential and NOT checked against explicit ones.
     _order_ids = set()
+    check_order_ids = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = cls._fields + tuple(cls.__dict__.get('__slots__', ()))
+        cls._get_fields = attrgetter(*cls._fields)
 
     def __init__(self, agent_id, time_placed, symbol, quantity, is_buy_order, order_id=None, tag=None):
 
@@ -27,7 +48,7 @@ class Order:
 
         # Order ID: either self generated or assigned
         self.order_id = self.generateOrderId() if not order_id else order_id
-        Order._order_ids.add(self.order_id)
+        if Order.check_order_ids: Order._order_ids.add(self.order_id)
 
         # Create placeholder fields that don't get filled in until certain
         # events happen.  (We could instead subclass to a special FilledOrder
@@ -48,20 +69,35 @@ class Order:
 
     def generateOrderId(self):
         # generates a unique order ID if the order ID is not specified
-        if not Order.order_id in Order._order_ids:
-            oid = Order.order_id
-        else:
-            Order.order_id += 1
-            oid = self.generateOrderId()
-        return oid
+        if not Order.check_order_ids:
+            oid = Order._next_order_id
+            Order._next_order_id += 1
+            return oid
+
+        while Order._next_order_id in Order._order_ids:
+            Order._next_order_id += 1
+        return Order._next_order_id
+
+    def snapshot(self):
+        # Returns a copy of this order exactly as it is now.  Unlike deepcopy, which re-runs the
+        # constructor for each copy, this copies the attributes directly and does not register
+        # the order id again.  All attributes are immutable values, so a shallow copy is enough.
+        order = type(self).__new__(type(self))
+        for field, value in zip(self._fields, self._get_fields(self)):
+            setattr(order, field, value)
+        return order
 
     def to_dict(self):
-        as_dict = deepcopy(self).__dict__
+        as_dict = dict(zip(self._fields, self._get_fields(self)))
         as_dict['time_placed'] = self.time_placed.isoformat()
         return as_dict
 
     def __copy__(self):
-        raise NotImplementedError
+        return self.snapshot()
 
     def __deepcopy__(self, memodict={}):
         raise NotImplementedError
+
+
+Order._fields = Order.__slots__
+Order._get_fields = attrgetter(*Order._fields)
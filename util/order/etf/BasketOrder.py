@@ -14,6 +14,8 @@ silent_mode = False
 
 class BasketOrder (Order):
 
+  __slots__ = ('dollar',)
+
   def __init__ (self, agent_id, time_placed, symbol, quantity, is_buy_order, dollar=True, order_id=None):
     super().__init__(agent_id, time_placed, symbol, quantity, is_buy_order, order_id)
     self.dollar = dollar
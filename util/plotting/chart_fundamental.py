@@ -7,6 +7,7 @@ import argparse
 import sys
 sys.path.append('..')
 from formatting.convert_order_stream import dir_path
+from LogFormat import readLog
 
 
 class Constants:
@@ -74,7 +75,7 @@ if __name__ == "__main__":
     set_up_plotting()
     validate_input(args.fundamental_file, args.legend_label)
 
-    fundamentals_df_list = [pd.read_pickle(f) for f in args.fundamental_file]
+    fundamentals_df_list = [readLog(f) for f in args.fundamental_file]
     legend_labels = args.legend_label
     plot_title = args.title
     output_dir = args.output_dir
@@ -5,6 +5,7 @@ import os
 sys.path.append('../..')
 
 from realism.realism_utils import make_orderbook_for_analysis, MID_PRICE_CUTOFF
+from util.LogFormat import readLog, findLog
 from matplotlib import pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
@@ -240,11 +241,11 @@ def load_fundamental(ob_path):
     ticker = basename.split('_')[1]
 
     # fundamental path from ticker fundamental_TICKER.bz2
-    fundamental_path = f'{os.path.dirname(ob_path)}/fundamental_{ticker}.bz2'
+    fundamental_path = findLog(f'{os.path.dirname(ob_path)}/fundamental_{ticker}.bz2')
 
     # load fundamental as pandas series
     if os.path.exists(fundamental_path):
-        fundamental_df = pd.read_pickle(fundamental_path)
+        fundamental_df = readLog(fundamental_path)
         fundamental_ts = fundamental_df['FundamentalValue'].sort_index() / 100  # convert to USD from cents
         fundamental_ts = fundamental_ts.loc[~fundamental_ts.index.duplicated(keep='last')]
 
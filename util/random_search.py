@@ -1,13 +1,68 @@
 import argparse
 import itertools
-from util import numeric
 import random
+import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[1])  # repository root, one level up from this file
+if p not in sys.path: sys.path.insert(0, p)
 
+import numpy as np
 
-def generate_random_tuples(list_of_lists, num_samples, seed):
+from util.util import numeric
+
+SAMPLING_METHODS = ['random', 'lhs', 'sobol']
+
+
+def random_tuples(list_of_lists, num_samples, seed):
+    """ Returns num_samples tuples drawn uniformly at random from the Cartesian product of a group
+        of lists (with replacement). """
     random.seed(a=seed)
-    for n in range(num_samples):
-        items = [random.choice(l) for l in list_of_lists]
+    return [tuple(random.choice(l) for l in list_of_lists) for n in range(num_samples)]
+
+
+def latin_hypercube_tuples(list_of_lists, num_samples, seed):
+    """ Returns num_samples tuples from the Cartesian product of a group of lists, chosen by Latin
+        hypercube sampling of the unit hypercube, each dimension mapped onto the indices of its
+        list: each list is split into num_samples equal strata of indices, each sampled once. """
+    random_state = np.random.RandomState(seed)
+    points = np.empty((num_samples, len(list_of_lists)))
+    for d in range(len(list_of_lists)):
+        points[:, d] = (random_state.permutation(num_samples) + random_state.rand(num_samples)) / num_samples
+    return unit_points_to_tuples(points, list_of_lists)
+
+
+def sobol_tuples(list_of_lists, num_samples, seed):
+    """ Returns num_samples tuples from the Cartesian product of a group of lists, chosen by a
+        scrambled Sobol sequence over the unit hypercube, each dimension mapped onto the indices of
+        its list.  Needs scipy >= 1.7.  Sobol sequences are balanced for powers of two samples. """
+    from scipy.stats import qmc
+    points = qmc.Sobol(d=len(list_of_lists), scramble=True, seed=seed).random(num_samples)
+    return unit_points_to_tuples(points, list_of_lists)
+
+
+def unit_points_to_tuples(points, list_of_lists):
+    """ Maps each point of the unit hypercube to the list elements at the corresponding indices. """
+    tuples = []
+    for point in points:
+        tuples.append(tuple(l[min(int(x * len(l)), len(l) - 1)] for x, l in zip(point, list_of_lists)))
+    return tuples
+
+
+def sample_tuples(list_of_lists, num_samples, seed, method='random'):
+    """ Returns num_samples tuples from the Cartesian product of a group of lists, by the given
+        sampling method (one of SAMPLING_METHODS). """
+    if method == 'random':
+        return random_tuples(list_of_lists, num_samples, seed)
+    elif method == 'lhs':
+        return latin_hypercube_tuples(list_of_lists, num_samples, seed)
+    elif method == 'sobol':
+        return sobol_tuples(list_of_lists, num_samples, seed)
+    else:
+        raise ValueError(f"Option not in {SAMPLING_METHODS}")
+
+
+def generate_random_tuples(list_of_lists, num_samples, seed, method='random'):
+    for items in sample_tuples(list_of_lists, num_samples, seed, method):
         print(','.join(str(s) for s in items))
 
 
@@ -17,9 +72,11 @@ def parse_cli():
                         help='Start of list', required=True, type=numeric)
     parser.add_argument('-n', '--num-samples', type=int, required=True, help='Number of tuples to print.')
     parser.add_argument('-s', '--random-seed', type=int, default=12345, help='Random seed.')
+    parser.add_argument('-m', '--method', default='random', choices=SAMPLING_METHODS,
+                        help='Sampling method: uniform random, Latin hypercube or Sobol sequence.')
 
     args = parser.parse_args()
-    generate_random_tuples(args.list, args.num_samples, args.random_seed)
+    generate_random_tuples(args.list, args.num_samples, args.random_seed, args.method)
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 from contextlib import contextmanager
 import warnings
+import logging
 from scipy.spatial.distance import pdist, squareform
 
 
@@ -13,13 +14,52 @@ from scipy.spatial.distance import pdist, squareform
 silent_mode = False
 
 
+# The Python logger behind log_print.  Verbose runs print its records to stdout, as log_print always
+# has, but they can be filtered or sent elsewhere like those of any other logger, e.g.
+# logging.getLogger('abides').setLevel(logging.WARNING) to mute log_print for part of a run.
+logger = logging.getLogger('abides')
+
+
+class _PrintHandler(logging.Handler):
+  # Prints each record to whatever sys.stdout is at the time, so that log_print output follows
+  # redirect_stdout (see util.ExperimentRunner).
+  def emit(self, record):
+    try: print (self.format(record))
+    except Exception: self.handleError(record)
+
+
+class _BraceMessage:
+  # A log_print message, formatted with str.format only when a handler asks for it.
+  __slots__ = ('fmt', 'args')
+
+  def __init__(self, fmt, args):
+    self.fmt = fmt
+    self.args = args
+
+  def __str__(self):
+    return self.fmt.format(*self.args)
+
+
+logger.addHandler(_PrintHandler())
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
 # This optional log_print function will call str.format(args) and print the
 # result to stdout.  It will return immediately when silent mode is active.
 # Use it for all permanent logging print statements to allow fastest possible
-# execution when verbose flag is not set.  This is especially fast because
-# the arguments will not even be formatted when in silent mode.
+# execution when verbose flag is not set.  The arguments are not even formatted
+# when in silent mode, but they are still evaluated: where that costs something
+# (fmtTime, string building), guard the call with log_enabled() instead.
 def log_print (str, *args):
-  if not silent_mode: print (str.format(*args))
+  if not silent_mode and logger.isEnabledFor(logging.INFO): logger.info(_BraceMessage(str, args))
+
+
+# Whether log_print would print anything.  Cheap enough to test before building
+# the arguments of a log_print on a hot path:
+#   if log_enabled(): log_print ("... {}", self.fmtTime(t))
+def log_enabled ():
+  return not silent_mode and logger.isEnabledFor(logging.INFO)
 
 
 # Accessor method for the global silent_mode variable.
@@ -115,7 +155,32 @@ def generate_uniform_random_pairwise_dist_on_line(left, right, num_points, rando
     :return:
     """
 
-    x_coords = random_state.uniform(low=left, high=right, size=num_points)
+    x_coords = generate_uniform_random_points_on_line(left, right, num_points, random_state=random_state)
+    return pairwise_dist_on_line(x_coords)
+
+
+def generate_uniform_random_points_on_line(left, right, num_points, random_state=None):
+    """ Uniformly generate points on an interval, and return numpy array of their coordinates.
+
+    :param left: left endpoint of interval
+    :param right: right endpoint of interval
+    :param num_points: number of points to use
+    :param random_state: np.RandomState object
+
+    :return:
+    """
+
+    return random_state.uniform(low=left, high=right, size=num_points)
+
+
+def pairwise_dist_on_line(x_coords):
+    """ Return numpy array of pairwise distances between points on a line.
+
+    :param x_coords: numpy array of point coordinates
+
+    :return:
+    """
+
     x_coords = x_coords.reshape((x_coords.size, 1))
     out = pdist(x_coords, 'euclidean')
     return squareform(out)